@@ -0,0 +1,6 @@
+﻿from modules_utils.lazy_import import lazy_submodules
+
+__getattr__, __dir__ = lazy_submodules(__name__, [
+    "alert_system",
+    "telegram_bot",
+])
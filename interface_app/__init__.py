@@ -0,0 +1,11 @@
+﻿from modules_utils.lazy_import import lazy_submodules
+
+__getattr__, __dir__ = lazy_submodules(__name__, [
+    "dashboard",
+    "holding_tab",
+    "immo_tab",
+    "log_visualizer",
+    "module_health_map",
+    "prop_kpis",
+    "propfirm_tab",
+])
@@ -61,11 +61,19 @@ def render_trades():
 
 def render_health():
     st.subheader("Health")
-    if st.button("Re-check"):
-        rpt = run_health_checks(Path("."))
-        st.session_state["health"] = rpt.to_json()
-    rpt_json = st.session_state.get("health", run_health_checks(Path(".")).to_json())
-    st.code(rpt_json, language="json")
+    # checks en parallèle + cache TTL par check: un rerun ne relance que les checks expirés
+    rpt = run_health_checks(Path("."), fresh=st.button("Re-check"))
+    st.code(rpt.to_json(), language="json")
+    st.dataframe(
+        {
+            "check": list(rpt.details),
+            "status": list(rpt.details.values()),
+            "ms": [rpt.durations_ms.get(k) for k in rpt.details],
+            "cached": [rpt.cached.get(k, False) for k in rpt.details],
+        },
+        use_container_width=True,
+        hide_index=True,
+    )
 
 
 def main():
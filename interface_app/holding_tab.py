@@ -1,12 +1,14 @@
 ﻿from __future__ import annotations
 
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import pandas as pd
 import streamlit as st
 import yaml
 
+from modules_utils.csv_tail import CsvTailReader
 from interface_app.holding_compta_logs import render_holding_compta_logs  # <- NEW
+from interface_app.prop_kpis import sync_kpi_engine
 
 @st.cache_data(ttl=10)
 def load_holding_config(path: str = "config/holding.yml") -> Dict[str, Any]:
@@ -24,22 +26,26 @@ def load_prop_rules(path: str = "config/prop_rules.yml") -> Dict[str, Any]:
     with open(p, "r", encoding="utf-8") as f:
         return yaml.safe_load(f) or {"accounts": []}
 
-@st.cache_data(ttl=10)
+@st.cache_resource
+def _csv_reader(path: str, parse_dates: Tuple[str, ...] = ()) -> CsvTailReader:
+    # un lecteur par fichier, partagé entre reruns: seules les lignes ajoutées sont parsées
+    return CsvTailReader(path, parse_dates=parse_dates)
+
 def load_equity_intraday(path: str = "data/equity_intraday.csv") -> Optional[pd.DataFrame]:
     p = Path(path)
     if not p.exists():
         return None
-    df = pd.read_csv(p)
-    if "timestamp" in df.columns:
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-    return df
+    rd = _csv_reader(path, ("timestamp",))
+    rd.refresh()
+    return rd.frame()
 
-@st.cache_data(ttl=10)
 def load_trades_today(path: str = "data/trades_today.csv") -> Optional[pd.DataFrame]:
     p = Path(path)
     if not p.exists():
         return None
-    return pd.read_csv(p)
+    rd = _csv_reader(path)
+    rd.refresh()
+    return rd.frame()
 
 def _build_tree_table(cfg: Dict[str, Any]) -> pd.DataFrame:
     rows: List[Dict[str, Any]] = []
@@ -71,20 +77,11 @@ def _build_tree_table(cfg: Dict[str, Any]) -> pd.DataFrame:
 def _aggregate_prop_kpis() -> Dict[str, Any]:
     rules = load_prop_rules()
     accounts = [a.get("id") for a in (rules.get("accounts") or []) if a.get("id")]
-    eq_df = load_equity_intraday()
-    tr_df = load_trades_today()
+    eng = sync_kpi_engine(rules, load_equity_intraday(), load_trades_today())
+    kpis = eng.all_kpis()
 
-    total_equity = 0.0
-    if eq_df is not None and not eq_df.empty and "timestamp" in eq_df.columns:
-        for acc in accounts:
-            sub = eq_df[eq_df.get("account_id", acc) == acc]
-            if not sub.empty:
-                sub = sub.sort_values("timestamp")
-                total_equity += float(sub["equity"].iloc[-1])
-
-    pnl_day = 0.0
-    if tr_df is not None and not tr_df.empty and "pnl" in tr_df.columns:
-        pnl_day = float(tr_df["pnl"].sum())
+    total_equity = sum(kpis[acc]["equity_now"] or 0.0 for acc in accounts if acc in kpis)
+    pnl_day = sum(k["pnl_day"] for k in kpis.values())
 
     return {
         "accounts_count": len(accounts),
@@ -142,8 +139,7 @@ def render_holding():
             st.info("Aucun outil déclaré.")
 
     st.caption("Les KPIs seront alimentés par les modules compta/prop/immo plus tard.")
-# Ouvre le fichier pour édition rapide
-notepad .\interface_app\holding_compta_logs.py
+
     # === Compta & Logs consolidés (holding) ===
     render_holding_compta_logs()
     # Export CSV
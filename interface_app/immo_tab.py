@@ -5,6 +5,7 @@ from datetime import datetime
 from modules_utils.ledger import read_ledger, append_entry
 from modules_utils.audit import audit
 from modules_utils.paths import IMMO_LOG
+from interface_app.log_visualizer import render_log_tail, render_log_visualizer
 
 def render_immo():
     st.subheader("Immo (SCI / futur)")
@@ -50,9 +51,6 @@ def render_immo():
             audit("immo", "INFO", f"Test log asset {asset}")
             st.toast("Ligne ajoutée à logs/immo.log")
 
-    # Log texte Immo
-    try:
-        text = IMMO_LOG.read_text(encoding="utf-8")
-        st.text_area("immo.log", text, height=200)
-    except FileNotFoundError:
-        st.info("logs/immo.log inexistant pour l'instant.")
+    # Logs Immo: requêtes paginées sur log_db + fin de immo.log (borné)
+    render_log_visualizer("immo_logs")
+    render_log_tail(IMMO_LOG, "immo.log")
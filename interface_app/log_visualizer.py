@@ -0,0 +1,157 @@
+﻿from __future__ import annotations
+
+import logging
+import os
+from datetime import datetime, time as dtime
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+import streamlit as st
+
+from modules_utils.log_query import LogFilter, LogQuery, LogRow
+
+LOG_DB = Path("logs/log_db.sqlite")
+LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+PAGE_SIZE = 100
+FOLLOW_MAX_ROWS = 500
+
+
+@st.cache_resource
+def _log_query(db_path: str) -> LogQuery:
+    # une connexion lecture seule partagée entre reruns
+    return LogQuery(db_path)
+
+
+def tail_text(path: str | Path, max_bytes: int = 64_000) -> str:
+    """Fin d'un fichier texte (au plus `max_bytes`), coupée sur une ligne complète."""
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        start = max(0, size - max_bytes)
+        f.seek(start)
+        data = f.read()
+    if start > 0:
+        data = data[data.find(b"\n") + 1:]
+    return data.decode("utf-8", errors="replace")
+
+
+def render_log_tail(path: Path, label: str, max_bytes: int = 64_000) -> None:
+    """Aperçu borné d'un .log texte (remplace l'affichage du fichier entier)."""
+    try:
+        text = tail_text(path, max_bytes)
+    except FileNotFoundError:
+        st.info(f"{path.as_posix()} inexistant pour l'instant.")
+        return
+    with st.expander(f"{label} (fin du fichier)"):
+        st.code(text or "(vide)", language="log")
+
+
+def _rows_df(rows: List[LogRow]) -> pd.DataFrame:
+    return pd.DataFrame({
+        "time": [datetime.fromtimestamp(r.ts) for r in rows],
+        "level": [r.level_name for r in rows],
+        "logger": [r.logger for r in rows],
+        "account": [r.account for r in rows],
+        "message": [r.message for r in rows],
+        "where": [f"{r.module}.{r.func}:{r.lineno}" for r in rows],
+    })
+
+
+def _filter_inputs(key: str, account: Optional[str]) -> LogFilter:
+    c1, c2, c3, c4 = st.columns([1, 1, 1, 2])
+    with c1:
+        day = st.date_input("Depuis", value=None, key=f"{key}_since")
+    with c2:
+        level = st.selectbox("Niveau min", LEVELS, index=1, key=f"{key}_level")
+    with c3:
+        logger_name = st.text_input("Logger", value="", key=f"{key}_logger")
+    with c4:
+        text = st.text_input("Recherche texte", value="", key=f"{key}_text")
+    if account is None:
+        account = st.text_input("Compte", value="", key=f"{key}_account") or None
+    return LogFilter(
+        since=datetime.combine(day, dtime.min).timestamp() if day else None,
+        min_level=logging.getLevelName(level),
+        logger=logger_name.strip() or None,
+        account=account,
+        text=text.strip() or None,
+    )
+
+
+def _render_pages(q: LogQuery, flt: LogFilter, key: str) -> None:
+    # pile des curseurs keyset: [None, c1, c2, ...] -> page courante = dernier
+    state_key = f"{key}_cursors"
+    sig_key = f"{key}_filter"
+    if st.session_state.get(sig_key) != flt:
+        st.session_state[sig_key] = flt
+        st.session_state[state_key] = [None]
+    cursors = st.session_state[state_key]
+
+    page = q.page(flt, cursor=cursors[-1], limit=PAGE_SIZE)
+    if page.rows:
+        st.dataframe(_rows_df(page.rows), use_container_width=True, hide_index=True)
+    else:
+        st.info("Aucune ligne pour ces filtres.")
+
+    c1, c2, c3 = st.columns([1, 1, 3])
+    with c1:
+        if st.button("⏮ Récents", key=f"{key}_first", disabled=len(cursors) == 1):
+            st.session_state[state_key] = [None]
+            st.rerun()
+    with c2:
+        if st.button("Plus anciens ▶", key=f"{key}_next", disabled=page.next_cursor is None):
+            cursors.append(page.next_cursor)
+            st.rerun()
+    with c3:
+        st.caption(f"Page {len(cursors)} · {len(page.rows)} lignes")
+
+
+def _render_follow(q: LogQuery, flt: LogFilter, key: str) -> None:
+    rows_key = f"{key}_follow_rows"
+    last_key = f"{key}_follow_last"
+    if st.session_state.get(f"{key}_follow_filter") != flt:
+        st.session_state[f"{key}_follow_filter"] = flt
+        # on amorce avec la page la plus récente, puis on ne lit que id > dernier vu
+        st.session_state[rows_key] = list(reversed(q.page(flt, limit=PAGE_SIZE).rows))
+        st.session_state[last_key] = q.last_id()
+
+    new = q.tail(flt, after_id=st.session_state[last_key], limit=FOLLOW_MAX_ROWS)
+    if new:
+        st.session_state[last_key] = new[-1].id
+        st.session_state[rows_key] = (st.session_state[rows_key] + new)[-FOLLOW_MAX_ROWS:]
+    rows = st.session_state[rows_key]
+    st.dataframe(_rows_df(rows[::-1]), use_container_width=True, hide_index=True)
+    st.caption(f"Suivi en direct · {len(rows)} dernières lignes")
+
+
+def render_log_visualizer(
+    key: str = "logs",
+    *,
+    account: Optional[str] = None,
+    db_path: Path = LOG_DB,
+    refresh_s: float = 2.0,
+) -> None:
+    """
+    Explorateur de logs/log_db.sqlite: filtres (date, niveau, logger, compte,
+    texte), pagination keyset et suivi en direct. Aucune requête ne charge
+    plus d'une page en mémoire.
+
+    Exemple d'usage:
+      render_log_visualizer("prop_logs", account=acc_id)
+    """
+    if not db_path.exists():
+        st.info(f"{db_path.as_posix()} inexistant pour l'instant.")
+        return
+    q = _log_query(str(db_path))
+    flt = _filter_inputs(key, account)
+    follow = st.toggle("Suivi en direct", value=False, key=f"{key}_follow")
+    if not follow:
+        _render_pages(q, flt, key)
+        return
+
+    fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+    if fragment is None:
+        _render_follow(q, flt, key)
+        st.button("Rafraîchir", key=f"{key}_refresh")
+        return
+    fragment(run_every=refresh_s)(_render_follow)(q, flt, key)
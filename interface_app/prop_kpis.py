@@ -0,0 +1,64 @@
+﻿from __future__ import annotations
+
+from threading import Lock
+from typing import Any, Dict, Optional
+
+import pandas as pd
+import streamlit as st
+
+from sniper_engine.risk_manager import PropKpiEngine
+
+
+@st.cache_resource
+def _kpi_feed() -> Dict[str, Any]:
+    # Partagé entre reruns et sessions: on ne pousse que les lignes nouvelles.
+    return {"engine": PropKpiEngine(), "eq_rows": 0, "tr_rows": 0, "lock": Lock()}
+
+
+def _feed_equity(eng: PropKpiEngine, new: pd.DataFrame) -> None:
+    if new.empty or "account_id" not in new.columns or "equity" not in new.columns:
+        return
+    if "timestamp" in new.columns:
+        new = new.sort_values("timestamp", kind="stable")
+    peaks = new.groupby("account_id", sort=False)["equity"].max()
+    last = new.drop_duplicates("account_id", keep="last").set_index("account_id")
+    for acc, row in last.iterrows():
+        ts = row["timestamp"] if "timestamp" in last.columns else pd.Timestamp.now()
+        eng.on_equity(acc, ts.to_pydatetime(), float(row["equity"]), peak=float(peaks[acc]))
+
+
+def _feed_trades(eng: PropKpiEngine, new: pd.DataFrame) -> None:
+    if new.empty or "account_id" not in new.columns or "pnl" not in new.columns:
+        return
+    if "timestamp" not in new.columns:
+        for acc, pnl in new.groupby("account_id", sort=False)["pnl"].sum().items():
+            eng.on_trade(acc, float(pnl))
+        return
+    # heure du trade: une ligne d'hier (rejeu, fichier rechargé) tombe dans sa propre période
+    ts = pd.to_datetime(new["timestamp"], errors="coerce")
+    order = ts.argsort(kind="stable")
+    for acc, pnl, t in zip(new["account_id"].to_numpy()[order], new["pnl"].to_numpy()[order], ts.iloc[order]):
+        eng.on_trade(acc, float(pnl), None if pd.isna(t) else t.to_pydatetime())
+
+
+def sync_kpi_engine(
+    rules_cfg: Dict[str, Any],
+    eq_df: Optional[pd.DataFrame],
+    tr_df: Optional[pd.DataFrame],
+) -> PropKpiEngine:
+    """Met à jour le moteur avec les lignes apparues depuis le dernier rerun."""
+    feed = _kpi_feed()
+    eq_n = 0 if eq_df is None else len(eq_df)
+    tr_n = 0 if tr_df is None else len(tr_df)
+    with feed["lock"]:
+        if eq_n < feed["eq_rows"] or tr_n < feed["tr_rows"]:
+            # fichier tronqué / rotaté (nouvelle journée): on repart de zéro
+            feed.update(engine=PropKpiEngine(), eq_rows=0, tr_rows=0)
+        eng = feed["engine"]
+        eng.set_rules(rules_cfg.get("accounts", []) or [])
+        if eq_df is not None:
+            _feed_equity(eng, eq_df.iloc[feed["eq_rows"]:])
+        if tr_df is not None:
+            _feed_trades(eng, tr_df.iloc[feed["tr_rows"]:])
+        feed["eq_rows"], feed["tr_rows"] = eq_n, tr_n
+    return eng
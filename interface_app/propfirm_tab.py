@@ -1,7 +1,7 @@
 ﻿from __future__ import annotations
 
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 import pandas as pd
 import streamlit as st
 import yaml
@@ -11,6 +11,9 @@ from modules_utils.notify import send_telegram
 from modules_utils.ledger import read_ledger, append_entry
 from modules_utils.audit import audit
 from modules_utils.paths import PROP_LOG
+from modules_utils.csv_tail import CsvTailReader
+from interface_app.prop_kpis import sync_kpi_engine
+from interface_app.log_visualizer import render_log_tail, render_log_visualizer
 
 PARIS = pytz.timezone("Europe/Paris")
 
@@ -22,22 +25,26 @@ def load_prop_rules(path: str = "config/prop_rules.yml") -> Dict[str, Any]:
     with open(p, "r", encoding="utf-8") as f:
         return yaml.safe_load(f) or {"accounts": []}
 
-@st.cache_data(ttl=10)
+@st.cache_resource
+def _csv_reader(path: str, parse_dates: Tuple[str, ...] = ()) -> CsvTailReader:
+    # un lecteur par fichier, partagé entre reruns: seules les lignes ajoutées sont parsées
+    return CsvTailReader(path, parse_dates=parse_dates)
+
 def load_equity_intraday(path: str = "data/equity_intraday.csv") -> Optional[pd.DataFrame]:
     p = Path(path)
     if not p.exists():
         return None
-    df = pd.read_csv(p)
-    if "timestamp" in df.columns:
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-    return df
+    rd = _csv_reader(path, ("timestamp",))
+    rd.refresh()
+    return rd.frame()
 
-@st.cache_data(ttl=10)
 def load_trades_today(path: str = "data/trades_today.csv") -> Optional[pd.DataFrame]:
     p = Path(path)
     if not p.exists():
         return None
-    return pd.read_csv(p)
+    rd = _csv_reader(path)
+    rd.refresh()
+    return rd.frame()
 
 def _time_until_reset(reset_time_str: str) -> Optional[str]:
     if not reset_time_str:
@@ -56,55 +63,6 @@ def _time_until_reset(reset_time_str: str) -> Optional[str]:
     except Exception:
         return None
 
-def compute_kpis(account: Dict[str, Any], eq_df: Optional[pd.DataFrame], trades_df: Optional[pd.DataFrame]) -> Dict[str, Any]:
-    acc_id = account.get("id")
-    rules  = account.get("rules", {}) or {}
-    init_cap = float(account.get("initial_capital", 0.0))
-
-    equity_now = None
-    dd_current = None
-    if eq_df is not None and not eq_df.empty:
-        sub = eq_df[eq_df.get("account_id", acc_id) == acc_id].copy() if "account_id" in eq_df.columns else eq_df.copy()
-        if not sub.empty:
-            sub = sub.sort_values("timestamp")
-            equity_now = float(sub["equity"].iloc[-1])
-            peak = float(sub["equity"].max())
-            dd_current = max(0.0, peak - float(sub["equity"].iloc[-1]))
-
-    pnl_day = 0.0
-    if trades_df is not None and not trades_df.empty:
-        sub_t = trades_df[trades_df.get("account_id", acc_id) == acc_id]
-        if "pnl" in sub_t.columns:
-            pnl_day = float(sub_t["pnl"].sum())
-
-    daily_loss_limit = float(rules.get("daily_loss_limit", 0.0))
-    max_drawdown     = float(rules.get("max_drawdown", 0.0))
-
-    margin_daily_left = daily_loss_limit - max(0.0, -pnl_day)
-    margin_dd_left = None
-    if dd_current is not None and max_drawdown > 0:
-        margin_dd_left = max_drawdown - dd_current
-
-    def pct_safe(numer, denom):
-        if denom is None or denom <= 0:
-            return None
-        return max(0, min(100, int(round((numer / denom) * 100))))
-
-    daily_pct = pct_safe(margin_daily_left, daily_loss_limit) if daily_loss_limit > 0 else None
-    dd_pct = pct_safe(margin_dd_left, max_drawdown) if (max_drawdown and margin_dd_left is not None) else None
-
-    return {
-        "equity_now": equity_now,
-        "pnl_day": pnl_day,
-        "dd_current": dd_current,
-        "daily_loss_limit": daily_loss_limit,
-        "max_drawdown": max_drawdown,
-        "margin_daily_left": margin_daily_left,
-        "margin_dd_left": margin_dd_left,
-        "daily_pct": daily_pct,
-        "dd_pct": dd_pct,
-    }
-
 def render_prop_compta_logs(acc_id: str):
     st.markdown("### Compta & Logs (Prop)")
 
@@ -141,12 +99,9 @@ def render_prop_compta_logs(acc_id: str):
             audit("prop", "INFO", f"Test log compte {acc_id}")
             st.toast("Ligne ajoutée à logs/prop.log")
 
-    # Log texte Prop (aperçu)
-    try:
-        text = PROP_LOG.read_text(encoding="utf-8")
-        st.text_area("prop.log", text, height=200)
-    except FileNotFoundError:
-        st.info("logs/prop.log inexistant pour l'instant.")
+    # Logs Prop: requêtes paginées sur log_db + fin de prop.log (borné)
+    render_log_visualizer(f"prop_logs_{acc_id}", account=acc_id)
+    render_log_tail(PROP_LOG, "prop.log")
 
 def render_propfirm():
     st.subheader("Prop Firm")
@@ -181,7 +136,8 @@ def render_propfirm():
     eq_df = load_equity_intraday()
     tr_df = load_trades_today()
 
-    kpis = compute_kpis(account, eq_df, tr_df)
+    # KPIs incrémentaux: seules les lignes nouvelles depuis le dernier rerun sont lues
+    kpis = sync_kpi_engine(rules_cfg, eq_df, tr_df).kpis(acc_id)
     with left:
         col1, col2, col3 = st.columns(3)
         col1.metric("Equity (now)", f"{kpis['equity_now']:,.0f} $" if kpis["equity_now"] is not None else "—")
@@ -0,0 +1,16 @@
+﻿from modules_utils.lazy_import import lazy_submodules
+
+__getattr__, __dir__ = lazy_submodules(__name__, [
+    "archive_logs",
+    "config_loader",
+    "csv_tail",
+    "health",
+    "health_watchdog",
+    "lazy_import",
+    "log_db_migrator",
+    "log_db_writer",
+    "log_query",
+    "patcher",
+    "rate_limiter",
+    "shared_buckets",
+])
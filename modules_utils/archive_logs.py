@@ -0,0 +1,449 @@
+﻿from __future__ import annotations
+
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from threading import Event, Lock, Thread
+from typing import IO, Any, Dict, Iterator, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # dépendance optionnelle: repli gzip
+    zstandard = None
+
+log = logging.getLogger("sniper")
+
+MANIFEST = "manifest.jsonl"
+_PENDING = ".pending"
+
+
+# ---------- Codecs (flux, mémoire bornée) ----------
+
+@dataclass(frozen=True)
+class _Codec:
+    name: str
+    suffix: str
+
+    def writer(self, raw: IO[bytes]) -> IO[bytes]:
+        if self.name == "zstd":
+            return zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=False)
+        return gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0)
+
+    def reader(self, raw: IO[bytes]) -> IO[bytes]:
+        if self.name == "zstd":
+            if zstandard is None:
+                raise RuntimeError("archive is zstd-compressed but 'zstandard' is not installed")
+            return zstandard.ZstdDecompressor().stream_reader(raw)
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+
+
+_CODECS = {"zstd": _Codec("zstd", ".zst"), "gzip": _Codec("gzip", ".gz")}
+
+
+def _pick_codec(name: str) -> _Codec:
+    if name == "auto":
+        name = "zstd" if zstandard is not None else "gzip"
+    if name == "zstd" and zstandard is None:
+        raise ValueError("codec 'zstd' requires the 'zstandard' package")
+    if name not in _CODECS:
+        raise ValueError(f"unknown codec: {name}")
+    return _CODECS[name]
+
+
+def _line_day(line: bytes) -> Optional[str]:
+    # format des handlers texte: "%Y-%m-%d %H:%M:%S | ..." (config/logging.yml)
+    head = line[:10]
+    if len(head) == 10 and head[4:5] == b"-" and head[7:8] == b"-" and head[:4].isdigit():
+        return head.decode("ascii")
+    return None
+
+
+class _Part:
+    """Un fichier compressé (jour, source) écrit en .tmp puis renommé."""
+
+    def __init__(self, archive_dir: Path, day: str, source: str, ext: str, codec: _Codec) -> None:
+        day_dir = archive_dir / day[:4] / day[5:7] / day
+        day_dir.mkdir(parents=True, exist_ok=True)
+        seq = 1 + sum(1 for p in day_dir.iterdir() if p.name.startswith(source + ".") and not p.name.endswith(".tmp"))
+        self.path = day_dir / f"{source}.{seq:04d}{ext}{codec.suffix}"
+        self.day, self.source, self.codec = day, source, codec
+        self.lines = 0
+        self.raw_bytes = 0
+        self._raw = open(self.path.with_name(self.path.name + ".tmp"), "wb")
+        self._z = codec.writer(self._raw)
+
+    def write(self, data: bytes, lines: int) -> None:
+        self._z.write(data)
+        self.raw_bytes += len(data)
+        self.lines += lines
+
+    def commit(self, archive_dir: Path) -> Dict[str, Any]:
+        self._z.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+        os.replace(self._raw.name, self.path)
+        return {
+            "day": self.day,
+            "source": self.source,
+            "path": self.path.relative_to(archive_dir).as_posix(),
+            "codec": self.codec.name,
+            "lines": self.lines,
+            "raw_bytes": self.raw_bytes,
+            "bytes": self.path.stat().st_size,
+            "created": round(time.time(), 3),
+        }
+
+    def abort(self) -> None:
+        try:
+            self._z.close()
+        finally:
+            self._raw.close()
+            Path(self._raw.name).unlink(missing_ok=True)
+
+
+class LogArchiver:
+    """
+    Archive les logs en flux vers logs/archive/AAAA/MM/AAAA-MM-JJ/ :
+      - fichiers texte rotés (system.log.1..N du RotatingFileHandler),
+        découpés par jour d'après l'horodatage de chaque ligne;
+      - lignes de logs/log_db.sqlite plus vieilles que `db_keep_days`,
+        en JSON lines, un jour à la fois, puis supprimées par petits lots.
+
+    Chaque (jour, source) est un flux compressé indépendant (zstd si
+    `zstandard` est installé, sinon gzip) référencé dans manifest.jsonl:
+    on peut relire un jour sans décompresser les autres. La lecture se fait
+    par blocs de `chunk_size` octets: mémoire bornée quelle que soit la
+    taille des logs. La rétention supprime les jours les plus anciens
+    (âge max, puis taille totale max).
+
+    Exemple d'usage:
+      arch = LogArchiver()
+      arch.start(interval=3600)          # thread de fond
+      arch.run_once()                    # ou un passage synchrone
+      for line in arch.iter_day("2025-01-15", source="system.log"):
+          ...
+    """
+
+    def __init__(
+        self,
+        logs_dir: str | Path = "logs",
+        archive_dir: str | Path = "logs/archive",
+        *,
+        db_path: Optional[str | Path] = "logs/log_db.sqlite",
+        codec: str = "auto",
+        chunk_size: int = 1 << 20,
+        db_keep_days: int = 7,
+        db_batch: int = 5_000,
+        max_age_days: Optional[int] = 90,
+        max_total_mb: Optional[float] = 2048,
+    ) -> None:
+        self.logs_dir = Path(logs_dir)
+        self.archive_dir = Path(archive_dir)
+        self.db_path = Path(db_path) if db_path else None
+        self.codec = _pick_codec(codec)
+        self.chunk_size = chunk_size
+        self.db_keep_days = db_keep_days
+        self.db_batch = db_batch
+        self.max_age_days = max_age_days
+        self.max_total_mb = max_total_mb
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    # ---------- Manifest ----------
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.archive_dir / MANIFEST
+
+    def manifest(self) -> List[Dict[str, Any]]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def _append_manifest(self, entries: List[Dict[str, Any]]) -> None:
+        if not entries:
+            return
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            for e in entries:
+                f.write(json.dumps(e, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite_manifest(self, entries: List[Dict[str, Any]]) -> None:
+        tmp = self.manifest_path.with_name(MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for e in entries:
+                f.write(json.dumps(e, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.manifest_path)
+
+    # ---------- Lecture ----------
+
+    def days(self) -> List[str]:
+        return sorted({e["day"] for e in self.manifest()})
+
+    def iter_day(self, day: str, source: Optional[str] = None) -> Iterator[str]:
+        """Lignes d'un jour archivé (décompression en flux de ses seules parties)."""
+        for e in self.manifest():
+            if e["day"] != day or (source is not None and e["source"] != source):
+                continue
+            with open(self.archive_dir / e["path"], "rb") as raw:
+                with _CODECS[e["codec"]].reader(raw) as z:
+                    rest = b""
+                    while True:
+                        chunk = z.read(self.chunk_size)
+                        if not chunk:
+                            break
+                        lines = (rest + chunk).split(b"\n")
+                        rest = lines.pop()
+                        for line in lines:
+                            yield line.decode("utf-8", errors="replace")
+                    if rest:
+                        yield rest.decode("utf-8", errors="replace")
+
+    # ---------- Fichiers texte rotés ----------
+
+    def _claim_rotated(self) -> List[Path]:
+        # rename atomique hors de l'espace de rotation: le handler peut
+        # continuer à renommer .1 -> .2 pendant qu'on compresse
+        pending = self.archive_dir / _PENDING
+        pending.mkdir(parents=True, exist_ok=True)
+        claimed = sorted(pending.iterdir())  # reprise après un arrêt brutal
+        for p in sorted(self.logs_dir.glob("*.log.[0-9]*")):
+            if not p.is_file() or not p.name.rsplit(".", 1)[-1].isdigit():
+                continue
+            dst = pending / f"{p.name}.{time.time_ns()}"
+            try:
+                os.replace(p, dst)
+            except FileNotFoundError:
+                continue  # renommé par le handler entre-temps: repris au prochain passage
+            claimed.append(dst)
+        return claimed
+
+    def _archive_text(self, path: Path) -> List[Dict[str, Any]]:
+        source = path.name.split(".log.", 1)[0] + ".log"
+        day = date.fromtimestamp(path.stat().st_mtime).isoformat()
+        parts: Dict[str, _Part] = {}
+        try:
+            with open(path, "rb") as f:
+                rest = b""
+                while True:
+                    chunk = f.read(self.chunk_size)
+                    if not chunk:
+                        if not rest:
+                            break
+                        chunk, rest = rest + b"\n", b""
+                    lines = (rest + chunk).split(b"\n")
+                    rest = lines.pop()
+                    # lignes consécutives du même jour écrites d'un bloc;
+                    # les lignes sans date (traceback) suivent la précédente
+                    start = 0
+                    for i, line in enumerate(lines):
+                        d = _line_day(line)
+                        if d is not None and d != day:
+                            self._route(parts, day, source, lines[start:i])
+                            day, start = d, i
+                    self._route(parts, day, source, lines[start:])
+            entries = [p.commit(self.archive_dir) for p in parts.values()]
+        except BaseException:
+            for p in parts.values():
+                p.abort()
+            raise
+        self._append_manifest(entries)
+        path.unlink()
+        return entries
+
+    def _route(self, parts: Dict[str, _Part], day: str, source: str, lines: List[bytes]) -> None:
+        if not lines:
+            return
+        part = parts.get(day)
+        if part is None:
+            part = parts[day] = _Part(self.archive_dir, day, source, "", self.codec)
+        part.write(b"\n".join(lines) + b"\n", len(lines))
+
+    def archive_rotated(self) -> List[Dict[str, Any]]:
+        entries: List[Dict[str, Any]] = []
+        with self._lock:
+            for p in self._claim_rotated():
+                entries += self._archive_text(p)
+        return entries
+
+    # ---------- Log DB ----------
+
+    def _db_day(self, conn: sqlite3.Connection, d0: float, d1: float, day: str) -> Optional[Dict[str, Any]]:
+        cols = ["id", "ts", "logger", "level", "account", "message", "module", "func", "lineno", "thread", "exc"]
+        part = _Part(self.archive_dir, day, "log_db", ".jsonl", self.codec)
+        max_id, key = 0, (d0, -1)
+        try:
+            while True:
+                rows = conn.execute(
+                    f"SELECT {', '.join(cols)} FROM logs WHERE ts < ? AND (ts, id) > (?, ?) "
+                    "ORDER BY ts, id LIMIT ?", (d1, key[0], key[1], self.db_batch)).fetchall()
+                if not rows:
+                    break
+                buf = "".join(json.dumps(dict(zip(cols, r)), ensure_ascii=False) + "\n" for r in rows)
+                part.write(buf.encode("utf-8"), len(rows))
+                key = (rows[-1][1], rows[-1][0])
+                max_id = max(max_id, max(r[0] for r in rows))
+            if part.lines == 0:
+                part.abort()
+                return None
+            entry = part.commit(self.archive_dir)
+        except BaseException:
+            part.abort()
+            raise
+        self._append_manifest([entry])
+        # Suppression par petits lots (transactions courtes): le writer
+        # n'attend jamais plus d'un lot. id <= max_id: les lignes arrivées
+        # après la lecture ont forcément un id plus grand et sont conservées.
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = conn.execute(
+                    "DELETE FROM logs WHERE id IN (SELECT id FROM logs WHERE ts >= ? AND ts < ? AND id <= ? LIMIT ?)",
+                    (d0, d1, max_id, self.db_batch))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            if cur.rowcount < self.db_batch:
+                break
+            time.sleep(0)  # laisse passer le thread d'écriture entre deux lots
+        return entry
+
+    def archive_db(self, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        if self.db_path is None or not self.db_path.exists():
+            return []
+        today = (now or datetime.now()).date()
+        cutoff = datetime.combine(today - timedelta(days=self.db_keep_days), datetime.min.time()).timestamp()
+        entries: List[Dict[str, Any]] = []
+        with self._lock:
+            conn = sqlite3.connect(str(self.db_path), isolation_level=None, timeout=10)
+            try:
+                lo = conn.execute("SELECT MIN(ts) FROM logs").fetchone()[0]
+                while lo is not None and lo < cutoff:
+                    day = date.fromtimestamp(lo)
+                    d0 = datetime.combine(day, datetime.min.time()).timestamp()
+                    d1 = datetime.combine(day + timedelta(days=1), datetime.min.time()).timestamp()
+                    entry = self._db_day(conn, d0, min(d1, cutoff), day.isoformat())
+                    if entry:
+                        entries.append(entry)
+                    lo = conn.execute("SELECT MIN(ts) FROM logs WHERE ts >= ?", (d1,)).fetchone()[0]
+            finally:
+                conn.close()
+        return entries
+
+    # ---------- Rétention ----------
+
+    def enforce_retention(self, today: Optional[date] = None) -> List[str]:
+        """Supprime les jours trop vieux puis les plus anciens au-delà de max_total_mb."""
+        with self._lock:
+            entries = self.manifest()
+            by_day: Dict[str, List[Dict[str, Any]]] = {}
+            for e in entries:
+                by_day.setdefault(e["day"], []).append(e)
+            days = sorted(by_day)
+            drop: List[str] = []
+            if self.max_age_days is not None:
+                oldest = ((today or date.today()) - timedelta(days=self.max_age_days)).isoformat()
+                drop += [d for d in days if d < oldest]
+            if self.max_total_mb is not None:
+                budget = self.max_total_mb * 1024 * 1024
+                total = sum(e["bytes"] for d in days if d not in drop for e in by_day[d])
+                for d in days:
+                    if total <= budget:
+                        break
+                    if d not in drop:
+                        drop.append(d)
+                        total -= sum(e["bytes"] for e in by_day[d])
+            if not drop:
+                return []
+            # manifest d'abord: un fichier orphelin vaut mieux qu'une entrée sans fichier
+            gone = set(drop)
+            self._rewrite_manifest([e for e in entries if e["day"] not in gone])
+            for d in drop:
+                for e in by_day[d]:
+                    (self.archive_dir / e["path"]).unlink(missing_ok=True)
+                day_dir = self.archive_dir / d[:4] / d[5:7] / d
+                for p in (day_dir, day_dir.parent, day_dir.parent.parent):
+                    try:
+                        p.rmdir()
+                    except OSError:
+                        break
+            return drop
+
+    # ---------- Orchestration ----------
+
+    def run_once(self) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        rotated = self.archive_rotated()
+        db = self.archive_db()
+        dropped = self.enforce_retention()
+        summary = {
+            "rotated_parts": len(rotated),
+            "db_days": len(db),
+            "db_rows": sum(e["lines"] for e in db),
+            "raw_bytes": sum(e["raw_bytes"] for e in rotated + db),
+            "bytes": sum(e["bytes"] for e in rotated + db),
+            "dropped_days": dropped,
+            "seconds": round(time.perf_counter() - t0, 3),
+        }
+        if rotated or db or dropped:
+            log.info("archive_logs: " + json.dumps(summary))
+        return summary
+
+    def _run(self, interval: float) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                log.warning(f"archive_logs: pass failed: {e}")
+            self._stop.wait(interval)
+
+    def start(self, interval: float = 3600.0) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, args=(interval,), name="log-archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def _main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Archive rotated logs and old log_db rows")
+    parser.add_argument("--logs-dir", default="logs")
+    parser.add_argument("--archive-dir", default="logs/archive")
+    parser.add_argument("--codec", default="auto", choices=["auto", "zstd", "gzip"])
+    parser.add_argument("--cat", metavar="YYYY-MM-DD", help="print an archived day and exit")
+    parser.add_argument("--source", help="with --cat: only this source (system.log, log_db...)")
+    args = parser.parse_args()
+    arch = LogArchiver(args.logs_dir, args.archive_dir, codec=args.codec)
+    if args.cat:
+        for line in arch.iter_day(args.cat, args.source):
+            sys.stdout.write(line + "\n")
+        return
+    print(json.dumps(arch.run_once(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    _main()
@@ -1,22 +1,68 @@
 ﻿from __future__ import annotations
 
+import hashlib
+import logging
+import os
+from collections import defaultdict
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Optional, Literal
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, List, Optional, Literal, Tuple
 
 import yaml
-from pydantic import BaseModel, Field, ValidationError, ConfigDict
+from pydantic import BaseModel as _PydanticBaseModel, Field, ValidationError, ConfigDict
+
+log = logging.getLogger("sniper")
 
 
 # --------- Pydantic models ---------
 
+class BaseModel(_PydanticBaseModel):
+    # Modèles immuables: la même instance est partagée via le cache du loader.
+    model_config = ConfigDict(frozen=True)
+
 class RiskModel(BaseModel):
     max_daily_dd_pct: float = Field(..., ge=0)
     max_trade_r_pct: float = Field(..., ge=0)
     target_rr: float = Field(..., gt=0)
 
+class ArchiveModel(BaseModel):
+    enabled: bool = True
+    dir: str = "logs/archive"
+    codec: Literal["auto", "zstd", "gzip"] = "auto"
+    interval_s: float = Field(default=3600.0, gt=0)
+    db_keep_days: int = Field(default=7, ge=0)
+    max_age_days: Optional[int] = Field(default=90, ge=1)
+    max_total_mb: Optional[float] = Field(default=2048.0, gt=0)
+
+class WatchdogModel(BaseModel):
+    interval_s: float = Field(default=15.0, gt=0)
+    host: str = "127.0.0.1"
+    port: int = Field(default=9108, ge=0, le=65535)
+
+class BacktestModel(BaseModel):
+    workers: Optional[int] = Field(default=None, ge=1)   # None = os.cpu_count()
+    results_dir: str = "data/models/vectorx_snapshots/archived_backtests"
+    fee_bps: float = Field(default=4.0, ge=0)
+    slippage_bps: float = Field(default=1.0, ge=0)
+
+class NewsModel(BaseModel):
+    sources: List[Literal["newsapi", "gnews", "newsdata", "fred"]] = ["newsapi", "gnews", "newsdata", "fred"]
+    query: str = "bitcoin OR crypto OR \"federal reserve\" OR inflation"
+    language: str = "en"
+    fred_series: List[str] = ["CPIAUCSL", "UNRATE", "FEDFUNDS", "DGS10"]
+    min_poll_s: float = Field(default=60.0, gt=0)      # plancher; sinon quota réparti sur sa fenêtre
+    dedup_window: int = Field(default=20000, ge=1)     # articles gardés pour la déduplication
+    near_dup_jaccard: float = Field(default=0.5, gt=0, le=1)
+    simhash_max_bits: int = Field(default=7, ge=0, le=15)
+
 class SystemModel(BaseModel):
     mode: Literal["dev", "live", "backtest"] = "dev"
     logging_cfg: str = "config/logging.yml"
+    archive: ArchiveModel = ArchiveModel()
+    watchdog: WatchdogModel = WatchdogModel()
+    backtest: BacktestModel = BacktestModel()
+    news: NewsModel = NewsModel()
 
 class BinanceSpotLimits(BaseModel):
     requests_per_min: Optional[int] = Field(default=None, ge=0)
@@ -59,7 +105,7 @@ class NewsdataLimits(BaseModel):
 
 class APILimits(BaseModel):
     # On permet des clés supplémentaires pour pouvoir ajouter d'autres APIs plus tard.
-    model_config = ConfigDict(extra="allow")
+    model_config = ConfigDict(extra="allow", frozen=True)
 
     binance: Optional[BinanceLimits] = None
     telegram: Optional[TelegramLimits] = None
@@ -72,38 +118,150 @@ class APILimits(BaseModel):
 
 # --------- Loader ---------
 
+@dataclass
+class _CacheEntry:
+    stamp: Tuple[int, int]    # (mtime_ns, size)
+    digest: bytes
+    model: BaseModel
+
+
 class ConfigLoader:
+    """
+    Les modèles sont mis en cache (partagé entre instances) et ne sont
+    re-parsés que si le fichier change (mtime/taille, puis hash du contenu).
+
+    Rechargement à chaud:
+      loader.subscribe("api_limits.yml", lambda api: ...)
+      loader.start_watching(interval=2.0)
+    """
+    _cache: Dict[str, _CacheEntry] = {}
+    _cache_lock = Lock()
+
     def __init__(self, config_dir: str | Path = "config"):
         self.config_dir = Path(config_dir)
+        self._subscribers: Dict[str, List[Callable[[BaseModel], None]]] = defaultdict(list)
+        self._notified: Dict[str, BaseModel] = {}
+        self._watch_stop = Event()
+        self._watcher: Optional[Thread] = None
 
-    def _load_yaml(self, name: str) -> Dict[str, Any]:
+    def _load_cached(self, name: str, build: Callable[[Dict[str, Any]], BaseModel]) -> BaseModel:
         path = self.config_dir / name
-        if not path.exists():
-            raise FileNotFoundError(f"Config file not found: {path}")
-        with open(path, "r", encoding="utf-8") as f:
-            return yaml.safe_load(f) or {}
+        key = os.path.abspath(path)
+        try:
+            st = os.stat(key)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Config file not found: {path}") from None
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._cache_lock:
+            entry = self._cache.get(key)
+        if entry is not None and entry.stamp == stamp:
+            return entry.model
+
+        raw = path.read_bytes()
+        digest = hashlib.blake2b(raw, digest_size=16).digest()
+        if entry is not None and entry.digest == digest:
+            # fichier touché mais contenu identique: pas de re-parse
+            with self._cache_lock:
+                entry.stamp = stamp
+            return entry.model
+        model = build(yaml.safe_load(raw.decode("utf-8")) or {})
+        with self._cache_lock:
+            self._cache[key] = _CacheEntry(stamp=stamp, digest=digest, model=model)
+        return model
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        with cls._cache_lock:
+            cls._cache.clear()
 
-    def load_risk(self) -> RiskModel:
-        data = self._load_yaml("risk.yml")
+    @staticmethod
+    def _build_risk(data: Dict[str, Any]) -> RiskModel:
         try:
             return RiskModel(**(data.get("risk") or {}))
         except ValidationError as e:
             raise ValueError(f"Invalid risk.yml: {e}") from e
 
-    def load_system(self) -> SystemModel:
-        data = self._load_yaml("system.yml")
+    @staticmethod
+    def _build_system(data: Dict[str, Any]) -> SystemModel:
         try:
             return SystemModel(**(data.get("system") or {}))
         except ValidationError as e:
             raise ValueError(f"Invalid system.yml: {e}") from e
 
-    def load_api_limits(self) -> APILimits:
-        data = self._load_yaml("api_limits.yml")
+    @staticmethod
+    def _build_api_limits(data: Dict[str, Any]) -> APILimits:
         try:
             return APILimits(**data)
         except ValidationError as e:
             raise ValueError(f"Invalid api_limits.yml: {e}") from e
 
+    def load_risk(self) -> RiskModel:
+        return self._load_cached("risk.yml", self._build_risk)
+
+    def load_system(self) -> SystemModel:
+        return self._load_cached("system.yml", self._build_system)
+
+    def load_api_limits(self) -> APILimits:
+        return self._load_cached("api_limits.yml", self._build_api_limits)
+
+    # ---------- Rechargement à chaud ----------
+
+    def _loaders(self) -> Dict[str, Callable[[], BaseModel]]:
+        return {
+            "risk.yml": self.load_risk,
+            "system.yml": self.load_system,
+            "api_limits.yml": self.load_api_limits,
+        }
+
+    def subscribe(self, name: str, callback: Callable[[BaseModel], None]) -> None:
+        """callback(model) est appelé à chaque changement de `name` (ex: 'risk.yml')."""
+        loaders = self._loaders()
+        if name not in loaders:
+            raise ValueError(f"Unknown config file: {name} (expected one of {sorted(loaders)})")
+        self._subscribers[name].append(callback)
+        self._notified.setdefault(name, loaders[name]())
+
+    def check_for_changes(self) -> List[str]:
+        """Un stat() par fichier suivi; notifie les abonnés si le modèle a changé."""
+        changed: List[str] = []
+        loaders = self._loaders()
+        for name, callbacks in list(self._subscribers.items()):
+            try:
+                model = loaders[name]()
+            except (OSError, ValueError, yaml.YAMLError) as e:
+                # config invalide sur disque: on garde l'ancienne
+                log.error(f"config: reload of {name} failed, keeping previous version: {e}")
+                continue
+            if model is self._notified.get(name):
+                continue
+            self._notified[name] = model
+            changed.append(name)
+            log.info(f"config: {name} changed on disk, notifying {len(callbacks)} subscriber(s)")
+            for cb in callbacks:
+                try:
+                    cb(model)
+                except Exception as e:
+                    log.error(f"config: subscriber for {name} failed: {e}")
+        return changed
+
+    def start_watching(self, interval: float = 2.0) -> None:
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._watch_stop.clear()
+
+        def _run() -> None:
+            while not self._watch_stop.wait(interval):
+                self.check_for_changes()
+
+        self._watcher = Thread(target=_run, name="config-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._watch_stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
     # Helpers de normalisation (comme avant)
     @staticmethod
     def rpm_to_rps(rpm: Optional[float | int]) -> Optional[float]:
@@ -129,6 +287,10 @@ class ConfigLoader:
             if api.binance.futures:
                 rpm = api.binance.futures.requests_per_min
                 out["binance"]["futures"] = {"rpm": rpm, "rps": self.rpm_to_rps(rpm)}
+                orders_rpm = api.binance.futures.orders_per_min
+                if orders_rpm is not None:
+                    # bucket séparé: clé 'binance.futures.orders'
+                    out["binance"]["futures"]["orders"] = {"rpm": orders_rpm, "rps": self.rpm_to_rps(orders_rpm)}
 
         # Telegram
         if api.telegram:
@@ -137,6 +299,7 @@ class ConfigLoader:
         # NewsAPI
         if api.newsapi:
             out["newsapi"] = api.newsapi.model_dump()
+            out["newsapi"].update({"rps": api.newsapi.burst_rps, "per_day": api.newsapi.requests_per_day})
 
         # FRED
         if api.fred:
@@ -158,7 +321,16 @@ class ConfigLoader:
             nd_rpm = api.newsdata.requests_per_min
             if nd_rpm is None and api.newsdata.requests_per_15min is not None:
                 nd_rpm = self.per_15min_to_rpm(api.newsdata.requests_per_15min)
-            out["newsdata"] = {"rpm": nd_rpm, "rps": self.rpm_to_rps(nd_rpm)}
+            out["newsdata"] = {
+                "rpm": nd_rpm,
+                "rps": self.rpm_to_rps(nd_rpm),
+                "per_15min": api.newsdata.requests_per_15min,
+            }
+
+        # GNews
+        if api.gnews:
+            out["gnews"] = api.gnews.model_dump()
+            out["gnews"].update({"rps": api.gnews.burst_rps, "per_day": api.gnews.requests_per_day})
 
         return out
 
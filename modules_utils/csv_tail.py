@@ -0,0 +1,123 @@
+﻿from __future__ import annotations
+
+import io
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class CsvTailReader:
+    """
+    Lecture incrémentale d'un CSV en append (equity_intraday, trades_today...).
+
+    On mémorise l'offset en octets: chaque refresh() ne parse que les lignes
+    ajoutées depuis la lecture précédente, et les colonnes typées (float64,
+    datetime64, object) sont accumulées dans des tableaux NumPy à capacité
+    doublante. Le coût d'un refresh dépend donc des nouvelles lignes, pas de
+    l'historique. Si le fichier est tronqué ou remplacé (rotation), on repart
+    de zéro.
+
+    Exemple d'usage:
+      rd = CsvTailReader("data/equity_intraday.csv", parse_dates=["timestamp"])
+      new = rd.refresh()     # DataFrame des lignes nouvelles
+      df = rd.frame()        # tout l'historique lu (sans re-parse)
+    """
+
+    def __init__(self, path: str | Path, *, parse_dates: Iterable[str] = ()) -> None:
+        self.path = Path(path)
+        self.parse_dates = list(parse_dates)
+        self._lock = Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._offset = 0
+        self._ino: Optional[int] = None
+        self._columns: Optional[List[str]] = None
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._n = 0
+        self._frame: Optional[pd.DataFrame] = None
+
+    @property
+    def rows(self) -> int:
+        return self._n
+
+    def _read_header(self, f) -> bool:
+        line = f.readline()
+        if not line.endswith(b"\n"):
+            return False  # en-tête pas encore complet
+        self._columns = [c.strip() for c in line.decode("utf-8-sig").rstrip("\r\n").split(",")]
+        self._offset = f.tell()
+        return True
+
+    def _parse(self, chunk: bytes) -> pd.DataFrame:
+        dates = [c for c in self.parse_dates if c in self._columns]
+        df = pd.read_csv(io.BytesIO(chunk), header=None, names=self._columns, parse_dates=dates)
+        for c in df.columns:
+            if c in dates:
+                continue
+            if pd.api.types.is_numeric_dtype(df[c]):
+                df[c] = df[c].astype("float64")
+            else:
+                df[c] = df[c].astype(object)
+        return df
+
+    def _append(self, df: pd.DataFrame) -> None:
+        n, m = self._n, len(df)
+        for c in df.columns:
+            values = df[c].to_numpy()
+            arr = self._arrays.get(c)
+            if arr is None:
+                arr = np.empty(max(1024, m), dtype=values.dtype)
+            elif arr.dtype != values.dtype:
+                arr = arr.astype(np.result_type(arr.dtype, values.dtype) if arr.dtype != object else object)
+            if n + m > len(arr):
+                grown = np.empty(max(2 * len(arr), n + m), dtype=arr.dtype)
+                grown[:n] = arr[:n]
+                arr = grown
+            arr[n:n + m] = values
+            self._arrays[c] = arr
+        self._n = n + m
+        self._frame = None
+
+    def refresh(self) -> pd.DataFrame:
+        """Lit les lignes ajoutées depuis le dernier appel (DataFrame éventuellement vide)."""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                self._reset()
+                return pd.DataFrame()
+            if (self._ino is not None and st.st_ino != self._ino) or st.st_size < self._offset:
+                self._reset()
+            self._ino = st.st_ino
+            if st.st_size == self._offset:
+                return pd.DataFrame(columns=self._columns or [])
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                if self._columns is None and not self._read_header(f):
+                    return pd.DataFrame()
+                data = f.read(st.st_size - self._offset)
+            # on ne consomme que des lignes complètes (écriture en cours)
+            end = data.rfind(b"\n") + 1
+            if end <= 0:
+                return pd.DataFrame(columns=self._columns)
+            self._offset += end
+            new = self._parse(data[:end])
+            if not new.empty:
+                self._append(new)
+            return new
+
+    def frame(self) -> pd.DataFrame:
+        """Historique complet; même objet tant qu'aucune ligne n'a été ajoutée."""
+        with self._lock:
+            if self._frame is None:
+                cols = self._columns or []
+                # Series à dtype explicite: pas de copie ni de ré-inférence des colonnes object
+                data = {c: pd.Series(self._arrays[c][:self._n], dtype=self._arrays[c].dtype, copy=False)
+                        for c in cols if c in self._arrays}
+                self._frame = pd.DataFrame(data, columns=cols, copy=False)
+            return self._frame
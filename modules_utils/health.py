@@ -2,128 +2,261 @@
 
 import json
 import os
-from dataclasses import dataclass, asdict
+import time
+from dataclasses import dataclass, field
+from functools import partial
 from pathlib import Path
-from typing import Dict, Tuple
-
-from modules_utils.config_loader import ConfigLoader
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 
 @dataclass
 class HealthReport:
     ok: bool
     details: Dict[str, str]
+    durations_ms: Dict[str, float] = field(default_factory=dict)
+    cached: Dict[str, bool] = field(default_factory=dict)
 
     def to_json(self) -> str:
-        return json.dumps({"ok": self.ok, "details": self.details}, ensure_ascii=False)
+        return json.dumps(
+            {"ok": self.ok, "details": self.details, "durations_ms": self.durations_ms},
+            ensure_ascii=False,
+        )
+
+
+# Un check retourne (ok, détail); le détail commence par OK / WARN / FAIL.
+CheckFn = Callable[[], Tuple[bool, str]]
+
+
+@dataclass
+class HealthCheck:
+    name: str
+    fn: CheckFn
+    timeout: float = 2.0     # s; au-delà: FAIL sans attendre la fin
+    ttl: float = 0.0         # s; résultat réutilisé tant qu'il est plus récent
+    critical: bool = True    # False: n'influence pas report.ok (ex: taille du log)
 
 
-def _check_dir_exists(p: Path, name: str, details: Dict[str, str]) -> bool:
+@dataclass
+class CheckResult:
+    ok: bool
+    detail: str
+    duration_ms: float
+    at: float                # time.monotonic() de fin
+
+
+@dataclass
+class _InFlight:
+    started: float
+    done: Event = field(default_factory=Event)
+    result: Optional[CheckResult] = None
+
+
+def _check_dir_exists(p: Path) -> Tuple[bool, str]:
     if p.exists() and p.is_dir():
-        details[name] = "OK"
-        return True
-    details[name] = f"FAIL: missing directory {p.as_posix()}"
-    return False
+        return True, "OK"
+    return False, f"FAIL: missing directory {p.as_posix()}"
 
 
-def _check_file_exists(p: Path, name: str, details: Dict[str, str]) -> bool:
+def _check_file_exists(p: Path) -> Tuple[bool, str]:
     if p.exists() and p.is_file():
-        details[name] = "OK"
-        return True
-    details[name] = f"FAIL: missing file {p.as_posix()}"
-    return False
+        return True, "OK"
+    return False, f"FAIL: missing file {p.as_posix()}"
 
 
-def _check_writable_dir(p: Path, name: str, details: Dict[str, str]) -> bool:
+def _check_writable_dir(p: Path) -> Tuple[bool, str]:
     try:
         p.mkdir(parents=True, exist_ok=True)
         test_file = p / ".health_write_test"
         with open(test_file, "w", encoding="utf-8") as f:
             f.write("ok")
         test_file.unlink(missing_ok=True)
-        details[name] = "OK"
-        return True
+        return True, "OK"
     except Exception as e:
-        details[name] = f"FAIL: write error in {p.as_posix()}: {e}"
-        return False
+        return False, f"FAIL: write error in {p.as_posix()}: {e}"
+
 
+def disk_free_mb(p: Path) -> int:
+    if hasattr(os, "statvfs"):  # POSIX
+        st = os.statvfs(p.as_posix())
+        return (st.f_bavail * st.f_frsize) // (1024 * 1024)
+    # Windows fallback
+    import shutil
+    return shutil.disk_usage(p)[2] // (1024 * 1024)
 
-def _check_disk_space(p: Path, name: str, details: Dict[str, str], min_free_mb: int = 200) -> bool:
+
+def _check_disk_space(p: Path, min_free_mb: int = 200) -> Tuple[bool, str]:
     try:
-        total, used, free = 0, 0, 0
-        if hasattr(os, "statvfs"):  # POSIX
-            st = os.statvfs(p.as_posix())
-            free = (st.f_bavail * st.f_frsize) // (1024 * 1024)
-            total = (st.f_blocks * st.f_frsize) // (1024 * 1024)
-            used = total - free
-        else:
-            # Windows fallback
-            import shutil
-            total_b, used_b, free_b = shutil.disk_usage(p)
-            total, used, free = total_b // (1024 * 1024), used_b // (1024 * 1024), free_b // (1024 * 1024)
+        free = disk_free_mb(p)
         if free >= min_free_mb:
-            details[name] = f"OK: {free} MB free"
-            return True
-        details[name] = f"FAIL: low disk space ({free} MB free < {min_free_mb} MB)"
-        return False
+            return True, f"OK: {free} MB free"
+        return False, f"FAIL: low disk space ({free} MB free < {min_free_mb} MB)"
     except Exception as e:
-        details[name] = f"FAIL: disk check error: {e}"
-        return False
+        return False, f"FAIL: disk check error: {e}"
 
 
-def _check_log_size(log_file: Path, name: str, details: Dict[str, str], max_mb: int = 10) -> bool:
+def _check_log_size(log_file: Path, max_mb: int = 10) -> Tuple[bool, str]:
     try:
         if not log_file.exists():
-            details[name] = "WARN: log file not created yet"
-            return True
+            return True, "WARN: log file not created yet"
         size_mb = log_file.stat().st_size / (1024 * 1024)
         if size_mb <= max_mb:
-            details[name] = f"OK: {size_mb:.2f} MB"
-            return True
-        details[name] = f"WARN: large log ({size_mb:.2f} MB > {max_mb} MB)"
-        return True
+            return True, f"OK: {size_mb:.2f} MB"
+        return True, f"WARN: large log ({size_mb:.2f} MB > {max_mb} MB)"
     except Exception as e:
-        details[name] = f"FAIL: log size check error: {e}"
-        return False
-
+        return False, f"FAIL: log size check error: {e}"
 
-def run_health_checks(project_root: Path = Path(".")) -> HealthReport:
-    details: Dict[str, str] = {}
-    ok = True
 
-    # Dossiers clés
-    config_dir = project_root / "config"
-    logs_dir = project_root / "logs"
-
-    ok &= _check_dir_exists(config_dir, "config_dir", details)
-    ok &= _check_dir_exists(logs_dir, "logs_dir", details)
-    ok &= _check_writable_dir(logs_dir, "logs_writable", details)
+def _check_configs(config_dir: Path) -> Tuple[bool, str]:
+    # Validation via ConfigLoader (Pydantic); le cache du loader évite le
+    # re-parse tant que les fichiers ne changent pas.
+    from modules_utils.config_loader import ConfigLoader
 
-    # Fichiers config
-    ok &= _check_file_exists(config_dir / "risk.yml", "risk.yml", details)
-    ok &= _check_file_exists(config_dir / "system.yml", "system.yml", details)
-    ok &= _check_file_exists(config_dir / "api_limits.yml", "api_limits.yml", details)
-
-    # Validation via ConfigLoader (Pydantic)
     try:
         loader = ConfigLoader(config_dir)
         _ = loader.load_risk()
         _ = loader.load_system()
         _ = loader.load_api_limits()
-        details["config_validation"] = "OK"
+        return True, "OK"
     except Exception as e:
-        ok = False
-        details["config_validation"] = f"FAIL: {e}"
+        return False, f"FAIL: {e}"
+
+
+def default_checks(project_root: Path = Path(".")) -> List[HealthCheck]:
+    config_dir = project_root / "config"
+    logs_dir = project_root / "logs"
+    return [
+        # Dossiers clés
+        HealthCheck("config_dir", partial(_check_dir_exists, config_dir), ttl=5),
+        HealthCheck("logs_dir", partial(_check_dir_exists, logs_dir), ttl=5),
+        HealthCheck("logs_writable", partial(_check_writable_dir, logs_dir), ttl=30),
+        # Fichiers config
+        HealthCheck("risk.yml", partial(_check_file_exists, config_dir / "risk.yml"), ttl=5),
+        HealthCheck("system.yml", partial(_check_file_exists, config_dir / "system.yml"), ttl=5),
+        HealthCheck("api_limits.yml", partial(_check_file_exists, config_dir / "api_limits.yml"), ttl=5),
+        HealthCheck("config_validation", partial(_check_configs, config_dir), timeout=5.0, ttl=5),
+        # Disque et logs
+        HealthCheck("disk_space", partial(_check_disk_space, project_root, 200), ttl=10),
+        HealthCheck("log_size", partial(_check_log_size, logs_dir / "system.log", 10), ttl=5, critical=False),
+    ]
+
+
+class HealthEngine:
+    """
+    Checks enregistrés, exécutés en parallèle (un thread daemon chacun),
+    avec timeout et cache TTL par check et la durée de chaque exécution.
+
+    Un check qui dépasse son timeout est rapporté en FAIL sans bloquer le
+    rapport; il n'est pas relancé tant qu'il tourne encore, et son résultat
+    tardif alimente le cache. Les threads sont daemon: un appel réseau
+    bloqué n'empêche pas la sortie du processus.
+
+    Exemple d'usage:
+      eng = HealthEngine(default_checks(Path(".")))
+      eng.register(HealthCheck("binance_ping", ping_binance, timeout=1.5, ttl=15))
+      rpt = eng.run()              # HealthReport (details + durations_ms)
+      rpt = eng.run(fresh=True)    # ignore le cache
+    """
+
+    def __init__(self, checks: Iterable[HealthCheck] = ()) -> None:
+        self._checks: Dict[str, HealthCheck] = {}
+        self._results: Dict[str, CheckResult] = {}
+        self._inflight: Dict[str, _InFlight] = {}
+        self._lock = Lock()
+        for c in checks:
+            self.register(c)
+
+    def register(self, check: HealthCheck) -> None:
+        with self._lock:
+            self._checks[check.name] = check
+            self._results.pop(check.name, None)
+
+    def unregister(self, name: str) -> None:
+        with self._lock:
+            self._checks.pop(name, None)
+            self._results.pop(name, None)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._checks)
+
+    def last_results(self) -> Dict[str, CheckResult]:
+        with self._lock:
+            return dict(self._results)
+
+    def _execute(self, check: HealthCheck, job: _InFlight) -> None:
+        try:
+            ok, detail = check.fn()
+        except Exception as e:
+            ok, detail = False, f"FAIL: {type(e).__name__}: {e}"
+        end = time.monotonic()
+        job.result = CheckResult(bool(ok), detail, (end - job.started) * 1000, end)
+        with self._lock:
+            if self._checks.get(check.name) is check:
+                self._results[check.name] = job.result
+            self._inflight.pop(check.name, None)
+        job.done.set()
+
+    def run(self, names: Optional[Iterable[str]] = None, *, fresh: bool = False) -> HealthReport:
+        now = time.monotonic()
+        jobs: Dict[str, Tuple[HealthCheck, _InFlight]] = {}
+        done: Dict[str, Tuple[CheckResult, bool]] = {}
+        with self._lock:
+            selected = [self._checks[n] for n in (names if names is not None else self._checks)]
+            for c in selected:
+                res = self._results.get(c.name)
+                if not fresh and res is not None and now - res.at < c.ttl:
+                    done[c.name] = (res, True)
+                    continue
+                job = self._inflight.get(c.name)
+                if job is None:
+                    job = self._inflight[c.name] = _InFlight(started=now)
+                    Thread(target=self._execute, args=(c, job), name=f"health-{c.name}", daemon=True).start()
+                jobs[c.name] = (c, job)
+
+        for name, (c, job) in jobs.items():
+            # timeout compté depuis le lancement (un check déjà en cours garde son échéance)
+            job.done.wait(max(0.0, job.started + c.timeout - time.monotonic()))
+            if job.result is not None:
+                done[name] = (job.result, False)
+            else:
+                waited = (time.monotonic() - job.started) * 1000
+                done[name] = (CheckResult(False, f"FAIL: timeout after {c.timeout:g}s", waited, time.monotonic()), False)
+
+        details: Dict[str, str] = {}
+        durations: Dict[str, float] = {}
+        cached: Dict[str, bool] = {}
+        ok = True
+        for c in selected:
+            res, hit = done[c.name]
+            details[c.name] = res.detail
+            durations[c.name] = round(res.duration_ms, 3)
+            cached[c.name] = hit
+            if c.critical:
+                ok &= res.ok
+        return HealthReport(ok=bool(ok), details=details, durations_ms=durations, cached=cached)
+
+
+_engines: Dict[str, HealthEngine] = {}
+_engines_lock = Lock()
+
+
+def get_engine(project_root: Path = Path(".")) -> HealthEngine:
+    """Moteur partagé (checks par défaut) pour un dossier projet."""
+    key = os.path.abspath(project_root)
+    with _engines_lock:
+        eng = _engines.get(key)
+        if eng is None:
+            eng = _engines[key] = HealthEngine(default_checks(Path(project_root)))
+        return eng
 
-    # Disque et logs
-    ok &= _check_disk_space(project_root, "disk_space", details, min_free_mb=200)
-    _ = _check_log_size(logs_dir / "system.log", "log_size", details, max_mb=10)
 
-    return HealthReport(ok=bool(ok), details=details)
+def run_health_checks(project_root: Path = Path("."), *, fresh: bool = False) -> HealthReport:
+    return get_engine(project_root).run(fresh=fresh)
 
 
 def _main_cli():
-    report = run_health_checks(Path("."))
+    report = run_health_checks(Path("."), fresh=True)
     print(report.to_json())
     # code 0 si ok, 1 sinon
     raise SystemExit(0 if report.ok else 1)
@@ -0,0 +1,283 @@
+﻿from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from modules_utils.health import HealthEngine, HealthReport, disk_free_mb, get_engine
+
+log = logging.getLogger("sniper")
+
+# valeur de sniper_health_check_status
+_STATUS = {"OK": 0, "WARN": 1, "FAIL": 2}
+
+
+def check_state(detail: str) -> str:
+    """OK / WARN / FAIL d'après le préfixe du détail d'un check."""
+    head = detail.split(":", 1)[0].strip().upper()
+    return head if head in _STATUS else "OK"
+
+
+def _label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Metrics:
+    """Texte au format d'exposition Prometheus (0.0.4)."""
+
+    def __init__(self) -> None:
+        self._lines: List[str] = []
+
+    def family(self, name: str, kind: str, help_: str, samples: List[Tuple[Dict[str, Any], float]]) -> None:
+        self._lines.append(f"# HELP {name} {help_}")
+        self._lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lbl = ",".join(f'{k}="{_label(v)}"' for k, v in labels.items())
+            v = float(value)
+            txt = str(int(v)) if v.is_integer() else format(v, ".9g")
+            self._lines.append(f"{name}{{{lbl}}} {txt}" if lbl else f"{name} {txt}")
+
+    def text(self) -> str:
+        return "\n".join(self._lines) + "\n"
+
+
+class HealthWatchdog:
+    """
+    Mode veille: exécute le HealthEngine toutes les `interval` secondes,
+    journalise uniquement les changements d'état dans logs/system_health.log
+    et expose des métriques texte (format Prometheus) sur HTTP local:
+      GET /metrics  -> statut et durée par check, disque libre, taille des
+                       logs, tokens des rate limiters, profondeur des files
+      GET /health   -> dernier HealthReport en JSON (503 si KO)
+
+    Les métriques sont calculées une fois par passage: un scrape ne fait
+    qu'envoyer le dernier texte.
+
+    Exemple d'usage:
+      wd = HealthWatchdog(interval=15, port=9108)
+      wd.watch_rate_limiter("main", rl)              # RateLimiter / AsyncRateLimiter / MultiWindowRateLimiter
+      wd.watch_queue("log_db", lambda: handler.queue_depth)
+      wd.start()                                     # thread de fond + serveur HTTP
+      wd.serve_forever()                             # ou bloquant (Ctrl-C)
+    """
+
+    def __init__(
+        self,
+        engine: Optional[HealthEngine] = None,
+        *,
+        project_root: str | Path = ".",
+        interval: float = 15.0,
+        transitions_log: str | Path = "logs/system_health.log",
+        host: str = "127.0.0.1",
+        port: Optional[int] = 9108,
+        log_files: Tuple[str, ...] = ("logs/system.log", "logs/log_db.sqlite"),
+    ) -> None:
+        self.project_root = Path(project_root)
+        self.engine = engine or get_engine(self.project_root)
+        self.interval = interval
+        self.transitions_log = Path(transitions_log)
+        self.host = host
+        self.port = port
+        self.log_files = log_files
+        self.report: Optional[HealthReport] = None
+        self.runs = 0
+        self._states: Dict[str, str] = {}
+        self._limiters: Dict[str, Any] = {}
+        self._queues: Dict[str, Callable[[], float]] = {}
+        self._metrics_text = "# no health run yet\n"
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    # ---------- Sources de métriques ----------
+
+    def watch_rate_limiter(self, name: str, limiter: Any) -> None:
+        self._limiters[name] = limiter
+
+    def watch_queue(self, name: str, depth: Callable[[], float]) -> None:
+        self._queues[name] = depth
+
+    def watch_logging_queues(self, logger: str = "sniper") -> None:
+        """Enregistre les handlers à file (ex: SQLiteLogHandler.queue_depth)."""
+        for h in logging.getLogger(logger).handlers:
+            if hasattr(h, "queue_depth"):
+                self.watch_queue(type(h).__name__, lambda h=h: h.queue_depth)
+
+    # ---------- Passage ----------
+
+    def _record_transitions(self, report: HealthReport) -> List[str]:
+        states = {name: check_state(d) for name, d in report.details.items()}
+        states["overall"] = "OK" if report.ok else "FAIL"
+        stamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        lines: List[str] = []
+        for name, state in states.items():
+            prev = self._states.get(name)
+            if prev == state:
+                continue
+            level = {"OK": "INFO", "WARN": "WARNING", "FAIL": "ERROR"}[state]
+            detail = report.details.get(name, "")
+            line = f"{stamp} | {level} | {name} | {prev or 'START'} -> {state}" + (f" | {detail}" if detail else "")
+            lines.append(line)
+            if state != "OK":
+                log.warning(f"health: {name} {prev or 'START'} -> {state} {detail}".rstrip())
+        self._states = states
+        if lines:
+            self.transitions_log.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.transitions_log, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        return lines
+
+    def _render(self, report: HealthReport, run_s: float) -> str:
+        m = _Metrics()
+        m.family("sniper_health_ok", "gauge", "1 if every critical check passes", [({}, report.ok)])
+        m.family("sniper_health_check_status", "gauge", "check state (0=OK, 1=WARN, 2=FAIL)",
+                 [({"check": k}, _STATUS[check_state(v)]) for k, v in report.details.items()])
+        m.family("sniper_health_check_duration_seconds", "gauge", "last execution time of each check",
+                 [({"check": k}, v / 1000) for k, v in report.durations_ms.items()])
+        m.family("sniper_health_check_cached", "gauge", "1 if the result came from the TTL cache",
+                 [({"check": k}, v) for k, v in report.cached.items()])
+        m.family("sniper_health_run_duration_seconds", "gauge", "wall time of the last health run", [({}, run_s)])
+        m.family("sniper_health_last_run_timestamp_seconds", "gauge", "epoch of the last health run", [({}, time.time())])
+        m.family("sniper_health_runs_total", "counter", "health runs since start", [({}, self.runs)])
+
+        try:
+            free = [({"path": self.project_root.as_posix()}, disk_free_mb(self.project_root) * 1024 * 1024)]
+        except OSError:
+            free = []
+        m.family("sniper_disk_free_bytes", "gauge", "free disk space", free)
+        sizes = []
+        for f in self.log_files:
+            p = self.project_root / f
+            try:
+                sizes.append(({"file": f}, os.stat(p).st_size))
+            except FileNotFoundError:
+                continue
+        m.family("sniper_log_size_bytes", "gauge", "size of log files", sizes)
+
+        tokens, remaining = [], []
+        for name, rl in list(self._limiters.items()):
+            if hasattr(rl, "tokens_all"):
+                tokens += [({"limiter": name, "key": k}, v) for k, v in rl.tokens_all().items()]
+            if hasattr(rl, "remaining_all"):
+                for key, windows in rl.remaining_all().items():
+                    remaining += [({"limiter": name, "key": key, "window": w}, v)
+                                  for w, v in windows.items() if w != "day_resets_in"]
+        m.family("sniper_rate_limiter_tokens", "gauge", "tokens currently available per bucket", tokens)
+        if remaining:
+            m.family("sniper_rate_limiter_remaining", "gauge", "requests left per quota window", remaining)
+
+        depths = []
+        for name, fn in list(self._queues.items()):
+            try:
+                depths.append(({"queue": name}, fn()))
+            except Exception:
+                continue
+        m.family("sniper_queue_depth", "gauge", "items waiting in internal queues", depths)
+        return m.text()
+
+    def run_once(self) -> HealthReport:
+        t0 = time.perf_counter()
+        report = self.engine.run()
+        run_s = time.perf_counter() - t0
+        with self._lock:
+            self.runs += 1
+            self._record_transitions(report)
+            self.report = report
+            self._metrics_text = self._render(report, run_s)
+        return report
+
+    def metrics_text(self) -> str:
+        return self._metrics_text
+
+    # ---------- Boucle / HTTP ----------
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            t0 = time.monotonic()
+            try:
+                self.run_once()
+            except Exception as e:
+                log.warning(f"health watchdog: run failed: {e}")
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - t0)))
+
+    def _serve(self) -> None:
+        if self.port is None:
+            return
+        wd = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # noqa: N802 (API http.server)
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics":
+                    body, ctype, code = wd.metrics_text().encode(), "text/plain; version=0.0.4", 200
+                elif path == "/health":
+                    rpt = wd.report
+                    body = (rpt.to_json() if rpt else json.dumps({"ok": None})).encode()
+                    ctype, code = "application/json", 200 if rpt is None or rpt.ok else 503
+                else:
+                    body, ctype, code = b"not found\n", "text/plain", 404
+                self.send_response(code)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):  # pas de ligne par scrape sur stderr
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]  # port=0 -> port choisi par l'OS
+        Thread(target=self._server.serve_forever, name="health-metrics", daemon=True).start()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._serve()
+        self._thread = Thread(target=self._loop, name="health-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def serve_forever(self) -> None:
+        self.start()
+        try:
+            while not self._stop.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+def _main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SNIPER health watchdog (Prometheus /metrics)")
+    parser.add_argument("--interval", type=float, default=15.0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9108)
+    args = parser.parse_args()
+    wd = HealthWatchdog(interval=args.interval, host=args.host, port=args.port)
+    print(f"health watchdog: http://{args.host}:{args.port}/metrics (every {args.interval:g}s)")
+    wd.serve_forever()
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,47 @@
+﻿from __future__ import annotations
+
+import importlib
+import importlib.util
+import sys
+from types import ModuleType
+from typing import Callable, Iterable, List, Tuple
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Retourne le module `name` sans l'exécuter: l'import réel a lieu au
+    premier accès d'attribut (importlib.util.LazyLoader).
+
+      asyncio = lazy_import("asyncio")   # coût payé seulement si utilisé
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def lazy_submodules(package: str, names: Iterable[str]) -> Tuple[Callable[[str], ModuleType], Callable[[], List[str]]]:
+    """
+    __getattr__/__dir__ (PEP 562) pour un package: `sniper_engine.indicators`
+    n'est importé qu'au premier accès, pas à l'import du package.
+
+      __getattr__, __dir__ = lazy_submodules(__name__, ["indicators", "trading"])
+    """
+    names = frozenset(names)
+
+    def __getattr__(attr: str) -> ModuleType:
+        if attr in names:
+            return importlib.import_module(f"{package}.{attr}")
+        raise AttributeError(f"module '{package}' has no attribute '{attr}'")
+
+    def __dir__() -> List[str]:
+        return sorted(names)
+
+    return __getattr__, __dir__
@@ -0,0 +1,100 @@
+﻿from __future__ import annotations
+
+import logging
+import sqlite3
+import sys
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+log = logging.getLogger("sniper")
+
+# Schéma versionné via PRAGMA user_version. Ajouter une migration = ajouter
+# une entrée (version, description, sql, requise) en fin de liste, jamais
+# modifier une entrée existante. Une migration non requise qui échoue (ex:
+# SQLite compilé sans FTS5) est sautée: le code lecteur doit s'en passer.
+MIGRATIONS: List[Tuple[int, str, str, bool]] = [
+    (
+        1,
+        "logs table + indexes (ts, logger, level, account)",
+        """
+        CREATE TABLE IF NOT EXISTS logs (
+            id      INTEGER PRIMARY KEY,
+            ts      REAL    NOT NULL,
+            logger  TEXT    NOT NULL,
+            level   INTEGER NOT NULL,
+            account TEXT,
+            message TEXT    NOT NULL,
+            module  TEXT,
+            func    TEXT,
+            lineno  INTEGER,
+            thread  TEXT,
+            exc     TEXT
+        );
+        CREATE INDEX IF NOT EXISTS ix_logs_ts         ON logs(ts);
+        CREATE INDEX IF NOT EXISTS ix_logs_logger_ts  ON logs(logger, ts);
+        CREATE INDEX IF NOT EXISTS ix_logs_level_ts   ON logs(level, ts);
+        CREATE INDEX IF NOT EXISTS ix_logs_account_ts ON logs(account, ts);
+        """,
+        True,
+    ),
+    (
+        2,
+        "full-text index on messages (FTS5, external content)",
+        # pas de trigger d'insertion: le writer alimente l'index par lot (~5x plus rapide)
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts USING fts5(message, content='logs', content_rowid='id');
+        CREATE TRIGGER IF NOT EXISTS logs_fts_ad AFTER DELETE ON logs BEGIN
+            INSERT INTO logs_fts(logs_fts, rowid, message) VALUES ('delete', old.id, old.message);
+        END;
+        INSERT INTO logs_fts(logs_fts) VALUES ('rebuild');
+        """,
+        False,
+    ),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def has_fts(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'logs_fts'").fetchone() is not None
+
+
+def migrate(db_path: str | Path = "logs/log_db.sqlite", target: Optional[int] = None) -> int:
+    """Applique les migrations manquantes; retourne la version finale."""
+    target = LATEST_VERSION if target is None else target
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path))
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        version = current_version(conn)
+        if version > LATEST_VERSION:
+            raise RuntimeError(f"{db_path}: schema v{version} is newer than this code (v{LATEST_VERSION})")
+        for v, desc, sql, required in MIGRATIONS:
+            if not version < v <= target:
+                continue
+            try:
+                # executescript valide la transaction en cours: on encadre nous-mêmes
+                conn.executescript(f"BEGIN;\n{sql}\nPRAGMA user_version = {v};\nCOMMIT;")
+            except sqlite3.OperationalError as e:
+                if required:
+                    raise
+                conn.rollback()
+                conn.execute(f"PRAGMA user_version = {v}")
+                log.warning(f"log_db_migrator: skipped v{v} ({desc}): {e}")
+            version = v
+        return version
+    finally:
+        conn.close()
+
+
+def _main():
+    db = sys.argv[1] if len(sys.argv) > 1 else "logs/log_db.sqlite"
+    print(f"{db}: schema v{migrate(db)}")
+
+
+if __name__ == "__main__":
+    _main()
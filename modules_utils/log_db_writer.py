@@ -0,0 +1,148 @@
+﻿from __future__ import annotations
+
+import logging
+import sqlite3
+import time
+from collections import deque
+from pathlib import Path
+from threading import Event, Thread
+from typing import Deque, Optional, Tuple
+
+from modules_utils.log_db_migrator import has_fts, migrate
+
+_INSERT = (
+    "INSERT INTO logs (ts, logger, level, account, message, module, func, lineno, thread, exc) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+# index plein texte alimenté après chaque lot (cf. migration v2)
+_FTS_SYNC = "INSERT INTO logs_fts(rowid, message) SELECT id, message FROM logs WHERE id > ?"
+
+_EXC_FMT = logging.Formatter()
+
+_Row = Tuple[float, str, int, Optional[str], str, str, str, int, str, Optional[str]]
+
+
+class SQLiteLogHandler(logging.Handler):
+    """
+    Handler logging -> SQLite (WAL), sans bloquer le thread appelant.
+
+    emit() ne fait qu'ajouter un tuple dans une file bornée (deque); un
+    thread d'écriture la vide par transactions de `batch_size` lignes toutes
+    les `flush_interval` secondes. Si la file est pleine, l'enregistrement
+    est compté dans `dropped` plutôt que de ralentir le trading.
+
+    Le compte est lu dans l'attribut `account` du record:
+      log.info("order filled", extra={"account": "FTMO10K"})
+
+    Config (logging.yml):
+      log_db:
+        class: modules_utils.log_db_writer.SQLiteLogHandler
+        filename: logs/log_db.sqlite
+    """
+
+    def __init__(
+        self,
+        filename: str | Path = "logs/log_db.sqlite",
+        level: int | str = logging.NOTSET,
+        *,
+        queue_size: int = 200_000,
+        batch_size: int = 5_000,
+        flush_interval: float = 0.2,
+    ) -> None:
+        super().__init__(level)
+        self.filename = str(filename)
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        self._enqueued = 0
+        self._failed = 0
+        self._buf: Deque[_Row] = deque()
+        self._wake = Event()
+        self._stop = Event()
+        migrate(self.filename)
+        self._thread = Thread(target=self._run, name="log-db-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._buf)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if len(self._buf) >= self.queue_size:
+            self.dropped += 1
+            return
+        try:
+            exc = (self.formatter or _EXC_FMT).formatException(record.exc_info) if record.exc_info else None
+            self._buf.append((
+                record.created,
+                record.name,
+                record.levelno,
+                getattr(record, "account", None),
+                record.getMessage(),
+                record.module,
+                record.funcName,
+                record.lineno,
+                record.threadName,
+                exc,
+            ))
+            self._enqueued += 1
+        except Exception:
+            self.handleError(record)
+
+    # ---------- Thread d'écriture ----------
+
+    def _drain(self, conn: sqlite3.Connection, fts: bool) -> None:
+        buf = self._buf
+        while buf:
+            n = min(len(buf), self.batch_size)
+            batch = [buf.popleft() for _ in range(n)]
+            try:
+                # IMMEDIATE: max(id) reste valable même si un autre processus écrit
+                conn.execute("BEGIN IMMEDIATE")
+                if fts:
+                    last = conn.execute("SELECT COALESCE(MAX(id), 0) FROM logs").fetchone()[0]
+                conn.executemany(_INSERT, batch)
+                if fts:
+                    conn.execute(_FTS_SYNC, (last,))
+                conn.execute("COMMIT")
+                self.written += n
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                self._failed += n
+                # voie standard des erreurs de handler (respecte logging.raiseExceptions), sans reboucler sur la DB
+                self.handleError(logging.makeLogRecord({
+                    "name": batch[0][1], "levelno": batch[0][2], "levelname": logging.getLevelName(batch[0][2]),
+                    "msg": f"log_db_writer: dropped {n} records ({e})",
+                }))
+
+    def _run(self) -> None:
+        conn = sqlite3.connect(self.filename, check_same_thread=False, isolation_level=None, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        fts = has_fts(conn)
+        try:
+            while not self._stop.is_set():
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                self._drain(conn, fts)
+            self._drain(conn, fts)
+        finally:
+            conn.close()
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Attend que tout ce qui a été émis jusqu'ici soit commité."""
+        target = self._enqueued
+        self._wake.set()
+        deadline = time.monotonic() + timeout
+        while self.written + self._failed < target and self._thread.is_alive() and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=10)
+        super().close()
@@ -0,0 +1,172 @@
+﻿from __future__ import annotations
+
+import logging
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+from modules_utils.log_db_migrator import has_fts
+
+_COLUMNS = "id, ts, logger, level, account, message, module, func, lineno, thread, exc"
+
+
+@dataclass
+class LogRow:
+    id: int
+    ts: float
+    logger: str
+    level: int
+    account: Optional[str]
+    message: str
+    module: Optional[str]
+    func: Optional[str]
+    lineno: Optional[int]
+    thread: Optional[str]
+    exc: Optional[str]
+
+    @property
+    def level_name(self) -> str:
+        return logging.getLevelName(self.level)
+
+
+@dataclass
+class LogFilter:
+    since: Optional[float] = None      # epoch (inclus)
+    until: Optional[float] = None      # epoch (exclu)
+    min_level: Optional[int] = None    # ex: logging.WARNING
+    logger: Optional[str] = None       # 'sniper' => sniper + sniper.*
+    account: Optional[str] = None
+    text: Optional[str] = None         # FTS5 MATCH (LIKE si FTS absent)
+
+
+# curseur keyset: (ts, id) de la dernière ligne de la page
+Cursor = Tuple[float, int]
+
+
+@dataclass
+class LogPage:
+    rows: List[LogRow]
+    next_cursor: Optional[Cursor]
+
+
+class LogQuery:
+    """
+    Requêtes sur logs/log_db.sqlite (voir log_db_writer / log_db_migrator).
+
+    Pagination keyset sur (ts, id) via les index (…, ts): chaque page coûte
+    O(limit · log n) quel que soit l'offset, rien n'est chargé en entier.
+
+    Exemple d'usage:
+      q = LogQuery()
+      page = q.page(LogFilter(account="FTMO10K", min_level=logging.WARNING))
+      older = q.page(flt, cursor=page.next_cursor)
+      new_rows = q.tail(flt, after_id=last_seen_id)
+    """
+
+    def __init__(self, db_path: str | Path = "logs/log_db.sqlite") -> None:
+        self.db_path = Path(db_path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._fts = False
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # lecture seule: ne crée pas la base si elle n'existe pas encore
+            uri = f"{self.db_path.resolve().as_uri()}?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._fts = has_fts(self._conn)
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _loggers(self, conn: sqlite3.Connection, name: str) -> List[str]:
+        """`name` + ses enfants `name.*` présents en base (une recherche d'index par logger)."""
+        found = [name] if conn.execute("SELECT 1 FROM logs WHERE logger = ? LIMIT 1", (name,)).fetchone() else []
+        lo, op, hi = name + ".", ">=", name + "/"
+        while True:
+            nxt = conn.execute(f"SELECT MIN(logger) FROM logs WHERE logger {op} ? AND logger < ?", (lo, hi)).fetchone()[0]
+            if nxt is None:
+                return found
+            found.append(nxt)
+            lo, op = nxt, ">"
+
+    def _where(self, flt: LogFilter, loggers: Optional[List[str]] = None) -> Tuple[List[str], List[Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        if flt.since is not None:
+            clauses.append("ts >= ?")
+            params.append(flt.since)
+        if flt.until is not None:
+            clauses.append("ts < ?")
+            params.append(flt.until)
+        if flt.min_level is not None:
+            clauses.append("level >= ?")
+            params.append(int(flt.min_level))
+        if loggers is not None:
+            clauses.append(f"logger IN ({', '.join('?' * len(loggers))})")
+            params += loggers
+        if flt.account:
+            clauses.append("account = ?")
+            params.append(flt.account)
+        if flt.text:
+            if self._fts:
+                clauses.append("id IN (SELECT rowid FROM logs_fts WHERE logs_fts MATCH ?)")
+                params.append(_fts_phrase(flt.text))
+            else:
+                clauses.append("message LIKE ?")
+                params.append(f"%{flt.text}%")
+        return clauses, params
+
+    def page(self, flt: LogFilter, *, cursor: Optional[Cursor] = None, limit: int = 100) -> LogPage:
+        """Lignes les plus récentes d'abord; `cursor` = page.next_cursor précédent."""
+        conn = self._connection()
+        # Filtre logger hiérarchique: une sous-requête par logger, chacune lue
+        # dans l'ordre de l'index (logger, ts) et bornée à `limit`, puis fusion.
+        # Un OR/plage sur logger obligerait SQLite à trier toutes les lignes.
+        groups: List[Optional[List[str]]] = [None]
+        if flt.logger:
+            groups = [[name] for name in self._loggers(conn, flt.logger)]
+            if not groups:
+                return LogPage(rows=[], next_cursor=None)
+        parts: List[str] = []
+        params: List[Any] = []
+        for loggers in groups:
+            clauses, p = self._where(flt, loggers)
+            if cursor is not None:
+                clauses.append("(ts, id) < (?, ?)")
+                p += [cursor[0], cursor[1]]
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            parts.append(f"SELECT {_COLUMNS} FROM logs {where} ORDER BY ts DESC, id DESC LIMIT ?")
+            params += [*p, limit]
+        if len(parts) == 1:
+            sql = parts[0]
+        else:
+            sql = " UNION ALL ".join(f"SELECT * FROM ({q})" for q in parts) + " ORDER BY ts DESC, id DESC LIMIT ?"
+            params.append(limit)
+        rows = [LogRow(*r) for r in conn.execute(sql, params)]
+        nxt = (rows[-1].ts, rows[-1].id) if len(rows) == limit else None
+        return LogPage(rows=rows, next_cursor=nxt)
+
+    def tail(self, flt: LogFilter, *, after_id: int = 0, limit: int = 500) -> List[LogRow]:
+        """Lignes insérées après `after_id` (suivi en direct), dans l'ordre d'insertion."""
+        conn = self._connection()
+        loggers = self._loggers(conn, flt.logger) if flt.logger else None
+        if loggers == []:
+            return []
+        clauses, params = self._where(flt, loggers)
+        clauses.append("id > ?")
+        params.append(after_id)
+        sql = f"SELECT {_COLUMNS} FROM logs WHERE {' AND '.join(clauses)} ORDER BY id LIMIT ?"
+        return [LogRow(*r) for r in conn.execute(sql, (*params, limit))]
+
+    def last_id(self) -> int:
+        return int(self._connection().execute("SELECT COALESCE(MAX(id), 0) FROM logs").fetchone()[0])
+
+
+def _fts_phrase(text: str) -> str:
+    # saisie utilisateur -> termes FTS5 échappés (ET implicite), pas de syntaxe exposée
+    terms = [t.replace('"', '""') for t in text.split()]
+    return " ".join(f'"{t}"' for t in terms)
@@ -1,11 +1,28 @@
 ﻿from __future__ import annotations
 
+import atexit
+import json
+import logging
+import os
+import random
 import time
-from collections import defaultdict
-from dataclasses import dataclass
-from math import ceil
-from threading import Lock
-from typing import Dict, Optional
+import weakref
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from math import ceil, inf
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Any, Deque, Dict, Mapping, Optional, Tuple
+
+from modules_utils.lazy_import import lazy_import
+from modules_utils.shared_buckets import SharedBucket, SharedBucketStore, _range_lock
+
+# asyncio ne sert qu'à AsyncRateLimiter, email.utils qu'aux Retry-After datés:
+# pas de coût au boot pour les autres
+asyncio = lazy_import("asyncio")
+email_utils = lazy_import("email.utils")
+
+log = logging.getLogger("sniper")
 
 
 @dataclass
@@ -15,6 +32,7 @@ class _Bucket:
     tokens: float
     last: float
     lock: Lock
+    blocked_until: float = 0.0    # epoch (time.time), posé par backoff()
 
     def refill(self) -> None:
         now = time.monotonic()
@@ -24,19 +42,48 @@ class _Bucket:
         self.tokens = min(self.capacity, self.tokens + dt * self.rps)
         self.last = now
 
+    def peek(self) -> float:
+        # tokens disponibles maintenant, sans modifier l'état (métriques)
+        return min(self.capacity, self.tokens + max(0.0, time.monotonic() - self.last) * self.rps)
+
+    def try_acquire(self, cost: float = 1.0) -> bool:
+        with self.lock:
+            if time.time() < self.blocked_until:
+                return False
+            self.refill()
+            if self.tokens >= cost:
+                self.tokens -= cost
+                return True
+            return False
+
     def acquire(self, cost: float = 1.0) -> None:
         # Bloc jusqu'à ce qu'on ait assez de tokens.
         while True:
             with self.lock:
-                self.refill()
-                if self.tokens >= cost:
-                    self.tokens -= cost
-                    return
-                # pas assez de tokens -> sleep le temps nécessaire
-                missing = cost - self.tokens
-                sleep_for = missing / self.rps if self.rps > 0 else 0.05
+                blocked = self.blocked_until - time.time()
+                if blocked > 0:
+                    sleep_for = blocked
+                else:
+                    self.refill()
+                    if self.tokens >= cost:
+                        self.tokens -= cost
+                        return
+                    # pas assez de tokens -> sleep le temps nécessaire
+                    missing = cost - self.tokens
+                    sleep_for = missing / self.rps if self.rps > 0 else 0.05
             time.sleep(max(0.01, sleep_for))
 
+    def resync(self, remaining: float) -> None:
+        # Le serveur fait foi: jamais plus de tokens que ce qu'il nous reste.
+        with self.lock:
+            self.refill()
+            self.tokens = min(self.tokens, max(0.0, remaining))
+
+    def backoff(self, until: float) -> None:
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, until)
+            self.tokens = 0.0
+
 
 class RateLimiter:
     """
@@ -44,9 +91,23 @@ class RateLimiter:
       rl = RateLimiter()
       rl.set_limit('binance.futures', rps=40, burst=40)
       rl.call('binance.futures', cost=5)   # endpoint weight=5
+      rl.report('binance.futures', resp.status_code, resp.headers)
+
+    Multi-processus (un seul budget par hôte):
+      rl = RateLimiter(store=SharedBucketStore('logs/rate_limiter.shm'))
     """
-    def __init__(self) -> None:
-        self._buckets: Dict[str, _Bucket] = {}
+    def __init__(
+        self,
+        store: Optional[SharedBucketStore] = None,
+        *,
+        backoff_base: float = 1.0,
+        backoff_cap: float = 120.0,
+    ) -> None:
+        self._buckets: Dict[str, _Bucket | SharedBucket] = {}
+        self._store = store
+        self._backoff_base = backoff_base
+        self._backoff_cap = backoff_cap
+        self._strikes: Dict[str, int] = defaultdict(int)
 
     @staticmethod
     def _mk_bucket(rps: float, burst: Optional[int]) -> _Bucket:
@@ -61,7 +122,19 @@ class RateLimiter:
         )
 
     def set_limit(self, key: str, *, rps: float, burst: Optional[int] = None) -> None:
-        self._buckets[key] = self._mk_bucket(rps, burst)
+        b = self._mk_bucket(rps, burst)
+        if self._store is not None:
+            self._buckets[key] = self._store.bucket(key, rps=b.rps, capacity=b.capacity)
+            return
+        old = self._buckets.get(key)
+        if old is None:
+            self._buckets[key] = b
+            return
+        # reconfiguration à chaud: on garde les tokens déjà consommés
+        with old.lock:
+            old.refill()
+            old.rps, old.capacity = b.rps, b.capacity
+            old.tokens = min(old.tokens, old.capacity)
 
     def call(self, key: str, *, cost: float = 1.0) -> None:
         if key not in self._buckets:
@@ -69,6 +142,16 @@ class RateLimiter:
             self.set_limit(key, rps=0.5, burst=1)
         self._buckets[key].acquire(cost=cost)
 
+    def try_call(self, key: str, *, cost: float = 1.0) -> bool:
+        # Variante non bloquante: False si pas assez de tokens.
+        if key not in self._buckets:
+            self.set_limit(key, rps=0.5, burst=1)
+        return self._buckets[key].try_acquire(cost=cost)
+
+    def tokens_all(self) -> Dict[str, float]:
+        """Tokens restants par clé (snapshot pour le watchdog / métriques)."""
+        return {k: (b.peek() if isinstance(b, _Bucket) else b.tokens) for k, b in list(self._buckets.items())}
+
     # ---------- Helpers d’intégration avec ConfigLoader ----------
 
     def set_limit_from_summary(self, key: str, summary: dict, *, default_rps: float = 1.0, burst: Optional[int] = None) -> None:
@@ -76,16 +159,547 @@ class RateLimiter:
         key ex: 'binance.spot' / 'binance.futures' / 'fred'...
         summary = loader.summarize_limits(api_limits)
         """
-        parts = key.split(".")
+        self.set_limit(key, rps=_rps_from_summary(key, summary, default_rps), burst=burst)
+
+    # ---------- Retour serveur (429/418, Retry-After, used-weight) ----------
+
+    def report(self, key: str, status: int, headers: Optional[Mapping[str, str]] = None) -> float:
+        """
+        A appeler après chaque réponse HTTP. Recale les tokens sur les
+        en-têtes X-MBX-USED-WEIGHT-<n><unit> / X-MBX-ORDER-COUNT-<n><unit>
+        et, sur 429/418, bloque le bucket (Retry-After, sinon backoff
+        exponentiel avec jitter). Retourne la pause appliquée (s).
+        """
+        if key not in self._buckets:
+            self.set_limit(key, rps=0.5, burst=1)
+        hdrs = {k.lower(): v for k, v in (headers or {}).items()}
+
+        for name, value in hdrs.items():
+            for prefix, target in (("x-mbx-used-weight-", key), ("x-mbx-order-count-", f"{key}.orders")):
+                if not name.startswith(prefix) or target not in self._buckets:
+                    continue
+                span = _interval_seconds(name[len(prefix):])
+                try:
+                    used = float(value)
+                except (TypeError, ValueError):
+                    continue
+                if span is None:
+                    continue
+                bucket = self._buckets[target]
+                bucket.resync(bucket.rps * span - used)
+
+        if status not in (418, 429):
+            if status < 400:
+                self._strikes[key] = 0
+            return 0.0
+
+        self._strikes[key] += 1
+        delay = _parse_retry_after(hdrs.get("retry-after"))
+        if delay is None:
+            # backoff exponentiel, "equal jitter": [d/2, d]
+            d = min(self._backoff_cap, self._backoff_base * 2 ** (self._strikes[key] - 1))
+            delay = d / 2 + random.uniform(0, d / 2)
+        self._buckets[key].backoff(time.time() + delay)
+        return delay
+
+
+_INTERVAL_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def _interval_seconds(suffix: str) -> Optional[float]:
+    # '1m' -> 60, '10s' -> 10 (suffixe des en-têtes Binance, en minuscules)
+    num, unit = suffix[:-1], suffix[-1:]
+    if not num.isdigit() or unit not in _INTERVAL_UNITS:
+        return None
+    return float(num) * _INTERVAL_UNITS[unit]
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    # Retry-After: secondes ou date HTTP
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email_utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _rps_from_summary(key: str, summary: dict, default_rps: float) -> float:
+    parts = key.split(".")
+    node = summary
+    for p in parts:
+        node = node.get(p, {})
+    # on cherche d'abord 'rps', sinon on devine depuis 'rpm'
+    rps = node.get("rps")
+    if rps is None:
+        rpm = node.get("rpm")
+        if rpm is not None:
+            rps = float(rpm) / 60.0
+    if rps is None:
+        rps = default_rps
+    return float(rps)
+
+
+# ---------- Variante asyncio ----------
+
+# tolérance flottante: un timer qui tombe à 1e-12 s près ne doit pas se ré-armer
+_EPS = 1e-9
+
+
+@dataclass(eq=False)
+class _AsyncBucket:
+    rps: float
+    capacity: float
+    tokens: float
+    last: float
+    waiters: Deque["_Waiter"] = field(default_factory=deque)
+
+    def refill(self, now: float) -> None:
+        dt = now - self.last
+        if dt <= 0:
+            return
+        self.tokens = min(self.capacity, self.tokens + dt * self.rps)
+        self.last = now
+
+    def peek(self) -> float:
+        # la boucle asyncio utilise time.monotonic() par défaut
+        return min(self.capacity, self.tokens + max(0.0, time.monotonic() - self.last) * self.rps)
+
+    def delay_for(self, cost: float) -> float:
+        missing = cost - self.tokens
+        return missing / self.rps if missing > _EPS else 0.0
+
+
+@dataclass(eq=False)
+class _Waiter:
+    costs: Tuple[Tuple[_AsyncBucket, float], ...]
+    future: "asyncio.Future[None]"
+
+    def is_head(self) -> bool:
+        return all(b.waiters[0] is self for b, _ in self.costs)
+
+
+class AsyncRateLimiter:
+    """
+    Variante asyncio de RateLimiter: les coroutines en attente ne bloquent
+    aucun thread, elles sont réveillées dans l'ordre d'arrivée (FIFO) par un
+    seul timer armé sur la prochaine échéance (pas de polling).
+
+    Exemple d'usage:
+      rl = AsyncRateLimiter()
+      rl.set_limit_from_summary('binance.futures', summary, burst=40)
+      rl.set_limit_from_summary('binance.futures.orders', summary, burst=20)
+      await rl.acquire('binance.futures', cost=5)
+      # poids de l'endpoint + 1 ordre, pris atomiquement dans les deux buckets
+      await rl.acquire_many({'binance.futures': 1, 'binance.futures.orders': 1})
+
+    Une instance appartient à une seule boucle asyncio.
+    """
+    def __init__(self) -> None:
+        self._buckets: Dict[str, _AsyncBucket] = {}
+        # buckets ayant des waiters (dict = set ordonné)
+        self._active: Dict[_AsyncBucket, None] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_at: float = inf
+
+    def set_limit(self, key: str, *, rps: float, burst: Optional[int] = None) -> None:
+        ref = RateLimiter._mk_bucket(rps, burst)
+        b = self._buckets.get(key)
+        if b is None:
+            self._buckets[key] = _AsyncBucket(rps=ref.rps, capacity=ref.capacity, tokens=ref.capacity, last=ref.last)
+            return
+        # mise à jour en place: les waiters déjà en file gardent leur bucket
+        b.refill(ref.last)
+        b.rps, b.capacity = ref.rps, ref.capacity
+        b.tokens = min(b.tokens, b.capacity)
+        if self._active and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._reconfigured)
+
+    def _reconfigured(self) -> None:
+        # capacité réduite sous le coût d'un waiter en file: il n'aboutirait jamais
+        # et bloquerait tous ceux derrière lui (FIFO) -> ValueError, comme à l'entrée
+        for b in list(self._active):
+            for w in [w for w in b.waiters if not w.future.done()]:
+                over = [(wb, c) for wb, c in w.costs if c > wb.capacity]
+                if not over:
+                    continue
+                for wb, _ in w.costs:
+                    wb.waiters.remove(w)
+                wb, c = over[0]
+                w.future.set_exception(ValueError(f"cost {c} exceeds capacity {wb.capacity} after set_limit"))
+        self._dispatch()
+
+    def set_limit_from_summary(self, key: str, summary: dict, *, default_rps: float = 1.0, burst: Optional[int] = None) -> None:
+        self.set_limit(key, rps=_rps_from_summary(key, summary, default_rps), burst=burst)
+
+    def tokens_all(self) -> Dict[str, float]:
+        return {k: b.peek() for k, b in list(self._buckets.items())}
+
+    def _bucket(self, key: str) -> _AsyncBucket:
+        if key not in self._buckets:
+            # sécurité : si non configuré -> très lent (0.5 rps)
+            self.set_limit(key, rps=0.5, burst=1)
+        return self._buckets[key]
+
+    async def acquire(self, key: str, cost: float = 1.0) -> None:
+        await self.acquire_many({key: cost})
+
+    async def acquire_many(self, costs: Mapping[str, float]) -> None:
+        """Prend `cost` tokens dans chaque bucket, tout ou rien."""
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        now = loop.time()
+        items = []
+        for key, cost in costs.items():
+            b = self._bucket(key)
+            if cost > b.capacity:
+                raise ValueError(f"cost {cost} exceeds capacity {b.capacity} of bucket '{key}'")
+            b.refill(now)
+            items.append((b, float(cost)))
+
+        # chemin rapide: personne devant nous et assez de tokens partout
+        if all(not b.waiters and b.tokens >= c - _EPS for b, c in items):
+            for b, c in items:
+                b.tokens -= c
+            return
+
+        w = _Waiter(costs=tuple(items), future=loop.create_future())
+        for b, _ in items:
+            b.waiters.append(w)
+            self._active[b] = None
+        if w.is_head():
+            self._arm(now + max(b.delay_for(c) for b, c in items))
+        try:
+            await w.future
+        except asyncio.CancelledError:
+            if w.future.cancelled():
+                # le waiter annulé est purgé au prochain passage
+                self._arm(loop.time())
+            raise
+
+    def _arm(self, at: float) -> None:
+        if at >= self._timer_at:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_at = at
+        self._timer = self._loop.call_at(at, self._dispatch)
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer, self._timer_at = None, inf
+        now = self._loop.time()
+        next_at = inf
+        progressed = True
+        while progressed:
+            progressed = False
+            next_at = inf
+            for b in list(self._active):
+                while b.waiters:
+                    w = b.waiters[0]
+                    if w.future.done():
+                        # annulé: on le retire, ce qui peut débloquer d'autres files
+                        b.waiters.popleft()
+                        progressed = True
+                        continue
+                    if not w.is_head():
+                        # un waiter plus ancien le bloque dans un autre bucket
+                        break
+                    for wb, _ in w.costs:
+                        wb.refill(now)
+                    delay = max(wb.delay_for(c) for wb, c in w.costs)
+                    if delay > 0:
+                        next_at = min(next_at, now + delay)
+                        break
+                    for wb, c in w.costs:
+                        wb.tokens -= c
+                        wb.waiters.popleft()
+                    w.future.set_result(None)
+                    progressed = True
+                if not b.waiters:
+                    self._active.pop(b, None)
+        if next_at < inf:
+            self._arm(next_at)
+
+
+# ---------- Quotas multi-fenêtres (minute / 15 min / jour) ----------
+
+class QuotaExceeded(RuntimeError):
+    """Quota journalier épuisé: attendre `retry_at` (epoch UTC) plutôt que dormir."""
+
+    def __init__(self, key: str, retry_at: float) -> None:
+        super().__init__(f"daily quota exhausted for '{key}', resets at {time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(retry_at))} UTC")
+        self.key = key
+        self.retry_at = retry_at
+
+
+@dataclass
+class _Window:
+    """
+    Compteur sur fenêtre alignée (epoch). En mode `sliding`, la fenêtre
+    précédente est pondérée au prorata (estimation glissante en O(1));
+    sinon c'est un quota fixe (ex: jour UTC, remis à zéro à minuit).
+    """
+    span: float
+    limit: float
+    sliding: bool = True
+    start: float = 0.0
+    count: float = 0.0
+    prev: float = 0.0
+
+    def roll(self, now: float) -> None:
+        start = now - (now % self.span)
+        if start != self.start:
+            self.prev = self.count if start - self.start == self.span else 0.0
+            self.count = 0.0
+            self.start = start
+
+    def used(self, now: float) -> float:
+        if not self.sliding:
+            return self.count
+        return self.prev * (1.0 - (now - self.start) / self.span) + self.count
+
+    def wait_for(self, cost: float, now: float) -> float:
+        if self.used(now) + cost <= self.limit + _EPS:
+            return 0.0
+        end = self.start + self.span
+        if not self.sliding:
+            return end - now
+        room = self.limit - self.count - cost
+        if room >= 0 and self.prev > 0:
+            # la part de la fenêtre précédente décroît: on attend qu'elle libère la place
+            return self.start + (1.0 - room / self.prev) * self.span - now
+        # pas de place dans la fenêtre courante: on attend la suivante
+        frac = 1.0 - (self.limit - cost) / self.count if self.count > 0 else 0.0
+        return end + max(0.0, frac) * self.span - now
+
+
+_WINDOWS = {"per_min": 60.0, "per_15min": 900.0, "per_day": 86400.0}
+
+
+@dataclass
+class _Quota:
+    bucket: Optional[_Bucket]
+    windows: Dict[str, _Window]
+
+
+class MultiWindowRateLimiter:
+    """
+    Applique simultanément toutes les limites déclarées pour une clé:
+    burst/seconde (token bucket), minute, 15 minutes et jour. Chaque appel
+    est O(1): les compteurs sont persistés (JSON, pour survivre à un
+    restart) par un thread de fond toutes les `persist_every` secondes, par
+    flush() et à la sortie, jamais sur le chemin d'un appel. Le fichier est
+    partagé entre processus: relu et fusionné sous verrou (lockf), chacun
+    n'écrase que les clés qu'il configure.
+
+    Exemple d'usage:
+      rl = MultiWindowRateLimiter(state_path='logs/rate_limits_state.json')
+      rl.set_limit_from_summary('newsapi', summary)    # 1 rps + 100/jour
+      rl.set_limit_from_summary('newsdata', summary)   # 2/min + 30/15min
+      rl.call('newsapi')            # lève QuotaExceeded si le quota du jour est épuisé
+      rl.remaining('newsapi')       # {'burst': 1.0, 'per_day': 99.0, ...}
+    """
+    def __init__(self, state_path: Optional[str | Path] = None, *, persist_every: float = 1.0) -> None:
+        self._quotas: Dict[str, _Quota] = {}
+        self._lock = Lock()
+        self._state_path = Path(state_path) if state_path is not None else None
+        self._io_lock = Lock()  # flush() du thread de fond vs atexit / appel explicite
+        self._dirty = False
+        self._persist_failing = False
+        self._saved: Dict[str, Any] = {}
+        if self._state_path is not None:
+            if self._state_path.exists():
+                try:
+                    self._saved = json.loads(self._state_path.read_text(encoding="utf-8")).get("keys", {})
+                except (OSError, ValueError):
+                    self._saved = {}
+            atexit.register(self.flush)
+            Thread(target=_persist_loop, args=(weakref.ref(self), max(0.05, persist_every)),
+                   name="rate-limits-persist", daemon=True).start()
+
+    def set_limit(
+        self,
+        key: str,
+        *,
+        rps: Optional[float] = None,
+        burst: Optional[int] = None,
+        per_min: Optional[float] = None,
+        per_15min: Optional[float] = None,
+        per_day: Optional[float] = None,
+    ) -> None:
+        limits = {"per_min": per_min, "per_15min": per_15min, "per_day": per_day}
+        windows: Dict[str, _Window] = {}
+        for name, limit in limits.items():
+            if limit is None:
+                continue
+            w = _Window(span=_WINDOWS[name], limit=float(limit), sliding=(name != "per_day"))
+            current = self._quotas[key].windows.get(name) if key in self._quotas else None
+            saved = self._saved.get(key, {}).get(name)
+            if current is not None:
+                # reconfiguration à chaud: les compteurs en cours sont conservés
+                w.start, w.count, w.prev = current.start, current.count, current.prev
+            elif saved:
+                w.start, w.count, w.prev = saved["start"], saved["count"], saved["prev"]
+            windows[name] = w
+        bucket = RateLimiter._mk_bucket(rps, burst) if rps is not None else None
+        with self._lock:
+            self._quotas[key] = _Quota(bucket=bucket, windows=windows)
+
+    def set_limit_from_summary(self, key: str, summary: dict, *, default_rps: float = 1.0, burst: Optional[int] = None) -> None:
         node = summary
-        for p in parts:
+        for p in key.split("."):
             node = node.get(p, {})
-        # on cherche d'abord 'rps', sinon on devine depuis 'rpm'
+        per_min, per_15min, per_day = node.get("rpm"), node.get("per_15min"), node.get("per_day")
         rps = node.get("rps")
-        if rps is None:
-            rpm = node.get("rpm")
-            if rpm is not None:
-                rps = float(rpm) / 60.0
-        if rps is None:
+        if rps is None and per_min is None and per_15min is None and per_day is None:
             rps = default_rps
-        self.set_limit(key, rps=float(rps), burst=burst)
+        self.set_limit(key, rps=rps, burst=burst, per_min=per_min, per_15min=per_15min, per_day=per_day)
+
+    def _quota(self, key: str) -> _Quota:
+        if key not in self._quotas:
+            # sécurité : si non configuré -> très lent (0.5 rps)
+            self.set_limit(key, rps=0.5, burst=1)
+        return self._quotas[key]
+
+    def _wait(self, q: _Quota, cost: float, now: float) -> Tuple[float, float]:
+        # -> (attente max, attente imposée par le quota jour)
+        wait, day_wait = 0.0, 0.0
+        if q.bucket is not None:
+            q.bucket.refill()
+            if q.bucket.tokens < cost:
+                wait = (cost - q.bucket.tokens) / q.bucket.rps
+        for name, w in q.windows.items():
+            if cost > w.limit:
+                raise ValueError(f"cost {cost} exceeds {name} limit {w.limit}")
+            w.roll(now)
+            ww = w.wait_for(cost, now)
+            if name == "per_day":
+                day_wait = ww
+            wait = max(wait, ww)
+        return wait, day_wait
+
+    def _consume(self, q: _Quota, cost: float, now: float) -> None:
+        if q.bucket is not None:
+            q.bucket.tokens -= cost
+        for w in q.windows.values():
+            w.count += cost
+        self._dirty = True
+
+    def try_acquire(self, key: str, *, cost: float = 1.0) -> bool:
+        q = self._quota(key)
+        with self._lock:
+            now = time.time()
+            wait, _ = self._wait(q, cost, now)
+            if wait > 0:
+                return False
+            self._consume(q, cost, now)
+            return True
+
+    def call(self, key: str, *, cost: float = 1.0) -> None:
+        # Bloque sur les fenêtres courtes; lève QuotaExceeded si le jour est épuisé.
+        q = self._quota(key)
+        while True:
+            with self._lock:
+                now = time.time()
+                wait, day_wait = self._wait(q, cost, now)
+                if day_wait > 0:
+                    raise QuotaExceeded(key, now + day_wait)
+                if wait <= 0:
+                    self._consume(q, cost, now)
+                    return
+            time.sleep(max(0.01, wait))
+
+    async def acquire(self, key: str, *, cost: float = 1.0) -> None:
+        """Variante asyncio de call(): attend sans bloquer la boucle; QuotaExceeded si le jour est épuisé."""
+        q = self._quota(key)
+        while True:
+            with self._lock:
+                now = time.time()
+                wait, day_wait = self._wait(q, cost, now)
+                if day_wait > 0:
+                    raise QuotaExceeded(key, now + day_wait)
+                if wait <= 0:
+                    self._consume(q, cost, now)
+                    return
+            await asyncio.sleep(max(0.01, wait))
+
+    def remaining(self, key: str) -> Dict[str, float]:
+        q = self._quota(key)
+        out: Dict[str, float] = {}
+        with self._lock:
+            now = time.time()
+            if q.bucket is not None:
+                q.bucket.refill()
+                out["burst"] = q.bucket.tokens
+            for name, w in q.windows.items():
+                w.roll(now)
+                out[name] = max(0.0, w.limit - w.used(now))
+                if name == "per_day":
+                    out["day_resets_in"] = w.start + w.span - now
+        return out
+
+    def remaining_all(self) -> Dict[str, Dict[str, float]]:
+        return {k: self.remaining(k) for k in list(self._quotas)}
+
+    # ---------- Persistance ----------
+
+    def _persist(self, mine: Dict[str, Any], now: float) -> None:
+        path = self._state_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(path.with_suffix(path.suffix + ".lock")), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            with _range_lock(fd, 0):
+                # clés non configurées ici (autre process, configurées plus tard): relues et conservées
+                try:
+                    keys = json.loads(path.read_text(encoding="utf-8")).get("keys", {})
+                except (OSError, ValueError):
+                    keys = dict(self._saved)
+                keys.update(mine)
+                tmp = path.with_suffix(path.suffix + ".tmp")
+                tmp.write_text(json.dumps({"saved_at": now, "keys": keys}), encoding="utf-8")
+                os.replace(tmp, path)
+        finally:
+            os.close(fd)
+        self._saved = keys
+
+    def flush(self) -> None:
+        """Écrit les compteurs s'ils ont changé; un échec disque est journalisé, jamais propagé."""
+        if self._state_path is None:
+            return
+        with self._io_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                # instantané sous le verrou (pas d'E/S), écriture hors verrou
+                mine = {
+                    k: {n: {"start": w.start, "count": w.count, "prev": w.prev} for n, w in q.windows.items()}
+                    for k, q in self._quotas.items()
+                }
+                self._dirty = False
+            try:
+                self._persist(mine, time.time())
+            except OSError as e:
+                self._dirty = True
+                if not self._persist_failing:  # une fois par série d'échecs, pas à chaque tour du thread
+                    log.warning(f"rate limiter: cannot persist {self._state_path}: {e}")
+                self._persist_failing = True
+            else:
+                self._persist_failing = False
+
+
+def _persist_loop(ref: "weakref.ref[MultiWindowRateLimiter]", every: float) -> None:
+    # référence faible: le thread ne garde pas le limiteur en vie
+    while True:
+        time.sleep(every)
+        rl = ref()
+        if rl is None:
+            return
+        rl.flush()
+        del rl
@@ -0,0 +1,178 @@
+﻿from __future__ import annotations
+
+import mmap
+import os
+import struct
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterator
+
+# Buckets partagés entre processus d'un même hôte (engine, dashboard, news...).
+# L'état vit dans un fichier mappé en mémoire; chaque slot est protégé par un
+# verrou de plage d'octets (fcntl / msvcrt) + un Lock local pour les threads.
+# time.monotonic() est une horloge système (Linux/Windows), donc comparable
+# d'un processus à l'autre.
+
+if os.name == "nt":  # pragma: no cover - Windows
+    import msvcrt
+
+    @contextmanager
+    def _range_lock(fd: int, offset: int) -> Iterator[None]:
+        os.lseek(fd, offset, os.SEEK_SET)
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                break
+            except OSError:
+                continue
+        try:
+            yield
+        finally:
+            os.lseek(fd, offset, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    @contextmanager
+    def _range_lock(fd: int, offset: int) -> Iterator[None]:
+        fcntl.lockf(fd, fcntl.LOCK_EX, 1, offset)
+        try:
+            yield
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN, 1, offset)
+
+
+_MAGIC = b"SNRL"
+_VERSION = 2
+_HEADER = struct.Struct("<4sII")        # magic, version, nslots
+_KEY_LEN = 64
+_SLOT = struct.Struct(f"<{_KEY_LEN}s5d")  # key, rps, capacity, tokens, last, blocked_until
+_STATE = struct.Struct("<5d")
+
+
+class SharedBucket:
+    """Même interface que `_Bucket` (acquire/resync/backoff...), état dans le mmap."""
+
+    def __init__(self, store: "SharedBucketStore", offset: int) -> None:
+        self._store = store
+        self._offset = offset
+        self._state_offset = offset + _KEY_LEN
+        self._lock = Lock()
+
+    def _take(self, cost: float) -> float:
+        # -> 0 si servi, sinon temps d'attente estimé
+        mm = self._store._mm
+        with self._lock, _range_lock(self._store._fd, self._offset):
+            rps, capacity, tokens, last, blocked_until = _STATE.unpack_from(mm, self._state_offset)
+            blocked = blocked_until - time.time()
+            if blocked > 0:
+                return blocked
+            now = time.monotonic()
+            if now > last:
+                tokens = min(capacity, tokens + (now - last) * rps)
+            last = now  # now < last: fichier antérieur à un reboot
+            if tokens >= cost:
+                _STATE.pack_into(mm, self._state_offset, rps, capacity, tokens - cost, last, blocked_until)
+                return 0.0
+            _STATE.pack_into(mm, self._state_offset, rps, capacity, tokens, last, blocked_until)
+            return (cost - tokens) / rps if rps > 0 else 0.05
+
+    def try_acquire(self, cost: float = 1.0) -> bool:
+        return self._take(cost) == 0.0
+
+    def acquire(self, cost: float = 1.0) -> None:
+        while True:
+            wait = self._take(cost)
+            if wait == 0.0:
+                return
+            time.sleep(max(0.01, wait))
+
+    def resync(self, remaining: float) -> None:
+        self._take(0.0)  # refill
+        mm = self._store._mm
+        with self._lock, _range_lock(self._store._fd, self._offset):
+            rps, capacity, tokens, last, blocked_until = _STATE.unpack_from(mm, self._state_offset)
+            tokens = min(tokens, max(0.0, remaining))
+            _STATE.pack_into(mm, self._state_offset, rps, capacity, tokens, last, blocked_until)
+
+    def backoff(self, until: float) -> None:
+        # partagé: un ban (418) vu par un processus bloque tout l'hôte
+        mm = self._store._mm
+        with self._lock, _range_lock(self._store._fd, self._offset):
+            rps, capacity, _, last, blocked_until = _STATE.unpack_from(mm, self._state_offset)
+            _STATE.pack_into(mm, self._state_offset, rps, capacity, 0.0, last, max(blocked_until, until))
+
+    @property
+    def rps(self) -> float:
+        return _STATE.unpack_from(self._store._mm, self._state_offset)[0]
+
+    @property
+    def tokens(self) -> float:
+        rps, capacity, tokens, last, _ = _STATE.unpack_from(self._store._mm, self._state_offset)
+        return min(capacity, tokens + max(0.0, time.monotonic() - last) * rps)
+
+
+class SharedBucketStore:
+    """
+    Table de buckets dans un fichier mappé (ex: logs/rate_limiter.shm).
+
+    Tous les processus qui ouvrent le même fichier tirent sur le même budget:
+      store = SharedBucketStore('logs/rate_limiter.shm')
+      rl = RateLimiter(store=store)
+    """
+
+    def __init__(self, path: str | Path, *, max_slots: int = 256) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._size = _HEADER.size + max_slots * _SLOT.size
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        self._slots: Dict[str, SharedBucket] = {}
+        self._lock = Lock()
+        with _range_lock(self._fd, 0):
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, self._size)
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                os.write(self._fd, _HEADER.pack(_MAGIC, _VERSION, max_slots))
+            self._size = os.fstat(self._fd).st_size
+            self._mm = mmap.mmap(self._fd, self._size)
+        magic, version, nslots = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{self.path} is not a SNIPER rate limiter store (v{_VERSION})")
+        self._nslots = nslots
+
+    def bucket(self, key: str, *, rps: float, capacity: float) -> SharedBucket:
+        """Crée (ou rejoint) le slot `key`; le premier processus le remplit."""
+        raw = key.encode("utf-8")
+        if len(raw) > _KEY_LEN:
+            raise ValueError(f"bucket key too long (>{_KEY_LEN} bytes): {key}")
+        raw = raw.ljust(_KEY_LEN, b"\0")
+        with self._lock, _range_lock(self._fd, 0):
+            free = None
+            for i in range(self._nslots):
+                off = _HEADER.size + i * _SLOT.size
+                slot_key = self._mm[off:off + _KEY_LEN]
+                if slot_key == raw:
+                    break
+                if free is None and slot_key[0] == 0:
+                    free = off
+            else:
+                if free is None:
+                    raise RuntimeError(f"{self.path}: no free slot left ({self._nslots})")
+                off = free
+                _SLOT.pack_into(self._mm, off, raw, rps, capacity, capacity, time.monotonic(), 0.0)
+                b = SharedBucket(self, off)
+                self._slots[key] = b
+                return b
+        b = self._slots.get(key) or SharedBucket(self, off)
+        # slot existant: on garde les tokens consommés, on met à jour la limite
+        with b._lock, _range_lock(self._fd, off):
+            _, _, tokens, last, blocked_until = _STATE.unpack_from(self._mm, b._state_offset)
+            _STATE.pack_into(self._mm, b._state_offset, rps, capacity, min(tokens, capacity), last, blocked_until)
+        self._slots[key] = b
+        return b
+
+    def close(self) -> None:
+        self._mm.close()
+        os.close(self._fd)
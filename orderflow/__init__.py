@@ -0,0 +1,8 @@
+﻿from modules_utils.lazy_import import lazy_submodules
+
+__getattr__, __dir__ = lazy_submodules(__name__, [
+    "dom_reader",
+    "flow_decision_engine",
+    "liquidity_map",
+    "safe_place_finder",
+])
@@ -0,0 +1,392 @@
+﻿from __future__ import annotations
+
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+log = logging.getLogger("sniper")
+
+# Poids REST de GET depth selon `limit` (doc Binance), pour le RateLimiter.
+_SPOT_DEPTH_WEIGHT = ((100, 5), (500, 25), (1000, 50), (5000, 250))
+_FUTURES_DEPTH_WEIGHT = ((50, 2), (100, 5), (500, 10), (1000, 20))
+
+_EMPTY = np.empty(0, dtype=np.float64)
+
+
+def depth_weight(limit: int, futures: bool = False) -> int:
+    for lim, w in (_FUTURES_DEPTH_WEIGHT if futures else _SPOT_DEPTH_WEIGHT):
+        if limit <= lim:
+            return w
+    return (_FUTURES_DEPTH_WEIGHT if futures else _SPOT_DEPTH_WEIGHT)[-1][1]
+
+
+def _levels(raw: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+    # [["30000.10", "0.5"], ...] (chaînes Binance) ou flottants
+    arr = np.asarray(raw if len(raw) else _EMPTY.reshape(0, 2), dtype=np.float64)
+    return arr[:, 0], arr[:, 1]
+
+
+class _Side:
+    """
+    Niveaux d'un côté du carnet, triés par prix croissant, dans deux
+    tableaux préalloués (prix, quantités) + double tampon pour les fusions.
+    Côté bid le meilleur prix est en fin de tableau, côté ask en début.
+    """
+
+    __slots__ = ("is_bid", "capacity", "n", "px", "qty", "_px2", "_qty2", "_cum", "_cum_n")
+
+    def __init__(self, is_bid: bool, capacity: int) -> None:
+        self.is_bid = is_bid
+        self.capacity = capacity
+        self.n = 0
+        self.px = np.empty(capacity, dtype=np.float64)
+        self.qty = np.empty(capacity, dtype=np.float64)
+        self._px2 = np.empty(capacity, dtype=np.float64)
+        self._qty2 = np.empty(capacity, dtype=np.float64)
+        # sommes préfixes best-first, valides sur les _cum_n premiers niveaux (0 = invalidées)
+        self._cum = np.empty(capacity, dtype=np.float64)
+        self._cum_n = 0
+
+    def load(self, px: np.ndarray, qty: np.ndarray) -> None:
+        keep = qty > 0
+        px, qty = px[keep], qty[keep]
+        order = np.argsort(px, kind="stable")
+        px, qty = px[order], qty[order]
+        if len(px) > self.capacity:
+            px, qty = (px[-self.capacity:], qty[-self.capacity:]) if self.is_bid else (px[:self.capacity], qty[:self.capacity])
+        self.n = len(px)
+        self._cum_n = 0
+        self.px[:self.n] = px
+        self.qty[:self.n] = qty
+
+    def apply(self, px: np.ndarray, qty: np.ndarray) -> None:
+        """Applique un lot de niveaux (qty=0 -> suppression), recherche O(log n) vectorisée."""
+        n = self.n
+        self._cum_n = 0
+        P, Q = self.px[:n], self.qty[:n]
+        idx = np.searchsorted(P, px)
+        found = idx < n
+        found[found] = P[idx[found]] == px[found]
+        live = qty > 0
+        # cas courant: simple changement de quantité sur des niveaux existants
+        upd = found & live
+        Q[idx[upd]] = qty[upd]
+        dele = found & ~live
+        ins = ~found & live
+        if not dele.any() and not ins.any():
+            return
+
+        keep = np.ones(n, dtype=bool)
+        keep[idx[dele]] = False
+        kp, kq = P[keep], Q[keep]
+        new_px, new_q = px[ins], qty[ins]
+        order = np.argsort(new_px, kind="stable")
+        new_px, new_q = new_px[order], new_q[order]
+        m = len(kp) + len(new_px)
+        pos = np.searchsorted(kp, new_px) + np.arange(len(new_px))
+        slot = np.ones(m, dtype=bool)
+        slot[pos] = False
+        if m <= self.capacity:
+            px2, q2 = self._px2[:m], self._qty2[:m]
+        else:
+            px2, q2 = np.empty(m), np.empty(m)
+        px2[pos], q2[pos] = new_px, new_q
+        px2[slot], q2[slot] = kp, kq
+        if m > self.capacity:
+            # carnet plein: on abandonne les niveaux les plus éloignés
+            cut = slice(m - self.capacity, m) if self.is_bid else slice(0, self.capacity)
+            px2, q2 = px2[cut], q2[cut]
+            m = self.capacity
+            self._px2[:m], self._qty2[:m] = px2, q2
+        self.px, self._px2 = self._px2, self.px
+        self.qty, self._qty2 = self._qty2, self.qty
+        self.n = m
+
+    # ---------- Requêtes ----------
+
+    def best(self) -> Optional[Tuple[float, float]]:
+        if self.n == 0:
+            return None
+        i = self.n - 1 if self.is_bid else 0
+        return float(self.px[i]), float(self.qty[i])
+
+    def level(self, k: int) -> Optional[Tuple[float, float]]:
+        """k-ième niveau depuis le meilleur (0 = meilleur), O(1)."""
+        if not 0 <= k < self.n:
+            return None
+        i = self.n - 1 - k if self.is_bid else k
+        return float(self.px[i]), float(self.qty[i])
+
+    def top(self, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Vues (sans copie) sur les k meilleurs niveaux, meilleur en premier."""
+        k = max(0, min(k, self.n))
+        if self.is_bid:
+            s = slice(self.n - 1, self.n - 1 - k if self.n - 1 - k >= 0 else None, -1)
+            return self.px[s], self.qty[s]
+        return self.px[:k], self.qty[:k]
+
+    def _cum_to(self, k: int) -> np.ndarray:
+        """Sommes préfixes des k meilleurs niveaux, prolongées paresseusement depuis le dernier apply.
+
+        Le premier appel après une mise à jour coûte O(k) (seulement la partie non encore couverte),
+        les suivants O(1): un flux tick-par-tick qui ne lit que le top 10 ne paie jamais tout le carnet.
+        """
+        m = self._cum_n
+        if k > m:
+            n = self.n
+            q = self.qty[n - 1 - m:(n - 1 - k if k < n else None):-1] if self.is_bid else self.qty[m:k]
+            seg = self._cum[m:k]
+            np.add.accumulate(q, out=seg)
+            if m:
+                seg += self._cum[m - 1]
+            self._cum_n = k
+        return self._cum[:k]
+
+    def volume_to_depth(self, k: int) -> float:
+        """Volume cumulé des k meilleurs niveaux (O(1) entre deux mises à jour)."""
+        k = max(0, min(k, self.n))
+        return float(self._cum_to(k)[k - 1]) if k else 0.0
+
+    def volume_to_price(self, price: float) -> float:
+        """Volume cumulé du meilleur niveau jusqu'à `price` inclus (O(log n) entre deux mises à jour)."""
+        P = self.px[:self.n]
+        if self.is_bid:
+            k = self.n - int(np.searchsorted(P, price, side="left"))
+        else:
+            k = int(np.searchsorted(P, price, side="right"))
+        return self.volume_to_depth(k)
+
+    def price_for_volume(self, volume: float) -> Optional[float]:
+        """Prix atteint en consommant `volume` depuis le meilleur niveau (None si carnet trop court)."""
+        i = int(np.searchsorted(self._cum_to(self.n), volume))
+        if i >= self.n:
+            return None
+        return float(self.px[self.n - 1 - i] if self.is_bid else self.px[i])
+
+
+class OrderBook:
+    """
+    Carnet L2 d'un symbole, alimenté comme le préconise Binance:
+      1) bufferiser les événements depthUpdate du websocket;
+      2) charger un snapshot REST (lastUpdateId);
+      3) ignorer les événements u <= lastUpdateId, puis exiger la continuité
+         (spot: U == u_précédent + 1, futures: pu == u_précédent).
+    Un trou de séquence repasse le carnet en resync: les événements sont de
+    nouveau bufferisés et `on_resync(symbol)` est appelé pour recharger un
+    snapshot.
+
+    Niveaux triés dans des tableaux NumPy: meilleur prix et niveau k en O(1),
+    localisation d'un prix en O(log n), mises à jour appliquées par lot.
+
+    Exemple d'usage:
+      book = OrderBook("BTCUSDT", futures=True, on_resync=lambda s: queue_snapshot(s))
+      book.on_event(ws_msg)                 # dict depthUpdate
+      book.load_snapshot(rest_json)         # {"lastUpdateId", "bids", "asks"}
+      book.best_bid(), book.spread(), book.top("ask", 10)
+      book.volume_to_price("bid", 29950.0)
+    """
+
+    def __init__(
+        self,
+        symbol: str,
+        *,
+        futures: bool = False,
+        max_levels: int = 20_000,
+        max_buffer: int = 10_000,
+        on_resync: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.symbol = symbol
+        self.futures = futures
+        self.bids = _Side(True, max_levels)
+        self.asks = _Side(False, max_levels)
+        self.last_update_id = 0
+        self.synced = False
+        self._first = True
+        self.gaps = 0
+        self.updates = 0
+        self.snapshots = 0
+        self.event_time: Optional[float] = None  # E (ms) du dernier diff, en secondes
+        self._buffer: Deque[Mapping[str, Any]] = deque(maxlen=max_buffer)
+        self._on_resync = on_resync
+        self._listeners: List[Callable[["OrderBook", np.ndarray, np.ndarray, np.ndarray, np.ndarray], None]] = []
+
+    def subscribe(self, cb: Callable[["OrderBook", np.ndarray, np.ndarray, np.ndarray, np.ndarray], None]) -> None:
+        """cb(book, bid_px, bid_qty, ask_px, ask_qty) après chaque diff appliqué (liquidity_map...)."""
+        self._listeners.append(cb)
+
+    # ---------- Synchronisation ----------
+
+    def load_snapshot(self, snap: Mapping[str, Any]) -> bool:
+        """Charge un snapshot REST puis rejoue le buffer; False si un nouveau snapshot est nécessaire."""
+        self.bids.load(*_levels(snap.get("bids", [])))
+        self.asks.load(*_levels(snap.get("asks", [])))
+        self.last_update_id = int(snap["lastUpdateId"])
+        self.synced = True
+        self._first = True
+        self.snapshots += 1
+        pending = list(self._buffer)
+        self._buffer.clear()
+        for evt in pending:
+            if not self.synced:
+                self._buffer.append(evt)
+            else:
+                self.on_event(evt)
+        return self.synced
+
+    def _resync(self, reason: str) -> None:
+        self.gaps += 1
+        self.synced = False
+        log.warning(f"dom_reader: {self.symbol} resync ({reason})")
+        if self._on_resync is not None:
+            self._on_resync(self.symbol)
+
+    def on_event(self, evt: Mapping[str, Any]) -> bool:
+        """Traite un depthUpdate; True s'il a été appliqué au carnet."""
+        if not self.synced:
+            self._buffer.append(evt)
+            return False
+        U, u = int(evt["U"]), int(evt["u"])
+        last = self.last_update_id
+        if u <= last:
+            return False  # déjà couvert par le snapshot
+        if self._first:
+            # premier événement après le snapshot: doit l'enjamber
+            lo = last if self.futures else last + 1
+            if not U <= lo <= u:
+                self._buffer.append(evt)
+                self._resync(f"snapshot {last} does not bridge event U={U} u={u}")
+                return False
+        elif self.futures:
+            if int(evt.get("pu", last)) != last:
+                self._buffer.append(evt)
+                self._resync(f"pu={evt.get('pu')} != {last}")
+                return False
+        elif U != last + 1:
+            self._buffer.append(evt)
+            self._resync(f"gap U={U} expected {last + 1}")
+            return False
+        self._first = False
+        bp, bq = _levels(evt.get("b", []))
+        ap, aq = _levels(evt.get("a", []))
+        if len(bp):
+            self.bids.apply(bp, bq)
+        if len(ap):
+            self.asks.apply(ap, aq)
+        self.last_update_id = u
+        self.updates += 1
+        E = evt.get("E")
+        self.event_time = E / 1000.0 if E is not None else None
+        for cb in self._listeners:
+            cb(self, bp, bq, ap, aq)
+        return True
+
+    # ---------- Requêtes ----------
+
+    def _side(self, side: str) -> _Side:
+        if side in ("bid", "bids", "b"):
+            return self.bids
+        if side in ("ask", "asks", "a"):
+            return self.asks
+        raise ValueError(f"unknown side: {side}")
+
+    def best_bid(self) -> Optional[Tuple[float, float]]:
+        return self.bids.best()
+
+    def best_ask(self) -> Optional[Tuple[float, float]]:
+        return self.asks.best()
+
+    def mid(self) -> Optional[float]:
+        b, a = self.bids.best(), self.asks.best()
+        return (b[0] + a[0]) / 2 if b and a else None
+
+    def spread(self) -> Optional[float]:
+        b, a = self.bids.best(), self.asks.best()
+        return a[0] - b[0] if b and a else None
+
+    def level(self, side: str, k: int) -> Optional[Tuple[float, float]]:
+        return self._side(side).level(k)
+
+    def top(self, side: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self._side(side).top(k)
+
+    def volume_to_depth(self, side: str, k: int) -> float:
+        return self._side(side).volume_to_depth(k)
+
+    def volume_to_price(self, side: str, price: float) -> float:
+        return self._side(side).volume_to_price(price)
+
+    def price_for_volume(self, side: str, volume: float) -> Optional[float]:
+        return self._side(side).price_for_volume(volume)
+
+    def imbalance(self, k: int = 10) -> Optional[float]:
+        """(bid - ask) / (bid + ask) sur les k premiers niveaux."""
+        b, a = self.bids.volume_to_depth(k), self.asks.volume_to_depth(k)
+        return (b - a) / (b + a) if b + a > 0 else None
+
+
+class DomReader:
+    """
+    Carnets de plusieurs symboles + récupération des snapshots via ApiHandler
+    (RateLimiter: clé binance.spot / binance.futures, poids selon `limit`).
+    Avec `recorder` (sniper_engine.market_recorder.MarketRecorder), chaque
+    diff et snapshot reçu est aussi enregistré pour rejeu.
+
+    Exemple d'usage:
+      dom = DomReader(api, futures=True)
+      dom.on_message(ws_json)          # route vers le bon OrderBook
+      dom.sync_pending()               # snapshots des carnets en resync
+      dom.book("BTCUSDT").best_bid()
+    """
+
+    SPOT_URL = "https://api.binance.com/api/v3/depth"
+    FUTURES_URL = "https://fapi.binance.com/fapi/v1/depth"
+
+    def __init__(self, api: Any = None, *, futures: bool = False, limit: int = 1000, max_levels: int = 20_000,
+                 recorder: Any = None) -> None:
+        self.api = api
+        self.recorder = recorder
+        self.futures = futures
+        self.limit = limit
+        self.max_levels = max_levels
+        self._books: Dict[str, OrderBook] = {}
+        self._pending: Dict[str, None] = {}
+
+    def book(self, symbol: str) -> OrderBook:
+        b = self._books.get(symbol)
+        if b is None:
+            b = self._books[symbol] = OrderBook(symbol, futures=self.futures, max_levels=self.max_levels,
+                                                 on_resync=self._mark_pending)
+            self._pending[symbol] = None
+        return b
+
+    def _mark_pending(self, symbol: str) -> None:
+        self._pending[symbol] = None
+
+    def on_message(self, evt: Mapping[str, Any]) -> bool:
+        data = evt.get("data", evt)  # flux combinés: {"stream": ..., "data": {...}}
+        if self.recorder is not None:
+            self.recorder.record_depth(data)
+        return self.book(data["s"]).on_event(data)
+
+    def fetch_snapshot(self, symbol: str) -> Dict[str, Any]:
+        key = "binance.futures" if self.futures else "binance.spot"
+        url = self.FUTURES_URL if self.futures else self.SPOT_URL
+        r = self.api.get(key, url, params={"symbol": symbol, "limit": self.limit},
+                         cost=depth_weight(self.limit, self.futures))
+        if not r.ok:
+            raise RuntimeError(f"depth snapshot {symbol}: HTTP {r.status}")
+        snap = r.json()
+        if self.recorder is not None:
+            self.recorder.record_snapshot(symbol, snap)
+        return snap
+
+    def sync_pending(self) -> List[str]:
+        """Charge un snapshot pour chaque carnet non synchronisé; retourne ceux synchronisés."""
+        done = []
+        for symbol in list(self._pending):
+            self._pending.pop(symbol, None)
+            if self.book(symbol).load_snapshot(self.fetch_snapshot(symbol)):
+                done.append(symbol)
+        return done
@@ -0,0 +1,491 @@
+﻿from __future__ import annotations
+
+import json
+import logging
+import math
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional
+
+from modules_utils.config_loader import RiskModel
+from orderflow.dom_reader import OrderBook
+from orderflow.liquidity_map import LiquidityMap
+from orderflow.safe_place_finder import Candidate, SafePlaceFinder
+
+log = logging.getLogger("sniper")
+
+_ns = time.perf_counter_ns
+
+
+# --------- Latence ---------
+
+class LatencyHistogram:
+    """
+    Histogramme de latences en nanosecondes, à compteurs préalloués:
+    4 sous-buckets par puissance de 2 (résolution ~19 %), de 1 ns à ~1 min.
+    record() ne fait que des opérations entières, sans allocation.
+    """
+
+    __slots__ = ("name", "counts", "count", "total", "max")
+
+    _SIZE = 37 << 2  # 2 bits de mantisse par puissance de 2, jusqu'à 2**37 ns
+
+    def __init__(self, name: str = "") -> None:
+        self.name = name
+        self.counts = [0] * self._SIZE
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns: int) -> None:
+        if ns < 0:
+            ns = 0
+        bl = ns.bit_length()
+        i = ns if bl <= 3 else (bl - 2) << 2 | (ns >> (bl - 3)) & 3
+        if i >= self._SIZE:
+            i = self._SIZE - 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    @staticmethod
+    def _upper(i: int) -> int:
+        # borne haute (incluse) du bucket i
+        if i < 8:
+            return i
+        e, m = (i >> 2) - 1, i & 3
+        return (((4 | m) + 1) << e) - 1
+
+    def percentile(self, q: float) -> float:
+        """Borne haute du bucket contenant le quantile q (0-100), en ns."""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(round(q / 100.0 * self.count)))
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= rank:
+                return float(min(self._upper(i), self.max))
+        return float(self.max)
+
+    def reset(self) -> None:
+        self.counts = [0] * self._SIZE
+        self.count = self.total = self.max = 0
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "p50_us": self.percentile(50) / 1e3,
+            "p99_us": self.percentile(99) / 1e3,
+            "max_us": self.max / 1e3,
+            "mean_us": self.total / self.count / 1e3 if self.count else 0.0,
+        }
+
+
+# --------- Files bornées à slots préalloués ---------
+
+class _SlotQueue:
+    """
+    File FIFO bornée sur un anneau de capacity + 1 slots préalloués:
+    claim() rend le slot libre (sans rien publier), commit() le publie,
+    pop() rend le plus ancien à traiter. Un étage qui ne produit rien ne
+    commit pas: la file reste intacte. File pleine: commit() évince le plus
+    ancien (données de marché: seul le récent compte), compté dans `dropped`.
+    """
+
+    __slots__ = ("name", "capacity", "_slots", "_head", "size", "dropped", "high_water")
+
+    def __init__(self, name: str, capacity: int, factory: Callable[[], Any]) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.name = name
+        self.capacity = capacity
+        self._slots = [factory() for _ in range(capacity + 1)]  # +1: slot de travail, jamais publié
+        self._head = 0
+        self.size = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def claim(self) -> Any:
+        """Slot libre à remplir; rien n'est publié ni évincé avant commit()."""
+        return self._slots[(self._head + self.size) % (self.capacity + 1)]
+
+    def commit(self) -> None:
+        """Publie le slot rendu par claim()."""
+        if self.size == self.capacity:
+            self._head = (self._head + 1) % (self.capacity + 1)
+            self.dropped += 1
+        else:
+            self.size += 1
+            if self.size > self.high_water:
+                self.high_water = self.size
+
+    def pop(self) -> Any:
+        if not self.size:
+            return None
+        slot = self._slots[self._head]
+        self._head = (self._head + 1) % (self.capacity + 1)
+        self.size -= 1
+        return slot
+
+
+class _Tick:
+    __slots__ = ("ctx", "evt", "t_in")
+
+    def __init__(self) -> None:
+        self.ctx: Optional[_SymbolCtx] = None
+        self.evt: Optional[Mapping[str, Any]] = None
+        self.t_in = 0
+
+
+class _Signal:
+    __slots__ = ("ctx", "side", "strength", "t_in")
+
+    def __init__(self) -> None:
+        self.ctx: Optional[_SymbolCtx] = None
+        self.side = ""
+        self.strength = 0.0
+        self.t_in = 0
+
+
+class _Placement:
+    __slots__ = ("ctx", "cand", "strength", "t_in")
+
+    def __init__(self) -> None:
+        self.ctx: Optional[_SymbolCtx] = None
+        self.cand = Candidate()
+        self.strength = 0.0
+        self.t_in = 0
+
+
+class OrderIntent:
+    """
+    Intention d'ordre limite en sortie du pipeline. Slot réutilisé: les
+    consommateurs copient via as_dict() s'ils la conservent.
+    """
+
+    __slots__ = ("symbol", "side", "price", "qty", "stop", "target", "rr", "strength", "t_in", "t_out")
+
+    def __init__(self) -> None:
+        self.symbol = self.side = ""
+        self.price = self.qty = self.stop = self.target = self.rr = self.strength = 0.0
+        self.t_in = self.t_out = 0
+
+    @property
+    def latency_us(self) -> float:
+        return (self.t_out - self.t_in) / 1e3
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+# --------- Risque ---------
+
+class RiskGate:
+    """
+    Limites de config/risk.yml (RiskModel) appliquées à chaque placement:
+      - perte du jour >= max_daily_dd_pct de l'equity de début de journée: rien ne passe (0 = sans limite);
+      - taille = equity x max_trade_r_pct / |entrée - stop| (arrondie à qty_step);
+      - ratio atteignable (objectif ramené devant le mur opposé) >= target_rr.
+    Les refus sont comptés par motif dans `rejects`.
+
+    Exemple d'usage:
+      gate = RiskGate(ConfigLoader().load_risk(), equity=10_000)
+      gate.on_pnl(-35.0)
+      ok = gate.size(cand, intent)
+    """
+
+    REASONS = ("daily_dd", "rr", "size")
+
+    def __init__(self, risk: RiskModel, *, equity: float, qty_step: float = 0.0, max_qty: Optional[float] = None) -> None:
+        self.risk = risk
+        self.equity = float(equity)
+        self.day_start_equity = float(equity)
+        self.pnl_day = 0.0
+        self.qty_step = qty_step
+        self.max_qty = max_qty
+        self.rejects: Dict[str, int] = {r: 0 for r in self.REASONS}
+
+    def set_risk(self, risk: RiskModel) -> None:
+        # branché sur ConfigLoader.subscribe("risk.yml", ...) pour le rechargement à chaud
+        self.risk = risk
+
+    def on_pnl(self, pnl: float) -> None:
+        self.pnl_day += pnl
+        self.equity += pnl
+
+    def new_day(self) -> None:
+        self.day_start_equity = self.equity
+        self.pnl_day = 0.0
+
+    @property
+    def halted(self) -> bool:
+        limit = self.day_start_equity * self.risk.max_daily_dd_pct / 100.0
+        return limit > 0 and -self.pnl_day >= limit
+
+    def size(self, cand: Candidate, out: OrderIntent) -> bool:
+        if self.halted:
+            self.rejects["daily_dd"] += 1
+            return False
+        if cand.rr < self.risk.target_rr:
+            self.rejects["rr"] += 1
+            return False
+        qty = self.equity * self.risk.max_trade_r_pct / 100.0 / abs(cand.entry - cand.stop)
+        if self.max_qty is not None and qty > self.max_qty:
+            qty = self.max_qty
+        if self.qty_step > 0:
+            qty = math.floor(qty / self.qty_step + 1e-6) * self.qty_step  # bruit flottant de entrée - stop
+        if qty <= 0:
+            self.rejects["size"] += 1
+            return False
+        out.side = cand.side
+        out.price, out.stop, out.target, out.rr = cand.entry, cand.stop, cand.target, cand.rr
+        out.qty = qty
+        return True
+
+
+# --------- Pipeline ---------
+
+class _SymbolCtx:
+    __slots__ = ("symbol", "book", "lmap", "last_intent_ts")
+
+    def __init__(self, symbol: str, book: OrderBook, lmap: LiquidityMap) -> None:
+        self.symbol = symbol
+        self.book = book
+        self.lmap = lmap
+        self.last_intent_ts = float("-inf")
+
+
+IntentCallback = Callable[[OrderIntent], None]
+
+STAGES = ("book", "signal", "place", "risk", "emit", "tick_to_decision")
+
+
+class FlowDecisionEngine:
+    """
+    Pipeline carnet -> signal -> placement -> risque -> OrderIntent, en
+    étages reliés par des files bornées à slots préalloués:
+
+      on_event(diff) -> [ticks]      -> book:   OrderBook + LiquidityMap (abonnée)
+                     -> [updates]    -> signal: déséquilibre top-k + cooldown
+                     -> [signals]    -> place:  SafePlaceFinder (mur support/résistance)
+                     -> [placements] -> risk:   RiskGate (RiskModel)
+                     -> [intents]    -> emit:   callbacks
+
+    Les étages sont vidés dans l'ordre par drain() sur le thread appelant
+    (boucle websocket): pas de verrou ni de réveil de thread entre étages.
+    Files pleines: les éléments les plus anciens sont abandonnés (`dropped`).
+    Chaque étage a son LatencyHistogram (temps de service), plus
+    tick_to_decision: de l'entrée du diff à l'émission de l'intention,
+    attente en file comprise.
+
+    Hors création d'un symbole, le pipeline lui-même n'alloue rien par tick
+    (slots, histogrammes et compteurs préalloués); les temporaires NumPy
+    du carnet et de la heatmap restent de taille bornée par le diff.
+
+    Exemple d'usage:
+      eng = FlowDecisionEngine(ConfigLoader().load_risk(), equity=10_000,
+                               map_factory=lambda sym: LiquidityMap(tick=0.1, bucket_ticks=5))
+      eng.subscribe(lambda it: trader.submit(it.as_dict()))
+      eng.load_snapshot("BTCUSDT", rest_json)
+      eng.on_event(ws_diff)                    # traite jusqu'à l'intention
+      eng.latency_report()["tick_to_decision"]["p99_us"]
+    """
+
+    def __init__(
+        self,
+        risk: RiskModel,
+        *,
+        equity: float,
+        map_factory: Callable[[str], LiquidityMap],
+        finder: Optional[SafePlaceFinder] = None,
+        futures: bool = False,
+        imbalance_depth: int = 10,
+        imbalance_threshold: float = 0.3,
+        cooldown_s: float = 1.0,
+        queue_size: int = 1024,
+        qty_step: float = 0.0,
+        auto_drain: bool = True,
+    ) -> None:
+        self.gate = RiskGate(risk, equity=equity, qty_step=qty_step)
+        self.finder = finder or SafePlaceFinder(target_rr=risk.target_rr)
+        self.map_factory = map_factory
+        self.futures = futures
+        self.imbalance_depth = imbalance_depth
+        self.imbalance_threshold = imbalance_threshold
+        self.cooldown_s = cooldown_s
+        self.auto_drain = auto_drain
+        self._ctx: Dict[str, _SymbolCtx] = {}
+        self._callbacks: List[IntentCallback] = []
+
+        self.q_ticks = _SlotQueue("ticks", queue_size, _Tick)
+        self.q_updates = _SlotQueue("updates", queue_size, _Tick)
+        self.q_signals = _SlotQueue("signals", queue_size, _Signal)
+        self.q_places = _SlotQueue("placements", queue_size, _Placement)
+        self.q_intents = _SlotQueue("intents", queue_size, OrderIntent)
+        self.hist: Dict[str, LatencyHistogram] = {s: LatencyHistogram(s) for s in STAGES}
+        self._stages = (
+            (self.q_ticks, self._stage_book, self.q_updates, self.hist["book"]),
+            (self.q_updates, self._stage_signal, self.q_signals, self.hist["signal"]),
+            (self.q_signals, self._stage_place, self.q_places, self.hist["place"]),
+            (self.q_places, self._stage_risk, self.q_intents, self.hist["risk"]),
+        )
+        self.intents = 0
+
+    def subscribe(self, cb: IntentCallback) -> None:
+        self._callbacks.append(cb)
+
+    def context(self, symbol: str) -> _SymbolCtx:
+        ctx = self._ctx.get(symbol)
+        if ctx is None:
+            book = OrderBook(symbol, futures=self.futures)
+            lmap = self.map_factory(symbol)
+            lmap.attach(book)
+            ctx = self._ctx[symbol] = _SymbolCtx(symbol, book, lmap)
+        return ctx
+
+    def book(self, symbol: str) -> OrderBook:
+        return self.context(symbol).book
+
+    def load_snapshot(self, symbol: str, snap: Mapping[str, Any]) -> bool:
+        return self.context(symbol).book.load_snapshot(snap)
+
+    # ---------- Chemin chaud ----------
+
+    def on_event(self, evt: Mapping[str, Any]) -> None:
+        data = evt.get("data", evt)
+        slot = self.q_ticks.claim()
+        slot.t_in = _ns()
+        slot.ctx = self.context(data["s"])
+        slot.evt = data
+        self.q_ticks.commit()
+        if self.auto_drain:
+            self.drain()
+
+    def drain(self) -> int:
+        """Vide les étages dans l'ordre; retourne le nombre d'intentions émises."""
+        before = self.intents
+        for q, stage, out, h in self._stages:
+            while q.size:
+                item = q.pop()
+                t0 = _ns()
+                stage(item, out)
+                h.record(_ns() - t0)
+        q, h, e2e = self.q_intents, self.hist["emit"], self.hist["tick_to_decision"]
+        while q.size:
+            it = q.pop()
+            t0 = _ns()
+            for cb in self._callbacks:
+                cb(it)
+            it.t_out = t1 = _ns()
+            h.record(t1 - t0)
+            e2e.record(t1 - it.t_in)
+            self.intents += 1
+        return self.intents - before
+
+    def _stage_book(self, t: _Tick, out: _SlotQueue) -> None:
+        evt, t.evt = t.evt, None
+        if not t.ctx.book.on_event(evt):  # LiquidityMap mise à jour par abonnement
+            return
+        u = out.claim()
+        u.ctx, u.t_in = t.ctx, t.t_in
+        out.commit()
+
+    def _stage_signal(self, u: _Tick, out: _SlotQueue) -> None:
+        ctx = u.ctx
+        book = ctx.book
+        imb = book.imbalance(self.imbalance_depth)
+        if imb is None or -self.imbalance_threshold < imb < self.imbalance_threshold:
+            return
+        now = book.event_time if book.event_time is not None else time.time()
+        if now - ctx.last_intent_ts < self.cooldown_s:
+            return
+        s = out.claim()
+        s.ctx, s.t_in, s.strength = ctx, u.t_in, imb
+        s.side = "buy" if imb > 0 else "sell"
+        out.commit()
+
+    def _stage_place(self, s: _Signal, out: _SlotQueue) -> None:
+        ctx = s.ctx
+        p = out.claim()
+        if not self.finder.find(ctx.book, ctx.lmap, s.side, p.cand):
+            return  # pas de placement sûr: slot non publié
+        p.ctx, p.t_in, p.strength = ctx, s.t_in, s.strength
+        out.commit()
+
+    def _stage_risk(self, p: _Placement, out: _SlotQueue) -> None:
+        it = out.claim()
+        if not self.gate.size(p.cand, it):
+            return
+        ctx = p.ctx
+        it.symbol, it.strength, it.t_in = ctx.symbol, p.strength, p.t_in
+        out.commit()
+        book = ctx.book
+        ctx.last_intent_ts = book.event_time if book.event_time is not None else time.time()
+
+    # ---------- Mesures ----------
+
+    def latency_report(self) -> Dict[str, Dict[str, float]]:
+        rep = {name: h.summary() for name, h in self.hist.items()}
+        for q in (self.q_ticks, self.q_updates, self.q_signals, self.q_places, self.q_intents):
+            rep[f"queue_{q.name}"] = {"dropped": q.dropped, "high_water": q.high_water}
+        rep["risk_rejects"] = dict(self.gate.rejects)
+        return rep
+
+    def reset_latency(self) -> None:
+        for h in self.hist.values():
+            h.reset()
+
+
+# --------- Rejeu ---------
+
+def iter_jsonl(path: str | Path) -> Iterator[Dict[str, Any]]:
+    """Messages enregistrés, un JSON par ligne: snapshots {"s", "lastUpdateId", ...} et diffs."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def replay(
+    engine: FlowDecisionEngine,
+    events: Iterable[Mapping[str, Any]],
+    *,
+    warmup: int = 0,
+    speed: Optional[float] = None,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Rejoue des données carnet enregistrées dans le pipeline et retourne le
+    rapport de latence. Les snapshots ({"s", "lastUpdateId", "bids", "asks"})
+    sont chargés hors mesure; les `warmup` premiers diffs ne sont pas comptés.
+    speed=None: au plus vite; sinon cadence d'origine (champ E) x speed.
+    """
+    n, t_first, e_first = 0, None, None
+    for evt in events:
+        data = evt.get("data", evt)
+        if "lastUpdateId" in data:
+            engine.load_snapshot(data["s"], data)
+            continue
+        if data.get("e", "depthUpdate") != "depthUpdate":
+            continue  # trades et autres flux enregistrés
+        if speed is not None and data.get("E") is not None:
+            if t_first is None:
+                t_first, e_first = time.perf_counter(), data["E"] / 1000.0
+            delay = (data["E"] / 1000.0 - e_first) / speed - (time.perf_counter() - t_first)
+            if delay > 0:
+                time.sleep(delay)
+        engine.on_event(data)
+        n += 1
+        if n == warmup:
+            engine.reset_latency()
+    if not engine.auto_drain:
+        engine.drain()
+    rep = engine.latency_report()
+    rep["replay"] = {"events": n, "intents": engine.intents}
+    return rep
@@ -0,0 +1,391 @@
+﻿from __future__ import annotations
+
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, List, NamedTuple, Optional
+
+import numpy as np
+
+_BID, _ASK = 0, 1
+_SIDES = ("bid", "ask")
+
+
+@dataclass(frozen=True)
+class LiquidityEvent:
+    """Mur apparu ("wall") ou liquidité retirée avant d'être touchée ("pull")."""
+    kind: str
+    side: str
+    price: float   # borne basse du bucket
+    size: float    # profondeur actuelle (wall) ou quantité retirée (pull)
+    peak: float
+    ts: float
+
+
+class HeatSlice(NamedTuple):
+    """Vues (sans copie) sur les n dernières lignes de la heatmap, ordre chronologique."""
+    ts: np.ndarray      # (n,) fin de chaque intervalle
+    prices: np.ndarray  # (cols,) borne basse de chaque bucket
+    z: np.ndarray       # (n, cols) intensité float32
+
+
+class _HeatRing:
+    """
+    Matrice temps x prix à nombre de lignes fixe, chaque ligne écrite deux
+    fois (i et i + rows) comme BarRing: les n dernières lignes forment une
+    tranche contiguë.
+    """
+
+    __slots__ = ("rows", "count", "z", "ts")
+
+    def __init__(self, rows: int, cols: int) -> None:
+        if rows < 1:
+            raise ValueError("rows must be >= 1")
+        self.rows = int(rows)
+        self.count = 0
+        self.z = np.zeros((2 * self.rows, cols), dtype=np.float32)
+        self.ts = np.zeros(2 * self.rows, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return min(self.count, self.rows)
+
+    @property
+    def nbytes(self) -> int:
+        return self.z.nbytes + self.ts.nbytes
+
+    def append(self, ts: float, row: np.ndarray) -> None:
+        i = self.count % self.rows
+        self.z[i] = row
+        self.z[i + self.rows] = self.z[i]
+        self.ts[i] = self.ts[i + self.rows] = ts
+        self.count += 1
+
+    def last(self, n: Optional[int] = None):
+        size = len(self)
+        n = size if n is None else max(0, min(int(n), size))
+        end = (self.count - 1) % self.rows + self.rows + 1 if self.count else 0
+        return self.ts[end - n:end], self.z[end - n:end]
+
+    def shift(self, k: int) -> None:
+        """Décale toutes les lignes de k buckets (k > 0: la grille monte)."""
+        if k > 0:
+            self.z[:, :-k] = self.z[:, k:]
+            self.z[:, -k:] = 0
+        elif k < 0:
+            self.z[:, -k:] = self.z[:, :k]
+            self.z[:, :-k] = 0
+
+
+EventCallback = Callable[[LiquidityEvent], None]
+
+
+class LiquidityMap:
+    """
+    Heatmap de liquidité au repos, mise à jour à partir des diffs du
+    carnet (OrderBook.subscribe) sans jamais rebalayer le carnet par tick.
+
+    Grille: `n_buckets` buckets de `bucket_ticks` ticks, centrée sur le mid
+    au premier snapshot et recentrée (décalage de l'historique) quand le mid
+    approche d'un bord. Pour chaque bucket on tient:
+      - la profondeur courante bid/ask, mise à jour par delta (nouvelle qty
+        - ancienne qty du niveau, tableau par tick);
+      - une intensité décroissante: moyenne exponentielle continue de la
+        profondeur (demi-vie `half_life` s), mise à jour paresseusement sur
+        les seuls buckets touchés et matérialisée à chaque fin d'intervalle.
+    Toutes les `interval` secondes une ligne d'intensité (float32) est
+    ajoutée dans un anneau de `rows` lignes: mémoire fixe.
+
+    Détection (buckets touchés uniquement):
+      - wall: profondeur >= max(wall_min, wall_mult x profondeur moyenne des
+              buckets non vides), moyenne recalculée à chaque intervalle;
+      - pull: un mur perd au moins `pull_frac` de son pic moins de
+              `pull_window` s après avoir été vu debout, sans être au meilleur
+              prix de son côté (retrait plutôt qu'exécution).
+
+    Exemple d'usage:
+      lmap = LiquidityMap(tick=0.1, bucket_ticks=5, n_buckets=400, rows=900, interval=1.0)
+      lmap.attach(dom.book("BTCUSDT"))           # alimenté par chaque diff appliqué
+      lmap.subscribe(lambda e: print(e.kind, e.side, e.price, e.size))
+      h = lmap.window(29_800, 30_200, n=300)     # h.z (300, cols) vue, h.prices, h.ts
+      st.plotly_chart(go.Figure(go.Heatmap(z=h.z.T, x=h.ts, y=h.prices)))
+    """
+
+    def __init__(
+        self,
+        *,
+        tick: float,
+        bucket_ticks: int = 1,
+        n_buckets: int = 512,
+        rows: int = 600,
+        interval: float = 1.0,
+        half_life: float = 30.0,
+        wall_mult: float = 4.0,
+        wall_min: float = 0.0,
+        pull_frac: float = 0.7,
+        pull_window: float = 5.0,
+        recenter_margin: float = 0.1,
+        max_events: int = 1000,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if tick <= 0 or bucket_ticks < 1 or n_buckets < 8 or interval <= 0 or half_life <= 0:
+            raise ValueError("invalid liquidity map geometry")
+        self.tick = float(tick)
+        self.bucket_ticks = int(bucket_ticks)
+        self.n_buckets = int(n_buckets)
+        self.interval = float(interval)
+        self.tau = half_life / math.log(2)
+        self.wall_mult = wall_mult
+        self.wall_min = wall_min
+        self.pull_frac = pull_frac
+        self.pull_window = pull_window
+        self.recenter_margin = recenter_margin
+        self._clock = clock
+
+        n_ticks = self.n_buckets * self.bucket_ticks
+        self._lvl = np.zeros((2, n_ticks), dtype=np.float64)        # qty par tick, par côté
+        self._depth = np.zeros((2, self.n_buckets), dtype=np.float64)
+        self._acc = np.zeros(self.n_buckets, dtype=np.float64)      # intensité au temps _last
+        self._last = np.zeros(self.n_buckets, dtype=np.float64)
+        self._peak = np.zeros((2, self.n_buckets), dtype=np.float64)
+        self._peak_t = np.zeros((2, self.n_buckets), dtype=np.float64)
+        self._wall = np.zeros((2, self.n_buckets), dtype=bool)
+        self._row = np.empty(self.n_buckets, dtype=np.float32)
+        self.ring = _HeatRing(rows, self.n_buckets)
+
+        self.base_tick: Optional[int] = None   # tick absolu du bucket 0
+        self.wall_threshold = math.inf
+        self._row_end: Optional[float] = None
+        self._ts = -math.inf
+        self._snapshots = -1
+        self.recenters = 0
+        self.events: Deque[LiquidityEvent] = deque(maxlen=max_events)
+        self._callbacks: List[EventCallback] = []
+
+    # ---------- Alimentation ----------
+
+    def attach(self, book: Any) -> None:
+        # l'état est chargé au premier diff reçu (horloge des événements)
+        book.subscribe(self.on_depth)
+
+    def subscribe(self, cb: EventCallback) -> None:
+        self._callbacks.append(cb)
+
+    def on_depth(self, book: Any, bp: np.ndarray, bq: np.ndarray, ap: np.ndarray, aq: np.ndarray) -> None:
+        """Listener OrderBook: applique le diff (ou reconstruit après un nouveau snapshot)."""
+        ts = book.event_time if book.event_time is not None else self._clock()
+        if book.snapshots != self._snapshots:
+            self.seed(book, ts)
+            return
+        bb, ba = book.best_bid(), book.best_ask()
+        if bb is not None and ba is not None and self._off_center((bb[0] + ba[0]) / 2):
+            self.seed(book, ts)
+            return
+        self.update(ts, bp, bq, ap, aq, bb[0] if bb else None, ba[0] if ba else None)
+
+    def seed(self, book: Any, ts: Optional[float] = None) -> None:
+        """(Re)charge l'état courant depuis le carnet entier: snapshot, resync ou recentrage."""
+        ts = self._now(self._clock() if ts is None else ts)
+        self._snapshots = book.snapshots
+        bb, ba = book.best_bid(), book.best_ask()
+        ref = bb or ba
+        if ref is None:
+            return
+        mid = (bb[0] + ba[0]) / 2 if bb and ba else ref[0]
+        self._roll(ts)
+        self._accrue_all(ts)
+        target = int(round(mid / self.tick)) - self._lvl.shape[1] // 2
+        target -= target % self.bucket_ticks
+        if self.base_tick is not None and target != self.base_tick:
+            k = (target - self.base_tick) // self.bucket_ticks
+            self._shift(k)
+            self.recenters += 1
+        self.base_tick = target
+
+        self._lvl[:] = 0
+        self._depth[:] = 0
+        for s, side in ((_BID, book.bids), (_ASK, book.asks)):
+            ti, q = self._ticks(side.px[:side.n], side.qty[:side.n])
+            self._lvl[s, ti] = q
+            self._depth[s] = np.bincount(ti // self.bucket_ticks, weights=q, minlength=self.n_buckets)
+        self._peak[:] = self._depth
+        self._peak_t[:] = ts
+        self._wall[:] = False
+        self._refresh_threshold()
+        self._wall[:] = self._depth >= self.wall_threshold
+        if self._row_end is None:
+            self._row_end = (math.floor(ts / self.interval) + 1) * self.interval
+
+    def update(self, ts: float, bp: np.ndarray, bq: np.ndarray, ap: np.ndarray, aq: np.ndarray,
+               best_bid: Optional[float] = None, best_ask: Optional[float] = None) -> None:
+        """Applique un diff (niveaux modifiés seulement, qty=0 -> retiré)."""
+        if self.base_tick is None:
+            return
+        ts = self._now(ts)
+        self._roll(ts)
+        if len(bp):
+            self._apply_side(_BID, ts, bp, bq, best_bid)
+        if len(ap):
+            self._apply_side(_ASK, ts, ap, aq, best_ask)
+
+    def _now(self, ts: float) -> float:
+        # horloge monotone: un horodatage en retard est ramené au dernier vu
+        if ts > self._ts:
+            self._ts = ts
+        return self._ts
+
+    def _ticks(self, px: np.ndarray, qty: np.ndarray):
+        ti = np.rint(px / self.tick).astype(np.int64) - self.base_tick
+        ok = (ti >= 0) & (ti < self._lvl.shape[1])
+        return ti[ok], qty[ok]
+
+    def _off_center(self, mid: float) -> bool:
+        if self.base_tick is None:
+            return False
+        pos = (mid / self.tick - self.base_tick) / self._lvl.shape[1]
+        return not self.recenter_margin <= pos <= 1 - self.recenter_margin
+
+    def _apply_side(self, s: int, ts: float, px: np.ndarray, qty: np.ndarray, best: Optional[float]) -> None:
+        ti, q = self._ticks(px, qty)
+        if not len(ti):
+            return
+        lvl = self._lvl[s]
+        delta = q - lvl[ti]
+        lvl[ti] = q
+        b = ti // self.bucket_ticks
+        self._accrue(b, ts)
+        np.add.at(self._depth[s], b, delta)
+        self._detect(s, b, ts, best)
+
+    # ---------- Intensité ----------
+
+    def _accrue(self, b: np.ndarray, ts: float) -> None:
+        # intégrale exacte d'une profondeur constante depuis _last (doublons sans effet: dt = 0)
+        w = np.exp((self._last[b] - ts) / self.tau)
+        d = self._depth[_BID, b] + self._depth[_ASK, b]
+        self._acc[b] = self._acc[b] * w + d * (1.0 - w)
+        self._last[b] = ts
+
+    def _accrue_all(self, ts: float) -> None:
+        w = np.exp((self._last - ts) / self.tau)
+        self._acc *= w
+        self._acc += (self._depth[_BID] + self._depth[_ASK]) * (1.0 - w)
+        self._last[:] = ts
+
+    def _roll(self, ts: float) -> None:
+        """Ferme les intervalles écoulés: une ligne par intervalle (au plus `rows`)."""
+        end = self._row_end
+        if end is None or ts < end:
+            return
+        n = int((ts - end) // self.interval) + 1
+        skip = max(0, n - self.ring.rows)
+        end += skip * self.interval
+        for _ in range(n - skip):
+            self._accrue_all(end)
+            self._row[:] = self._acc
+            self.ring.append(end, self._row)
+            end += self.interval
+        self._row_end = end
+        self._refresh_threshold()
+
+    def _refresh_threshold(self) -> None:
+        tot = self._depth[_BID] + self._depth[_ASK]
+        nz = tot[tot > 0]
+        mean = float(nz.mean()) if len(nz) else 0.0
+        self.wall_threshold = max(self.wall_min, self.wall_mult * mean) if mean > 0 else math.inf
+
+    def _shift(self, k: int) -> None:
+        self.ring.shift(k)
+        for a in (self._acc, self._last):
+            if k > 0:
+                a[:-k] = a[k:]
+                a[-k:] = 0
+            elif k < 0:
+                a[-k:] = a[:k]
+                a[:-k] = 0
+
+    # ---------- Murs / retraits ----------
+
+    def _detect(self, s: int, b: np.ndarray, ts: float, best: Optional[float]) -> None:
+        cur = self._depth[s, b]
+        peak, peak_t, wall = self._peak[s], self._peak_t[s], self._wall[s]
+        standing = cur >= self.wall_threshold
+        up = cur > peak[b]
+        peak[b[up]] = cur[up]
+        peak_t[b[standing]] = ts
+
+        new = standing & ~wall[b]
+        was = wall[b] & ~standing
+        if not new.any() and not was.any():
+            return
+        # b peut contenir des doublons (plusieurs ticks d'un même bucket): un événement par bucket
+        peak[b[new]] = cur[new]
+        for j in np.unique(b[new]):
+            self._emit("wall", s, int(j), float(self._depth[s, j]), float(peak[j]), ts)
+        wall[b[new]] = True
+
+        if was.any():
+            if best is not None:
+                bb = self.bucket_of(best)
+                away = b < bb if s == _BID else b > bb
+            else:
+                away = np.ones(len(b), dtype=bool)
+            pulled = (was & away & (cur <= (1.0 - self.pull_frac) * peak[b])
+                      & (ts - peak_t[b] <= self.pull_window))
+            for j in np.unique(b[pulled]):
+                self._emit("pull", s, int(j), float(peak[j] - self._depth[s, j]), float(peak[j]), ts)
+            gone = b[was]
+            wall[gone] = False
+            peak[gone] = self._depth[s, gone]
+
+    def _emit(self, kind: str, s: int, bucket: int, size: float, peak: float, ts: float) -> None:
+        evt = LiquidityEvent(kind, _SIDES[s], self.bucket_price(bucket), size, peak, ts)
+        self.events.append(evt)
+        for cb in self._callbacks:
+            cb(evt)
+
+    # ---------- Export ----------
+
+    def bucket_of(self, price: float) -> int:
+        """Index du bucket contenant `price` (peut sortir de [0, n_buckets))."""
+        return (int(round(price / self.tick)) - self.base_tick) // self.bucket_ticks
+
+    def bucket_price(self, bucket: int) -> float:
+        return (self.base_tick + bucket * self.bucket_ticks) * self.tick
+
+    @property
+    def prices(self) -> np.ndarray:
+        return (self.base_tick + np.arange(self.n_buckets) * self.bucket_ticks) * self.tick
+
+    def last(self, n: Optional[int] = None) -> HeatSlice:
+        """Les n dernières lignes clôturées (toutes si n=None): vues sur l'anneau."""
+        ts, z = self.ring.last(n)
+        return HeatSlice(ts, self.prices, z)
+
+    def window(self, price_lo: float, price_hi: float, n: Optional[int] = None) -> HeatSlice:
+        """Comme last(), restreint aux buckets couvrant [price_lo, price_hi] (vue, pas de copie)."""
+        ts, z = self.ring.last(n)
+        lo = max(0, (int(math.floor(price_lo / self.tick)) - self.base_tick) // self.bucket_ticks)
+        hi = min(self.n_buckets, (int(math.floor(price_hi / self.tick)) - self.base_tick) // self.bucket_ticks + 1)
+        hi = max(hi, lo)
+        return HeatSlice(ts, self.prices[lo:hi], z[:, lo:hi])
+
+    def depth(self, side: str) -> np.ndarray:
+        """Profondeur courante par bucket (vue)."""
+        return self._depth[_SIDES.index(side)]
+
+    def intensity(self, ts: Optional[float] = None) -> np.ndarray:
+        """Intensité de chaque bucket à l'instant ts (copie, hors anneau)."""
+        ts = self._clock() if ts is None else ts
+        w = np.exp((self._last - ts) / self.tau)
+        return self._acc * w + (self._depth[_BID] + self._depth[_ASK]) * (1.0 - w)
+
+    def walls(self, side: Optional[str] = None) -> List[float]:
+        """Prix (borne basse) des buckets actuellement classés murs."""
+        sides = (_SIDES.index(side),) if side else (_BID, _ASK)
+        return sorted(self.bucket_price(int(j)) for s in sides for j in np.flatnonzero(self._wall[s]))
+
+    @property
+    def memory_bytes(self) -> int:
+        return (self.ring.nbytes + self._lvl.nbytes + self._depth.nbytes + self._acc.nbytes
+                + self._last.nbytes + self._peak.nbytes + self._peak_t.nbytes + self._wall.nbytes)
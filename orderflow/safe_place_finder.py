@@ -0,0 +1,116 @@
+﻿from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+from orderflow.liquidity_map import LiquidityMap
+
+
+class Candidate:
+    """
+    Placement proposé. Slot réutilisé d'un tick à l'autre (pas d'allocation
+    sur le chemin chaud): passer par as_dict() pour le conserver.
+    """
+
+    __slots__ = ("side", "entry", "stop", "target", "rr", "wall_price", "wall_size")
+
+    def __init__(self) -> None:
+        self.side = ""
+        self.entry = self.stop = self.target = self.rr = 0.0
+        self.wall_price = self.wall_size = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class SafePlaceFinder:
+    """
+    Cherche où poser un ordre limite à l'abri d'un mur de liquidité:
+      - achat: le bucket bid le plus chargé parmi les `max_buckets` sous le
+        meilleur bid (support) doit dépasser le seuil de mur; entrée juste
+        devant le mur (`entry_ticks` au-dessus, sans dépasser le meilleur bid),
+        stop `stop_ticks` sous le mur;
+      - vente: symétrique côté ask (résistance, stop au-dessus).
+    L'objectif vaut target_rr x risque, ramené devant le mur opposé s'il y en
+    a un plus près; `rr` est le ratio réellement atteignable, à filtrer par
+    le contrôle de risque.
+
+    Les profondeurs viennent de LiquidityMap.depth() (vues): la recherche est
+    un argmax sur une tranche, sans copie.
+
+    Exemple d'usage:
+      finder = SafePlaceFinder(max_buckets=20, stop_ticks=2, target_rr=2.0)
+      cand = Candidate()
+      if finder.find(book, lmap, "buy", cand):
+          print(cand.entry, cand.stop, cand.target, cand.rr)
+    """
+
+    def __init__(
+        self,
+        *,
+        max_buckets: int = 20,
+        min_wall: Optional[float] = None,
+        entry_ticks: int = 1,
+        stop_ticks: int = 2,
+        target_rr: float = 2.0,
+    ) -> None:
+        if max_buckets < 1 or target_rr <= 0:
+            raise ValueError("invalid safe place finder parameters")
+        self.max_buckets = max_buckets
+        self.min_wall = min_wall
+        self.entry_ticks = entry_ticks
+        self.stop_ticks = stop_ticks
+        self.target_rr = target_rr
+
+    def _wall(self, lmap: LiquidityMap, side: str, lo: int, hi: int, thr: float) -> int:
+        """Bucket le plus chargé de [lo, hi) s'il dépasse thr, sinon -1."""
+        lo, hi = max(0, lo), min(lmap.n_buckets, hi)
+        if hi <= lo:
+            return -1
+        window = lmap.depth(side)[lo:hi]
+        k = int(window.argmax())
+        return lo + k if window[k] >= thr else -1
+
+    def find(self, book: Any, lmap: LiquidityMap, side: str, out: Candidate) -> bool:
+        """Remplit `out` et retourne True si un placement existe pour side ('buy' | 'sell')."""
+        bb, ba = book.best_bid(), book.best_ask()
+        if bb is None or ba is None or lmap.base_tick is None:
+            return False
+        thr = lmap.wall_threshold if self.min_wall is None else self.min_wall
+        tick, n = lmap.tick, self.max_buckets
+        jb, ja = lmap.bucket_of(bb[0]), lmap.bucket_of(ba[0])
+
+        if side == "buy":
+            j = self._wall(lmap, "bid", jb - n + 1, jb + 1, thr)
+            if j < 0:
+                return False
+            top = lmap.bucket_price(j + 1) - tick
+            entry = min(top + self.entry_ticks * tick, bb[0])
+            stop = lmap.bucket_price(j) - self.stop_ticks * tick
+            risk = entry - stop
+            target = entry + self.target_rr * risk
+            r = self._wall(lmap, "ask", ja, ja + n, thr)
+            if r >= 0:
+                target = min(target, lmap.bucket_price(r) - tick)
+            reward = target - entry
+        elif side == "sell":
+            j = self._wall(lmap, "ask", ja, ja + n, thr)
+            if j < 0:
+                return False
+            entry = max(lmap.bucket_price(j) - self.entry_ticks * tick, ba[0])
+            stop = lmap.bucket_price(j + 1) - tick + self.stop_ticks * tick
+            risk = stop - entry
+            target = entry - self.target_rr * risk
+            s = self._wall(lmap, "bid", jb - n + 1, jb + 1, thr)
+            if s >= 0:
+                target = max(target, lmap.bucket_price(s + 1))
+            reward = entry - target
+        else:
+            raise ValueError(f"unknown side: {side}")
+        if risk <= 0:
+            return False
+        out.side = side
+        out.entry, out.stop, out.target = entry, stop, target
+        out.rr = reward / risk
+        out.wall_price = lmap.bucket_price(j)
+        out.wall_size = float(lmap.depth("bid" if side == "buy" else "ask")[j])
+        return True
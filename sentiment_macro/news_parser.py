@@ -0,0 +1,652 @@
+﻿from __future__ import annotations
+
+import abc
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+import unicodedata
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Deque, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from modules_utils.rate_limiter import MultiWindowRateLimiter, QuotaExceeded
+from sniper_engine.api_handler import ApiResponse
+
+log = logging.getLogger("sniper")
+
+
+# ---------- Articles ----------
+
+@dataclass
+class Article:
+    """Article normalisé, quelle que soit la source (kind="macro" pour une publication FRED)."""
+    provider: str
+    source: str
+    title: str
+    summary: str
+    url: str
+    published: float
+    kind: str = "news"
+    canonical: str = ""
+    fetched: float = 0.0
+    id: int = -1
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+    def text(self) -> str:
+        return f"{strip_source_suffix(self.title)} {self.summary}"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _ts(value: Any) -> float:
+    """ISO 8601 ("...Z" compris) ou "YYYY-MM-DD HH:MM:SS" (UTC) -> epoch; 0.0 si illisible."""
+    if not value:
+        return 0.0
+    try:
+        dt = datetime.fromisoformat(str(value).strip().replace(" ", "T", 1))
+    except ValueError:
+        return 0.0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+# ---------- Normalisation (URL, texte) ----------
+
+_TRACKING = {
+    "fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "ocid", "cmpid", "ref", "ref_src", "src", "smid",
+    "smtyp", "guccounter", "guce_referrer", "guce_referrer_sig", "taid", "mod", "rss", "feed", "ito", "yptr",
+    "__twitter_impression", "at_medium", "at_campaign", "cid", "partner", "traffic_source",
+}
+_HOST_PREFIXES = ("www.", "m.", "amp.", "mobile.")
+_AMP_PATH = re.compile(r"(/amp/?|\.amp|/amp\.html)$")
+
+
+def canonical_url(url: str) -> str:
+    """
+    Forme canonique d'une URL d'article: https, hôte sans www./m./amp.,
+    chemin sans suffixe AMP ni "/" final, paramètres de suivi (utm_*,
+    fbclid, ...) retirés, les autres triés, sans fragment.
+    """
+    p = urllib.parse.urlsplit(url.strip())
+    scheme = p.scheme.lower()
+    if scheme not in ("http", "https"):
+        return url.strip()
+    host = (p.hostname or "").lower()
+    for pre in _HOST_PREFIXES:
+        if host.startswith(pre):
+            host = host[len(pre):]
+            break
+    if p.port and p.port not in (80, 443):
+        host = f"{host}:{p.port}"
+    path = re.sub(r"/{2,}", "/", p.path or "/")
+    path = _AMP_PATH.sub("", path).rstrip("/") or "/"
+    query = sorted((k, v) for k, v in urllib.parse.parse_qsl(p.query)
+                   if not k.lower().startswith("utm_") and k.lower() not in _TRACKING)
+    return urllib.parse.urlunsplit(("https", host, path, urllib.parse.urlencode(query), ""))
+
+
+_SOURCE_SUFFIX = re.compile(r"\s+[-|–—]\s+[^-|–—]{2,60}$")
+_TRUNCATED = re.compile(r"\s*(\[\+\d+ chars\]|\[\.\.\.\]|\.\.\.|…)\s*$")
+_NON_WORD = re.compile(r"[^\w\s]+")
+
+
+def strip_source_suffix(title: str) -> str:
+    """"Fed holds rates - Reuters" -> "Fed holds rates" (suffixe éditeur ajouté par les agrégateurs)."""
+    return _SOURCE_SUFFIX.sub("", title or "")
+
+
+def tokens(text: str) -> List[str]:
+    """Minuscules, sans accents ni ponctuation, marqueurs de troncature retirés."""
+    text = _TRUNCATED.sub("", text or "")
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return _NON_WORD.sub(" ", text).split()
+
+
+# ---------- Déduplication ----------
+
+_M1 = np.uint64(0x9E3779B97F4A7C15)
+_M2 = np.uint64(0xC2B2AE3D27D4EB4F)
+_SHIFTS = np.arange(64, dtype=np.uint64)
+
+
+def _hashes(words: Sequence[str]) -> np.ndarray:
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(w.encode("utf-8"), digest_size=8).digest(), "little") for w in words),
+        dtype=np.uint64, count=len(words))
+
+
+def simhash(h: np.ndarray) -> int:
+    """SimHash 64 bits d'une suite de hachages de mots."""
+    if not len(h):
+        return 0
+    ones = ((h[:, None] >> _SHIFTS) & np.uint64(1)).sum(axis=0)
+    return int.from_bytes(np.packbits(ones * 2 > len(h), bitorder="little").tobytes(), "little")
+
+
+class DupHit(NamedTuple):
+    reason: str        # url | text | simhash | minhash
+    original: int      # id de l'article déjà vu
+    similarity: float  # 1.0 (exact), 1 - bits/64 (simhash) ou Jaccard estimé (minhash)
+
+
+class NewsDeduper:
+    """
+    Déduplication exacte et approchée sur une fenêtre des `window`
+    derniers articles, toutes sources confondues:
+
+      - exacte: URL canonique, puis empreinte du texte normalisé
+        (kind="macro": URL canonique seule, soit (série, date));
+      - SimHash (64 bits en max_bits + 1 bandes: au moins une bande
+        identique à <= max_bits bits d'écart): quasi-copies (même texte,
+        titre ou fin de résumé différents);
+      - MinHash (n_perm permutations sur des bigrammes de mots, LSH en
+        `bands` bandes): reprises réécrites, Jaccard estimé >= jaccard.
+
+    Coût par article: hachage des mots + quelques recherches de dict et
+    comparaisons de signatures avec les candidats des mêmes bandes.
+
+    Exemple d'usage:
+      dd = NewsDeduper(window=20000, jaccard=0.5)
+      hit = dd.add(article)        # None: nouveau (indexé, article.id posé)
+      if hit: log.debug(f"dup of {hit.original} ({hit.reason})")
+    """
+
+    def __init__(self, window: int = 20000, *, jaccard: float = 0.5, max_bits: int = 7, n_perm: int = 64,
+                 bands: int = 32, shingle: int = 2, seed: int = 1) -> None:
+        if n_perm % bands:
+            raise ValueError("n_perm must be a multiple of bands")
+        if not 0 <= max_bits <= 15:
+            raise ValueError("max_bits must be in [0, 15]")
+        if not 1 <= shingle <= 3:
+            raise ValueError("shingle must be in [1, 3]")
+        self.window = window
+        self.jaccard = jaccard
+        self.max_bits = max_bits
+        self.bands = bands
+        self.shingle = shingle
+        self._sim_bits = 64 // (max_bits + 1)
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 63, n_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, n_perm, dtype=np.uint64)
+        self._next = 0
+        self._order: Deque[int] = deque()
+        self._items: Dict[int, Tuple[str, bytes, int, np.ndarray]] = {}
+        self._urls: Dict[str, int] = {}
+        self._texts: Dict[bytes, int] = {}
+        self._sim: Dict[Tuple[int, int], List[int]] = {}
+        self._lsh: Dict[Tuple[int, bytes], List[int]] = {}
+        self.stats = {"new": 0, "url": 0, "text": 0, "simhash": 0, "minhash": 0}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def minhash(self, h: np.ndarray) -> np.ndarray:
+        k = self.shingle
+        if len(h) >= k:
+            sh = h[:len(h) - k + 1].copy()
+            for j, m in enumerate((_M1, _M2)[:k - 1], start=1):
+                sh = sh * m ^ h[j:len(h) - k + 1 + j]
+        else:
+            sh = h
+        sh = np.unique(sh)
+        return ((self._a[:, None] * sh[None, :] + self._b[:, None]) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+    def _sim_keys(self, sig: int) -> List[Tuple[int, int]]:
+        w = self._sim_bits
+        mask = (1 << w) - 1
+        return [(b, (sig >> (w * b)) & mask) for b in range(self.max_bits + 1)]
+
+    def _lsh_keys(self, mh: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(b, row.tobytes()) for b, row in enumerate(mh.reshape(self.bands, -1))]
+
+    def add(self, article: Article) -> Optional[DupHit]:
+        url = article.canonical or canonical_url(article.url)
+        article.canonical = url
+        hit = self._urls.get(url)
+        if hit is not None:
+            self.stats["url"] += 1
+            return DupHit("url", hit, 1.0)
+        if article.kind == "macro":
+            # publication FRED: l'URL canonique porte (série, date); une valeur inchangée
+            # d'un mois sur l'autre n'est pas une reprise -> ni empreinte de texte ni SimHash/MinHash
+            self._insert(article, url, b"", -1, np.zeros(len(self._a), dtype=np.uint32), index=False)
+            self.stats["new"] += 1
+            return None
+        words = tokens(article.text())
+        digest = hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=16).digest()
+        hit = self._texts.get(digest) if words else None
+        if hit is not None:
+            self.stats["text"] += 1
+            return DupHit("text", hit, 1.0)
+        h = _hashes(words)
+        sig = simhash(h)
+        mh = self.minhash(h) if len(h) else np.zeros(len(self._a), dtype=np.uint32)
+        if len(words) >= self.shingle:
+            seen: set = set()
+            for key in self._sim_keys(sig):
+                for i in self._sim.get(key, ()):
+                    if i in seen:
+                        continue
+                    seen.add(i)
+                    bits = (sig ^ self._items[i][2]).bit_count()
+                    if bits <= self.max_bits:
+                        self.stats["simhash"] += 1
+                        return DupHit("simhash", i, 1.0 - bits / 64)
+            best, best_j = -1, 0.0
+            seen = set()
+            for key in self._lsh_keys(mh):
+                for i in self._lsh.get(key, ()):
+                    if i in seen:
+                        continue
+                    seen.add(i)
+                    j = float(np.mean(mh == self._items[i][3]))
+                    if j > best_j:
+                        best, best_j = i, j
+            if best >= 0 and best_j >= self.jaccard:
+                self.stats["minhash"] += 1
+                return DupHit("minhash", best, best_j)
+        self._insert(article, url, digest if words else b"", sig, mh, index=len(words) >= self.shingle)
+        self.stats["new"] += 1
+        return None
+
+    def _insert(self, article: Article, url: str, digest: bytes, sig: int, mh: np.ndarray, index: bool) -> None:
+        i = article.id = self._next
+        self._next += 1
+        self._items[i] = (url, digest, sig if index else -1, mh)
+        self._order.append(i)
+        self._urls[url] = i
+        if digest:
+            self._texts[digest] = i
+        if index:
+            for key in self._sim_keys(sig):
+                self._sim.setdefault(key, []).append(i)
+            for key in self._lsh_keys(mh):
+                self._lsh.setdefault(key, []).append(i)
+        while len(self._order) > self.window:
+            self._evict(self._order.popleft())
+
+    def _evict(self, i: int) -> None:
+        url, digest, sig, mh = self._items.pop(i)
+        if self._urls.get(url) == i:
+            del self._urls[url]
+        if digest and self._texts.get(digest) == i:
+            del self._texts[digest]
+        if sig < 0:
+            return
+        for index, keys in ((self._sim, self._sim_keys(sig)), (self._lsh, self._lsh_keys(mh))):
+            for key in keys:
+                ids = index.get(key)
+                if ids is not None:
+                    ids.remove(i)
+                    if not ids:
+                        del index[key]
+
+
+# ---------- Sources ----------
+
+@dataclass
+class Request:
+    url: str
+    params: Dict[str, Any]
+    headers: Dict[str, str] = field(default_factory=dict)
+    tag: str = ""
+
+
+class NewsSource(abc.ABC):
+    """
+    Source pollée: requests(since) -> requêtes HTTP d'un cycle (une par
+    appel de quota), parse(payload, req) -> articles. `key` est aussi la
+    clé du quota dans api_limits.yml; la clé d'API vient du paramètre ou
+    de la variable d'environnement `env`.
+    """
+
+    key = ""
+    env = ""
+    base_url = ""
+
+    def __init__(self, api_key: Optional[str] = None, *, base_url: Optional[str] = None, query: str = "",
+                 language: str = "en") -> None:
+        self.api_key = api_key if api_key is not None else os.environ.get(self.env)
+        self.base_url = (base_url or self.base_url).rstrip("/")
+        self.query = query
+        self.language = language
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.api_key)
+
+    @abc.abstractmethod
+    def requests(self, since: Optional[float]) -> List[Request]:
+        ...
+
+    @abc.abstractmethod
+    def parse(self, payload: Any, req: Request) -> List[Article]:
+        ...
+
+
+class NewsAPISource(NewsSource):
+    key, env, base_url = "newsapi", "NEWSAPI_KEY", "https://newsapi.org/v2"
+
+    def requests(self, since):
+        params = {"q": self.query, "language": self.language, "sortBy": "publishedAt", "pageSize": 100}
+        if since:
+            params["from"] = _iso(since)
+        return [Request(f"{self.base_url}/everything", params, {"X-Api-Key": self.api_key or ""})]
+
+    def parse(self, payload, req):
+        out = []
+        for a in (payload or {}).get("articles") or []:
+            if not a.get("url") or not a.get("title"):
+                continue
+            out.append(Article(self.key, (a.get("source") or {}).get("name") or "", a["title"],
+                               a.get("description") or a.get("content") or "", a["url"], _ts(a.get("publishedAt"))))
+        return out
+
+
+class GNewsSource(NewsSource):
+    key, env, base_url = "gnews", "GNEWS_API_KEY", "https://gnews.io/api/v4"
+
+    def requests(self, since):
+        params = {"q": self.query, "lang": self.language, "sortby": "publishedAt", "max": 100,
+                  "apikey": self.api_key or ""}
+        if since:
+            params["from"] = _iso(since)
+        return [Request(f"{self.base_url}/search", params)]
+
+    def parse(self, payload, req):
+        out = []
+        for a in (payload or {}).get("articles") or []:
+            if not a.get("url") or not a.get("title"):
+                continue
+            out.append(Article(self.key, (a.get("source") or {}).get("name") or "", a["title"],
+                               a.get("description") or a.get("content") or "", a["url"], _ts(a.get("publishedAt"))))
+        return out
+
+
+class NewsDataSource(NewsSource):
+    key, env, base_url = "newsdata", "NEWSDATA_API_KEY", "https://newsdata.io/api/1"
+
+    def requests(self, since):
+        # /latest: dernières 48 h, pas de filtre de date côté API (le dédoublonnage s'en charge)
+        return [Request(f"{self.base_url}/latest", {"q": self.query, "language": self.language,
+                                                    "apikey": self.api_key or ""})]
+
+    def parse(self, payload, req):
+        out = []
+        for a in (payload or {}).get("results") or []:
+            if not a.get("link") or not a.get("title"):
+                continue
+            out.append(Article(self.key, a.get("source_name") or a.get("source_id") or "", a["title"],
+                               a.get("description") or "", a["link"], _ts(a.get("pubDate"))))
+        return out
+
+
+class FredSource(NewsSource):
+    """Dernière observation de chaque série FRED: une "publication" macro par nouvelle date."""
+
+    key, env, base_url = "fred", "FRED_API_KEY", "https://api.stlouisfed.org/fred"
+
+    def __init__(self, api_key: Optional[str] = None, *, series: Sequence[str] = (), **kw: Any) -> None:
+        super().__init__(api_key, **kw)
+        self.series = list(series)
+
+    def requests(self, since):
+        return [Request(f"{self.base_url}/series/observations",
+                        {"series_id": s, "api_key": self.api_key or "", "file_type": "json",
+                         "sort_order": "desc", "limit": 1}, tag=s) for s in self.series]
+
+    def parse(self, payload, req):
+        out = []
+        for o in (payload or {}).get("observations") or []:
+            date, value = o.get("date"), o.get("value")
+            if not date or value in (None, "."):
+                continue
+            out.append(Article(self.key, "FRED", f"{req.tag} {date}: {value}", f"{req.tag} = {value} ({date})",
+                               f"https://fred.stlouisfed.org/series/{req.tag}?date={date}", _ts(date), kind="macro",
+                               meta={"series": req.tag, "date": date, "value": float(value)}))
+        return out
+
+
+SOURCES = {cls.key: cls for cls in (NewsAPISource, GNewsSource, NewsDataSource, FredSource)}
+
+
+def pace_s(node: Mapping[str, Any], cost: float = 1.0) -> float:
+    """Intervalle de poll qui répartit le quota le plus serré (jour, 15 min, minute) sur sa fenêtre."""
+    pace = 0.0
+    for name, span in (("per_day", 86400.0), ("per_15min", 900.0), ("rpm", 60.0)):
+        limit = node.get(name)
+        if limit:
+            pace = max(pace, span / float(limit) * cost)
+    return pace
+
+
+def _http_get(req: Request, timeout: float) -> ApiResponse:
+    url = f"{req.url}{'&' if '?' in req.url else '?'}{urllib.parse.urlencode(req.params)}"
+    r = urllib.request.Request(url, headers={"User-Agent": "sniper-news/1.0", **req.headers})
+    try:
+        with urllib.request.urlopen(r, timeout=timeout) as resp:
+            return ApiResponse(resp.status, dict(resp.headers.items()), resp.read())
+    except urllib.error.HTTPError as e:
+        return ApiResponse(e.code, dict(e.headers.items()) if e.headers else {}, e.read() or b"")
+
+
+# ---------- Pipeline ----------
+
+class NewsPipeline:
+    """
+    Ingestion asyncio: une tâche de poll par source, toutes en parallèle,
+    chacune dans son quota (MultiWindowRateLimiter: burst, minute, 15 min,
+    jour) et espacée pour répartir ce quota sur sa fenêtre. Les articles
+    sont normalisés puis dédoublonnés (NewsDeduper) avant la file de
+    sortie: une dépêche reprise par quatre agrégateurs n'est émise (et
+    scorée en aval) qu'une fois. Les appels HTTP (urllib) tournent dans
+    des threads (asyncio.to_thread); 429/418: pause Retry-After.
+
+    Exemple d'usage:
+      pipe = NewsPipeline.from_config("config")
+      async with pipe:
+          async for art in pipe.stream():
+              score(art)
+    """
+
+    def __init__(
+        self,
+        sources: Sequence[NewsSource],
+        limiter: MultiWindowRateLimiter,
+        *,
+        deduper: Optional[NewsDeduper] = None,
+        summary: Optional[Mapping[str, Any]] = None,
+        min_poll_s: float = 60.0,
+        queue_size: int = 1000,
+        timeout: float = 10.0,
+        backoff_s: float = 30.0,
+    ) -> None:
+        self.sources = [s for s in sources if s.enabled]
+        for s in sources:
+            if not s.enabled:
+                log.info(f"news_parser: {s.key} disabled (no API key, set {s.env})")
+        self.limiter = limiter
+        self.deduper = deduper or NewsDeduper()
+        self.queue: asyncio.Queue[Article] = asyncio.Queue(queue_size)
+        self.timeout = timeout
+        self.backoff_s = backoff_s
+        self.interval = {s.key: max(min_poll_s, pace_s((summary or {}).get(s.key, {}), len(s.requests(None))))
+                         for s in self.sources}
+        self.since: Dict[str, Optional[float]] = {s.key: None for s in self.sources}
+        self.stats: Dict[str, Dict[str, int]] = {
+            s.key: {"calls": 0, "errors": 0, "throttled": 0, "fetched": 0, "new": 0, "duplicates": 0}
+            for s in self.sources}
+        self._tasks: List[asyncio.Task] = []
+        self._stop = asyncio.Event()
+
+    @classmethod
+    def from_config(cls, config_dir: str = "config", *, state_path: Optional[str] = "logs/rate_limits_state.json",
+                    **kw: Any) -> "NewsPipeline":
+        from modules_utils.config_loader import ConfigLoader
+
+        loader = ConfigLoader(config_dir)
+        news = loader.load_system().news
+        summary = loader.summarize_limits(loader.load_api_limits())
+        limiter = MultiWindowRateLimiter(state_path=state_path)
+        sources: List[NewsSource] = []
+        for key in news.sources:
+            limiter.set_limit_from_summary(key, summary)
+            extra = {"series": news.fred_series} if key == "fred" else {}
+            sources.append(SOURCES[key](query=news.query, language=news.language, **extra))
+        dedup = NewsDeduper(news.dedup_window, jaccard=news.near_dup_jaccard, max_bits=news.simhash_max_bits)
+        return cls(sources, limiter, deduper=dedup, summary=summary, min_poll_s=news.min_poll_s, **kw)
+
+    # ---------- cycle de poll ----------
+
+    async def poll(self, src: NewsSource) -> float:
+        """Un cycle d'une source; retourne la pause imposée par le serveur (0 sinon)."""
+        st = self.stats[src.key]
+        for req in src.requests(self.since[src.key]):
+            await self.limiter.acquire(src.key)
+            st["calls"] += 1
+            try:
+                resp = await asyncio.to_thread(_http_get, req, self.timeout)
+            except (OSError, ValueError) as e:
+                st["errors"] += 1
+                log.warning(f"news_parser: {src.key} request failed: {e}")
+                continue
+            if resp.status in (418, 429):
+                st["throttled"] += 1
+                try:
+                    return max(0.0, float(resp.headers.get("Retry-After") or resp.headers.get("retry-after")))
+                except (TypeError, ValueError):
+                    return self.backoff_s
+            if not resp.ok:
+                st["errors"] += 1
+                log.warning(f"news_parser: {src.key} HTTP {resp.status}")
+                continue
+            try:
+                articles = src.parse(resp.json(), req)
+            except ValueError as e:
+                st["errors"] += 1
+                log.warning(f"news_parser: {src.key} bad payload: {e}")
+                continue
+            await self._ingest(src, articles)
+        return 0.0
+
+    async def _ingest(self, src: NewsSource, articles: List[Article]) -> None:
+        st = self.stats[src.key]
+        now = time.time()
+        newest = self.since[src.key] or 0.0
+        for a in articles:
+            st["fetched"] += 1
+            a.fetched = now
+            if a.published > newest:
+                newest = a.published
+            if self.deduper.add(a) is not None:
+                st["duplicates"] += 1
+                continue
+            st["new"] += 1
+            await self.queue.put(a)
+        if newest:
+            self.since[src.key] = newest
+
+    async def _sleep(self, seconds: float) -> bool:
+        """Attend `seconds` ou l'arrêt; True si arrêt demandé."""
+        try:
+            await asyncio.wait_for(self._stop.wait(), timeout=max(0.0, seconds))
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _run_source(self, src: NewsSource) -> None:
+        loop = asyncio.get_running_loop()
+        while not self._stop.is_set():
+            t0 = loop.time()
+            try:
+                pause = await self.poll(src)
+            except QuotaExceeded as e:
+                log.info(f"news_parser: {e}")
+                pause = e.retry_at - time.time()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # une source en échec ne doit pas arrêter les autres
+                self.stats[src.key]["errors"] += 1
+                log.warning(f"news_parser: {src.key} poll failed: {e!r}")
+                pause = self.backoff_s
+            wait = max(pause, self.interval[src.key] - (loop.time() - t0))
+            if await self._sleep(wait):
+                return
+
+    # ---------- cycle de vie ----------
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._tasks = [asyncio.create_task(self._run_source(s), name=f"news:{s.key}") for s in self.sources]
+
+    async def stop(self) -> None:
+        self._stop.set()
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.limiter.flush()
+
+    async def __aenter__(self) -> "NewsPipeline":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.stop()
+
+    async def stream(self) -> AsyncIterator[Article]:
+        """Articles uniques, dans l'ordre d'arrivée, jusqu'à l'arrêt du pipeline."""
+        while True:
+            if self._stop.is_set() and self.queue.empty():
+                return
+            get = asyncio.ensure_future(self.queue.get())
+            stop = asyncio.ensure_future(self._stop.wait())
+            done, _ = await asyncio.wait({get, stop}, return_when=asyncio.FIRST_COMPLETED)
+            stop.cancel()
+            if get in done:
+                yield get.result()
+            else:
+                get.cancel()
+
+
+def _main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Poll news/macro sources and print unique articles (JSON lines)")
+    parser.add_argument("--config", default="config")
+    parser.add_argument("--seconds", type=float, default=300.0)
+    args = parser.parse_args()
+
+    async def run():
+        pipe = NewsPipeline.from_config(args.config)
+        async with pipe:
+            async def dump():
+                async for a in pipe.stream():
+                    print(json.dumps({k: v for k, v in a.as_dict().items() if k != "meta"}, ensure_ascii=False))
+            task = asyncio.create_task(dump())
+            await asyncio.sleep(args.seconds)
+        await task
+        print(json.dumps({"stats": pipe.stats, "dedup": pipe.deduper.stats}))
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,7 @@
+﻿from modules_utils.lazy_import import lazy_submodules
+
+__getattr__, __dir__ = lazy_submodules(__name__, [
+    "comptabilite",
+    "forecast_engine",
+    "patrimoine_forecaster",
+])
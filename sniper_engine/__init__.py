@@ -0,0 +1,12 @@
+﻿from modules_utils.lazy_import import lazy_submodules
+
+__getattr__, __dir__ = lazy_submodules(__name__, [
+    "api_handler",
+    "backtest",
+    "bar_aggregator",
+    "indicators",
+    "market_recorder",
+    "risk_manager",
+    "trading",
+    "utils",
+])
@@ -0,0 +1,81 @@
+﻿from __future__ import annotations
+
+import json
+import logging
+import urllib.error
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional
+
+from modules_utils.rate_limiter import RateLimiter
+
+log = logging.getLogger("sniper")
+
+
+@dataclass
+class ApiResponse:
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def json(self) -> Any:
+        return json.loads(self.body.decode("utf-8")) if self.body else None
+
+
+class ApiHandler:
+    """
+    Point d'entrée unique des appels REST: prend les tokens dans le
+    RateLimiter avant l'appel, puis lui renvoie le statut et les en-têtes
+    (used-weight, Retry-After) pour qu'il se recale / recule.
+
+    Exemple d'usage:
+      rl = RateLimiter()
+      rl.set_limit_from_summary('binance.futures', summary, burst=40)
+      api = ApiHandler(rl)
+      r = api.request('binance.futures', 'GET', 'https://fapi.binance.com/fapi/v1/depth',
+                      params={'symbol': 'BTCUSDT', 'limit': 100}, cost=5)
+    """
+
+    def __init__(self, limiter: RateLimiter, *, timeout: float = 10.0, max_retries: int = 3) -> None:
+        self.limiter = limiter
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+    def _send(self, method: str, url: str, headers: Mapping[str, str], data: Optional[bytes]) -> ApiResponse:
+        req = urllib.request.Request(url, data=data, headers=dict(headers), method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return ApiResponse(resp.status, dict(resp.headers.items()), resp.read())
+        except urllib.error.HTTPError as e:
+            return ApiResponse(e.code, dict(e.headers.items()) if e.headers else {}, e.read() or b"")
+
+    def request(
+        self,
+        key: str,
+        method: str,
+        url: str,
+        *,
+        params: Optional[Mapping[str, Any]] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        data: Optional[bytes] = None,
+        cost: float = 1.0,
+    ) -> ApiResponse:
+        if params:
+            url = f"{url}{'&' if '?' in url else '?'}{urllib.parse.urlencode(params)}"
+        attempt = 0
+        while True:
+            self.limiter.call(key, cost=cost)
+            resp = self._send(method, url, headers or {}, data)
+            pause = self.limiter.report(key, resp.status, resp.headers)
+            if resp.status not in (418, 429) or attempt >= self.max_retries:
+                return resp
+            attempt += 1
+            log.warning(f"api_handler: {key} HTTP {resp.status}, backoff {pause:.1f}s (retry {attempt}/{self.max_retries})")
+
+    def get(self, key: str, url: str, **kw: Any) -> ApiResponse:
+        return self.request(key, "GET", url, **kw)
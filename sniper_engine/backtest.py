@@ -0,0 +1,492 @@
+﻿from __future__ import annotations
+
+import itertools
+import json
+import logging
+import math
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from sniper_engine import indicators, trading
+
+log = logging.getLogger("sniper")
+
+RESULTS_DIR = "data/models/vectorx_snapshots/archived_backtests"
+MANIFEST = "manifest.jsonl"
+
+Params = Dict[str, float]
+Strategy = Callable[[Mapping[str, np.ndarray], Sequence[Params], Dict[Any, np.ndarray]], np.ndarray]
+
+
+# ---------- Stratégies vectorisées ----------
+#
+# strategy(bars, params, cache) -> positions (n, k) dans [-1, 1], une colonne
+# par jeu de paramètres. `cache` est propre au lot: les indicateurs partagés
+# entre variantes (même période) ne sont calculés qu'une fois. Les positions
+# sont remplies ligne par ligne dans un (k, n) contigu et rendues transposées
+# (vue): trading.simulate les relit sans copie.
+
+def _cached(cache: Dict[Any, np.ndarray], key: Any, fn: Callable[[], np.ndarray]) -> np.ndarray:
+    v = cache.get(key)
+    if v is None:
+        v = cache[key] = fn()
+    return v
+
+
+def ema_cross(bars: Mapping[str, np.ndarray], params: Sequence[Params], cache: Dict[Any, np.ndarray]) -> np.ndarray:
+    """Long si EMA(fast) > EMA(slow), short sinon. Paramètres: fast, slow."""
+    close = bars["close"]
+    out = np.empty((len(params), len(close)))
+    for j, p in enumerate(params):
+        f = _cached(cache, ("ema", int(p["fast"])), lambda: indicators.ema(close, int(p["fast"])))
+        s = _cached(cache, ("ema", int(p["slow"])), lambda: indicators.ema(close, int(p["slow"])))
+        np.subtract(f, s, out=out[j])
+        np.sign(out[j], out=out[j])
+    return out.T
+
+
+def zscore_revert(bars: Mapping[str, np.ndarray], params: Sequence[Params], cache: Dict[Any, np.ndarray]) -> np.ndarray:
+    """Retour à la moyenne: short si z > entry, long si z < -entry, à plat si |z| < exit. Paramètres: window, entry, exit."""
+    close = bars["close"]
+    sig = np.full((len(params), len(close)), np.nan)
+    for j, p in enumerate(params):
+        z = _cached(cache, ("z", int(p["window"])), lambda: indicators.zscore(close, int(p["window"])))
+        entry, exit_ = float(p["entry"]), float(p.get("exit", 0.0))
+        col = sig[j]
+        col[np.abs(z) < exit_] = 0.0
+        col[z > entry] = -1.0
+        col[z < -entry] = 1.0
+    return trading.hold(sig.T)
+
+
+def breakout(bars: Mapping[str, np.ndarray], params: Sequence[Params], cache: Dict[Any, np.ndarray]) -> np.ndarray:
+    """Donchian: long au-dessus du plus haut des `window` barres précédentes, short sous le plus bas."""
+    close = bars["close"]
+    high, low = bars.get("high", close), bars.get("low", close)
+    n = len(close)
+    sig = np.full((len(params), n), np.nan)
+    for j, p in enumerate(params):
+        w = int(p["window"])
+        if w >= n:
+            continue
+
+        def _channel(w=w):
+            hh = np.full(n, np.nan)
+            ll = np.full(n, np.nan)
+            hh[w:] = np.lib.stride_tricks.sliding_window_view(high, w).max(axis=1)[:-1]
+            ll[w:] = np.lib.stride_tricks.sliding_window_view(low, w).min(axis=1)[:-1]
+            return np.stack([hh, ll])
+
+        hh, ll = _cached(cache, ("donchian", w), _channel)
+        col = sig[j]
+        col[close > hh] = 1.0
+        col[close < ll] = -1.0
+    return trading.hold(sig.T)
+
+
+STRATEGIES: Dict[str, Strategy] = {
+    "ema_cross": ema_cross,
+    "zscore_revert": zscore_revert,
+    "breakout": breakout,
+}
+
+
+def _strategy(strategy: Union[str, Strategy]) -> Strategy:
+    if callable(strategy):
+        return strategy
+    try:
+        return STRATEGIES[strategy]
+    except KeyError:
+        raise ValueError(f"unknown strategy: {strategy} (known: {', '.join(STRATEGIES)})") from None
+
+
+def param_grid(grid: Mapping[str, Iterable[float]], where: Optional[Callable[[Params], bool]] = None) -> List[Params]:
+    """Produit cartésien {"fast": [5, 10], "slow": [50, 100]} -> [{"fast": 5, "slow": 50}, ...]."""
+    keys = list(grid)
+    combos = [dict(zip(keys, vals)) for vals in itertools.product(*(list(grid[k]) for k in keys))]
+    return [c for c in combos if where is None or where(c)]
+
+
+def walk_forward_windows(n: int, train: int, test: int, step: Optional[int] = None) -> List[Tuple[int, int, int]]:
+    """Fenêtres (début train, début test, fin test) glissantes sur n barres."""
+    step = step or test
+    if train < 2 or test < 2 or step < 1:
+        raise ValueError("walk-forward needs train >= 2, test >= 2, step >= 1")
+    out = []
+    s = 0
+    while s + train + test <= n:
+        out.append((s, s + train, s + train + test))
+        s += step
+    return out
+
+
+# ---------- Données partagées (mmap, sans copie par worker) ----------
+
+class SharedBars:
+    """
+    Colonnes de barres (close, high, low, volume, ts...) en fichiers .npy
+    ouverts en np.load(mmap_mode="r") par chaque worker: une seule copie en
+    page cache, rien n'est picklé hormis le chemin. create() écrit dans
+    /dev/shm quand il existe (RAM), sinon dans un répertoire temporaire.
+
+    Exemple d'usage:
+      shared = SharedBars.create({"close": close, "high": high, "low": low})
+      bars = shared.open()          # dict de vues mmap en lecture seule
+      shared.close()                # supprime le répertoire temporaire
+    """
+
+    def __init__(self, directory: str | Path, *, owned: bool = False) -> None:
+        self.dir = Path(directory)
+        self.owned = owned
+        self.columns = sorted(p.stem for p in self.dir.glob("*.npy"))
+        if "close" not in self.columns:
+            raise ValueError(f"{self.dir}: bars need at least a 'close' column")
+
+    @classmethod
+    def create(cls, bars: Mapping[str, np.ndarray], directory: Optional[str | Path] = None) -> "SharedBars":
+        owned = directory is None
+        if owned:
+            base = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+            directory = tempfile.mkdtemp(prefix="sniper-bars-", dir=base)
+        save_bars(bars, directory)
+        return cls(directory, owned=owned)
+
+    def open(self) -> Dict[str, np.ndarray]:
+        return {c: np.load(self.dir / f"{c}.npy", mmap_mode="r") for c in self.columns}
+
+    def __len__(self) -> int:
+        return len(np.load(self.dir / "close.npy", mmap_mode="r"))
+
+    def close(self) -> None:
+        if self.owned:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            self.owned = False
+
+    def __enter__(self) -> "SharedBars":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def save_bars(bars: Mapping[str, np.ndarray], directory: str | Path) -> Path:
+    """Barres en colonnes .npy (float64), relisibles en mmap."""
+    d = Path(directory)
+    d.mkdir(parents=True, exist_ok=True)
+    n = None
+    for name, col in bars.items():
+        a = np.ascontiguousarray(col, dtype=np.float64)
+        if n is not None and len(a) != n:
+            raise ValueError(f"column {name!r} has {len(a)} rows, expected {n}")
+        n = len(a)
+        np.save(d / f"{name}.npy", a)
+    return d
+
+
+def bars_from_ticks(source: Any, interval_s: float, symbol: str) -> Dict[str, np.ndarray]:
+    """
+    Barres temps OHLCV d'un symbole depuis les trades enregistrés
+    (sniper_engine.market_recorder), calculées par blocs NumPy (reduceat).
+    Mêmes créneaux que BarAggregator (floor(ts / taille)); créneaux sans
+    trade absents.
+    """
+    from sniper_engine.market_recorder import TRADE, MarketReplay
+
+    parts: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+    for f, rec in MarketReplay(source, symbols={symbol}).blocks():
+        if symbol not in f.symbols:
+            continue
+        m = (rec["kind"] == TRADE) & (rec["sym"] == f.symbols.index(symbol))
+        parts.append((rec["ts"][m] / 1e9, rec["price"][m], rec["qty"][m]))
+    if not parts:
+        return {k: np.empty(0) for k in ("ts", "open", "high", "low", "close", "volume")}
+    ts, px, qty = (np.concatenate(c) for c in zip(*parts))
+    bucket = np.floor(ts / interval_s) * interval_s
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(px)] - 1
+    return {
+        "ts": bucket[starts],
+        "open": px[starts],
+        "high": np.maximum.reduceat(px, starts),
+        "low": np.minimum.reduceat(px, starts),
+        "close": px[ends],
+        "volume": np.add.reduceat(qty, starts),
+    }
+
+
+def periods_per_year(bars: Mapping[str, np.ndarray]) -> float:
+    """Barres par an d'après l'écart médian de `ts` (secondes); 1 minute par défaut."""
+    ts = bars.get("ts")
+    if ts is not None and len(ts) > 1:
+        dt = float(np.median(np.diff(ts[: min(len(ts), 10_000)])))
+        if dt > 0:
+            return 365.0 * 86400.0 / dt
+    return 365.0 * 24 * 60
+
+
+# ---------- Exécution (workers) ----------
+
+_WORKER: Dict[str, Any] = {}
+
+
+def _init_worker(directory: str) -> None:
+    _WORKER["bars"] = SharedBars(directory).open()
+
+
+def _run_chunk(strategy: Union[str, Strategy], params: Sequence[Params], windows: Sequence[Tuple[int, int]],
+               costs: Tuple[float, float, float]) -> np.ndarray:
+    """Métriques (len(windows), len(params), len(METRICS)) pour un lot de paramètres."""
+    bars = _WORKER["bars"]
+    fee, slip, ppy = costs
+    pos = _strategy(strategy)(bars, params, {})
+    close = bars["close"]
+    out = np.empty((len(windows), len(params), len(trading.METRICS)))
+    for w, (a, b) in enumerate(windows):
+        m = trading.simulate(close, pos, fee_bps=fee, slippage_bps=slip, periods_per_year=ppy, start=a, end=b)
+        out[w] = np.column_stack([m[k] for k in trading.METRICS])
+    return out
+
+
+@dataclass
+class BacktestResult:
+    """
+    Résultat en colonnes (tableaux de même longueur): paramètres, fenêtre,
+    métriques. Archivé en .npz (une entrée par colonne, compressé).
+    """
+    kind: str
+    strategy: str
+    columns: Dict[str, np.ndarray]
+    meta: Dict[str, Any] = field(default_factory=dict)
+    path: Optional[Path] = None
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def best(self, metric: str = "sharpe") -> Dict[str, float]:
+        col = self.columns[metric]
+        i = int(np.nanargmin(col) if metric == "max_drawdown" else np.nanargmax(col))
+        return {k: float(v[i]) for k, v in self.columns.items()}
+
+    def rows(self) -> List[Dict[str, float]]:
+        keys = list(self.columns)
+        return [dict(zip(keys, map(float, vals))) for vals in zip(*(self.columns[k] for k in keys))]
+
+
+class BacktestEngine:
+    """
+    Backtests vectorisés sur des barres enregistrées: chaque tâche évalue un
+    lot de paramètres en une passe NumPy (positions (n, k)), les lots sont
+    répartis sur un pool de processus qui lisent les barres en mmap
+    (SharedBars), sans copie picklée. workers=1: tout dans le processus
+    courant (mêmes résultats).
+
+      - sweep(): grille de paramètres sur [start, end);
+      - walk_forward(): fenêtres train/test glissantes; le meilleur jeu du
+        train (metric) est retenu et rapporté sur le test qui suit. Toutes
+        les fenêtres d'un lot sont évaluées sur les mêmes positions.
+    Résultats archivés dans data/models/vectorx_snapshots/archived_backtests
+    (<run_id>.npz + manifest.jsonl).
+
+    Exemple d'usage:
+      with BacktestEngine(bars, workers=8, fee_bps=4) as bt:
+          res = bt.sweep("ema_cross", param_grid({"fast": [5, 10, 20], "slow": [50, 100, 200]}))
+          res.best("sharpe")
+          wf = bt.walk_forward("zscore_revert", grid, train=20_000, test=5_000)
+          bt.archive(wf)
+    """
+
+    def __init__(
+        self,
+        bars: Union[Mapping[str, np.ndarray], SharedBars, str, Path],
+        *,
+        workers: Optional[int] = None,
+        fee_bps: float = 0.0,
+        slippage_bps: float = 0.0,
+        results_dir: str | Path = RESULTS_DIR,
+        chunks_per_worker: int = 4,
+    ) -> None:
+        if isinstance(bars, SharedBars):
+            self.shared = bars
+        elif isinstance(bars, (str, Path)):
+            self.shared = SharedBars(bars)
+        else:
+            self.shared = SharedBars.create(bars)
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.fee_bps = fee_bps
+        self.slippage_bps = slippage_bps
+        self.results_dir = Path(results_dir)
+        self.chunks_per_worker = chunks_per_worker
+        self.n = len(self.shared)
+        self.ppy = periods_per_year(self.shared.open())
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers == 1:
+            return None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(str(self.shared.dir),))
+        return self._pool
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self.shared.close()
+
+    def __enter__(self) -> "BacktestEngine":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _evaluate(self, strategy: Union[str, Strategy], params: Sequence[Params],
+                  windows: Sequence[Tuple[int, int]]) -> np.ndarray:
+        """(len(windows), len(params), len(METRICS)), lots répartis sur le pool."""
+        if not params:
+            raise ValueError("empty parameter grid")
+        _strategy(strategy)  # nom inconnu: erreur ici plutôt que dans un worker
+        costs = (self.fee_bps, self.slippage_bps, self.ppy)
+        pool = self._executor()
+        n_chunks = 1 if pool is None else min(len(params), self.workers * self.chunks_per_worker)
+        size = math.ceil(len(params) / n_chunks)
+        chunks = [params[i:i + size] for i in range(0, len(params), size)]
+        if pool is None:
+            _init_worker(str(self.shared.dir))
+            parts = [_run_chunk(strategy, c, windows, costs) for c in chunks]
+        else:
+            futs = [pool.submit(_run_chunk, strategy, c, windows, costs) for c in chunks]
+            parts = [f.result() for f in futs]
+        return np.concatenate(parts, axis=1)
+
+    @staticmethod
+    def _param_columns(params: Sequence[Params]) -> Dict[str, np.ndarray]:
+        keys = list(params[0])
+        return {k: np.array([float(p[k]) for p in params]) for k in keys}
+
+    def sweep(self, strategy: Union[str, Strategy], params: Sequence[Params], *,
+              start: int = 0, end: Optional[int] = None) -> BacktestResult:
+        end = self.n if end is None else end
+        t0 = time.perf_counter()
+        m = self._evaluate(strategy, params, [(start, end)])[0]
+        cols = self._param_columns(params)
+        cols.update({k: m[:, i] for i, k in enumerate(trading.METRICS)})
+        return BacktestResult("sweep", _name(strategy), cols, self._meta(params, time.perf_counter() - t0,
+                                                                         start=start, end=end))
+
+    def walk_forward(self, strategy: Union[str, Strategy], params: Sequence[Params], *, train: int, test: int,
+                     step: Optional[int] = None, metric: str = "sharpe") -> BacktestResult:
+        if metric not in trading.METRICS:
+            raise ValueError(f"unknown metric: {metric}")
+        wins = walk_forward_windows(self.n, train, test, step)
+        if not wins:
+            raise ValueError(f"not enough bars ({self.n}) for train={train} test={test}")
+        t0 = time.perf_counter()
+        spans = [(a, b) for a, b, _ in wins] + [(b, c) for _, b, c in wins]
+        m = self._evaluate(strategy, params, spans)
+        tr, te = m[:len(wins)], m[len(wins):]
+        k = trading.METRICS.index(metric)
+        score = -tr[:, :, k] if metric == "max_drawdown" else tr[:, :, k]
+        pick = np.nanargmax(np.nan_to_num(score, nan=-np.inf), axis=1)
+        cols: Dict[str, np.ndarray] = {
+            "train_start": np.array([a for a, _, _ in wins], dtype=np.float64),
+            "test_start": np.array([b for _, b, _ in wins], dtype=np.float64),
+            "test_end": np.array([c for _, _, c in wins], dtype=np.float64),
+        }
+        pcols = self._param_columns(params)
+        cols.update({k2: v[pick] for k2, v in pcols.items()})
+        rows = np.arange(len(wins))
+        cols[f"train_{metric}"] = tr[rows, pick, k]
+        cols.update({name: te[rows, pick, i] for i, name in enumerate(trading.METRICS)})
+        meta = self._meta(params, time.perf_counter() - t0, train=train, test=test, step=step or test, metric=metric)
+        meta["oos_total_return"] = float(np.prod(1.0 + cols["total_return"]) - 1.0)
+        return BacktestResult("walk_forward", _name(strategy), cols, meta)
+
+    def _meta(self, params: Sequence[Params], seconds: float, **extra: Any) -> Dict[str, Any]:
+        return {
+            "bars": self.n, "variants": len(params), "workers": self.workers, "seconds": round(seconds, 4),
+            "fee_bps": self.fee_bps, "slippage_bps": self.slippage_bps, "periods_per_year": self.ppy, **extra,
+        }
+
+    # ---------- Archivage ----------
+
+    def archive(self, result: BacktestResult, *, tag: str = "") -> Path:
+        """Écrit <run_id>.npz (colonnes) et ajoute une ligne au manifest.jsonl."""
+        return archive_result(result, self.results_dir, tag=tag)
+
+
+def _name(strategy: Union[str, Strategy]) -> str:
+    return strategy if isinstance(strategy, str) else getattr(strategy, "__name__", "custom")
+
+
+def archive_result(result: BacktestResult, results_dir: str | Path = RESULTS_DIR, *, tag: str = "") -> Path:
+    d = Path(results_dir)
+    d.mkdir(parents=True, exist_ok=True)
+    run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{result.kind}-{result.strategy}-{uuid.uuid4().hex[:6]}"
+    path = d / f"{run_id}.npz"
+    tmp = d / f"{run_id}.tmp.npz"
+    np.savez_compressed(tmp, **result.columns)
+    os.replace(tmp, path)
+    entry = {"run_id": run_id, "file": path.name, "kind": result.kind, "strategy": result.strategy, "tag": tag,
+             "rows": len(result), "columns": list(result.columns), "created": time.time(), "meta": result.meta}
+    with open(d / MANIFEST, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    result.path = path
+    return path
+
+
+def load_result(path: str | Path) -> BacktestResult:
+    """Relit un .npz archivé (métadonnées depuis le manifest s'il est présent)."""
+    path = Path(path)
+    with np.load(path) as z:
+        cols = {k: z[k] for k in z.files}
+    entry: Dict[str, Any] = {}
+    man = path.parent / MANIFEST
+    if man.exists():
+        with open(man, "r", encoding="utf-8") as f:
+            for line in f:
+                e = json.loads(line)
+                if e.get("file") == path.name:
+                    entry = e
+    return BacktestResult(entry.get("kind", ""), entry.get("strategy", ""), cols, entry.get("meta", {}), path)
+
+
+def _main():
+    import argparse
+
+    from modules_utils.config_loader import ConfigLoader
+
+    parser = argparse.ArgumentParser(description="Vectorized backtests over recorded bars")
+    parser.add_argument("bars", help="directory of .npy bar columns (close, high, low, ts...)")
+    parser.add_argument("--strategy", default="ema_cross", choices=sorted(STRATEGIES))
+    parser.add_argument("--grid", action="append", default=[], metavar="NAME=V1,V2,...")
+    parser.add_argument("--walk-forward", metavar="TRAIN,TEST[,STEP]")
+    parser.add_argument("--metric", default="sharpe", choices=trading.METRICS)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    cfg = ConfigLoader().load_system().backtest
+    grid = {k: [float(v) for v in vals.split(",")] for k, vals in (g.split("=", 1) for g in args.grid)}
+    params = param_grid(grid)
+    with BacktestEngine(args.bars, workers=args.workers or cfg.workers, fee_bps=cfg.fee_bps,
+                        slippage_bps=cfg.slippage_bps, results_dir=cfg.results_dir) as bt:
+        if args.walk_forward:
+            parts = [int(x) for x in args.walk_forward.split(",")]
+            res = bt.walk_forward(args.strategy, params, train=parts[0], test=parts[1],
+                                  step=parts[2] if len(parts) > 2 else None, metric=args.metric)
+        else:
+            res = bt.sweep(args.strategy, params)
+        path = bt.archive(res)
+    print(json.dumps({"file": str(path), "rows": len(res), "best": res.best(args.metric), "meta": res.meta}))
+
+
+if __name__ == "__main__":
+    _main()
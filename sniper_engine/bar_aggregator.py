@@ -0,0 +1,242 @@
+﻿from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+FIELDS = ("ts", "end_ts", "open", "high", "low", "close", "volume", "ticks")
+_TS, _END, _O, _H, _L, _C, _V, _N = range(len(FIELDS))
+
+_UNITS = {"s": ("time", 1.0), "m": ("time", 60.0), "h": ("time", 3600.0), "d": ("time", 86400.0),
+          "t": ("tick", 1.0), "v": ("volume", 1.0), "r": ("range", 1.0)}
+_SPEC_RE = re.compile(r"^\s*([0-9]*\.?[0-9]+)\s*([smhdtvr])\s*$")
+
+
+@dataclass(frozen=True)
+class BarSpec:
+    """'1m', '5m', '1h' (temps) | '500t' (ticks) | '100v' (volume) | '25r' (range, en prix)."""
+    name: str
+    kind: str
+    size: float
+
+    @classmethod
+    def parse(cls, name: str) -> "BarSpec":
+        m = _SPEC_RE.match(name)
+        if not m:
+            raise ValueError(f"invalid bar spec: {name!r} (expected e.g. 1m, 500t, 100v, 25r)")
+        kind, mult = _UNITS[m.group(2)]
+        size = float(m.group(1)) * mult
+        if size <= 0:
+            raise ValueError(f"invalid bar spec: {name!r} (size must be > 0)")
+        return cls(name=name.strip(), kind=kind, size=size)
+
+
+class Bars(NamedTuple):
+    """Vues (sans copie) sur les N dernières barres clôturées, ordre chronologique."""
+    ts: np.ndarray        # ouverture (début du créneau pour les barres temps)
+    end_ts: np.ndarray    # dernier tick
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    ticks: np.ndarray
+
+
+class BarRing:
+    """
+    Historique de barres à capacité fixe. Chaque barre est écrite deux fois
+    (i et i + capacity): les N dernières barres forment toujours une tranche
+    contiguë, d'où des vues sans copie. Mémoire: 8 champs x 2 x capacity x 8 o.
+
+    Les vues sont vivantes: elles restent justes jusqu'à ce que `capacity`
+    nouvelles barres les écrasent; copier si on les conserve.
+    """
+
+    __slots__ = ("capacity", "count", "_data")
+
+    def __init__(self, capacity: int) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.capacity = int(capacity)
+        self.count = 0
+        self._data = np.zeros((len(FIELDS), 2 * self.capacity), dtype=np.float64)
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+    def append(self, bar: Tuple[float, ...]) -> None:
+        i = self.count % self.capacity
+        col = self._data[:, i]
+        col[:] = bar
+        self._data[:, i + self.capacity] = col
+        self.count += 1
+
+    def last(self, n: Optional[int] = None) -> Bars:
+        size = len(self)
+        n = size if n is None else max(0, min(int(n), size))
+        end = (self.count - 1) % self.capacity + self.capacity + 1 if self.count else 0
+        block = self._data[:, end - n:end]
+        return Bars(*block)
+
+
+class _Forming:
+    __slots__ = ("ts", "end_ts", "open", "high", "low", "close", "volume", "ticks")
+
+    def __init__(self, ts: float, t: float, price: float, qty: float) -> None:
+        self.ts = ts
+        self.end_ts = t
+        self.open = self.high = self.low = self.close = price
+        self.volume = qty
+        self.ticks = 1
+
+    def add(self, t: float, price: float, qty: float) -> None:
+        self.end_ts = t
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += qty
+        self.ticks += 1
+
+    def row(self) -> Tuple[float, ...]:
+        return (self.ts, self.end_ts, self.open, self.high, self.low, self.close, self.volume, float(self.ticks))
+
+
+class _Series:
+    __slots__ = ("spec", "ring", "forming")
+
+    def __init__(self, spec: BarSpec, capacity: int) -> None:
+        self.spec = spec
+        self.ring = BarRing(capacity)
+        self.forming: Optional[_Forming] = None
+
+
+BarCallback = Callable[[str, BarSpec, BarRing], None]
+
+
+class BarAggregator:
+    """
+    Ticks -> barres pour N symboles et plusieurs unités à la fois (temps,
+    ticks, volume, range). L'historique de chaque (symbole, unité) vit dans
+    un BarRing préalloué: mémoire fixe par symbole, quelle que soit la durée
+    de la session, et `bars()` rend des vues NumPy directement utilisables
+    par sniper_engine.indicators (batch) ou vectorx.
+
+    Règles de clôture:
+      - temps : créneaux alignés sur l'epoch (floor(ts / taille)); la barre
+                se ferme au premier tick du créneau suivant ou via
+                close_elapsed(now). Pas de barres vides pour les trous.
+      - ticks : après `taille` ticks;
+      - volume: dès que le volume cumulé atteint `taille` (le tick qui
+                franchit le seuil reste dans la barre, pas de découpe);
+      - range : dès que high - low >= `taille` (tick inclus).
+
+    Exemple d'usage:
+      agg = BarAggregator(["1m", "5m", "500t", "100v", "25r"], capacity=1024)
+      agg.subscribe(lambda sym, spec, ring: ...)       # à chaque barre clôturée
+      closed = agg.on_tick("BTCUSDT", ts, price, qty)  # ["1m"] si une barre 1m vient de se fermer
+      b = agg.bars("BTCUSDT", "1m", 200)               # b.close, b.high... (vues)
+      ema(b.close, 21)
+    """
+
+    def __init__(self, specs: Iterable[str | BarSpec], *, capacity: int = 1024) -> None:
+        self.specs: List[BarSpec] = [s if isinstance(s, BarSpec) else BarSpec.parse(s) for s in specs]
+        if not self.specs:
+            raise ValueError("at least one bar spec is required")
+        names = [s.name for s in self.specs]
+        if len(set(names)) != len(names):
+            raise ValueError(f"duplicate bar specs: {names}")
+        self.capacity = capacity
+        self._symbols: Dict[str, List[_Series]] = {}
+        self._callbacks: List[BarCallback] = []
+
+    def subscribe(self, cb: BarCallback) -> None:
+        self._callbacks.append(cb)
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._symbols)
+
+    def _series(self, symbol: str) -> List[_Series]:
+        series = self._symbols.get(symbol)
+        if series is None:
+            series = self._symbols[symbol] = [_Series(s, self.capacity) for s in self.specs]
+        return series
+
+    def _close(self, symbol: str, s: _Series) -> None:
+        s.ring.append(s.forming.row())
+        s.forming = None
+        for cb in self._callbacks:
+            cb(symbol, s.spec, s.ring)
+
+    def on_tick(self, symbol: str, ts: float, price: float, qty: float = 0.0) -> List[str]:
+        """Intègre un tick; retourne les unités dont une barre vient de se fermer."""
+        ts, price, qty = float(ts), float(price), float(qty)
+        closed: List[str] = []
+        for s in self._series(symbol):
+            spec, f = s.spec, s.forming
+            if spec.kind == "time":
+                bucket = math.floor(ts / spec.size) * spec.size
+                if f is not None and bucket > f.ts:
+                    self._close(symbol, s)
+                    closed.append(spec.name)
+                    f = None
+                if f is None:
+                    s.forming = _Forming(bucket, ts, price, qty)
+                else:
+                    f.add(ts, price, qty)
+                continue
+
+            if f is None:
+                f = s.forming = _Forming(ts, ts, price, qty)
+            else:
+                f.add(ts, price, qty)
+            if ((spec.kind == "tick" and f.ticks >= spec.size)
+                    or (spec.kind == "volume" and f.volume >= spec.size)
+                    or (spec.kind == "range" and f.high - f.low >= spec.size)):
+                self._close(symbol, s)
+                closed.append(spec.name)
+        return closed
+
+    def close_elapsed(self, now: float) -> List[Tuple[str, str]]:
+        """Ferme les barres temps dont le créneau est terminé (symboles sans tick)."""
+        closed: List[Tuple[str, str]] = []
+        for symbol, series in self._symbols.items():
+            for s in series:
+                if s.spec.kind == "time" and s.forming is not None and now >= s.forming.ts + s.spec.size:
+                    self._close(symbol, s)
+                    closed.append((symbol, s.spec.name))
+        return closed
+
+    def _get(self, symbol: str, spec: str) -> _Series:
+        for s in self._symbols.get(symbol, ()):
+            if s.spec.name == spec:
+                return s
+        if spec not in (s.name for s in self.specs):
+            raise KeyError(f"unknown bar spec: {spec}")
+        raise KeyError(f"no ticks for symbol {symbol}")
+
+    def bars(self, symbol: str, spec: str, n: Optional[int] = None) -> Bars:
+        """Vues sur les n dernières barres clôturées (toutes si n=None, au plus capacity)."""
+        return self._get(symbol, spec).ring.last(n)
+
+    def ring(self, symbol: str, spec: str) -> BarRing:
+        return self._get(symbol, spec).ring
+
+    def forming(self, symbol: str, spec: str) -> Optional[Dict[str, float]]:
+        """Barre en cours (non clôturée) ou None."""
+        f = self._get(symbol, spec).forming
+        return dict(zip(FIELDS, f.row())) if f is not None else None
+
+    def memory_bytes(self, symbol: Optional[str] = None) -> int:
+        syms = [symbol] if symbol is not None else self.symbols
+        return sum(s.ring.nbytes for sym in syms for s in self._symbols.get(sym, ()))
@@ -0,0 +1,451 @@
+﻿from __future__ import annotations
+
+import abc
+import math
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Deux modes, mêmes résultats au bit près:
+#   - batch: fonctions NumPy sur des tableaux (n,) ou (n, symboles), axe 0 = temps;
+#   - streaming: classes à état O(1) par symbole, une mise à jour par tick/barre.
+#
+# Pour garantir l'égalité exacte, les deux modes font les mêmes opérations
+# flottantes dans le même ordre:
+#   - fenêtres glissantes: somme courante s += (y_t - y_{t-n}), soit en batch
+#     un np.cumsum (accumulation séquentielle) des différences; les valeurs
+#     sont décalées de la première observation (y = x - x0) pour limiter
+#     la perte de précision de la variance;
+#   - récursions (EMA, lissage de Wilder): boucle sur le temps, en flottants
+#     Python pour une série, en opérations vectorielles par ligne pour
+#     (n, symboles). Jamais de np.mean/np.std (sommation par paires).
+
+NAN = float("nan")
+
+
+def _as_2d(x) -> Tuple[np.ndarray, bool]:
+    a = np.asarray(x, dtype=np.float64)
+    if a.ndim == 1:
+        return a[:, None], True
+    if a.ndim != 2:
+        raise ValueError(f"expected shape (n,) or (n, symbols), got {a.shape}")
+    return a, False
+
+
+def _out(a: np.ndarray, squeeze: bool) -> np.ndarray:
+    return a[:, 0] if squeeze else a
+
+
+def _rows(a: np.ndarray, squeeze: bool):
+    # une série: flottants Python (boucle ~10x plus rapide que des scalaires NumPy)
+    return a[:, 0].tolist() if squeeze else a
+
+
+def _stack(res: List, squeeze: bool, width: int) -> np.ndarray:
+    if not res:
+        return np.empty((0, width))
+    return np.asarray(res, dtype=np.float64).reshape(len(res), width)
+
+
+def _check_period(period: int) -> int:
+    period = int(period)
+    if period < 1:
+        raise ValueError("period must be >= 1")
+    return period
+
+
+# ---------- Fenêtres glissantes (batch) ----------
+
+def _window_sums(x: np.ndarray, period: int, squares: bool):
+    """Sommes glissantes des valeurs décalées y = x - x0 (et de y²)."""
+    ref = x[0]
+    y = x - ref
+    lag = np.zeros_like(y)
+    lag[period:] = y[:-period]
+    s = np.cumsum(y - lag, axis=0)
+    q = np.cumsum(y * y - lag * lag, axis=0) if squares else None
+    return ref, y, s, q
+
+
+def sma(x, period: int) -> np.ndarray:
+    """Moyenne mobile simple (NaN pendant les period-1 premières barres)."""
+    period = _check_period(period)
+    a, sq = _as_2d(x)
+    if len(a) == 0:
+        return _out(a.copy(), sq)
+    ref, _, s, _ = _window_sums(a, period, squares=False)
+    out = s / period + ref
+    out[:period - 1] = NAN
+    return _out(out, sq)
+
+
+def _mean_std(a: np.ndarray, period: int):
+    ref, y, s, q = _window_sums(a, period, squares=True)
+    m = s / period
+    var = np.maximum(q / period - m * m, 0.0)
+    return ref, y, m, np.sqrt(var)
+
+
+def bollinger(x, period: int = 20, k: float = 2.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(milieu, haut, bas) avec écart-type population (ddof=0)."""
+    period = _check_period(period)
+    a, sq = _as_2d(x)
+    if len(a) == 0:
+        e = _out(a.copy(), sq)
+        return e, e.copy(), e.copy()
+    ref, _, m, sd = _mean_std(a, period)
+    mid = m + ref
+    width = k * sd
+    upper, lower = mid + width, mid - width
+    for arr in (mid, upper, lower):
+        arr[:period - 1] = NAN
+    return _out(mid, sq), _out(upper, sq), _out(lower, sq)
+
+
+def zscore(x, period: int) -> np.ndarray:
+    """(x - moyenne) / écart-type sur la fenêtre; 0 si la fenêtre est plate."""
+    period = _check_period(period)
+    a, sq = _as_2d(x)
+    if len(a) == 0:
+        return _out(a.copy(), sq)
+    _, y, m, sd = _mean_std(a, period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(sd > 0, (y - m) / sd, 0.0)
+    z[:period - 1] = NAN
+    return _out(z, sq)
+
+
+def vwap(price, volume, reset=None) -> np.ndarray:
+    """VWAP cumulé, remis à zéro quand reset[t] est vrai (début de session)."""
+    p, sq = _as_2d(price)
+    v, _ = _as_2d(volume)
+    pv = p * v
+    starts = [0]
+    if reset is not None:
+        r = np.asarray(reset, dtype=bool)
+        starts += [int(i) for i in np.flatnonzero(r) if i > 0]
+    cum_pv = np.empty_like(pv)
+    cum_v = np.empty_like(v)
+    # une accumulation par session (pas de soustraction de cumsum)
+    for a, b in zip(starts, starts[1:] + [len(p)]):
+        np.cumsum(pv[a:b], axis=0, out=cum_pv[a:b])
+        np.cumsum(v[a:b], axis=0, out=cum_v[a:b])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.where(cum_v != 0, cum_pv / cum_v, NAN)
+    return _out(out, sq)
+
+
+# ---------- Récursions (batch) ----------
+
+def ema(x, period: int) -> np.ndarray:
+    """EMA alpha = 2/(period+1), initialisée sur la première valeur (adjust=False)."""
+    period = _check_period(period)
+    a, sq = _as_2d(x)
+    if len(a) == 0:
+        return _out(a.copy(), sq)
+    alpha = 2.0 / (period + 1)
+    rows = _rows(a, sq)
+    e = rows[0]
+    res = [e]
+    for xt in rows[1:]:
+        e = e + alpha * (xt - e)
+        res.append(e)
+    return _out(_stack(res, sq, a.shape[1]), sq)
+
+
+def _wilder(values, period: int, start: int, squeeze: bool, width: int):
+    """Moyenne de Wilder: moyenne simple des `period` premières valeurs à partir de `start`, puis (m*(p-1)+v)/p."""
+    n = len(values)
+    res: List = [NAN if squeeze else np.full(width, NAN)] * min(n, start + period - 1)
+    if n < start + period:
+        return res
+    acc = values[start]
+    for t in range(start + 1, start + period):
+        acc = acc + values[t]
+    m = acc / period
+    res.append(m)
+    for t in range(start + period, n):
+        m = (m * (period - 1) + values[t]) / period
+        res.append(m)
+    return res
+
+
+def _rsi_value(ag, al):
+    if isinstance(ag, float):
+        if al == 0.0:
+            return 50.0 if ag == 0.0 else 100.0
+        return 100.0 - 100.0 / (1.0 + ag / al)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = 100.0 - 100.0 / (1.0 + ag / al)
+    return np.where(al == 0.0, np.where(ag == 0.0, 50.0, 100.0), r)
+
+
+def rsi(x, period: int = 14) -> np.ndarray:
+    """RSI de Wilder (NaN pendant les `period` premières barres)."""
+    period = _check_period(period)
+    a, sq = _as_2d(x)
+    n, w = a.shape
+    out = np.full((n, w), NAN)
+    if n <= period:
+        return _out(out, sq)
+    delta = np.zeros_like(a)
+    delta[1:] = a[1:] - a[:-1]
+    gains = np.maximum(delta, 0.0)
+    losses = np.maximum(-delta, 0.0)
+    ag = _stack(_wilder(_rows(gains, sq), period, 1, sq, w), sq, w)
+    al = _stack(_wilder(_rows(losses, sq), period, 1, sq, w), sq, w)
+    out[period:] = _rsi_value(ag[period:], al[period:])
+    return _out(out, sq)
+
+
+def true_range(high, low, close) -> np.ndarray:
+    h, sq = _as_2d(high)
+    l, _ = _as_2d(low)
+    c, _ = _as_2d(close)
+    tr = h - l
+    if len(tr) > 1:
+        pc = c[:-1]
+        tr[1:] = np.maximum(np.maximum(tr[1:], np.abs(h[1:] - pc)), np.abs(l[1:] - pc))
+    return _out(tr, sq)
+
+
+def atr(high, low, close, period: int = 14) -> np.ndarray:
+    """ATR de Wilder (NaN pendant les period-1 premières barres)."""
+    period = _check_period(period)
+    tr, sq = _as_2d(true_range(high, low, close))
+    n, w = tr.shape
+    out = _stack(_wilder(_rows(tr, sq), period, 0, sq, w), sq, w)
+    return _out(out if n else tr.copy(), sq)
+
+
+# ---------- Streaming (état O(1) par symbole) ----------
+
+class _Stream(abc.ABC):
+    __slots__ = ()
+
+    @abc.abstractmethod
+    def on_bar(self, high: float, low: float, close: float, volume: float):
+        ...
+
+
+class EMA(_Stream):
+    __slots__ = ("alpha", "value")
+
+    def __init__(self, period: int) -> None:
+        self.alpha = 2.0 / (_check_period(period) + 1)
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        e = self.value
+        self.value = float(x) if e != e else e + self.alpha * (float(x) - e)
+        return self.value
+
+    def on_bar(self, high, low, close, volume):
+        return self.update(close)
+
+
+class _Window(_Stream):
+    # somme (et somme des carrés) des valeurs décalées sur un anneau fixe
+    __slots__ = ("period", "_ref", "_ring", "_i", "_n", "_s", "_q")
+
+    def __init__(self, period: int) -> None:
+        self.period = _check_period(period)
+        self._ref = NAN
+        self._ring = [0.0] * self.period
+        self._i = 0
+        self._n = 0
+        self._s = 0.0
+        self._q = 0.0
+
+    def _push(self, x: float) -> float:
+        x = float(x)
+        if self._n == 0:
+            self._ref = x
+        y = x - self._ref
+        old = self._ring[self._i]
+        self._ring[self._i] = y
+        self._i = (self._i + 1) % self.period
+        self._s = self._s + (y - old)
+        self._q = self._q + (y * y - old * old)
+        self._n += 1
+        return y
+
+    def _mean_std(self) -> Tuple[float, float]:
+        m = self._s / self.period
+        var = self._q / self.period - m * m
+        return m, math.sqrt(var if var > 0.0 else 0.0)
+
+    @property
+    def ready(self) -> bool:
+        return self._n >= self.period
+
+
+class SMA(_Window):
+    __slots__ = ()
+
+    def update(self, x: float) -> float:
+        self._push(x)
+        return self._s / self.period + self._ref if self.ready else NAN
+
+    def on_bar(self, high, low, close, volume):
+        return self.update(close)
+
+
+class Bollinger(_Window):
+    __slots__ = ("k",)
+
+    def __init__(self, period: int = 20, k: float = 2.0) -> None:
+        super().__init__(period)
+        self.k = float(k)
+
+    def update(self, x: float) -> Tuple[float, float, float]:
+        self._push(x)
+        if not self.ready:
+            return NAN, NAN, NAN
+        m, sd = self._mean_std()
+        mid = m + self._ref
+        width = self.k * sd
+        return mid, mid + width, mid - width
+
+    def on_bar(self, high, low, close, volume):
+        return self.update(close)
+
+
+class ZScore(_Window):
+    __slots__ = ()
+
+    def update(self, x: float) -> float:
+        y = self._push(x)
+        if not self.ready:
+            return NAN
+        m, sd = self._mean_std()
+        return (y - m) / sd if sd > 0 else 0.0
+
+    def on_bar(self, high, low, close, volume):
+        return self.update(close)
+
+
+class _Wilder:
+    __slots__ = ("period", "_n", "_acc", "value")
+
+    def __init__(self, period: int) -> None:
+        self.period = period
+        self._n = 0
+        self._acc = 0.0
+        self.value = NAN
+
+    def update(self, v: float) -> float:
+        p = self.period
+        self._n += 1
+        if self._n < p:
+            self._acc = v if self._n == 1 else self._acc + v
+        elif self._n == p:
+            self.value = (v if p == 1 else self._acc + v) / p
+        else:
+            self.value = (self.value * (p - 1) + v) / p
+        return self.value
+
+
+class RSI(_Stream):
+    __slots__ = ("_prev", "_gain", "_loss")
+
+    def __init__(self, period: int = 14) -> None:
+        period = _check_period(period)
+        self._prev = NAN
+        self._gain = _Wilder(period)
+        self._loss = _Wilder(period)
+
+    def update(self, x: float) -> float:
+        x = float(x)
+        prev, self._prev = self._prev, x
+        if prev != prev:
+            return NAN
+        d = x - prev
+        ag = self._gain.update(d if d > 0.0 else 0.0)
+        al = self._loss.update(-d if -d > 0.0 else 0.0)
+        return NAN if ag != ag else _rsi_value(ag, al)
+
+    def on_bar(self, high, low, close, volume):
+        return self.update(close)
+
+
+class ATR(_Stream):
+    __slots__ = ("_pc", "_avg")
+
+    def __init__(self, period: int = 14) -> None:
+        self._pc = NAN
+        self._avg = _Wilder(_check_period(period))
+
+    def update(self, high: float, low: float, close: float) -> float:
+        high, low = float(high), float(low)
+        tr = high - low
+        pc = self._pc
+        if pc == pc:
+            tr = max(tr, abs(high - pc), abs(low - pc))
+        self._pc = float(close)
+        return self._avg.update(tr)
+
+    def on_bar(self, high, low, close, volume):
+        return self.update(high, low, close)
+
+
+class VWAP(_Stream):
+    __slots__ = ("_pv", "_v")
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        """Début de session."""
+        self._pv = 0.0
+        self._v = 0.0
+
+    def update(self, price: float, volume: float) -> float:
+        volume = float(volume)
+        self._pv = self._pv + float(price) * volume
+        self._v = self._v + volume
+        return self._pv / self._v if self._v != 0 else NAN
+
+    def on_bar(self, high, low, close, volume):
+        return self.update(close, volume)
+
+
+class IndicatorSet:
+    """
+    Indicateurs streaming pour N symboles: chaque symbole reçoit sa propre
+    copie du jeu d'indicateurs, créée au premier tick. Coût par tick
+    constant (indépendant de l'historique et du nombre de symboles).
+
+    Exemple d'usage:
+      ind = IndicatorSet(lambda: {"ema20": EMA(20), "rsi14": RSI(14), "atr14": ATR(14), "vwap": VWAP()})
+      vals = ind.on_bar("BTCUSDT", high, low, close, volume)   # {"ema20": ..., ...}
+      ind.reset_session("BTCUSDT")                             # VWAP repart à zéro
+
+    Les mêmes valeurs s'obtiennent en batch (ema(closes, 20), rsi(...), ...).
+    """
+
+    def __init__(self, factory: Callable[[], Dict[str, _Stream]]) -> None:
+        self._factory = factory
+        self._symbols: Dict[str, Dict[str, _Stream]] = {}
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._symbols
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._symbols)
+
+    def indicators(self, symbol: str) -> Dict[str, _Stream]:
+        ind = self._symbols.get(symbol)
+        if ind is None:
+            ind = self._symbols[symbol] = self._factory()
+        return ind
+
+    def on_bar(self, symbol: str, high: float, low: float, close: float, volume: float = 0.0) -> Dict[str, object]:
+        return {name: i.on_bar(high, low, close, volume) for name, i in self.indicators(symbol).items()}
+
+    def reset_session(self, symbol: Optional[str] = None) -> None:
+        for sym in ([symbol] if symbol is not None else self.symbols):
+            for i in self._symbols.get(sym, {}).values():
+                if isinstance(i, VWAP):
+                    i.reset()
@@ -0,0 +1,559 @@
+﻿from __future__ import annotations
+
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+log = logging.getLogger("sniper")
+
+# ---------- Format ----------
+#
+# Fichier .tick = en-tête 64 o + enregistrements fixes de 64 o, en ajout seul.
+# Un message (diff, snapshot, trade) = nb + na enregistrements consécutifs
+# (au moins 1), bids d'abord; nb/na sont répétés sur chaque enregistrement.
+#
+#   recv   i8  horodatage local de réception (ns), croissant: index et cadence
+#   ts     i8  horodatage bourse (E / T, ns)
+#   seq    i8  u (diff) | lastUpdateId (snapshot) | id (trade)
+#   first  i8  U (diff)
+#   prev   i8  pu (diff futures, -1 sinon)
+#   price  f8  prix (NaN pour un diff vide)
+#   qty    f8  quantité (0 = niveau retiré)
+#   sym    u2  index dans la table des symboles (.sym)
+#   kind   u1  DEPTH | SNAPSHOT | TRADE
+#   flags  u1  bit 7 = début de message; TRADE: bit 0 = acheteur maker
+#   nb, na u2  niveaux bid / ask du message (TRADE: 1, 0)
+#
+# price et qty sont adjacents: les niveaux d'un message se lisent comme une
+# vue (n, 2) float64 sans copie, directement consommable par OrderBook.
+# Sidecars: .sym (JSON, table des symboles) et .idx (paires int64
+# (recv, n° d'enregistrement) tous les `index_every` enregistrements, en début
+# de message).
+
+RECORD = np.dtype([
+    ("recv", "<i8"), ("ts", "<i8"), ("seq", "<i8"), ("first", "<i8"), ("prev", "<i8"),
+    ("price", "<f8"), ("qty", "<f8"),
+    ("sym", "<u2"), ("kind", "u1"), ("flags", "u1"), ("nb", "<u2"), ("na", "<u2"),
+])
+assert RECORD.itemsize == 64
+
+DEPTH, SNAPSHOT, TRADE = 1, 2, 3
+START = 0x80
+
+MAGIC = b"SNPRTICK"
+VERSION = 1
+_HEADER = struct.Struct("<8sIIqqI")  # magic, version, record size, count, created_ns, index_every
+HEADER_SIZE = 64
+_MAX_SIDE = 0xFFFF
+
+
+def _pairs(raw: Any) -> np.ndarray:
+    # [["30000.10", "0.5"], ...] (chaînes Binance), flottants ou tableau (n, 2)
+    if isinstance(raw, np.ndarray):
+        return raw.reshape(-1, 2).astype(np.float64, copy=False)
+    if not len(raw):
+        return np.empty((0, 2), dtype=np.float64)
+    return np.asarray(raw, dtype=np.float64)
+
+
+def _read_header(path: Path) -> Tuple[int, int, int]:
+    with open(path, "rb") as f:
+        raw = f.read(_HEADER.size)
+    if len(raw) < _HEADER.size:
+        raise ValueError(f"{path}: truncated header")
+    magic, version, size, count, created, every = _HEADER.unpack(raw)
+    if magic != MAGIC or size != RECORD.itemsize:
+        raise ValueError(f"{path}: not a tick file (magic={magic!r}, record={size})")
+    if version != VERSION:
+        raise ValueError(f"{path}: unsupported tick file version {version}")
+    return count, created, every
+
+
+# ---------- Enregistrement ----------
+
+class MarketRecorder:
+    """
+    Enregistreur binaire append-only des diffs de profondeur, snapshots et
+    trades, écrit directement dans un fichier mappé en mémoire (mmap)
+    préalloué par blocs de `chunk_mb`. Le compteur d'enregistrements de
+    l'en-tête n'avance qu'au flush (toutes les `flush_every` s ou via
+    flush()): un lecteur, ou une reprise après crash, ne voit que des
+    messages complets. Nouveau segment dès `segment_mb` atteints.
+
+    Exemple d'usage:
+      rec = MarketRecorder("data/market", prefix="binance-futures")
+      dom = DomReader(api, futures=True, recorder=rec)   # diffs + snapshots
+      rec.record_trade(trade_msg)                        # flux @trade
+      rec.close()
+    """
+
+    def __init__(
+        self,
+        directory: str | Path = "data/market",
+        *,
+        prefix: str = "ticks",
+        segment_mb: float = 1024.0,
+        chunk_mb: float = 64.0,
+        index_every: int = 4096,
+        flush_every: float = 1.0,
+        clock_ns: Callable[[], int] = time.time_ns,
+    ) -> None:
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.prefix = prefix
+        self.chunk = max(1, int(chunk_mb * 1024 * 1024) // RECORD.itemsize)
+        self.segment_records = max(self.chunk, int(segment_mb * 1024 * 1024) // RECORD.itemsize)
+        self.index_every = index_every
+        self.flush_every = flush_every
+        self._clock_ns = clock_ns
+        self._symbols: Dict[str, int] = {}
+        self._f = None
+        self._mm: Optional[mmap.mmap] = None
+        self._rec: Optional[np.ndarray] = None
+        self.path: Optional[Path] = None
+        self.paths: List[Path] = []
+        self.count = 0
+        self.capacity = 0
+        self.total_records = 0
+        self._last_index = -index_every
+        self._idx = None
+        self._last_flush = time.monotonic()
+
+    # ---------- Segments ----------
+
+    def _open_segment(self, recv: int) -> None:
+        stamp = datetime.fromtimestamp(recv / 1e9, tz=timezone.utc).strftime("%Y%m%d-%H%M%S")
+        path = self.dir / f"{self.prefix}-{stamp}.tick"
+        k = 1
+        while path.exists():
+            path = self.dir / f"{self.prefix}-{stamp}-{k}.tick"
+            k += 1
+        self.path = path
+        self.paths.append(path)
+        self._f = open(path, "w+b")
+        self._f.write(_HEADER.pack(MAGIC, VERSION, RECORD.itemsize, 0, recv, self.index_every).ljust(HEADER_SIZE, b"\0"))
+        self._f.flush()
+        self._idx = open(path.with_suffix(".idx"), "wb")
+        self._symbols = {}
+        self._write_symbols()
+        self.count = 0
+        self.capacity = 0
+        self._last_index = -self.index_every
+        self._grow(self.chunk)
+
+    def _grow(self, capacity: int) -> None:
+        self._rec = None
+        if self._mm is not None:
+            self._mm.close()
+        self._f.truncate(HEADER_SIZE + capacity * RECORD.itemsize)
+        self._mm = mmap.mmap(self._f.fileno(), HEADER_SIZE + capacity * RECORD.itemsize)
+        self._rec = np.frombuffer(self._mm, dtype=RECORD, count=capacity, offset=HEADER_SIZE)
+        self.capacity = capacity
+
+    def _close_segment(self) -> None:
+        if self._f is None:
+            return
+        self._flush_header()
+        self._rec = None
+        self._mm.close()
+        self._mm = None
+        self._f.truncate(HEADER_SIZE + self.count * RECORD.itemsize)
+        self._f.close()
+        self._f = None
+        self._idx.close()
+        self._idx = None
+
+    def _write_symbols(self) -> None:
+        tmp = self.path.with_suffix(".sym.tmp")
+        tmp.write_text(json.dumps(list(self._symbols)), encoding="utf-8")
+        os.replace(tmp, self.path.with_suffix(".sym"))
+
+    def _sym(self, symbol: str) -> int:
+        i = self._symbols.get(symbol)
+        if i is None:
+            i = self._symbols[symbol] = len(self._symbols)
+            self._write_symbols()
+        return i
+
+    def _flush_header(self) -> None:
+        self._mm[16:24] = struct.pack("<q", self.count)
+        self._idx.flush()
+        self._last_flush = time.monotonic()
+
+    def flush(self) -> None:
+        """Publie les enregistrements écrits (compteur d'en-tête) et synchronise le mmap."""
+        if self._f is not None:
+            self._flush_header()
+            self._mm.flush()
+
+    def close(self) -> None:
+        self._close_segment()
+
+    def __enter__(self) -> "MarketRecorder":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    # ---------- Écriture ----------
+
+    def _claim(self, n: int, recv: int) -> np.ndarray:
+        if self._f is None or self.count + n > self.segment_records and self.count:
+            self._close_segment()
+            self._open_segment(recv)
+        if self.count + n > self.capacity:
+            self._grow(self.capacity + max(self.chunk, n))
+        if self.count - self._last_index >= self.index_every:
+            self._idx.write(struct.pack("<qq", recv, self.count))
+            self._last_index = self.count
+        rows = self._rec[self.count:self.count + n]
+        self.count += n
+        self.total_records += n
+        return rows
+
+    def _commit(self) -> None:
+        if time.monotonic() - self._last_flush >= self.flush_every:
+            self._flush_header()
+
+    def _levels(self, kind: int, symbol: str, seq: int, first: int, prev: int, ts: int,
+                bids: Any, asks: Any, recv: Optional[int]) -> int:
+        recv = self._clock_ns() if recv is None else recv
+        b, a = _pairs(bids), _pairs(asks)
+        nb, na = len(b), len(a)
+        if nb > _MAX_SIDE or na > _MAX_SIDE:
+            raise ValueError(f"too many levels in one message ({nb}/{na} > {_MAX_SIDE})")
+        n = max(1, nb + na)
+        rows = self._claim(n, recv)
+        sym = self._sym(symbol)
+        rows["recv"] = recv
+        rows["ts"] = ts
+        rows["seq"] = seq
+        rows["first"] = first
+        rows["prev"] = prev
+        rows["sym"] = sym
+        rows["kind"] = kind
+        rows["flags"] = 0
+        rows["flags"][0] = START
+        rows["nb"] = nb
+        rows["na"] = na
+        if nb + na:
+            price, qty = rows["price"], rows["qty"]
+            price[:nb], qty[:nb] = b[:, 0], b[:, 1]
+            price[nb:], qty[nb:] = a[:, 0], a[:, 1]
+        else:
+            rows["price"] = np.nan
+            rows["qty"] = 0.0
+        self._commit()
+        return n
+
+    def record_depth(self, evt: Mapping[str, Any], recv_ns: Optional[int] = None) -> int:
+        """Diff depthUpdate Binance (spot ou futures); retourne le nombre d'enregistrements."""
+        evt = evt.get("data", evt)
+        return self._levels(DEPTH, evt["s"], int(evt["u"]), int(evt["U"]), int(evt.get("pu", -1)),
+                            int(evt.get("E", 0)) * 1_000_000, evt.get("b", ()), evt.get("a", ()), recv_ns)
+
+    def record_snapshot(self, symbol: str, snap: Mapping[str, Any], recv_ns: Optional[int] = None) -> int:
+        """Snapshot REST {"lastUpdateId", "bids", "asks"}."""
+        ts = int(snap.get("E", snap.get("T", 0))) * 1_000_000
+        return self._levels(SNAPSHOT, symbol, int(snap["lastUpdateId"]), 0, -1, ts,
+                            snap.get("bids", ()), snap.get("asks", ()), recv_ns)
+
+    def record_trade(self, evt: Mapping[str, Any], recv_ns: Optional[int] = None) -> int:
+        """Trade (@trade / @aggTrade): s, t|a, p, q, T, m."""
+        evt = evt.get("data", evt)
+        recv = self._clock_ns() if recv_ns is None else recv_ns
+        row = self._claim(1, recv)
+        row["recv"] = recv
+        row["ts"] = int(evt.get("T", evt.get("E", 0))) * 1_000_000
+        row["seq"] = int(evt.get("t", evt.get("a", 0)))
+        row["first"] = 0
+        row["prev"] = -1
+        row["price"] = float(evt["p"])
+        row["qty"] = float(evt["q"])
+        row["sym"] = self._sym(evt["s"])
+        row["kind"] = TRADE
+        row["flags"] = START | (1 if evt.get("m") else 0)
+        row["nb"] = 1
+        row["na"] = 0
+        self._commit()
+        return 1
+
+    def write_records(self, records: np.ndarray, symbols: Sequence[str]) -> None:
+        """Ajout en bloc de messages déjà encodés (conversion, tests); `symbols` = table de `records`."""
+        if not len(records):
+            return
+        rows = self._claim(len(records), int(records["recv"][0]))
+        remap = np.array([self._sym(s) for s in symbols] if symbols else [0], dtype=np.uint16)
+        rows[:] = records
+        rows["sym"] = remap[records["sym"]]
+        self._commit()
+
+    @property
+    def bytes_written(self) -> int:
+        return self.total_records * RECORD.itemsize
+
+
+# ---------- Lecture ----------
+
+class MarketFile:
+    """
+    Segment .tick ouvert en lecture seule via np.memmap: `records` est une
+    vue sur le fichier, aucune copie. Un fichier en cours d'écriture peut
+    être relu avec refresh() (compteur d'en-tête).
+
+    Exemple d'usage:
+      f = MarketFile("data/market/ticks-20250101-000000.tick")
+      f.records["price"], f.symbols
+      i, j = f.range(start_ns, end_ns)     # via l'index .idx
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.refresh()
+
+    def refresh(self) -> None:
+        count, self.created_ns, self.index_every = _read_header(self.path)
+        size = self.path.stat().st_size
+        count = min(count, (size - HEADER_SIZE) // RECORD.itemsize)
+        self.count = count
+        if count:
+            self.records = np.memmap(self.path, dtype=RECORD, mode="r", offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.records = np.empty(0, dtype=RECORD)
+        sym = self.path.with_suffix(".sym")
+        self.symbols: List[str] = json.loads(sym.read_text(encoding="utf-8")) if sym.exists() else []
+        idx = self.path.with_suffix(".idx")
+        raw = np.fromfile(idx, dtype="<i8") if idx.exists() else np.empty(0, dtype="<i8")
+        raw = raw[: len(raw) // 2 * 2].reshape(-1, 2)
+        self.index = raw[raw[:, 1] < count]
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def nbytes(self) -> int:
+        return self.count * RECORD.itemsize
+
+    def _seek(self, recv_ns: int) -> int:
+        """Premier début de message dont recv >= recv_ns: index, puis recherche par blocs."""
+        if not self.count:
+            return 0
+        k = int(np.searchsorted(self.index[:, 0], recv_ns, side="right")) - 1
+        pos = int(self.index[k, 1]) if k >= 0 else 0
+        step = max(self.index_every, 1024)
+        recv, flags = self.records["recv"], self.records["flags"]
+        while pos < self.count:
+            end = min(self.count, pos + step)
+            hit = np.flatnonzero((recv[pos:end] >= recv_ns) & (flags[pos:end] & START != 0))
+            if len(hit):
+                return pos + int(hit[0])
+            pos = end
+        return self.count
+
+    def message_start(self, k: int) -> int:
+        """Début du message contenant l'enregistrement k."""
+        flags = self.records["flags"]
+        while k > 0 and not flags[k] & START:
+            lo = max(0, k - 4096)
+            hit = np.flatnonzero(flags[lo:k + 1] & START)
+            if len(hit):
+                return lo + int(hit[-1])
+            k = lo
+        return k
+
+    def range(self, start_ns: Optional[int] = None, end_ns: Optional[int] = None) -> Tuple[int, int]:
+        """[i, j) des enregistrements dont recv est dans [start_ns, end_ns), bornés aux messages."""
+        i = 0 if start_ns is None else self._seek(start_ns)
+        j = self.count if end_ns is None else self._seek(end_ns)
+        return i, max(i, j)
+
+    def pairs(self, i: int, n: int) -> np.ndarray:
+        """Vue (n, 2) [prix, qty] sur les enregistrements i..i+n, sans copie."""
+        base = self.records["price"][i:i + n]
+        return np.lib.stride_tricks.as_strided(base, shape=(n, 2), strides=(RECORD.itemsize, 8), writeable=False)
+
+
+def list_segments(source: str | Path | Iterable[str | Path], prefix: str = "") -> List[Path]:
+    if isinstance(source, (str, Path)):
+        p = Path(source)
+        if p.is_dir():
+            return sorted(q for q in p.glob(f"{prefix}*.tick"))
+        return [p]
+    # liste mêlant fichiers et répertoires (CLI: plusieurs sources)
+    return [q for s in source for q in list_segments(s, prefix)]
+
+
+# ---------- Rejeu ----------
+
+@dataclass
+class ReplayStats:
+    messages: int = 0
+    records: int = 0
+    depth: int = 0
+    snapshots: int = 0
+    trades: int = 0
+    seconds: float = 0.0
+    lag_max_s: float = 0.0   # retard max sur la cadence demandée (speed != None)
+
+    @property
+    def mb_per_s(self) -> float:
+        return self.records * RECORD.itemsize / 1e6 / self.seconds if self.seconds else 0.0
+
+
+class MarketReplay:
+    """
+    Rejoue des segments .tick dans l'ordre d'enregistrement, à l'identique:
+    mêmes messages, même ordre, horodatages bourse d'origine (E/T). Les
+    messages ont la forme Binance utilisée en direct, les niveaux étant des
+    vues (n, 2) sur le mmap:
+      - diff:     {"e": "depthUpdate", "E", "s", "U", "u", "pu"?, "b", "a"}
+      - snapshot: {"s", "lastUpdateId", "bids", "asks"}
+      - trade:    {"e": "trade", "E", "T", "s", "t", "p", "q", "m"}
+    Cadence: speed=None au plus vite, 1.0 temps réel (recv d'origine), N = N x.
+
+    Exemple d'usage:
+      rp = MarketReplay("data/market", speed=None, start_ns=t0, symbols={"BTCUSDT"})
+      rp.run(dom=DomReader(futures=True), bars=BarAggregator(["1m"]))
+      replay(flow_engine, MarketReplay(path).messages())    # orderflow.flow_decision_engine
+      for f, recs in rp.blocks(): ...                       # vues brutes, traitement vectorisé
+    """
+
+    def __init__(
+        self,
+        source: str | Path | Iterable[str | Path],
+        *,
+        speed: Optional[float] = None,
+        start_ns: Optional[int] = None,
+        end_ns: Optional[int] = None,
+        symbols: Optional[Iterable[str]] = None,
+        prefix: str = "",
+    ) -> None:
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be > 0 (or None for as fast as possible)")
+        self.paths = list_segments(source, prefix)
+        self.speed = speed
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+        self.symbols = set(symbols) if symbols is not None else None
+        self.stats = ReplayStats()
+
+    def files(self) -> Iterator[MarketFile]:
+        for p in self.paths:
+            f = MarketFile(p)
+            if f.count:
+                yield f
+
+    def blocks(self, max_records: int = 1 << 16) -> Iterator[Tuple[MarketFile, np.ndarray]]:
+        """Tranches brutes (vues) de la fenêtre [start_ns, end_ns), coupées en bord de message."""
+        for f in self.files():
+            i, j = f.range(self.start_ns, self.end_ns)
+            rec = f.records
+            while i < j:
+                k = min(j, i + max_records)
+                if k < j:
+                    # coupe au début du message à cheval (ou après lui s'il dépasse max_records)
+                    start = f.message_start(k)
+                    k = start if start > i else min(j, i + max(1, int(rec["nb"][i]) + int(rec["na"][i])))
+                yield f, rec[i:k]
+                i = k
+
+    def messages(self) -> Iterator[Dict[str, Any]]:
+        st = self.stats = ReplayStats()
+        t_start = time.perf_counter()
+        recv0: Optional[int] = None
+        speed = self.speed
+        for f in self.files():
+            syms = f.symbols
+            keep = None
+            if self.symbols is not None:
+                keep = np.array([s in self.symbols for s in syms] or [False])
+            i, j = f.range(self.start_ns, self.end_ns)
+            rec = f.records
+            # colonnes scalaires extraites une fois par fichier (vues, pas de copie)
+            recv_c, ts_c, seq_c, first_c, prev_c = rec["recv"], rec["ts"], rec["seq"], rec["first"], rec["prev"]
+            sym_c, kind_c, flags_c, nb_c, na_c = rec["sym"], rec["kind"], rec["flags"], rec["nb"], rec["na"]
+            price_c, qty_c = rec["price"], rec["qty"]
+            while i < j:
+                nb, na = int(nb_c[i]), int(na_c[i])
+                n = max(1, nb + na)
+                sym = int(sym_c[i])
+                if keep is not None and not keep[sym]:
+                    i += n
+                    continue
+                if speed is not None:
+                    recv = int(recv_c[i])
+                    if recv0 is None:
+                        recv0 = recv
+                    delay = (recv - recv0) / 1e9 / speed - (time.perf_counter() - t_start)
+                    if delay > 0:
+                        time.sleep(delay)
+                    elif -delay > st.lag_max_s:
+                        st.lag_max_s = -delay
+                kind = int(kind_c[i])
+                symbol = syms[sym]
+                if kind == DEPTH:
+                    lv = f.pairs(i, nb + na)
+                    msg: Dict[str, Any] = {
+                        "e": "depthUpdate", "E": int(ts_c[i]) // 1_000_000, "s": symbol,
+                        "U": int(first_c[i]), "u": int(seq_c[i]), "b": lv[:nb], "a": lv[nb:],
+                    }
+                    prev = int(prev_c[i])
+                    if prev >= 0:
+                        msg["pu"] = prev
+                    st.depth += 1
+                elif kind == SNAPSHOT:
+                    lv = f.pairs(i, nb + na)
+                    msg = {"s": symbol, "lastUpdateId": int(seq_c[i]), "E": int(ts_c[i]) // 1_000_000,
+                           "bids": lv[:nb], "asks": lv[nb:]}
+                    st.snapshots += 1
+                else:
+                    ts = int(ts_c[i]) // 1_000_000
+                    msg = {"e": "trade", "E": ts, "T": ts, "s": symbol, "t": int(seq_c[i]),
+                           "p": float(price_c[i]), "q": float(qty_c[i]), "m": bool(flags_c[i] & 1)}
+                    st.trades += 1
+                st.messages += 1
+                st.records += n
+                i += n
+                yield msg
+        st.seconds = time.perf_counter() - t_start
+
+    def run(
+        self,
+        *,
+        dom: Any = None,
+        flow: Any = None,
+        bars: Any = None,
+        on_message: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> ReplayStats:
+        """
+        Alimente les consommateurs par leurs interfaces live:
+          dom  (DomReader):          on_message(diff), book(s).load_snapshot(snap)
+          flow (FlowDecisionEngine): on_event(diff), load_snapshot(s, snap)
+          bars (BarAggregator):      on_tick(s, T en s, p, q) pour chaque trade
+        """
+        for msg in self.messages():
+            if "lastUpdateId" in msg:
+                if dom is not None:
+                    dom.book(msg["s"]).load_snapshot(msg)
+                if flow is not None:
+                    flow.load_snapshot(msg["s"], msg)
+            elif msg.get("e") == "trade":
+                if bars is not None:
+                    bars.on_tick(msg["s"], msg["T"] / 1000.0, msg["p"], msg["q"])
+            else:
+                if dom is not None:
+                    dom.on_message(msg)
+                if flow is not None:
+                    flow.on_event(msg)
+            if on_message is not None:
+                on_message(msg)
+        return self.stats
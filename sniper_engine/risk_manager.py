@@ -0,0 +1,171 @@
+﻿from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional
+from zoneinfo import ZoneInfo
+
+log = logging.getLogger("sniper")
+
+# reset_time des comptes prop: heure de Paris, quel que soit le fuseau du serveur
+PROP_TZ = ZoneInfo("Europe/Paris")
+
+
+def prop_time(ts: datetime) -> datetime:
+    """Heure prop naïve: un ts aware est converti en Europe/Paris, un ts naïf est supposé déjà l'être."""
+    return ts if ts.tzinfo is None else ts.astimezone(PROP_TZ).replace(tzinfo=None)
+
+
+# --------- KPIs prop firm (incrémental) ---------
+
+@dataclass
+class PropAccountRules:
+    id: str
+    initial_capital: float = 0.0
+    reset_time: str = ""              # "HH:MM", heure de Paris (PROP_TZ)
+    daily_loss_limit: float = 0.0
+    max_drawdown: float = 0.0
+    drawdown_type: str = "trailing"   # static | trailing
+
+    @classmethod
+    def from_config(cls, account: Dict[str, Any]) -> "PropAccountRules":
+        rules = account.get("rules", {}) or {}
+        return cls(
+            id=str(account.get("id")),
+            initial_capital=float(account.get("initial_capital", 0.0) or 0.0),
+            reset_time=str(account.get("reset_time", "") or ""),
+            daily_loss_limit=float(rules.get("daily_loss_limit", 0.0) or 0.0),
+            max_drawdown=float(rules.get("max_drawdown", 0.0) or 0.0),
+            drawdown_type=str(rules.get("drawdown_type", "trailing") or "trailing"),
+        )
+
+    def period_of(self, ts: datetime) -> date:
+        # journée prop = de reset_time à reset_time
+        try:
+            hh, mm = [int(x) for x in self.reset_time.split(":")]
+        except ValueError:
+            hh, mm = 0, 0
+        return (prop_time(ts) - timedelta(hours=hh, minutes=mm)).date()
+
+
+@dataclass
+class _AccountState:
+    rules: PropAccountRules
+    equity_now: Optional[float] = None
+    equity_ts: Optional[datetime] = None
+    peak: Optional[float] = None
+    pnl_day: float = 0.0
+    period: Optional[date] = None
+    lock: Lock = field(default_factory=Lock)
+
+    def roll(self, ts: datetime) -> bool:
+        """Avance la journée prop jusqu'à ts; False si ts tombe dans une journée déjà close."""
+        period = self.rules.period_of(ts)
+        if self.period is None or period > self.period:
+            self.period = period
+            self.pnl_day = 0.0
+        return period == self.period
+
+
+def _pct_safe(numer: float, denom: Optional[float]) -> Optional[int]:
+    if denom is None or denom <= 0:
+        return None
+    return max(0, min(100, int(round((numer / denom) * 100))))
+
+
+class PropKpiEngine:
+    """
+    KPIs prop firm tenus à jour ligne par ligne (ou par paquet de lignes):
+    pic, drawdown trailing/static, PnL du jour remis à zéro à `reset_time`,
+    marges restantes. `kpis(account_id)` est O(1).
+
+    Exemple d'usage:
+      eng = PropKpiEngine(load_prop_rules()["accounts"])
+      eng.on_equity("FTMO10K", ts, 100150.0)
+      eng.on_trade("FTMO10K", -50.0, ts)
+      eng.kpis("FTMO10K")   # equity_now, pnl_day, dd_current, margin_*_left, *_pct
+    """
+
+    def __init__(self, accounts: Iterable[Dict[str, Any]] = ()) -> None:
+        self._states: Dict[str, _AccountState] = {}
+        self.set_rules(accounts)
+
+    def set_rules(self, accounts: Iterable[Dict[str, Any]]) -> None:
+        # rechargement des règles: l'état (pic, PnL) est conservé
+        for acc in accounts:
+            rules = PropAccountRules.from_config(acc)
+            st = self._states.get(rules.id)
+            if st is None:
+                self._states[rules.id] = _AccountState(rules=rules)
+            else:
+                st.rules = rules
+
+    def _state(self, account_id: str) -> _AccountState:
+        st = self._states.get(account_id)
+        if st is None:
+            st = self._states[account_id] = _AccountState(rules=PropAccountRules(id=account_id))
+        return st
+
+    @property
+    def account_ids(self) -> List[str]:
+        return list(self._states)
+
+    def on_equity(self, account_id: str, ts: datetime, equity: float, *, peak: Optional[float] = None) -> None:
+        """`peak` = max d'un paquet de lignes dont (ts, equity) est la dernière."""
+        st = self._state(account_id)
+        hi = float(equity) if peak is None else max(float(peak), float(equity))
+        with st.lock:
+            st.peak = hi if st.peak is None else max(st.peak, hi)
+            # ligne en retard: elle compte pour le pic, pas pour l'equity courante
+            if st.equity_ts is None or ts >= st.equity_ts:
+                st.equity_ts = ts
+                st.equity_now = float(equity)
+
+    def on_trade(self, account_id: str, pnl: float, ts: Optional[datetime] = None) -> None:
+        st = self._state(account_id)
+        ts = ts or datetime.now(PROP_TZ)
+        with st.lock:
+            if st.roll(ts):
+                st.pnl_day += float(pnl)
+                return
+        # trade d'une journée déjà remise à zéro: ne touche pas le PnL du jour
+        log.warning(f"prop kpi: late trade for {account_id} at {ts} ignored (period {st.period} already open)")
+
+    def kpis(self, account_id: str, now: Optional[datetime] = None) -> Dict[str, Any]:
+        st = self._state(account_id)
+        r = st.rules
+        with st.lock:
+            st.roll(now or datetime.now(PROP_TZ))
+            equity_now, peak, pnl_day = st.equity_now, st.peak, st.pnl_day
+
+        dd_current = None
+        if equity_now is not None:
+            if r.drawdown_type == "static" and r.initial_capital > 0:
+                dd_current = max(0.0, r.initial_capital - equity_now)
+            else:
+                dd_current = max(0.0, peak - equity_now)
+
+        margin_daily_left = r.daily_loss_limit - max(0.0, -pnl_day)
+        margin_dd_left = None
+        if dd_current is not None and r.max_drawdown > 0:
+            margin_dd_left = r.max_drawdown - dd_current
+
+        daily_pct = _pct_safe(margin_daily_left, r.daily_loss_limit) if r.daily_loss_limit > 0 else None
+        dd_pct = _pct_safe(margin_dd_left, r.max_drawdown) if (r.max_drawdown and margin_dd_left is not None) else None
+
+        return {
+            "equity_now": equity_now,
+            "pnl_day": pnl_day,
+            "dd_current": dd_current,
+            "daily_loss_limit": r.daily_loss_limit,
+            "max_drawdown": r.max_drawdown,
+            "margin_daily_left": margin_daily_left,
+            "margin_dd_left": margin_dd_left,
+            "daily_pct": daily_pct,
+            "dd_pct": dd_pct,
+        }
+
+    def all_kpis(self, now: Optional[datetime] = None) -> Dict[str, Dict[str, Any]]:
+        return {acc: self.kpis(acc, now) for acc in self.account_ids}
@@ -1,36 +1,87 @@
-﻿import json
+﻿import time
+
+_T0 = time.perf_counter()
+
+import argparse
+import importlib
+import json
 import logging, logging.config
+import sys
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Optional
+
+# yaml / pydantic / modules_utils sont importés dans leur phase de boot
+# (voir --profile-boot), pas au chargement du script.
+
+
+class _BootProfile:
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.phases = []
+        self.imports = []
+
+    @contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - t0))
 
-import yaml
+    def load(self, module: str):
+        if module in sys.modules:
+            return sys.modules[module]
+        t0 = time.perf_counter()
+        mod = importlib.import_module(module)
+        self.imports.append((module, time.perf_counter() - t0))
+        return mod
 
-from modules_utils.config_loader import ConfigLoader
-from modules_utils.rate_limiter import RateLimiter
-from modules_utils.health import run_health_checks   # ← NEW
+    def report(self) -> str:
+        lines = ["== boot profile (ms) =="]
+        lines += [f"phase   {name:<32}{dt * 1000:9.1f}" for name, dt in self.phases]
+        lines += [f"import  {name:<32}{dt * 1000:9.1f}" for name, dt in self.imports]
+        lines.append(f"total   {'(since script start)':<32}{(time.perf_counter() - _T0) * 1000:9.1f}")
+        return "\n".join(lines)
 
-def setup_logging(cfg_path: Path = Path("config/logging.yml")):
+
+def setup_logging(cfg_path: Path = Path("config/logging.yml"), prof: Optional[_BootProfile] = None):
+    prof = prof or _BootProfile(False)
+    yaml = prof.load("yaml")
     with open(cfg_path, "r", encoding="utf-8") as f:
         cfg = yaml.safe_load(f)
     logging.config.dictConfig(cfg)
 
-def main():
-    setup_logging()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SNIPER boot")
+    parser.add_argument("--profile-boot", action="store_true", help="affiche le temps de chaque phase de boot")
+    parser.add_argument("--watchdog", action="store_true", help="reste actif: health checks périodiques + /metrics")
+    args = parser.parse_args(argv)
+    prof = _BootProfile(args.profile_boot)
+
+    with prof.phase("logging_setup"):
+        setup_logging(prof=prof)
     log = logging.getLogger("sniper")
     log.info("boot: starting SNIPER")
 
     # --- Load configs ---
-    loader = ConfigLoader("config")
-    risk = loader.load_risk()
-    system = loader.load_system()
-    api_limits = loader.load_api_limits()
-    summary = loader.summarize_limits(api_limits)
+    with prof.phase("config_load"):
+        prof.load("pydantic")
+        ConfigLoader = prof.load("modules_utils.config_loader").ConfigLoader
+        loader = ConfigLoader("config")
+        risk = loader.load_risk()
+        system = loader.load_system()
+        api_limits = loader.load_api_limits()
+        summary = loader.summarize_limits(api_limits)
 
     log.info(f"system: mode={system.mode}, logging_cfg={system.logging_cfg}")
     log.info(f"risk: dd={risk.max_daily_dd_pct}%, r/trade={risk.max_trade_r_pct}%, targetRR={risk.target_rr}")
     log.info("api_limits: " + json.dumps(summary, ensure_ascii=False))
 
     # --- Health checks (watchdog) ---
-    report = run_health_checks(Path("."))
+    with prof.phase("health_checks"):
+        run_health_checks = prof.load("modules_utils.health").run_health_checks
+        report = run_health_checks(Path("."))
     if report.ok:
         log.info("health: OK")
     else:
@@ -39,12 +90,48 @@ def main():
         log.info(f"health::{k} => {v}")
 
     # --- Rate limiter demo (kept) ---
-    rl = RateLimiter()
-    rl.set_limit_from_summary('binance.futures', summary, burst=40)
-    rl.call('binance.futures', cost=5)
+    with prof.phase("rate_limiter_init"):
+        RateLimiter = prof.load("modules_utils.rate_limiter").RateLimiter
+        rl = RateLimiter()
+        rl.set_limit_from_summary('binance.futures', summary, burst=40)
+        rl.call('binance.futures', cost=5)
     log.info("rate_limiter: first weighted call (binance.futures cost=5) passed")
 
+    # --- Hot reload: api_limits.yml / risk.yml modifiés -> poussés sans restart ---
+    def _on_api_limits(api):
+        rl.set_limit_from_summary('binance.futures', loader.summarize_limits(api), burst=40)
+
+    def _on_risk(new_risk):
+        # RiskGate.set_risk(new_risk) pour un pipeline de décision lancé depuis ce process
+        nonlocal risk
+        risk = new_risk
+        log.info(f"risk reloaded: dd={risk.max_daily_dd_pct}%, r/trade={risk.max_trade_r_pct}%, targetRR={risk.target_rr}")
+    loader.subscribe("api_limits.yml", _on_api_limits)
+    loader.subscribe("risk.yml", _on_risk)
+    loader.start_watching()
+
+    # --- Archivage des logs (thread de fond) ---
+    if system.archive.enabled:
+        with prof.phase("log_archiver_start"):
+            LogArchiver = prof.load("modules_utils.archive_logs").LogArchiver
+            arc = system.archive
+            archiver = LogArchiver("logs", arc.dir, codec=arc.codec, db_keep_days=arc.db_keep_days,
+                                   max_age_days=arc.max_age_days, max_total_mb=arc.max_total_mb)
+            archiver.start(interval=arc.interval_s)
+
     print("SNIPER boot OK. See logs/system.log and console.")
+    if prof.enabled:
+        print(prof.report())
+
+    # --- Watchdog: health checks en continu + métriques HTTP (Ctrl-C pour sortir) ---
+    if args.watchdog:
+        HealthWatchdog = prof.load("modules_utils.health_watchdog").HealthWatchdog
+        wd_cfg = system.watchdog
+        wd = HealthWatchdog(interval=wd_cfg.interval_s, host=wd_cfg.host, port=wd_cfg.port)
+        wd.watch_rate_limiter("main", rl)
+        wd.watch_logging_queues("sniper")
+        print(f"health watchdog: http://{wd_cfg.host}:{wd_cfg.port}/metrics")
+        wd.serve_forever()
     return 0 if report.ok else 1
 
 if __name__ == "__main__":
@@ -0,0 +1,59 @@
+﻿import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from modules_utils.rate_limiter import RateLimiter
+from sniper_engine.api_handler import ApiHandler
+
+HITS = []
+
+
+class _FakeBinance(BaseHTTPRequestHandler):
+    # 1er appel -> 429 + Retry-After: 1, ensuite 200 avec used-weight presque plein
+    def do_GET(self):
+        HITS.append(time.monotonic())
+        if len(HITS) == 1:
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.end_headers()
+            return
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('X-MBX-USED-WEIGHT-1M', '2395')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), _FakeBinance)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{srv.server_port}/fapi/v1/depth'
+
+    rl = RateLimiter()
+    rl.set_limit('binance.futures', rps=40, burst=40)
+    api = ApiHandler(rl)
+
+    r = api.get('binance.futures', url, params={'symbol': 'BTCUSDT'}, cost=5)
+    assert r.ok and r.json() == {'ok': True}
+    assert HITS[1] - HITS[0] >= 0.95, HITS  # Retry-After respecté
+
+    # 2400 rpm - 2395 utilisés -> 5 tokens max, le prochain coût 5 passe, le suivant attend
+    assert rl.try_call('binance.futures', cost=5)
+    assert not rl.try_call('binance.futures', cost=5)
+
+    # sans Retry-After: backoff exponentiel avec jitter, borné
+    rl2 = RateLimiter(backoff_base=0.5, backoff_cap=4)
+    rl2.set_limit('fred', rps=2)
+    delays = [rl2.report('fred', 429) for _ in range(6)]
+    assert all(0.25 <= d <= 4 for d in delays) and delays[-1] >= 2, delays
+    assert rl2.report('fred', 200) == 0.0
+    srv.shutdown()
+    print('Adaptive backoff smoke OK', [round(d, 2) for d in delays])
+
+
+if __name__ == '__main__':
+    main()
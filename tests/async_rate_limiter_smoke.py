@@ -0,0 +1,54 @@
+﻿import asyncio
+import time
+
+from modules_utils.config_loader import ConfigLoader
+from modules_utils.rate_limiter import AsyncRateLimiter
+
+
+async def main_async():
+    loader = ConfigLoader('config')
+    summary = loader.summarize_limits(loader.load_api_limits())
+
+    rl = AsyncRateLimiter()
+    rl.set_limit_from_summary('binance.futures', summary, burst=40)
+    rl.set_limit_from_summary('binance.futures.orders', summary, burst=20)
+    rl.set_limit('fifo', rps=500, burst=5)
+
+    t0 = time.monotonic()
+    # 60 coroutines: poids 1 + 1 ordre chacune (orders = 20 rps, burst 20)
+    await asyncio.gather(*[
+        rl.acquire_many({'binance.futures': 1, 'binance.futures.orders': 1})
+        for _ in range(60)
+    ])
+    dt = time.monotonic() - t0
+    # 20 en burst puis 40 à 20 rps -> ~2 s: pas de sur-attente ni de famine
+    assert 1.9 <= dt <= 2.3, dt
+
+    # 2000 coroutines sur un bucket: réveil dans l'ordre d'arrivée
+    order = []
+
+    async def worker(i):
+        await rl.acquire('fifo', cost=1)
+        order.append(i)
+
+    tasks = [asyncio.create_task(worker(i)) for i in range(2000)]
+    await asyncio.sleep(0.01)
+    tasks[1000].cancel()   # une annulation ne doit pas bloquer la file
+    await asyncio.gather(*tasks, return_exceptions=True)
+    assert order == [i for i in range(2000) if i != 1000]
+
+    # capacité abaissée sous le coût d'un waiter en file: ValueError pour lui, ceux derrière passent
+    rl.set_limit('shrink', rps=10, burst=10)
+    await rl.acquire('shrink', cost=10)
+    big = asyncio.create_task(rl.acquire('shrink', cost=8))
+    small = asyncio.create_task(rl.acquire('shrink', cost=1))
+    await asyncio.sleep(0.01)
+    rl.set_limit('shrink', rps=10, burst=5)
+    done, pending = await asyncio.wait([big, small], timeout=1.0)
+    assert not pending and isinstance(big.exception(), ValueError) and small.exception() is None
+
+    print(f'AsyncRateLimiter smoke OK in {time.monotonic() - t0:.2f}s')
+
+
+if __name__ == '__main__':
+    asyncio.run(main_async())
@@ -0,0 +1,134 @@
+﻿import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from sniper_engine import indicators, trading
+from sniper_engine.backtest import (
+    BacktestEngine, SharedBars, bars_from_ticks, load_result, param_grid, walk_forward_windows,
+)
+from sniper_engine.market_recorder import MarketRecorder
+
+T0 = 1_699_999_980.0  # aligné sur la minute
+
+
+def _bars(n: int, seed: int = 11):
+    """Marche aléatoire 1m avec régimes (tendance / retour à la moyenne)."""
+    rnd = np.random.default_rng(seed)
+    drift = np.repeat(rnd.normal(0, 2e-4, n // 2000 + 1), 2000)[:n]
+    close = 100.0 * np.exp(np.cumsum(drift + rnd.normal(0, 1e-3, n)))
+    spread = np.abs(rnd.normal(0, 5e-4, n)) * close
+    return {'ts': T0 + 60.0 * np.arange(n), 'close': close, 'high': close + spread, 'low': close - spread}
+
+
+def _naive(close, pos, cost):
+    """Boucle de référence: position de la barre précédente, coût sur chaque variation."""
+    eq, peak, mdd, prev, rets = 1.0, 1.0, 0.0, 0.0, []
+    for t in range(len(close)):
+        r = prev * (close[t] / close[t - 1] - 1.0) if t else 0.0
+        r -= abs(pos[t] - prev) * cost
+        eq *= 1.0 + r
+        peak = max(peak, eq)
+        mdd = max(mdd, 1.0 - eq / peak)
+        prev = pos[t]
+        rets.append(r)
+    return eq - 1.0, mdd, float(np.mean(rets) / np.std(rets)) if np.std(rets) > 0 else 0.0
+
+
+def main():
+    bars = _bars(60_000)
+    close = bars['close']
+
+    # 1) métriques vectorisées == boucle naïve (coûts inclus, fenêtre décalée)
+    pos = np.sign(indicators.ema(close, 10) - indicators.ema(close, 50))
+    m = trading.simulate(close, pos, fee_bps=4, slippage_bps=1, periods_per_year=1.0, start=1000, end=9000)
+    tr, mdd, sh = _naive(close[1000:9000], pos[1000:9000], 5e-4)
+    assert abs(m['total_return'][0] - tr) < 1e-9 and abs(m['max_drawdown'][0] - mdd) < 1e-9
+    assert abs(m['sharpe'][0] - sh) < 1e-9
+    assert m['trades'][0] == np.count_nonzero(np.diff(pos[1000:9000], prepend=0.0))
+    assert np.array_equal(trading.hold([np.nan, 1, np.nan, 0, np.nan, -1]), [0, 1, 1, 0, 0, -1])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        grid = param_grid({'fast': [5, 8, 13, 21, 34], 'slow': [55, 89, 144, 233]})
+        zgrid = param_grid({'window': [20, 50, 100, 200], 'entry': [1.5, 2.0, 2.5], 'exit': [0.0, 0.5]})
+
+        # 2) mêmes résultats en processus unique et en pool (barres partagées en mmap)
+        with SharedBars.create(bars) as shared:
+            one = BacktestEngine(shared, workers=1, fee_bps=4, slippage_bps=1, results_dir=tmp / 'res')
+            two = BacktestEngine(shared, workers=2, fee_bps=4, slippage_bps=1, results_dir=tmp / 'res')
+            r1, r2 = one.sweep('ema_cross', grid), two.sweep('ema_cross', grid)
+            assert len(r1) == len(grid) and abs(one.ppy - 365 * 1440) < 1e-6
+            for k in r1.columns:
+                assert np.array_equal(r1.columns[k], r2.columns[k]), k
+            ref = trading.simulate(close, np.sign(indicators.ema(close, 13) - indicators.ema(close, 89)),
+                                   fee_bps=4, slippage_bps=1, periods_per_year=one.ppy)
+            row = next(r for r in r1.rows() if r['fast'] == 13 and r['slow'] == 89)
+            assert abs(row['sharpe'] - ref['sharpe'][0]) < 1e-9
+
+            # 3) walk-forward: le jeu retenu est le meilleur du train, rapporté sur le test suivant
+            wf = two.walk_forward('zscore_revert', zgrid, train=12_000, test=4_000, metric='sharpe')
+            wins = walk_forward_windows(len(close), 12_000, 4_000)
+            assert len(wf) == len(wins) == 12
+            for i, (a, b, c) in enumerate(wins):
+                tr_all = one.sweep('zscore_revert', zgrid, start=a, end=b)
+                best = tr_all.best('sharpe')
+                assert (wf.columns['window'][i], wf.columns['entry'][i], wf.columns['exit'][i]) == \
+                    (best['window'], best['entry'], best['exit'])
+                te = one.sweep('zscore_revert', [{k: best[k] for k in ('window', 'entry', 'exit')}], start=b, end=c)
+                assert abs(wf.columns['total_return'][i] - te.columns['total_return'][0]) < 1e-12
+            wf_dd = one.walk_forward('breakout', param_grid({'window': [20, 60, 240]}), train=12_000, test=4_000,
+                                     step=8_000, metric='max_drawdown')
+            assert len(wf_dd) == 6 and np.all(wf_dd.columns['train_max_drawdown'] >= 0)
+
+            # 4) archivage .npz + manifest
+            path = two.archive(wf, tag='bench')
+            back = load_result(path)
+            assert back.kind == 'walk_forward' and back.meta['metric'] == 'sharpe'
+            assert all(np.array_equal(back.columns[k], wf.columns[k]) for k in wf.columns)
+            man = [json.loads(line) for line in open(tmp / 'res' / 'manifest.jsonl', encoding='utf-8')]
+            assert man[-1]['file'] == path.name and man[-1]['rows'] == len(wf) and man[-1]['tag'] == 'bench'
+
+            # 5) débit
+            big = param_grid({'fast': range(3, 40, 3), 'slow': range(50, 400, 25)})
+            t0 = time.perf_counter()
+            res = one.sweep('ema_cross', big)
+            dt = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            res2 = two.sweep('ema_cross', big)
+            pdt = time.perf_counter() - t0
+            assert len(res) == len(big) and np.array_equal(res.columns['sharpe'], res2.columns['sharpe'])
+            t0 = time.perf_counter()
+            one.sweep('zscore_revert', zgrid * 4)
+            zdt = time.perf_counter() - t0
+            two.close()
+            one.close()
+
+        # 6) barres depuis les trades enregistrés (sniper_engine.market_recorder)
+        rec = MarketRecorder(tmp / 'mkt', clock_ns=lambda: 0)
+        px = [100.0, 101.0, 99.5, 100.5, 102.0, 101.0]
+        for i, (t, p) in enumerate(zip([0, 10, 59, 60, 61, 185], px)):
+            rec.record_trade({'e': 'trade', 's': 'BTCUSDT', 't': i, 'p': str(p), 'q': '1.0', 'T': int((T0 + t) * 1000)},
+                             recv_ns=int((T0 + t) * 1e9))
+            rec.record_trade({'e': 'trade', 's': 'ETHUSDT', 't': i, 'p': '5.0', 'q': '9.0', 'T': int((T0 + t) * 1000)},
+                             recv_ns=int((T0 + t) * 1e9))
+        rec.close()
+        b = bars_from_ticks(tmp / 'mkt', 60.0, 'BTCUSDT')
+        assert np.array_equal(b['ts'], T0 + np.array([0.0, 60.0, 180.0]))
+        assert np.array_equal(b['open'], [100.0, 100.5, 101.0]) and np.array_equal(b['close'], [99.5, 102.0, 101.0])
+        assert np.array_equal(b['high'], [101.0, 102.0, 101.0]) and np.array_equal(b['low'], [99.5, 100.5, 101.0])
+        assert np.array_equal(b['volume'], [3.0, 2.0, 1.0])
+
+    runs = len(big)
+    print(f'backtest bench OK: {runs} ema_cross variants x {len(close):,} bars in {dt:.2f}s '
+          f'({runs / dt:,.0f} runs/s, {runs * len(close) / dt / 1e6:,.1f} M bar-evals/s in-process; '
+          f'{runs / pdt:,.0f} runs/s with 2 workers on {os.cpu_count()} CPU), '
+          f'zscore {len(zgrid) * 4 / zdt:,.0f} runs/s; '
+          f'walk-forward {len(wf)} windows x {len(zgrid)} variants in {wf.meta["seconds"]:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+﻿import time
+
+import numpy as np
+
+from sniper_engine.bar_aggregator import BarAggregator, BarSpec
+from sniper_engine.indicators import ema
+
+
+def _ref_time_bars(ts, px, qty, size):
+    # référence naïve: groupby sur le créneau, barres complètes seulement
+    bucket = np.floor(ts / size) * size
+    keys, start = np.unique(bucket, return_index=True)
+    out = []
+    for i, k in enumerate(keys[:-1]):  # la dernière est encore en cours
+        a, b = start[i], start[i + 1]
+        out.append((k, ts[b - 1], px[a], px[a:b].max(), px[a:b].min(), px[b - 1], qty[a:b].sum(), b - a))
+    return np.array(out)
+
+
+def main():
+    rnd = np.random.default_rng(5)
+    n = 60_000
+    ts = 1_700_000_000 + np.cumsum(rnd.exponential(0.25, n))
+    px = 30_000 + np.cumsum(rnd.normal(0, 2.0, n))
+    qty = rnd.uniform(0.01, 1.5, n)
+
+    cap = 64
+    agg = BarAggregator(['1m', '5m', '200t', '50v', '25r'], capacity=cap)
+    seen = []
+    agg.subscribe(lambda sym, spec, ring: seen.append((sym, spec.name)))
+    t0 = time.perf_counter()
+    for i in range(n):
+        agg.on_tick('BTCUSDT', ts[i], px[i], qty[i])
+    dt = time.perf_counter() - t0
+    mem = agg.memory_bytes('BTCUSDT')
+
+    # 1) barres temps == référence (sur les `cap` dernières, ring déjà bouclé)
+    ref = _ref_time_bars(ts, px, qty, 60.0)
+    assert len(ref) > cap and agg.ring('BTCUSDT', '1m').count == len(ref)
+    b = agg.bars('BTCUSDT', '1m')
+    got = np.column_stack(b)
+    assert got.shape == (cap, 8) and np.allclose(got, ref[-cap:], rtol=0, atol=1e-6), 'time bars mismatch'
+    assert agg.forming('BTCUSDT', '1m')['ts'] == np.floor(ts[-1] / 60) * 60
+
+    # 2) ticks / volume / range
+    assert agg.ring('BTCUSDT', '200t').count == n // 200
+    assert np.all(agg.bars('BTCUSDT', '200t').ticks == 200)
+    vb = agg.bars('BTCUSDT', '50v')
+    assert np.all(vb.volume >= 50) and np.all(vb.volume < 50 + 1.5)
+    rb = agg.bars('BTCUSDT', '25r')
+    assert np.all(rb.high - rb.low >= 25)
+    assert sum(1 for s in seen if s[1] == '1m') == len(ref)
+
+    # 3) vues sans copie, contiguës, utilisables par les indicateurs
+    last = agg.bars('BTCUSDT', '1m', 20)
+    ring = agg.ring('BTCUSDT', '1m')
+    assert np.shares_memory(last.close, ring._data) and last.close.flags['C_CONTIGUOUS']
+    assert np.array_equal(last.close, got[-20:, 5])
+    assert ema(last.close, 10).shape == (20,)
+
+    # 4) mémoire fixe par symbole, quelle que soit la durée
+    for i in range(n):
+        agg.on_tick('BTCUSDT', ts[-1] + 1 + i * 0.25, px[i], qty[i])
+    assert agg.memory_bytes('BTCUSDT') == mem == 5 * 8 * 2 * cap * 8
+
+    # 5) multi-symboles + clôture sur timer
+    for sym in ('ETHUSDT', 'SOLUSDT'):
+        agg.on_tick(sym, 1_700_000_010.0, 100.0, 1.0)
+    closed = agg.close_elapsed(1_700_000_400.0)
+    assert ('ETHUSDT', '1m') in closed and ('SOLUSDT', '5m') in closed
+    assert agg.bars('ETHUSDT', '1m').close.tolist() == [100.0]
+
+    try:
+        BarSpec.parse('3x')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('invalid spec accepted')
+
+    print(f'BarAggregator smoke OK: {n / dt / 1e3:,.0f}k ticks/s (5 specs), '
+          f'{mem / 1024:.0f} KiB fixed per symbol at capacity {cap}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+﻿import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Budget de cold boot (interpréteur compris), ajustable par machine.
+BUDGET_MS = float(os.environ.get('SNIPER_BOOT_BUDGET_MS', '1500'))
+PACKAGES = ['sniper_engine', 'orderflow', 'vectorx', 'trap_simulator', 'sentiment_macro',
+            'sniper_compta', 'journal_ia', 'alerting', 'interface_app', 'modules_utils']
+
+
+def main():
+    # 1) importer les packages ne doit charger aucun sous-module
+    code = (
+        'import sys\n'
+        f'for p in {PACKAGES!r}: __import__(p)\n'
+        f'loaded = [m for m in sys.modules if m.split(".")[0] in {PACKAGES!r} and "." in m and m != "modules_utils.lazy_import"]\n'
+        'assert not loaded, loaded\n'
+    )
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+    # 2) cold boot complet sous le budget (meilleur de 3), dans un répertoire jetable:
+    # logs/, DB de logs, watcher de config et archiveur n'écrivent pas dans le dépôt
+    root = Path(__file__).resolve().parent.parent
+    best = None
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copytree(root / 'config', Path(tmp) / 'config')
+        (Path(tmp) / 'logs').mkdir()
+        for _ in range(3):
+            t0 = time.perf_counter()
+            out = subprocess.run([sys.executable, str(root / 'start_sniper.py'), '--profile-boot'], cwd=tmp,
+                                 check=True, capture_output=True, text=True).stdout
+            dt = (time.perf_counter() - t0) * 1000
+            best = dt if best is None else min(best, dt)
+    print(out[out.index('== boot profile'):])
+    assert best <= BUDGET_MS, f'cold boot {best:.0f} ms > budget {BUDGET_MS:.0f} ms'
+    print(f'Boot budget smoke OK: {best:.0f} ms <= {BUDGET_MS:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+﻿import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from modules_utils.config_loader import ConfigLoader
+from modules_utils.rate_limiter import RateLimiter
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        cfg = Path(tmp)
+        for name in ('risk.yml', 'system.yml', 'api_limits.yml'):
+            shutil.copy(Path('config') / name, cfg / name)
+
+        loader = ConfigLoader(cfg)
+        risk = loader.load_risk()
+        # même objet tant que le fichier ne change pas (pas de re-parse)
+        assert loader.load_risk() is risk
+        assert ConfigLoader(cfg).load_risk() is risk
+
+        t0 = time.perf_counter()
+        for _ in range(10_000):
+            loader.load_api_limits()
+        print(f'cached load_api_limits: {(time.perf_counter() - t0) / 10_000 * 1e6:.1f} us/call')
+
+        rl = RateLimiter()
+        rl.set_limit_from_summary('binance.futures', loader.summarize_limits(loader.load_api_limits()), burst=40)
+        seen = []
+
+        def on_api(api):
+            seen.append(api)
+            rl.set_limit_from_summary('binance.futures', loader.summarize_limits(api), burst=40)
+
+        loader.subscribe('api_limits.yml', on_api)
+        assert loader.check_for_changes() == []
+
+        # contenu identique mais fichier touché -> pas de notification
+        p = cfg / 'api_limits.yml'
+        p.write_bytes(p.read_bytes())
+        assert loader.check_for_changes() == []
+
+        p.write_text(p.read_text(encoding='utf-8').replace('requests_per_min: 2400', 'requests_per_min: 1200'), encoding='utf-8')
+        assert loader.check_for_changes() == ['api_limits.yml']
+        assert seen[-1].binance.futures.requests_per_min == 1200
+        assert rl._buckets['binance.futures'].rps == 20.0
+
+        # YAML invalide: l'ancienne config est conservée
+        p.write_text('binance: [', encoding='utf-8')
+        assert loader.check_for_changes() == []
+        print('ConfigLoader cache/reload smoke OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+﻿import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from modules_utils.csv_tail import CsvTailReader
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'equity_intraday.csv'
+        path.write_bytes(Path('data/equity_intraday.csv').read_bytes())
+
+        rd = CsvTailReader(path, parse_dates=['timestamp'])
+        first = rd.refresh()
+        assert len(first) == 6 and str(first['timestamp'].dtype).startswith('datetime64')
+        ref = pd.read_csv('data/equity_intraday.csv', encoding='utf-8-sig', parse_dates=['timestamp'])
+        assert (rd.frame()['equity'].to_numpy() == ref['equity'].to_numpy()).all()
+
+        # ligne incomplète: ignorée tant que le '\n' n'est pas écrit
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('2025-09-01 13:00:00,100250.5,FTMO10K\n2025-09-01 13:01:00,1002')
+        assert len(rd.refresh()) == 1
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('60,FTMO10K\n')
+        new = rd.refresh()
+        assert len(new) == 1 and new['equity'].iloc[0] == 100260.0
+        assert rd.rows == 8 and rd.refresh().empty
+
+        # grosse historique puis petit append: le refresh ne dépend que du delta
+        with open(path, 'a', encoding='utf-8') as f:
+            for i in range(300_000):
+                f.write(f'2025-09-02 09:00:00,{100000 + i % 500},ACC{i % 40}\n')
+        t0 = time.perf_counter()
+        rd.refresh()
+        full = time.perf_counter() - t0
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('2025-09-02 10:00:00,100000,FTMO10K\n')
+        t0 = time.perf_counter()
+        rd.refresh()
+        rd.frame()
+        tail = time.perf_counter() - t0
+        assert rd.rows == 300_009
+
+        # rotation: fichier recréé plus court -> relu depuis le début
+        path.write_bytes(Path('data/equity_intraday.csv').read_bytes())
+        rd.refresh()
+        assert rd.rows == 6
+        print(f'CsvTailReader smoke OK: 300k rows parsed in {full * 1e3:.0f} ms, 1-row tail refresh {tail * 1e3:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
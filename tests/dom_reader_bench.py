@@ -0,0 +1,151 @@
+﻿import time
+
+import numpy as np
+
+from orderflow.dom_reader import DomReader, OrderBook, depth_weight
+
+TICK = 0.1
+
+
+def _snapshot(rnd, mid: float, levels: int, last_id: int):
+    bids = [[f'{mid - TICK * (i + 1):.1f}', f'{rnd.uniform(0.01, 5):.3f}'] for i in range(levels)]
+    asks = [[f'{mid + TICK * (i + 1):.1f}', f'{rnd.uniform(0.01, 5):.3f}'] for i in range(levels)]
+    return {'lastUpdateId': last_id, 'bids': bids, 'asks': asks}
+
+
+def _events(rnd, mid: float, n: int, first_id: int, per_event: int = 20):
+    """Diffs Binance réalistes: surtout des changements près du top, des ajouts et suppressions."""
+    evts, u = [], first_id - 1
+    for _ in range(n):
+        mid += rnd.normal(0, 0.5) * TICK
+        side_b, side_a = [], []
+        for _ in range(per_event):
+            off = int(abs(rnd.normal(0, 40))) + 1
+            q = 0.0 if rnd.random() < 0.15 else rnd.uniform(0.01, 5)
+            if rnd.random() < 0.5:
+                side_b.append([f'{round(mid - off * TICK, 1):.1f}', f'{q:.3f}'])
+            else:
+                side_a.append([f'{round(mid + off * TICK, 1):.1f}', f'{q:.3f}'])
+        # un prix au plus une fois par côté et par événement
+        side_b = list({p: [p, q] for p, q in side_b}.values())
+        side_a = list({p: [p, q] for p, q in side_a}.values())
+        U = u + 1
+        u = U + int(rnd.integers(0, 3))
+        evts.append({'e': 'depthUpdate', 's': 'BTCUSDT', 'U': U, 'u': u, 'pu': U - 1, 'b': side_b, 'a': side_a})
+    return evts
+
+
+class _DictBook:
+    def __init__(self, snap):
+        self.b = {float(p): float(q) for p, q in snap['bids']}
+        self.a = {float(p): float(q) for p, q in snap['asks']}
+
+    def apply(self, evt):
+        for side, key in ((self.b, 'b'), (self.a, 'a')):
+            for p, q in evt[key]:
+                p, q = float(p), float(q)
+                if q == 0:
+                    side.pop(p, None)
+                else:
+                    side[p] = q
+
+
+def _same(book: OrderBook, ref: _DictBook) -> bool:
+    bp, bq = book.top('bid', book.bids.n)
+    ap, aq = book.top('ask', book.asks.n)
+    rb = sorted(ref.b.items(), reverse=True)
+    ra = sorted(ref.a.items())
+    return (bp.tolist() == [p for p, _ in rb] and bq.tolist() == [q for _, q in rb]
+            and ap.tolist() == [p for p, _ in ra] and aq.tolist() == [q for _, q in ra])
+
+
+def main():
+    rnd = np.random.default_rng(11)
+    mid = 30_000.0
+    snap = _snapshot(rnd, mid, 1000, last_id=1_000)
+    evts = _events(rnd, mid, 20_000, first_id=990)
+
+    # 1) buffer avant snapshot, événements déjà couverts ignorés, puis continuité
+    resyncs = []
+    book = OrderBook('BTCUSDT', on_resync=resyncs.append)
+    for e in evts[:50]:
+        assert not book.on_event(e)
+    assert book.load_snapshot(snap) and book.synced
+    ref = _DictBook(snap)
+    for e in evts[:50]:
+        if e['u'] > 1_000:
+            ref.apply(e)
+    assert _same(book, ref)
+
+    # 2) débit + exactitude vs carnet dict
+    levels = sum(len(e['b']) + len(e['a']) for e in evts[50:])
+    t0 = time.perf_counter()
+    for e in evts[50:]:
+        book.on_event(e)
+    dt = time.perf_counter() - t0
+    for e in evts[50:]:
+        ref.apply(e)
+    assert _same(book, ref) and book.gaps == 0 and not resyncs
+
+    # 3) requêtes
+    bb, ba = book.best_bid(), book.best_ask()
+    assert bb[0] == max(ref.b) and ba[0] == min(ref.a)
+    assert book.level('bid', 3)[0] == sorted(ref.b, reverse=True)[3]
+    px, q = book.top('ask', 10)
+    assert np.shares_memory(q, book.asks.qty) and len(px) == 10
+    lim = sorted(ref.b, reverse=True)[19]
+    assert abs(book.volume_to_price('bid', lim) - sum(v for p, v in ref.b.items() if p >= lim)) < 1e-9
+    assert abs(book.volume_to_depth('bid', 20) - book.volume_to_price('bid', lim)) < 1e-9
+    # sommes préfixes paresseuses: requêtes profondes répétées, puis invalidation par une mise à jour
+    deep = sorted(ref.a)[book.asks.n // 2]
+    n_q = 100_000
+    t2 = time.perf_counter()
+    for _ in range(n_q):
+        book.volume_to_price('ask', deep)
+    cum_us = (time.perf_counter() - t2) / n_q * 1e6
+    assert abs(book.volume_to_price('ask', deep) - sum(v for p, v in ref.a.items() if p <= deep)) < 1e-6
+    asks = sorted(ref.a)
+    need = sum(ref.a[p] for p in asks[:30]) - 1e-9
+    assert book.price_for_volume('ask', need) == asks[29]
+    assert book.price_for_volume('ask', sum(ref.a.values()) + 1.0) is None
+    top_bid = max(ref.b)
+    book.bids.apply(np.array([top_bid]), np.array([ref.b[top_bid] + 7.0]))
+    ref.b[top_bid] += 7.0
+    assert abs(book.volume_to_price('bid', lim) - sum(v for p, v in ref.b.items() if p >= lim)) < 1e-9
+    assert book.price_for_volume('bid', ref.b[top_bid] - 1e-9) == top_bid
+    t1 = time.perf_counter()
+    for _ in range(n_q):
+        book.best_bid()
+        book.level('ask', 5)
+    q_us = (time.perf_counter() - t1) / n_q * 1e6
+
+    # 4) trou de séquence -> resync, buffer, puis re-snapshot
+    last = book.last_update_id
+    gap = {'U': last + 5, 'u': last + 6, 'b': [], 'a': []}
+    assert not book.on_event(gap) and not book.synced and resyncs == ['BTCUSDT'] and book.gaps == 1
+    nxt = {'U': last + 7, 'u': last + 7, 'b': [['29999.0', '1.0']], 'a': []}
+    book.on_event(nxt)
+    snap2 = _snapshot(rnd, mid, 500, last_id=last + 6)
+    assert book.load_snapshot(snap2) and book.last_update_id == last + 7
+    assert book.volume_to_price('bid', 29999.0) > 0
+
+    # futures: continuité par `pu`
+    fb = OrderBook('BTCUSDT', futures=True)
+    fb.load_snapshot({'lastUpdateId': 10, 'bids': [['1.0', '1']], 'asks': [['2.0', '1']]})
+    assert fb.on_event({'U': 8, 'u': 12, 'pu': 7, 'b': [], 'a': []})
+    assert not fb.on_event({'U': 14, 'u': 15, 'pu': 13, 'b': [], 'a': []}) and fb.gaps == 1
+
+    # routage multi-symboles (flux combiné)
+    dom = DomReader(futures=True)
+    dom.on_message({'stream': 'ethusdt@depth', 'data': {'s': 'ETHUSDT', 'U': 1, 'u': 2, 'pu': 0, 'b': [], 'a': []}})
+    assert not dom.book('ETHUSDT').synced and 'ETHUSDT' in dom._pending
+    assert depth_weight(1000) == 50 and depth_weight(1000, futures=True) == 20
+
+    n = len(evts) - 50
+    print(f'OrderBook bench OK: {n / dt:,.0f} diff events/s, {levels / dt:,.0f} level updates/s per symbol '
+          f'(~{levels / n:.0f} levels/event, 1000-level snapshot); best/level query {q_us:.2f} us, '
+          f'cumulative volume query {cum_us:.2f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+﻿import json
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from modules_utils.config_loader import RiskModel
+from orderflow.dom_reader import OrderBook
+from orderflow.flow_decision_engine import FlowDecisionEngine, LatencyHistogram, OrderIntent, RiskGate, iter_jsonl, replay
+from orderflow.liquidity_map import LiquidityMap
+from orderflow.safe_place_finder import Candidate, SafePlaceFinder
+
+TICK = 0.1
+T0 = 1_700_000_000.0
+RISK = RiskModel(max_daily_dd_pct=2.0, max_trade_r_pct=1.0, target_rr=2.0)
+
+
+def _lmap(_sym=None) -> LiquidityMap:
+    return LiquidityMap(tick=TICK, bucket_ticks=2, n_buckets=600, rows=120, interval=1.0, wall_mult=4.0)
+
+
+def _snap(mid: float, levels: int, qty: float, last_id: int, symbol: str = 'BTCUSDT'):
+    return {'s': symbol, 'lastUpdateId': last_id,
+            'bids': [[round(mid - TICK * (i + 1), 1), qty] for i in range(levels)],
+            'asks': [[round(mid + TICK * (i + 1), 1), qty] for i in range(levels)]}
+
+
+def _session(path: Path, n: int, seed: int = 7) -> int:
+    """Session enregistrée: snapshot + diffs; murs et déséquilibres ponctuels près du mid."""
+    rnd = np.random.default_rng(seed)
+    mid, u = 30_000.0, 1_000
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(_snap(mid, 400, 1.0, u)) + '\n')
+        for i in range(n):
+            mid = round(mid + rnd.integers(-1, 2) * TICK, 1)
+            b = {round(mid - TICK * o, 1): round(float(rnd.uniform(0.2, 2.0)), 3) for o in rnd.integers(1, 40, 6)}
+            a = {round(mid + TICK * o, 1): round(float(rnd.uniform(0.2, 2.0)), 3) for o in rnd.integers(1, 40, 6)}
+            r = rnd.random()
+            if r < 0.02:      # support + poussée acheteuse au top
+                b[round(mid - TICK * 8, 1)] = 60.0
+                for o in range(1, 6):
+                    b[round(mid - TICK * o, 1)] = 12.0
+            elif r < 0.04:    # résistance + poussée vendeuse
+                a[round(mid + TICK * 8, 1)] = 60.0
+                for o in range(1, 6):
+                    a[round(mid + TICK * o, 1)] = 12.0
+            u += 1
+            f.write(json.dumps({'e': 'depthUpdate', 'E': int((T0 + i * 0.005) * 1000), 's': 'BTCUSDT', 'U': u, 'u': u,
+                                'b': [[p, q] for p, q in b.items()], 'a': [[p, q] for p, q in a.items()]}) + '\n')
+    return n
+
+
+def main():
+    # 1) histogramme: percentiles à la résolution des buckets (~19 %)
+    rnd = np.random.default_rng(1)
+    lat = rnd.lognormal(9.5, 0.8, 50_000).astype(np.int64)
+    h = LatencyHistogram()
+    for v in lat.tolist():
+        h.record(v)
+    for q in (50, 99):
+        ref = np.percentile(lat, q)
+        assert ref <= h.percentile(q) <= ref * 1.26, (q, ref, h.percentile(q))
+    assert h.max == lat.max() and h.count == len(lat)
+
+    # 2) placement: support bid à 8 ticks, résistance ask à 20 ticks
+    book = OrderBook('BTCUSDT')
+    book.load_snapshot(_snap(30_000.0, 200, 1.0, 10))
+    lmap = _lmap()
+    lmap.attach(book)
+    book.on_event({'E': int(T0 * 1000), 'U': 11, 'u': 11, 'b': [['29999.2', '50']], 'a': [['30002.0', '50']]})
+    cand = Candidate()
+    finder = SafePlaceFinder(max_buckets=20, stop_ticks=2, target_rr=3.0)
+    assert finder.find(book, lmap, 'buy', cand)
+    assert abs(cand.wall_price - 29999.2) < 1e-9 and abs(cand.entry - 29999.4) < 1e-9 and abs(cand.stop - 29999.0) < 1e-9
+    assert abs(cand.target - 30000.6) < 1e-9 and abs(cand.rr - 3.0) < 1e-9
+    assert SafePlaceFinder(target_rr=10.0).find(book, lmap, 'buy', cand)
+    assert abs(cand.target - 30001.9) < 1e-9 and abs(cand.rr - 2.5 / 0.4) < 1e-9  # bridé devant la résistance
+    assert finder.find(book, lmap, 'sell', cand) and abs(cand.wall_price - 30002.0) < 1e-9
+    assert abs(cand.entry - 30001.9) < 1e-9 and abs(cand.stop - 30002.3) < 1e-9 and abs(cand.target - 30000.7) < 1e-9
+    assert not SafePlaceFinder(max_buckets=3).find(book, lmap, 'buy', cand)
+
+    # 3) risque: taille en R, filtre RR, arrêt sur perte du jour
+    gate = RiskGate(RISK, equity=10_000.0, qty_step=0.001)
+    it = OrderIntent()
+    assert finder.find(book, lmap, 'buy', cand) and gate.size(cand, it)
+    assert abs(it.qty - 250.0) < 1e-9 and it.price == cand.entry  # 100 $ de risque / 0.4
+    cand.rr = 1.5
+    assert not gate.size(cand, it) and gate.rejects['rr'] == 1
+    cand.rr = 3.0
+    gate.on_pnl(-200.0)
+    assert gate.halted and not gate.size(cand, it) and gate.rejects['daily_dd'] == 1
+    gate.new_day()
+    assert gate.size(cand, it) and abs(it.qty - 245.0) < 1e-9
+
+    # 4) rejeu d'une session enregistrée: latences par étage + tick-to-decision
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'session.jsonl'
+        n = _session(path, 20_000)
+        events = list(iter_jsonl(path))
+    intents = []
+    eng = FlowDecisionEngine(RISK, equity=10_000.0, map_factory=_lmap, cooldown_s=0.5, qty_step=0.001)
+    eng.subscribe(lambda i: intents.append(i.as_dict()))
+    replay(eng, events[:10_001], warmup=1_000)
+    # une fois chaud, le pipeline n'accumule rien: le nombre de blocs vivants reste stable
+    blocks = sys.getallocatedblocks()
+    rep = replay(eng, events[10_001:])
+    grown = sys.getallocatedblocks() - blocks - len(intents)  # hors dicts gardés par le test
+
+    assert rep['replay']['events'] == n - 10_000
+    assert rep['book']['count'] == n - 1_000 and eng.book('BTCUSDT').gaps == 0
+    assert intents and eng.intents == len(intents) and 0 < rep['tick_to_decision']['count'] <= len(intents)
+    assert all(i['side'] in ('buy', 'sell') and i['rr'] >= RISK.target_rr and i['qty'] > 0 for i in intents)
+    buys = [i for i in intents if i['side'] == 'buy']
+    assert all(i['stop'] < i['price'] < i['target'] for i in buys)
+    assert rep['queue_ticks']['dropped'] == 0 and rep['queue_ticks']['high_water'] == 1
+    assert grown < 2_000, grown
+
+    # 5) files bornées: sans drain, les plus anciens sont abandonnés
+    eng2 = FlowDecisionEngine(RISK, equity=10_000.0, map_factory=_lmap, queue_size=64, auto_drain=False)
+    eng2.load_snapshot('BTCUSDT', _snap(30_000.0, 50, 1.0, 5))
+    for k in range(200):
+        eng2.on_event({'s': 'BTCUSDT', 'U': 6 + k, 'u': 6 + k, 'b': [], 'a': []})
+    assert len(eng2.q_ticks) == 64 and eng2.q_ticks.dropped == 136
+    eng2.drain()
+    assert not len(eng2.q_ticks) and eng2.book('BTCUSDT').gaps == 1  # trou de séquence visible par le carnet
+
+    # 6) file pleine + candidat refusé par le risque: rien n'est évincé; l'éviction n'a lieu qu'au commit
+    eng3 = FlowDecisionEngine(RISK, equity=10_000.0, map_factory=_lmap, queue_size=2, auto_drain=False)
+    q = eng3.q_intents
+    for k in (1.0, 2.0):
+        q.claim().strength = k
+        q.commit()
+    bad = eng3.q_places.claim()
+    bad.cand.rr = 1.5  # sous target_rr
+    eng3._stage_risk(bad, q)
+    assert eng3.gate.rejects['rr'] == 1 and len(q) == 2 and q.dropped == 0
+    assert [q.pop().strength, q.pop().strength] == [1.0, 2.0] and q.pop() is None
+    for k in (1.0, 2.0, 3.0):
+        q.claim().strength = k
+        q.commit()
+    assert q.dropped == 1 and [q.pop().strength, q.pop().strength] == [2.0, 3.0] and q.high_water == 2
+
+    print('decision pipeline latency (replay, us):')
+    for stage in ('book', 'signal', 'place', 'risk', 'emit', 'tick_to_decision'):
+        s = rep[stage]
+        print(f"  {stage:<17} n={s['count']:>6}  p50={s['p50_us']:8.1f}  p99={s['p99_us']:8.1f}  max={s['max_us']:9.1f}")
+    print(f"flow decision bench OK: {len(intents)} intents, rejects {rep['risk_rejects']}, "
+          f"+{grown} live blocks over {n - 10_000} ticks")
+
+
+if __name__ == '__main__':
+    main()
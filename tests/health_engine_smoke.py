@@ -0,0 +1,68 @@
+﻿import time
+from pathlib import Path
+from threading import Event
+
+from modules_utils.health import HealthCheck, HealthEngine, run_health_checks
+
+
+def main():
+    # 1) checks par défaut: mêmes clés qu'avant, 2e appel servi par le cache
+    t0 = time.perf_counter()
+    rpt = run_health_checks(Path('.'), fresh=True)
+    cold = (time.perf_counter() - t0) * 1000
+    assert set(rpt.details) == {'config_dir', 'logs_dir', 'logs_writable', 'risk.yml', 'system.yml',
+                                'api_limits.yml', 'config_validation', 'disk_space', 'log_size'}, rpt.details
+    assert set(rpt.durations_ms) == set(rpt.details)
+    t0 = time.perf_counter()
+    warm_rpt = run_health_checks(Path('.'))
+    warm = (time.perf_counter() - t0) * 1000
+    assert all(warm_rpt.cached.values()) and warm_rpt.details == rpt.details
+
+    # 2) exécution parallèle, timeout, pas de relance d'un check encore en cours
+    calls = {'slow': 0, 'hang': 0, 'ttl': 0}
+    release = Event()
+
+    def slow():
+        calls['slow'] += 1
+        time.sleep(0.3)
+        return True, 'OK: slow'
+
+    def hang():
+        calls['hang'] += 1
+        release.wait()
+        return True, 'OK: finally'
+
+    def counted():
+        calls['ttl'] += 1
+        return True, 'OK'
+
+    def boom():
+        raise ConnectionError('api down')
+
+    eng = HealthEngine([HealthCheck(f'slow{i}', slow, timeout=1.0) for i in range(3)])
+    eng.register(HealthCheck('hang', hang, timeout=0.1))
+    eng.register(HealthCheck('ttl', counted, ttl=60))
+    eng.register(HealthCheck('optional', boom, critical=False))
+
+    t0 = time.perf_counter()
+    r1 = eng.run()
+    dt = time.perf_counter() - t0
+    assert 0.3 <= dt < 0.6, f'checks must run concurrently ({dt:.2f}s)'
+    assert r1.details['hang'].startswith('FAIL: timeout') and not r1.ok
+    assert r1.details['optional'] == 'FAIL: ConnectionError: api down'
+    assert 300 <= r1.durations_ms['slow0'] < 500
+
+    r2 = eng.run(['hang', 'ttl'])
+    assert calls['hang'] == 1 and calls['ttl'] == 1 and r2.cached['ttl']
+    release.set()
+    time.sleep(0.05)
+    r3 = eng.run(['hang', 'ttl', 'optional'])
+    assert r3.ok and r3.details['hang'] == 'OK: finally', r3.details  # résultat tardif mis en cache
+    assert eng.run(['ttl'], fresh=True) and calls['ttl'] == 2
+
+    print(f'HealthEngine smoke OK: default checks cold {cold:.1f} ms, cached {warm:.2f} ms; '
+          f'3x0.3s checks + hung check in {dt:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
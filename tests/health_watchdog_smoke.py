@@ -0,0 +1,92 @@
+﻿import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from modules_utils.health import HealthCheck, HealthEngine
+from modules_utils.health_watchdog import HealthWatchdog
+from modules_utils.rate_limiter import MultiWindowRateLimiter, RateLimiter
+
+
+def _get(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=2) as r:
+            return r.status, r.read().decode()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode()
+
+
+def _wait_runs(wd: HealthWatchdog, n: int) -> None:
+    target = wd.runs + n
+    deadline = time.monotonic() + 5
+    while wd.runs < target and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert wd.runs >= target
+
+
+def main():
+    state = {'ok': True}
+    eng = HealthEngine([
+        HealthCheck('api', lambda: (True, 'OK') if state['ok'] else (False, 'FAIL: api unreachable')),
+        HealthCheck('log_size', lambda: (True, 'WARN: large log (12.00 MB > 10 MB)'), critical=False),
+    ])
+    rl = RateLimiter()
+    rl.set_limit('binance.futures', rps=40, burst=40)
+    rl.call('binance.futures', cost=15)
+    quota = MultiWindowRateLimiter()
+    quota.set_limit('newsapi', rps=1, per_day=100)
+    quota.try_acquire('newsapi')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        trans = Path(tmp) / 'system_health.log'
+        wd = HealthWatchdog(eng, project_root='.', interval=0.02, transitions_log=trans, port=0)
+        wd.watch_rate_limiter('main', rl)
+        wd.watch_rate_limiter('news', quota)
+        wd.watch_queue('ticks', lambda: 7)
+        wd.start()
+        try:
+            _wait_runs(wd, 5)
+            base = f'http://127.0.0.1:{wd.port}'
+            code, text = _get(base + '/metrics')
+            assert code == 200
+            for needle in ('sniper_health_ok 1', 'sniper_health_check_status{check="api"} 0',
+                           'sniper_health_check_status{check="log_size"} 1',
+                           'sniper_health_check_duration_seconds{check="api"}',
+                           'sniper_disk_free_bytes{path="."}',
+                           'sniper_rate_limiter_remaining{limiter="news",key="newsapi",window="per_day"} 99',
+                           'sniper_queue_depth{queue="ticks"} 7'):
+                assert needle in text, (needle, text)
+            tok = next(l for l in text.splitlines() if l.startswith('sniper_rate_limiter_tokens{limiter="main"'))
+            assert 25 <= float(tok.rsplit(' ', 1)[1]) <= 40, tok
+            assert _get(base + '/health')[0] == 200
+
+            state['ok'] = False
+            _wait_runs(wd, 5)
+            assert 'sniper_health_check_status{check="api"} 2' in wd.metrics_text()
+            assert _get(base + '/health')[0] == 503
+            state['ok'] = True
+            _wait_runs(wd, 5)
+
+            # scrape: juste le texte en cache
+            t0 = time.perf_counter()
+            for _ in range(50):
+                _get(base + '/metrics')
+            scrape_ms = (time.perf_counter() - t0) / 50 * 1000
+        finally:
+            wd.stop()
+
+        # seules les transitions sont journalisées, pas chaque passage
+        lines = trans.read_text(encoding='utf-8').splitlines()
+        moves = [line.split(' | ')[2:4] for line in lines]
+        assert moves == [
+            ['api', 'START -> OK'], ['log_size', 'START -> WARN'], ['overall', 'START -> OK'],
+            ['api', 'OK -> FAIL'], ['overall', 'OK -> FAIL'],
+            ['api', 'FAIL -> OK'], ['overall', 'FAIL -> OK'],
+        ], moves
+        print(f'HealthWatchdog smoke OK: {wd.runs} runs, {len(lines)} transition lines, '
+              f'scrape {scrape_ms:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
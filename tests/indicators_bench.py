@@ -0,0 +1,104 @@
+﻿import time
+
+import numpy as np
+
+from sniper_engine.indicators import (
+    ATR, EMA, RSI, SMA, VWAP, Bollinger, IndicatorSet, ZScore,
+    atr, bollinger, ema, rsi, sma, vwap, zscore,
+)
+
+
+def _bars(n: int, m: int, seed: int = 1):
+    rnd = np.random.default_rng(seed)
+    close = 30_000 * np.exp(np.cumsum(rnd.normal(0, 1e-3, (n, m)), axis=0))
+    close[50:60] = close[49]  # fenêtre plate: z-score 0, RSI sans pertes
+    spread = np.abs(rnd.normal(0, 5, (n, m)))
+    high, low = close + spread, close - spread
+    vol = rnd.uniform(0.1, 3.0, (n, m))
+    return high, low, close, vol
+
+
+def _stream(n: int, col: int, high, low, close, vol, reset):
+    out = {k: [] for k in ('ema', 'sma', 'rsi', 'atr', 'vwap', 'z', 'bb')}
+    e, s, r, a, v, z, bb = EMA(21), SMA(20), RSI(14), ATR(14), VWAP(), ZScore(30), Bollinger(20, 2.0)
+    for t in range(n):
+        if reset[t] and t > 0:
+            v.reset()
+        h, lo, c, vo = float(high[t, col]), float(low[t, col]), float(close[t, col]), float(vol[t, col])
+        out['ema'].append(e.update(c))
+        out['sma'].append(s.update(c))
+        out['rsi'].append(r.update(c))
+        out['atr'].append(a.update(h, lo, c))
+        out['vwap'].append(v.update(c, vo))
+        out['z'].append(z.update(c))
+        out['bb'].append(bb.update(c))
+    return out
+
+
+def _same(a, b) -> bool:
+    return np.array_equal(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64), equal_nan=True)
+
+
+def main():
+    # 1) batch == streaming au bit près (1 série et 2-D symboles)
+    n, m = 3_000, 4
+    high, low, close, vol = _bars(n, m)
+    reset = np.zeros(n, dtype=bool)
+    reset[::1_000] = True
+    mid, up, lo = bollinger(close, 20, 2.0)
+    batch = {'ema': ema(close, 21), 'sma': sma(close, 20), 'rsi': rsi(close, 14),
+             'atr': atr(high, low, close, 14), 'vwap': vwap(close, vol, reset), 'z': zscore(close, 30)}
+    for col in range(m):
+        st = _stream(n, col, high, low, close, vol, reset)
+        for k, arr in batch.items():
+            assert _same(arr[:, col], st[k]), (k, col)
+            # 1-D (boucle flottants Python) == 2-D (boucle vectorielle)
+            one = {'ema': lambda: ema(close[:, col], 21), 'sma': lambda: sma(close[:, col], 20),
+                   'rsi': lambda: rsi(close[:, col], 14), 'atr': lambda: atr(high[:, col], low[:, col], close[:, col], 14),
+                   'vwap': lambda: vwap(close[:, col], vol[:, col], reset), 'z': lambda: zscore(close[:, col], 30)}[k]()
+            assert _same(one, arr[:, col]), (k, col)
+        bb = np.array(st['bb'])
+        assert _same(bb[:, 0], mid[:, col]) and _same(bb[:, 1], up[:, col]) and _same(bb[:, 2], lo[:, col])
+    assert np.all(np.isnan(batch['rsi'][:14])) and not np.any(np.isnan(batch['rsi'][14:]))
+    assert np.all((batch['rsi'][14:] >= 0) & (batch['rsi'][14:] <= 100))
+    assert zscore(np.full(40, 5.0), 30)[-1] == 0.0
+    assert abs(sma(np.arange(10.0), 4)[-1] - 7.5) < 1e-12
+
+    # 2) débit batch (millions de barres/s)
+    n, m = 20_000, 500
+    high, low, close, vol = _bars(n, m, seed=2)
+    bars = n * m
+    print(f'batch throughput on {n:,} bars x {m} symbols:')
+    for name, fn in [('sma20', lambda: sma(close, 20)), ('bollinger20', lambda: bollinger(close, 20)),
+                     ('zscore30', lambda: zscore(close, 30)), ('vwap', lambda: vwap(close, vol)),
+                     ('ema21', lambda: ema(close, 21)), ('rsi14', lambda: rsi(close, 14)),
+                     ('atr14', lambda: atr(high, low, close, 14))]:
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t0
+        rate = bars / dt / 1e6
+        print(f'  {name:<12}{rate:9.1f} M bars/s')
+        assert rate > 1.0, name
+    one = close[:, 0].copy()
+    t0 = time.perf_counter()
+    ema(one, 21)
+    print(f'  ema21 (1 series){n / (time.perf_counter() - t0) / 1e6:7.1f} M bars/s')
+
+    # 3) streaming: coût par tick constant, quel que soit l'historique
+    ind = IndicatorSet(lambda: {'ema21': EMA(21), 'sma20': SMA(20), 'rsi14': RSI(14), 'atr14': ATR(14),
+                                'vwap': VWAP(), 'z30': ZScore(30), 'bb20': Bollinger(20)})
+    syms = [f'S{i}' for i in range(m)]
+    costs = []
+    for block in range(3):
+        t0 = time.perf_counter()
+        for t in range(block * 200, block * 200 + 200):
+            for j, sym in enumerate(syms):
+                ind.on_bar(sym, high[t, j], low[t, j], close[t, j], vol[t, j])
+        costs.append((time.perf_counter() - t0) / (200 * m) * 1e6)
+    assert max(costs) < 3 * min(costs), costs
+    print(f'streaming: {costs[-1]:.2f} us per symbol-bar for 7 indicators ({m} symbols)')
+    print('indicators bench OK (batch == streaming bit for bit)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+﻿import time
+
+import numpy as np
+
+from orderflow.dom_reader import OrderBook
+from orderflow.liquidity_map import LiquidityMap
+
+TICK = 0.1
+T0 = 1_700_000_000.0
+
+
+def _snap(mid: float, levels: int, qty: float = 1.0, last_id: int = 100):
+    return {'lastUpdateId': last_id,
+            'bids': [[round(mid - TICK * (i + 1), 1), qty] for i in range(levels)],
+            'asks': [[round(mid + TICK * (i + 1), 1), qty] for i in range(levels)]}
+
+
+class _Feed:
+    def __init__(self, book: OrderBook):
+        self.book, self.u = book, book.last_update_id
+
+    def send(self, ts: float, b=(), a=()):
+        self.u += 1
+        assert self.book.on_event({'E': int(ts * 1000), 'U': self.u, 'u': self.u, 'b': list(b), 'a': list(a)})
+
+
+def _book_depth(lmap: LiquidityMap, side) -> np.ndarray:
+    ti = np.rint(side.px[:side.n] / TICK).astype(np.int64) - lmap.base_tick
+    ok = (ti >= 0) & (ti < lmap.n_buckets * lmap.bucket_ticks)
+    return np.bincount(ti[ok] // lmap.bucket_ticks, weights=side.qty[:side.n][ok], minlength=lmap.n_buckets)
+
+
+def main():
+    # 1) intensité: moyenne exponentielle continue, demi-vie exacte
+    book = OrderBook('BTCUSDT')
+    book.load_snapshot(_snap(30_000.0, 200))
+    lmap = LiquidityMap(tick=TICK, bucket_ticks=5, n_buckets=200, rows=120, interval=1.0, half_life=10.0)
+    lmap.attach(book)
+    feed = _Feed(book)
+    feed.send(T0)         # premier diff: chargement depuis le carnet
+    feed.send(T0 + 10.0)  # diff vide: fait avancer le temps, 10 lignes clôturées
+    h = lmap.last()
+    assert len(h.ts) == 10 and h.ts[-1] == T0 + 10.0
+    full = lmap.depth('bid') + lmap.depth('ask')
+    j = int(np.argmax(full))
+    assert abs(h.z[-1, j] - full[j] * 0.5) < 1e-4 * full[j], (h.z[-1, j], full[j])
+
+    # 2) mur profond puis retrait rapide -> wall + pull; mur au meilleur prix exécuté -> pas de pull
+    events = []
+    lmap.subscribe(events.append)
+    feed.send(T0 + 10.2, b=[['29990.0', '60']])
+    assert [e.kind for e in events] == ['wall'] and events[0].side == 'bid'
+    assert 29990.0 in [round(p, 1) for p in lmap.walls('bid')]
+    feed.send(T0 + 11.0, b=[['29990.0', '0']])
+    assert [e.kind for e in events] == ['wall', 'pull'] and abs(events[1].size - 60) < 1e-9
+    assert not lmap.walls('bid')
+    feed.send(T0 + 11.5, a=[['30000.5', '80']])
+    feed.send(T0 + 11.6, a=[['30000.1', '0'], ['30000.2', '0'], ['30000.3', '0'], ['30000.4', '0']])
+    feed.send(T0 + 11.7, a=[['30000.5', '0']])
+    assert [e.kind for e in events] == ['wall', 'pull', 'wall'], events
+    # retrait lent (> pull_window) -> pas un pull
+    feed.send(T0 + 12.0, b=[['29980.0', '60']])
+    feed.send(T0 + 30.0, b=[['29980.0', '0']])
+    assert [e.kind for e in events] == ['wall', 'pull', 'wall', 'wall'] and not lmap.walls('bid')
+
+    # 3) exactitude incrémentale sur un flux aléatoire + mémoire fixe
+    rnd = np.random.default_rng(3)
+    book = OrderBook('ETHUSDT')
+    book.load_snapshot(_snap(2_000.0, 1000, qty=2.0))
+    lmap = LiquidityMap(tick=TICK, bucket_ticks=2, n_buckets=1200, rows=300, interval=0.5, half_life=20.0)
+    lmap.attach(book)
+    mem = lmap.memory_bytes
+    feed = _Feed(book)
+    feed.send(T0 - 1.0)
+    n, mid, evts = 20_000, 2_000.0, []
+    for i in range(n):
+        mid += rnd.normal(0, 0.3) * TICK
+        offs = np.abs(rnd.normal(0, 30, 16)).astype(int) + 1
+        q = np.where(rnd.random(16) < 0.2, 0.0, rnd.uniform(0.1, 5, 16)).round(3)
+        b = {round(mid - o * TICK, 1): x for o, x in zip(offs[:8], q[:8])}
+        a = {round(mid + o * TICK, 1): x for o, x in zip(offs[8:], q[8:])}
+        evts.append((T0 + i * 0.01, [[p, x] for p, x in b.items()], [[p, x] for p, x in a.items()]))
+    levels = sum(len(b) + len(a) for _, b, a in evts)
+    t0 = time.perf_counter()
+    for ts, b, a in evts:
+        feed.send(ts, b=b, a=a)
+    dt = time.perf_counter() - t0
+    assert np.allclose(lmap.depth('bid'), _book_depth(lmap, book.bids), atol=1e-6)
+    assert np.allclose(lmap.depth('ask'), _book_depth(lmap, book.asks), atol=1e-6)
+    assert lmap.ring.count == 401 and len(lmap.ring) == 300 and lmap.memory_bytes == mem
+
+    # 4) export: vues sans copie, fenêtre de prix
+    h = lmap.window(1_990.0, 2_010.0, n=100)
+    assert h.z.shape == (100, len(h.prices)) and np.shares_memory(h.z, lmap.ring.z)
+    assert h.prices[0] <= 1_990.0 < h.prices[0] + 0.2 * 1.0001 and h.prices[-1] <= 2_010.0
+
+    # 5) recentrage quand le mid approche du bord: l'historique suit la grille
+    before = lmap.last(1).z[0].copy()
+    old_base = lmap.base_tick
+    book.load_snapshot(_snap(2_090.0, 1000, qty=2.0, last_id=feed.u))
+    feed.send(T0 + 200.1)
+    assert lmap.recenters == 1 and lmap.base_tick > old_base
+    k = (lmap.base_tick - old_base) // lmap.bucket_ticks
+    assert np.array_equal(lmap.ring.z[(lmap.ring.count - 2) % 300 + 300, :-k][: len(before) - k], before[k:])
+    assert np.allclose(lmap.depth('bid'), _book_depth(lmap, book.bids))
+
+    print(f'LiquidityMap smoke OK: {n / dt:,.0f} diff events/s incl. order book ({levels / dt:,.0f} levels/s), '
+          f'{mem / 1024:.0f} KiB fixed ({lmap.ring.rows} rows x {lmap.n_buckets} buckets)')
+
+
+if __name__ == '__main__':
+    main()
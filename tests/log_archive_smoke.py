@@ -0,0 +1,128 @@
+﻿import logging
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from threading import Thread
+
+from modules_utils.archive_logs import LogArchiver
+from modules_utils.log_db_migrator import migrate
+from modules_utils.log_db_writer import SQLiteLogHandler
+
+TODAY = date.today()
+DAYS = [(TODAY - timedelta(days=k)).isoformat() for k in (12, 11, 10)]
+
+
+def _write_rotated(logs: Path) -> dict:
+    # system.log.2 = jours 1-2, system.log.1 = jours 2-3 (+ traceback sans date)
+    expected = {d: [] for d in DAYS}
+    specs = {'system.log.2': DAYS[:2], 'system.log.1': DAYS[1:]}
+    for name, days in specs.items():
+        with open(logs / name, 'w', encoding='utf-8') as f:
+            for d in days:
+                for i in range(60_000):
+                    line = f'{d} 12:{i // 3600 % 60:02d}:{i % 60:02d} | INFO | sniper | tick {i} {"x" * 80}'
+                    f.write(line + '\n')
+                    expected[d].append(line)
+                tb = ['Traceback (most recent call last):', '  File "x.py", line 1', 'ZeroDivisionError']
+                f.write('\n'.join(tb) + '\n')
+                expected[d] += tb
+    return expected
+
+
+def _fill_db(db: Path) -> int:
+    migrate(db)
+    conn = sqlite3.connect(db, isolation_level=None)
+    conn.execute('BEGIN')
+    start = datetime.combine(TODAY - timedelta(days=10), datetime.min.time()).timestamp()
+    rows = [(start + i * 8.64, 'sniper', 20, 'FTMO10K', f'row {i}') for i in range(100_000 * 11 // 10)]
+    conn.executemany('INSERT INTO logs (ts, logger, level, account, message) VALUES (?, ?, ?, ?, ?)', rows)
+    conn.execute("INSERT INTO logs_fts(logs_fts) VALUES ('rebuild')")
+    conn.execute('COMMIT')
+    conn.close()
+    return len(rows)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        logs = Path(tmp) / 'logs'
+        logs.mkdir()
+        expected = _write_rotated(logs)
+        db = logs / 'log_db.sqlite'
+        n_rows = _fill_db(db)
+        arch = LogArchiver(logs, logs / 'archive', db_path=db, codec='gzip', db_keep_days=7,
+                           max_age_days=None, max_total_mb=None)
+
+        # 1) fichiers rotés: flux par blocs, mémoire bornée
+        raw = sum(p.stat().st_size for p in logs.glob('system.log.*'))
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        parts = arch.archive_rotated()
+        dt = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert not list(logs.glob('system.log.*')), 'rotated files must be consumed'
+        assert len(parts) == 4 and arch.days() == DAYS, (parts, arch.days())
+        assert peak < 16 * 1024 * 1024, f'peak {peak / 1e6:.1f} MB'
+        for d in DAYS:
+            assert list(arch.iter_day(d, 'system.log')) == expected[d], d
+
+        # 2) log_db: jours > 7 jours archivés pendant que le writer continue
+        h = SQLiteLogHandler(db)
+        log = logging.getLogger('sniper.archive_smoke')
+        log.propagate = False
+        log.setLevel(logging.INFO)
+        log.addHandler(h)
+        stop = []
+
+        def _spam():
+            i = 0
+            while not stop:
+                log.info('live %d', i)
+                i += 1
+                if i % 100 == 0:
+                    time.sleep(0.005)  # ~20k logs/s, bien au-delà du rythme réel
+
+        th = Thread(target=_spam)
+        th.start()
+        t1 = time.perf_counter()
+        db_parts = arch.archive_db()
+        db_dt = time.perf_counter() - t1
+        stop.append(1)
+        th.join()
+        h.flush()
+        log.removeHandler(h)
+        h.close()
+        assert h.dropped == 0 and h.written == h._enqueued, (h.dropped, h.written, h._enqueued)
+
+        cutoff = datetime.combine(TODAY - timedelta(days=7), datetime.min.time()).timestamp()
+        conn = sqlite3.connect(db)
+        assert conn.execute('SELECT COUNT(*) FROM logs WHERE ts < ?', (cutoff,)).fetchone()[0] == 0
+        kept = conn.execute("SELECT COUNT(*) FROM logs WHERE message LIKE 'row %'").fetchone()[0]
+        archived = sum(e['lines'] for e in db_parts)
+        assert kept + archived == n_rows, (kept, archived, n_rows)
+        # l'index plein texte suit les suppressions
+        fts = conn.execute("SELECT COUNT(*) FROM logs_fts WHERE logs_fts MATCH 'row'").fetchone()[0]
+        assert fts == kept, (fts, kept)
+        conn.close()
+        first_db_day = db_parts[0]['day']
+        assert next(arch.iter_day(first_db_day, 'log_db')).startswith('{"id": 1,')
+
+        # 3) rétention: âge puis taille totale, manifest réécrit
+        arch.max_age_days = 11
+        dropped = arch.enforce_retention()
+        assert dropped == DAYS[:1], dropped
+        arch.max_total_mb = 1.0
+        arch.enforce_retention()
+        total = sum(e['bytes'] for e in arch.manifest())
+        assert total <= 1024 * 1024 and arch.days() and arch.days()[-1] == max(arch.days()), total
+        assert all((arch.archive_dir / e['path']).exists() for e in arch.manifest())
+
+        print(f'LogArchiver smoke OK: {raw / dt / 1e6:.0f} MB/s text ({raw / 1e6:.0f} MB, '
+              f'peak {peak / 1e6:.1f} MB), {archived:,} db rows in {db_dt:.2f}s with live writer')
+
+
+if __name__ == '__main__':
+    main()
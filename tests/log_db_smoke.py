@@ -0,0 +1,50 @@
+﻿import logging
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from modules_utils.log_db_migrator import LATEST_VERSION, current_version
+from modules_utils.log_db_writer import SQLiteLogHandler
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / 'log_db.sqlite'
+        h = SQLiteLogHandler(db)
+        log = logging.getLogger('sniper.bench')
+        log.propagate = False
+        log.setLevel(logging.INFO)
+        log.addHandler(h)
+
+        n = 100_000
+        t0 = time.perf_counter()
+        for i in range(n):
+            log.info('tick %d', i, extra={'account': 'FTMO10K' if i % 2 else '5ers25K'})
+        emit_dt = time.perf_counter() - t0
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            log.exception('boom', extra={'account': 'FTMO10K'})
+        h.flush()
+        total_dt = time.perf_counter() - t0
+
+        conn = sqlite3.connect(db)
+        assert current_version(conn) == LATEST_VERSION
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        count = conn.execute('SELECT COUNT(*) FROM logs').fetchone()[0]
+        assert count == n + 1 and h.dropped == 0, (count, h.dropped)
+        row = conn.execute("SELECT level, account, exc FROM logs WHERE message = 'boom'").fetchone()
+        assert row[0] == logging.ERROR and row[1] == 'FTMO10K' and 'ZeroDivisionError' in row[2]
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM logs WHERE account = 'FTMO10K' AND ts > 0").fetchall()
+        assert 'ix_logs_account_ts' in str(plan), plan
+        conn.close()
+        log.removeHandler(h)
+        h.close()
+
+        print(f'SQLiteLogHandler smoke OK: {emit_dt / n * 1e6:.2f} us/record in caller, '
+              f'{n / total_dt:,.0f} records/s committed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+﻿import logging
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from modules_utils.log_db_migrator import migrate
+from modules_utils.log_query import LogFilter, LogQuery
+
+N = 1_000_000
+WORDS = ['order', 'filled', 'rejected', 'spread', 'latency', 'heartbeat', 'reconnect', 'trap']
+LOGGERS = ['sniper', 'sniper.orderflow', 'sniper.engine', 'sniperx', 'prop']
+ACCOUNTS = ['FTMO10K', '5ers25K', None]
+
+
+def _fill(db: Path) -> float:
+    migrate(db)
+    rnd = random.Random(7)
+    t0 = 1_700_000_000.0
+    conn = sqlite3.connect(db, isolation_level=None)
+    conn.execute('BEGIN')
+    conn.executemany(
+        'INSERT INTO logs (ts, logger, level, account, message) VALUES (?, ?, ?, ?, ?)',
+        ((t0 + i * 0.01, LOGGERS[i % 5], (10, 20, 20, 20, 30, 40, 20)[i % 7], ACCOUNTS[i % 3],
+          f'{rnd.choice(WORDS)} {rnd.choice(WORDS)} #{i}') for i in range(N)),
+    )
+    conn.execute("INSERT INTO logs_fts(logs_fts) VALUES ('rebuild')")
+    conn.execute('COMMIT')
+    conn.close()
+    return t0
+
+
+def _timed(fn):
+    t = time.perf_counter()
+    out = fn()
+    return out, (time.perf_counter() - t) * 1e3
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / 'log_db.sqlite'
+        t0 = _fill(db)
+        q = LogQuery(db)
+
+        # pagination keyset: pages disjointes, ordre (ts, id) décroissant
+        flt = LogFilter(account='FTMO10K', min_level=logging.WARNING)
+        p1, ms1 = _timed(lambda: q.page(flt, limit=100))
+        p2, ms2 = _timed(lambda: q.page(flt, cursor=p1.next_cursor, limit=100))
+        assert len(p1.rows) == len(p2.rows) == 100
+        assert p1.rows[-1].ts > p2.rows[0].ts
+        assert all(r.account == 'FTMO10K' and r.level >= logging.WARNING for r in p1.rows + p2.rows)
+
+        # logger hiérarchique: 'sniper' couvre sniper.*, pas 'sniperx'
+        pl, msl = _timed(lambda: q.page(LogFilter(logger='sniper'), limit=500))
+        assert {r.logger for r in pl.rows} == {'sniper', 'sniper.orderflow', 'sniper.engine'}
+
+        # plein texte + plage de temps
+        window = LogFilter(since=t0 + 5_000, until=t0 + 6_000, text='rejected trap')
+        pt, mst = _timed(lambda: q.page(window, limit=50))
+        assert pt.rows and all('rejected' in r.message and 'trap' in r.message for r in pt.rows)
+        assert all(t0 + 5_000 <= r.ts < t0 + 6_000 for r in pt.rows)
+
+        # suivi: seulement les lignes après le dernier id vu
+        last = q.last_id()
+        assert last == N and q.tail(LogFilter(), after_id=last) == []
+        assert [r.id for r in q.tail(LogFilter(), after_id=last - 3)] == [N - 2, N - 1, N]
+
+        conn = sqlite3.connect(db)
+        plan = conn.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM logs WHERE account = ? AND (ts, id) < (?, ?) '
+            'ORDER BY ts DESC, id DESC LIMIT 100', ('FTMO10K', t0 + 1e6, 0)).fetchall()
+        assert 'ix_logs_account_ts' in str(plan) and 'TEMP B-TREE' not in str(plan), plan
+        conn.close()
+        q.close()
+
+        worst = max(ms1, ms2, msl, mst)
+        assert worst < 250, (ms1, ms2, msl, mst)
+        print(f'LogQuery smoke OK on {N:,} rows: page {ms1:.2f} ms, next {ms2:.2f} ms, '
+              f'logger {msl:.2f} ms, fts+range {mst:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+﻿import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from orderflow.dom_reader import DomReader
+from orderflow.flow_decision_engine import FlowDecisionEngine, replay
+from orderflow.liquidity_map import LiquidityMap
+from modules_utils.config_loader import RiskModel
+from sniper_engine.bar_aggregator import BarAggregator
+from sniper_engine.market_recorder import RECORD, MarketFile, MarketRecorder, MarketReplay
+
+TICK = 0.1
+T0_NS = 1_700_000_000 * 10**9
+SYMS = ('BTCUSDT', 'ETHUSDT')
+
+
+def _session(n: int, seed: int = 4):
+    """(recv_ns, kind, msg): snapshots, diffs (~16 niveaux) et trades entrelacés sur 2 symboles."""
+    rnd = np.random.default_rng(seed)
+    out, recv = [], T0_NS
+    mids = {'BTCUSDT': 30_000.0, 'ETHUSDT': 2_000.0}
+    u = {s: 100 for s in SYMS}
+    for s in SYMS:
+        m = mids[s]
+        out.append((recv, 'snap', s, {'lastUpdateId': u[s],
+                                      'bids': [[f'{m - TICK * (i + 1):.1f}', '1.000'] for i in range(500)],
+                                      'asks': [[f'{m + TICK * (i + 1):.1f}', '1.000'] for i in range(500)]}))
+    for k in range(n):
+        recv += int(rnd.integers(100_000, 2_000_000))
+        s = SYMS[k % 2]
+        if rnd.random() < 0.25:
+            mids[s] += rnd.normal(0, 1) * TICK
+            out.append((recv, 'trade', s, {'e': 'trade', 's': s, 't': k, 'p': f'{mids[s]:.1f}',
+                                           'q': f'{rnd.uniform(0.01, 2):.3f}', 'T': recv // 10**6, 'm': bool(k & 1)}))
+            continue
+        m = mids[s]
+        offs = rnd.integers(1, 60, 16)
+        b = {f'{m - o * TICK:.1f}': f'{q:.3f}' for o, q in zip(offs[:8], rnd.uniform(0, 3, 8) * (rnd.random(8) > 0.2))}
+        a = {f'{m + o * TICK:.1f}': f'{q:.3f}' for o, q in zip(offs[8:], rnd.uniform(0, 3, 8) * (rnd.random(8) > 0.2))}
+        u[s] += 1
+        evt = {'e': 'depthUpdate', 'E': recv // 10**6, 's': s, 'U': u[s], 'u': u[s],
+               'b': [[p, q] for p, q in b.items()], 'a': [[p, q] for p, q in a.items()]}
+        if k % 97 == 0:
+            evt['b'], evt['a'] = [], []  # diff vide
+        out.append((recv, 'depth', s, evt))
+    return out
+
+
+def _record(directory: Path, session, **kw):
+    clock = [0]
+    rec = MarketRecorder(directory, clock_ns=lambda: clock[0], **kw)
+    dom = DomReader(recorder=rec)
+    bars = BarAggregator(['1m', '200t'], capacity=256)
+    t0 = time.perf_counter()
+    for recv, kind, s, msg in session:
+        clock[0] = recv
+        if kind == 'depth':
+            dom.on_message(msg)
+        elif kind == 'snap':
+            dom.book(s).load_snapshot(msg)
+            rec.record_snapshot(s, msg)
+        else:
+            rec.record_trade(msg)
+            bars.on_tick(s, msg['T'] / 1000.0, float(msg['p']), float(msg['q']))
+    dt = time.perf_counter() - t0
+    rec.close()
+    return rec, dom, bars, dt
+
+
+def _same_books(d1: DomReader, d2: DomReader) -> bool:
+    for s in SYMS:
+        b1, b2 = d1.book(s), d2.book(s)
+        for side in ('bid', 'ask'):
+            n = getattr(b1, side + 's').n
+            p1, q1 = b1.top(side, n)
+            p2, q2 = b2.top(side, getattr(b2, side + 's').n)
+            if not (np.array_equal(p1, p2) and np.array_equal(q1, q2)):
+                return False
+        if b1.last_update_id != b2.last_update_id:
+            return False
+    return True
+
+
+def _intents(path: Path):
+    risk = RiskModel(max_daily_dd_pct=2.0, max_trade_r_pct=1.0, target_rr=1.5)
+    eng = FlowDecisionEngine(risk, equity=10_000.0, imbalance_threshold=0.2, cooldown_s=0.2,
+                             map_factory=lambda s: LiquidityMap(tick=TICK, bucket_ticks=2, n_buckets=400, wall_mult=2.5))
+    out = []
+    eng.subscribe(lambda i: out.append({k: v for k, v in i.as_dict().items() if k not in ('t_in', 't_out')}))
+    replay(eng, MarketReplay(path).messages())
+    return out
+
+
+def main():
+    session = _session(40_000)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        # 1) enregistrement: segments, index, symboles
+        rec, live, live_bars, _ = _record(tmp / 'a', session, segment_mb=1.0, chunk_mb=0.25, index_every=512)
+        files = [MarketFile(p) for p in rec.paths]
+        assert len(files) >= 3 and sum(len(f) for f in files) == rec.total_records
+        assert all(f.symbols and len(f.index) > 0 for f in files)
+        assert all(f.path.stat().st_size == 64 + len(f) * RECORD.itemsize for f in files)
+
+        # 2) rejeu -> mêmes carnets, mêmes barres, mêmes compteurs
+        dom, bars = DomReader(), BarAggregator(['1m', '200t'], capacity=256)
+        rp = MarketReplay(tmp / 'a')
+        st = rp.run(dom=dom, bars=bars)
+        kinds = [k for _, k, _, _ in session]
+        assert (st.depth, st.snapshots, st.trades) == (kinds.count('depth'), kinds.count('snap'), kinds.count('trade'))
+        assert st.records == rec.total_records and _same_books(live, dom)
+        assert MarketReplay([tmp / 'a']).paths == MarketReplay(tmp / 'a').paths == rec.paths
+        for s in SYMS:
+            for spec in ('1m', '200t'):
+                assert np.array_equal(np.column_stack(bars.bars(s, spec)), np.column_stack(live_bars.bars(s, spec)))
+
+        # 3) déterminisme: deux rejeux dans le pipeline de décision -> mêmes intentions
+        i1, i2 = _intents(tmp / 'a'), _intents(tmp / 'a')
+        assert i1 and i1 == i2, (len(i1), len(i2))
+
+        # 4) fenêtre temporelle via l'index
+        lo, hi = session[len(session) // 3][0], session[len(session) // 2][0]
+        want = sum(1 for r, *_ in session if lo <= r < hi)
+        got = sum(1 for _ in MarketReplay(tmp / 'a', start_ns=lo, end_ns=hi).messages())
+        assert got == want, (got, want)
+        only = MarketReplay(tmp / 'a', symbols={'ETHUSDT'})
+        assert all(m['s'] == 'ETHUSDT' for m in only.messages()) and only.stats.messages
+
+        # 5) cadence: ~0.6 s enregistrées rejouées à 4x
+        lo = session[1000][0]
+        rp = MarketReplay(tmp / 'a', speed=4.0, start_ns=lo, end_ns=lo + 600_000_000)
+        t0 = time.perf_counter()
+        n = sum(1 for _ in rp.messages())
+        dt = time.perf_counter() - t0
+        assert n > 100 and 0.12 <= dt < 0.4, dt
+
+        # 6) lecture seule d'un fichier en cours: seuls les messages publiés (flush) sont visibles
+        clock = [T0_NS]
+        w = MarketRecorder(tmp / 'b', clock_ns=lambda: clock[0], flush_every=3600)
+        w.record_depth(session[5][3])
+        w.flush()
+        published = w.count
+        w.record_depth(session[7][3])
+        f = MarketFile(w.path)
+        assert len(f) == published and f.records['kind'][0] == 1
+        w.flush()
+        f.refresh()
+        assert len(f) == w.count
+        w.close()
+
+        # 7) débit: écriture brute, lecture par blocs (vues) et messages
+        big = session * 4
+        clock = [0]
+        w = MarketRecorder(tmp / 'c', clock_ns=lambda: clock[0], chunk_mb=64)
+        t0 = time.perf_counter()
+        for recv, kind, s, msg in big:
+            clock[0] = recv
+            if kind == 'depth':
+                w.record_depth(msg)
+            elif kind == 'snap':
+                w.record_snapshot(s, msg)
+            else:
+                w.record_trade(msg)
+        w.close()
+        wdt = time.perf_counter() - t0
+        mb = w.bytes_written / 1e6
+
+        rp = MarketReplay(tmp / 'c')
+        t0 = time.perf_counter()
+        qty = sum(float(r['qty'].sum()) for _, r in rp.blocks())
+        bdt = time.perf_counter() - t0
+        ref = sum(float(MarketFile(p).records['qty'].sum()) for p in rp.paths)
+        assert abs(qty - ref) < 1e-6 * max(1.0, ref)
+        t0 = time.perf_counter()
+        msgs = sum(1 for _ in rp.messages())
+        mdt = time.perf_counter() - t0
+        assert msgs == len(big)
+
+    print(f'market recorder bench OK: {mb:.0f} MB, write {mb / wdt:,.0f} MB/s ({mb / wdt * 60 / 1e3:.1f} GB/min, '
+          f'incl. JSON-string parsing), block read {mb / bdt:,.0f} MB/s, '
+          f'message replay {msgs / mdt:,.0f} msg/s ({mb / mdt * 60 / 1e3:.1f} GB/min)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+﻿import asyncio
+import json
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from modules_utils.rate_limiter import MultiWindowRateLimiter
+from sentiment_macro.news_parser import (
+    Article, FredSource, GNewsSource, NewsAPISource, NewsDataSource, NewsDeduper, NewsPipeline, canonical_url,
+    pace_s,
+)
+
+HITS = Counter()
+PARAMS = {}
+
+WIRE = ("The Federal Reserve held interest rates steady on Wednesday and signalled that it still expects "
+        "to cut borrowing costs later this year as inflation cools, while officials stressed they need more "
+        "evidence before acting")
+WIRE_EDIT = ("The Federal Reserve held interest rates steady on Wednesday and signaled that it still expects "
+             "to cut borrowing costs later this year as inflation cools, while officials said they need more "
+             "evidence before moving")
+
+
+def _newsapi():
+    return {'status': 'ok', 'articles': [
+        {'source': {'name': 'Reuters'}, 'title': 'Fed holds rates steady, still sees cuts this year - Reuters',
+         'description': WIRE, 'url': 'https://www.reuters.com/markets/us/fed-holds-rates/?utm_source=newsapi&utm_medium=rss',
+         'publishedAt': '2024-03-20T18:05:00Z', 'content': WIRE[:80] + '… [+2310 chars]'},
+        {'source': {'name': 'CoinDesk'}, 'title': 'Bitcoin ETF inflows hit record',
+         'description': 'Spot bitcoin exchange-traded funds drew record net inflows on Tuesday, led by the largest '
+                        'issuers, as the price of the cryptocurrency climbed toward its all time high.',
+         'url': 'https://www.coindesk.com/markets/2024/03/19/bitcoin-etf-inflows/', 'publishedAt': '2024-03-19T21:00:00Z'},
+    ]}
+
+
+def _gnews():
+    return {'totalArticles': 2, 'articles': [
+        # même dépêche: URL AMP mobile, autre paramètre de suivi
+        {'title': 'Fed holds rates steady, still sees cuts this year', 'description': WIRE,
+         'url': 'http://m.reuters.com/markets/us/fed-holds-rates/amp/?fbclid=abc', 'publishedAt': '2024-03-20T18:06:00Z',
+         'source': {'name': 'Reuters', 'url': 'https://www.reuters.com'}},
+        # reprise syndiquée, même texte, autre URL
+        {'title': 'Fed holds rates steady, still sees cuts this year', 'description': WIRE,
+         'url': 'https://finance.yahoo.com/news/fed-holds-rates-steady-180500123.html', 'publishedAt': '2024-03-20T18:10:00Z',
+         'source': {'name': 'Yahoo Finance', 'url': 'https://finance.yahoo.com'}},
+    ]}
+
+
+def _newsdata():
+    return {'status': 'success', 'totalResults': 2, 'results': [
+        # réécriture légère (orthographe US, deux mots changés): MinHash
+        {'title': 'Fed keeps rates on hold, still sees cuts later this year', 'link': 'https://www.cnbc.com/2024/03/20/fed-decision.html',
+         'description': WIRE_EDIT, 'pubDate': '2024-03-20 18:20:00', 'source_id': 'cnbc'},
+        {'title': 'Ether slides as staking outflows accelerate', 'link': 'https://www.theblock.co/post/ether-staking',
+         'description': 'Ether fell five percent as withdrawals from liquid staking protocols accelerated over the '
+                        'weekend, according to on chain data.', 'pubDate': '2024-03-20 09:00:00', 'source_id': 'theblock'},
+    ]}
+
+
+def _fred(series):
+    return {'observations': [{'date': '2024-02-01', 'value': {'CPIAUCSL': '310.326', 'UNRATE': '3.9'}[series]}]}
+
+
+class _FakeNews(BaseHTTPRequestHandler):
+    def do_GET(self):
+        u = urllib.parse.urlsplit(self.path)
+        q = dict(urllib.parse.parse_qsl(u.query))
+        name = u.path.strip('/').split('/')[0]
+        HITS[name] += 1
+        PARAMS.setdefault(name, []).append((q, self.headers.get('X-Api-Key')))
+        if name == 'gnews' and HITS[name] == 1:
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.end_headers()
+            return
+        body = {'newsapi': _newsapi, 'gnews': _gnews, 'newsdata': _newsdata}.get(name)
+        payload = body() if body else _fred(q['series_id'])
+        raw = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, *args):
+        pass
+
+
+async def main_async(base: str):
+    # quotas réduits: newsapi 2/jour, newsdata 2/min, gnews 3 rps, fred 100 rps (2 séries par cycle)
+    rl = MultiWindowRateLimiter()
+    rl.set_limit('newsapi', rps=1, burst=1, per_day=2)
+    rl.set_limit('gnews', rps=3, burst=1)
+    rl.set_limit('newsdata', rps=10, burst=10, per_min=2)
+    rl.set_limit('fred', rps=100, burst=10, per_min=120)
+    sources = [
+        NewsAPISource('k1', base_url=f'{base}/newsapi', query='fed'),
+        GNewsSource('k2', base_url=f'{base}/gnews', query='fed'),
+        NewsDataSource('k3', base_url=f'{base}/newsdata', query='fed'),
+        FredSource('k4', base_url=f'{base}/fred', series=['CPIAUCSL', 'UNRATE']),
+        NewsAPISource('', base_url=f'{base}/newsapi'),   # sans clé: ignorée
+    ]
+    pipe = NewsPipeline(sources, rl, deduper=NewsDeduper(100), min_poll_s=0.3, queue_size=4)
+    assert len(pipe.sources) == 4
+    got = []
+    t0 = time.monotonic()
+    async with pipe:
+        async def consume():
+            async for a in pipe.stream():
+                got.append(a)
+                await asyncio.sleep(0.05)  # consommateur lent: la file bornée (4) freine l'ingestion
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(2.5)
+    await asyncio.wait_for(task, 1.0)
+    dt = time.monotonic() - t0
+    return pipe, got, dt
+
+
+def main():
+    # 1) URL canonique
+    assert canonical_url('http://m.reuters.com/markets/us/fed-holds-rates/amp/?fbclid=abc#top') == \
+        canonical_url('https://www.reuters.com/markets/us/fed-holds-rates?utm_source=x&utm_medium=rss')
+    assert canonical_url('https://ex.com/a?b=2&a=1&gclid=z') == 'https://ex.com/a?a=1&b=2'
+    assert canonical_url('https://ex.com/a?id=1') != canonical_url('https://ex.com/a?id=2')
+    assert pace_s({'per_day': 100, 'rps': 1}) == 864.0 and pace_s({'rpm': 2, 'per_15min': 30}) == 30.0
+
+    # 2) déduplication: exacte, SimHash, MinHash, sans faux positif entre sujets voisins; fenêtre bornée
+    dd = NewsDeduper(3)
+    mk = lambda t, s, u: Article('t', '', t, s, u, 0.0)  # noqa: E731
+    assert dd.add(mk('Fed holds rates', WIRE, 'https://a.com/1')) is None
+    assert dd.add(mk('x', 'y', 'https://www.a.com/1/?utm_campaign=z')).reason == 'url'
+    assert dd.add(mk('Fed holds rates - AP', WIRE + '...', 'https://b.com/2')).reason == 'text'
+    head, tail = WIRE.split(', while ')
+    near = dd.add(mk('Fed holds rates', f'While {tail}, {head}', 'https://c.com/3'))    # propositions permutées
+    assert near.reason == 'simhash' and near.original == 0, near
+    hit = dd.add(mk('Fed keeps rates on hold', WIRE_EDIT, 'https://d.com/4'))            # réécriture
+    assert hit is not None and hit.reason == 'minhash' and hit.original == 0 and hit.similarity >= 0.5, hit
+    other = 'The Federal Reserve raised interest rates on Wednesday and signalled more hikes ahead as inflation ' \
+            'stays stubbornly high, surprising markets that expected a pause'
+    assert dd.add(mk('Fed raises rates', other, 'https://e.com/5')) is None
+    for i in range(3):
+        dd.add(mk(f'story {i}', f'unrelated topic number {i} about oil gas and shipping routes {i}', f'https://f.com/{i}'))
+    assert len(dd) == 3 and dd.add(mk('Fed holds rates', WIRE, 'https://a.com/1')) is None  # sorti de la fenêtre
+
+    # publications macro: valeur inchangée d'un mois sur l'autre = nouvelle publication; même (série, date) = doublon
+    fred = FredSource('k', series=['UNRATE'])
+    req = fred.requests(None)[0]
+    jul, aug = (fred.parse({'observations': [{'date': d, 'value': '4.1'}]}, req)[0] for d in ('2026-07-01', '2026-08-01'))
+    dd = NewsDeduper(100)
+    assert dd.add(jul) is None and dd.add(aug) is None, dd.stats
+    again = fred.parse({'observations': [{'date': '2026-08-01', 'value': '4.1'}]}, req)[0]
+    assert dd.add(again).reason == 'url' and dd.stats['simhash'] == dd.stats['minhash'] == dd.stats['text'] == 0
+
+    # 3) pipeline contre un serveur HTTP local: 4 sources en parallèle, quotas, 429, dédoublonnage
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), _FakeNews)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    pipe, got, dt = asyncio.run(main_async(f'http://127.0.0.1:{srv.server_port}'))
+    srv.shutdown()
+
+    assert HITS['newsapi'] == 2, HITS            # quota jour (2) atteint: plus d'appel
+    assert HITS['newsdata'] == 2, HITS           # 2/min
+    assert 2 <= HITS['gnews'] <= 8, HITS         # 429 + Retry-After 1 s, puis cycles à 0.3 s (3 rps max)
+    assert HITS['fred'] >= 4 and HITS['fred'] % 2 == 0, HITS
+    q, key = PARAMS['newsapi'][0]
+    assert key == 'k1' and 'apiKey' not in q and 'from' not in q
+    assert PARAMS['newsapi'][1][0]['from'] == '2024-03-20T18:05:00Z'   # 2e cycle: depuis le plus récent
+    assert pipe.stats['gnews']['throttled'] == 1
+
+    titles = sorted(a.title for a in got)
+    fed = [a for a in got if 'Fed' in a.title]
+    assert len(fed) == 1, titles                          # une dépêche, cinq reprises, un seul article
+    assert len(got) == len({a.canonical for a in got}) == 5, titles   # + bitcoin, ether, 2 publications FRED
+    macro = {a.meta['series']: a.meta['value'] for a in got if a.kind == 'macro'}
+    assert macro == {'CPIAUCSL': 310.326, 'UNRATE': 3.9}
+    dup = sum(s['duplicates'] for s in pipe.stats.values())
+    fetched = sum(s['fetched'] for s in pipe.stats.values())
+    assert fetched == dup + len(got)
+    assert pipe.deduper.stats['simhash'] + pipe.deduper.stats['minhash'] + pipe.deduper.stats['text'] >= 2
+    print(f'news parser smoke OK: {sum(HITS.values())} calls in {dt:.1f}s ({dict(HITS)}), {fetched} fetched, '
+          f'{len(got)} unique streamed, dedup {pipe.deduper.stats}')
+
+
+if __name__ == '__main__':
+    main()
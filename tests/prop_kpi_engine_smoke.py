@@ -0,0 +1,56 @@
+﻿import time
+from datetime import datetime, timedelta, timezone
+
+import yaml
+
+from sniper_engine.risk_manager import PropKpiEngine
+
+
+def main():
+    with open('config/prop_rules.yml', 'r', encoding='utf-8') as f:
+        accounts = yaml.safe_load(f)['accounts']
+    eng = PropKpiEngine(accounts)
+    t = datetime(2025, 9, 1, 9, 0)
+
+    # FTMO10K trailing: pic 100200 puis 99700 -> DD 500
+    for i, eq in enumerate([100000, 100150, 99800, 100200, 99700]):
+        eng.on_equity('FTMO10K', t + timedelta(hours=i), eq)
+    # ligne en retard: compte pour le pic, pas pour l'equity courante
+    eng.on_equity('FTMO10K', t, 100300)
+    k = eng.kpis('FTMO10K', now=t + timedelta(hours=5))
+    assert k['equity_now'] == 99700 and k['dd_current'] == 600, k
+
+    # 5ers25K static: DD mesuré depuis le capital initial (25000)
+    eng.on_equity('5ers25K', t, 25500)
+    eng.on_equity('5ers25K', t + timedelta(hours=1), 24800)
+    assert eng.kpis('5ers25K', now=t)['dd_current'] == 200
+
+    # PnL du jour remis à zéro au reset (22:00)
+    eng.on_trade('FTMO10K', -1000, t + timedelta(hours=12))          # 21:00
+    assert eng.kpis('FTMO10K', now=t + timedelta(hours=12))['margin_daily_left'] == 4000
+    assert eng.kpis('FTMO10K', now=t + timedelta(hours=13, minutes=1))['pnl_day'] == 0.0
+
+    # trade en retard (journée déjà remise à zéro): ignoré, pas compté dans le PnL du jour
+    eng.on_trade('FTMO10K', -300, t + timedelta(hours=12, minutes=30))  # 21:30, veille du reset
+    assert eng.kpis('FTMO10K', now=t + timedelta(hours=13, minutes=2))['pnl_day'] == 0.0
+
+    # horodatages aware (hôte en UTC): reset à 22:00 Paris = 20:00 UTC en été
+    utc = datetime(2025, 9, 2, 19, 30, tzinfo=timezone.utc)            # 21:30 Paris
+    eng.on_trade('FTMO10K', -200, utc)
+    assert eng.kpis('FTMO10K', now=utc + timedelta(minutes=20))['pnl_day'] == -200
+    assert eng.kpis('FTMO10K', now=utc + timedelta(minutes=31))['pnl_day'] == 0.0   # 22:01 Paris
+
+    # coût par tick / par lecture indépendant de l'historique
+    n = 200_000
+    t0 = time.perf_counter()
+    for i in range(n):
+        eng.on_equity(f'ACC{i % 50}', t + timedelta(seconds=i), 100000 + (i % 997))
+    dt_upd = (time.perf_counter() - t0) / n * 1e6
+    t0 = time.perf_counter()
+    eng.all_kpis(now=t)
+    print(f'PropKpiEngine smoke OK: {dt_upd:.2f} us/update, all_kpis({len(eng.account_ids)} accounts) '
+          f'in {(time.perf_counter() - t0) * 1e3:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
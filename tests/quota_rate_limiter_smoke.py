@@ -0,0 +1,103 @@
+﻿import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from modules_utils.config_loader import ConfigLoader
+from modules_utils.rate_limiter import MultiWindowRateLimiter, QuotaExceeded
+
+
+def main():
+    loader = ConfigLoader('config')
+    summary = loader.summarize_limits(loader.load_api_limits())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state = Path(tmp) / 'rate_limits_state.json'
+
+        rl = MultiWindowRateLimiter(state_path=state)
+        for key in ('newsapi', 'gnews', 'newsdata', 'yahoo_provider', 'binance.futures'):
+            rl.set_limit_from_summary(key, summary)
+        print(rl.remaining_all())
+
+        # quota jour réduit pour le test: 3/jour, 100 rps
+        rl.set_limit('newsapi', rps=100, burst=10, per_day=3)
+        for _ in range(3):
+            rl.call('newsapi')
+        assert not rl.try_acquire('newsapi')
+        try:
+            rl.call('newsapi')
+            raise AssertionError('QuotaExceeded attendu')
+        except QuotaExceeded as e:
+            assert e.retry_at > time.time()
+        rl.flush()
+
+        # restart: le compteur du jour est relu depuis le fichier d'état
+        rl2 = MultiWindowRateLimiter(state_path=state)
+        rl2.set_limit('newsapi', rps=100, burst=10, per_day=3)
+        assert rl2.remaining('newsapi')['per_day'] == 0.0, rl2.remaining('newsapi')
+        assert not rl2.try_acquire('newsapi')
+
+        # fenêtre minute: 5/min -> la 6e est refusée
+        rl2.set_limit('fred', rps=100, burst=100, per_min=5)
+        assert all(rl2.try_acquire('fred') for _ in range(5))
+        assert not rl2.try_acquire('fred')
+
+        # deux limiteurs sur le même fichier, clés disjointes: aucun n'efface les compteurs de l'autre
+        shared = Path(tmp) / 'shared_state.json'
+        ra = MultiWindowRateLimiter(state_path=shared)
+        ra.set_limit('a', rps=100, burst=10, per_day=10)
+        for _ in range(4):
+            ra.call('a')
+        ra.flush()
+        rb = MultiWindowRateLimiter(state_path=shared)
+        rb.set_limit('b', rps=100, burst=10, per_day=10)
+        rb.call('b')
+        rb.flush()
+        ra.call('a')
+        ra.flush()
+        rc = MultiWindowRateLimiter(state_path=shared)
+        rc.set_limit('a', rps=100, burst=10, per_day=10)
+        rc.set_limit('b', rps=100, burst=10, per_day=10)
+        assert rc.remaining('a')['per_day'] == 5.0 and rc.remaining('b')['per_day'] == 9.0, rc.remaining_all()
+
+        # persistance en fond (hors chemin d'appel), sans flush explicite
+        bg = Path(tmp) / 'bg_state.json'
+        rd = MultiWindowRateLimiter(state_path=bg, persist_every=0.05)
+        rd.set_limit('x', rps=100, burst=10, per_day=10)
+        rd.call('x')
+        deadline = time.monotonic() + 2.0
+        while not bg.exists() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert json.loads(bg.read_text(encoding='utf-8'))['keys']['x']['per_day']['count'] == 1.0
+
+        # disque en échec (parent = fichier): l'appel passe, flush journalise sans lever
+        (Path(tmp) / 'not_a_dir').write_text('x')
+        bad = MultiWindowRateLimiter(state_path=Path(tmp) / 'not_a_dir' / 'state.json')
+        bad.set_limit('x', rps=100, burst=10, per_day=10)
+        assert bad.try_acquire('x')
+        bad.flush()
+
+        # deux processus qui écrivent le même fichier en boucle: fusion sous lockf, aucune clé perdue
+        multi = Path(tmp) / 'multi_state.json'
+        code = ('import sys\nfrom modules_utils.rate_limiter import MultiWindowRateLimiter\n'
+                'rl = MultiWindowRateLimiter(state_path=sys.argv[1])\n'
+                'rl.set_limit(sys.argv[2], rps=1e6, burst=10**6, per_day=1e6)\n'
+                'for _ in range(200):\n    rl.call(sys.argv[2])\n    rl.flush()\n')
+        procs = [subprocess.Popen([sys.executable, '-c', code, str(multi), k]) for k in ('p1', 'p2')]
+        assert all(p.wait(60) == 0 for p in procs)
+        keys = json.loads(multi.read_text(encoding='utf-8'))['keys']
+        assert keys['p1']['per_day']['count'] == keys['p2']['per_day']['count'] == 200.0, keys
+
+        t0 = time.perf_counter()
+        rl2.set_limit('bench', rps=1e9, burst=10**9, per_min=1e9, per_15min=1e9, per_day=1e9)
+        n = 100_000
+        for _ in range(n):
+            rl2.try_acquire('bench')
+        dt = time.perf_counter() - t0
+        print(f'MultiWindowRateLimiter smoke OK ({dt / n * 1e6:.2f} us/call, 4 windows)')
+
+
+if __name__ == '__main__':
+    main()
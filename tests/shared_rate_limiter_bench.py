@@ -0,0 +1,50 @@
+﻿import multiprocessing as mp
+import tempfile
+import time
+from pathlib import Path
+
+from modules_utils.rate_limiter import RateLimiter
+from modules_utils.shared_buckets import SharedBucketStore
+
+N = 200_000
+
+
+def _bench(rl: RateLimiter) -> float:
+    rl.set_limit('bench', rps=1e12, burst=10**12)
+    t0 = time.perf_counter()
+    for _ in range(N):
+        rl.call('bench', cost=1)
+    return (time.perf_counter() - t0) / N * 1e6
+
+
+def _worker(path: str, out) -> None:
+    rl = RateLimiter(store=SharedBucketStore(path))
+    # rps quasi nul: seul le burst initial (100) est disponible pour tout l'hôte
+    rl.set_limit('binance.futures', rps=0.001, burst=100)
+    out.put(sum(rl.try_call('binance.futures') for _ in range(100)))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / 'rate_limiter.shm')
+
+        local_us = _bench(RateLimiter())
+        shared_us = _bench(RateLimiter(store=SharedBucketStore(path)))
+        print(f'in-process bucket: {local_us:.2f} us/acquire')
+        print(f'shared bucket    : {shared_us:.2f} us/acquire')
+
+        # 4 processus, un seul budget de 100 tokens
+        RateLimiter(store=SharedBucketStore(path)).set_limit('binance.futures', rps=0.001, burst=100)
+        q = mp.Queue()
+        procs = [mp.Process(target=_worker, args=(path, q)) for _ in range(4)]
+        for p in procs:
+            p.start()
+        got = [q.get() for _ in procs]
+        for p in procs:
+            p.join()
+        assert sum(got) == 100, got
+        print(f'shared budget OK: {got} -> {sum(got)} tokens across {len(procs)} processes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+﻿import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from trap_simulator.trap_decoder import (
+    DIM, TrapDecoder, decision_points, extract, features_from_paths, outcomes, seed_memory,
+)
+from trap_simulator.trap_memory import TrapMemory
+from trap_simulator.trap_simulator import SCENARIOS, TrapSimulator
+
+N_PER_SCENARIO = 75_000
+# Budget p99 de requête (us), vérifié seulement s'il est fourni: un aléa d'ordonnanceur
+# sur une machine chargée ne doit pas faire échouer la suite (p50 et rappel restent vérifiés).
+P99_BUDGET_US = float(os.environ.get('SNIPER_TRAP_P99_US', 'inf'))
+
+
+def _probe(sim: TrapSimulator, n: int, batch: int):
+    """Épisodes hors mémoire (autre lot de tirages): features, labels, issues."""
+    rng = np.random.default_rng(batch)
+    feats, labels = [], []
+    for s in SCENARIOS:
+        p = sim.paths(s, n, batch=batch)
+        feats.append(features_from_paths(p, decision_points(p, rng)))
+        labels += [s] * n
+    return np.concatenate(feats), labels
+
+
+def main():
+    sim = TrapSimulator(seed=5)
+    pilot, _ = _probe(sim, 2000, batch=900)
+    center, scale = pilot.mean(axis=0), pilot.std(axis=0) + 1e-6
+
+    # 1) extraction: lot vectorisé == instant par instant
+    p = sim.paths('stop_hunt', 64)
+    at = decision_points(p, np.random.default_rng(0))
+    f = features_from_paths(p, at)
+    assert f.shape == (64, DIM) and np.all(np.isfinite(f))
+    i = 7
+    one = extract(p.x[i, at[i] - 31:at[i] + 1], p.volume[i, at[i] - 31:at[i] + 1], p.flow[i, at[i] - 31:at[i] + 1],
+                  p.lo[i], p.hi[i])
+    assert np.allclose(one[0], f[i], atol=1e-5)
+    assert np.all(outcomes(p, at, 30) > -5)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'mem'
+
+        # 2) remplissage incrémental (pas de reconstruction) à plusieurs centaines de milliers d'épisodes
+        mem = TrapMemory(path, dim=DIM, center=center, scale=scale, capacity=4096)
+        t0 = time.perf_counter()
+        n = seed_memory(mem, sim, N_PER_SCENARIO)
+        fill_s = time.perf_counter() - t0
+        assert n == len(mem) == 4 * N_PER_SCENARIO and mem.capacity >= len(mem)
+        assert mem.label_counts() == {s: N_PER_SCENARIO for s in SCENARIOS}
+
+        # 3) latence et rappel vs balayage exact
+        qs, qlab = _probe(sim, 100, batch=901)
+        lat, recall, cand = [], [], []
+        for q in qs:
+            t = time.perf_counter()
+            a = mem.query(q, 10)
+            lat.append(time.perf_counter() - t)
+            cand.append(a.candidates)
+        for q in qs[::4]:
+            a, e = mem.query(q, 10), mem.query(q, 10, exact=True)
+            recall.append(len(set(a.ids) & set(e.ids)) / 10)
+            assert np.all(np.diff(a.dist) >= 0) and a.dist[0] >= e.dist[0] - 1e-6
+        lat_us = np.array(lat) * 1e6
+        p50, p99 = np.percentile(lat_us, 50), np.percentile(lat_us, 99)
+        assert p50 < 1000 and p99 <= P99_BUDGET_US, (p50, p99)
+        assert np.mean(recall) > 0.7, np.mean(recall)
+
+        # 4) insertion incrémentale: visible tout de suite (queue), puis après fusion
+        q = qs[0] + 0.001
+        new = mem.add(q, label='live', outcome=1.5, ts=123.0)
+        nb = mem.query(q, 3)
+        assert nb.ids[0] == new[0] and nb.labels[0] == 'live' and nb.outcome[0] == np.float32(1.5)
+        t0 = time.perf_counter()
+        extra = np.random.default_rng(1).standard_normal((5000, DIM)).astype(np.float32) * scale + center
+        for row in extra:
+            mem.add(row, label='noise', outcome=0.0)
+        ins_us = (time.perf_counter() - t0) / len(extra) * 1e6
+        assert mem.count - mem._merged < mem.merge_every
+        pending = mem.count - mem._merged
+        tlat = []
+        for q2 in qs:
+            t = time.perf_counter()
+            mem.query(q2, 10)
+            tlat.append(time.perf_counter() - t)
+        tail_p50, tail_p99 = np.percentile(np.array(tlat) * 1e6, [50, 99])
+        assert pending > 500 and tail_p50 < 1000 and tail_p99 <= P99_BUDGET_US, (pending, tail_p50, tail_p99)
+        nb = mem.query(q, 3)
+        assert nb.ids[0] == new[0]
+        assert mem.query(extra[-1], 1).ids[0] == len(mem) - 1
+        assert set(mem.query(q, 5, label='stop_hunt').labels) == {'stop_hunt'}
+
+        # 5) persistance: réouverture, mêmes réponses
+        before = mem.query(qs[5], 10)
+        count = len(mem)
+        mem.close()
+        t0 = time.perf_counter()
+        mem = TrapMemory(path)
+        open_s = time.perf_counter() - t0
+        after = mem.query(qs[5], 10)
+        assert len(mem) == count and np.array_equal(before.ids, after.ids) and before.labels == after.labels
+        try:
+            TrapMemory(path, dim=DIM + 1)
+            raise AssertionError('dim mismatch not detected')
+        except ValueError:
+            pass
+
+        # 6) décodeur: "quels pièges passés ressemblent à maintenant?"
+        dec = TrapDecoder(mem, k=25)
+        hits = {s: 0 for s in SCENARIOS}
+        dlat = []
+        for feats, lab in zip(qs, qlab):
+            r = dec.read(feats)
+            dlat.append(r.latency_us)
+            hits[lab] += r.label == lab
+        acc = {s: hits[s] / 100 for s in SCENARIOS}
+        assert acc['stop_hunt'] > 0.6 and acc['baseline'] > 0.5, acc
+        assert sum(hits.values()) / len(qlab) > 0.5, acc
+        hp = sim.paths('stop_hunt', 4, batch=902)
+        t = int(hp.t_first[0])
+        r = dec.decode(hp.x[0, :t + 1], hp.volume[0, :t + 1], hp.flow[0, :t + 1], hp.lo[0], hp.hi[0])
+        assert r.shares and abs(sum(r.shares.values()) - 1.0) < 1e-6 and np.isfinite(r.expected)
+        rid = dec.remember(r.features, 'stop_hunt', 2.0)
+        assert mem.query(r.features, 1).ids[0] == rid
+        idx_mb = mem.memory_bytes() / 1e6
+        mem.close()
+
+    print(f'trap memory bench OK: {n:,} episodes filled in {fill_s:.1f}s (incl. simulation), '
+          f'query p50 {p50:.0f} us / p99 {p99:.0f} us (p99 {tail_p99:.0f} us with {pending} unmerged), recall@10 {np.mean(recall):.2f} '
+          f'(~{np.mean(cand):,.0f} candidates), insert {ins_us:.0f} us, reopen {open_s * 1e3:.0f} ms, '
+          f'index {idx_mb:.0f} MB; decoder p50 {np.percentile(dlat, 50):.0f} us, '
+          f'accuracy {", ".join(f"{s} {a:.0%}" for s, a in acc.items())}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+﻿import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from trap_simulator.trap_simulator import SCENARIOS, TrapConfig, TrapSimulator, evaluate
+
+
+def main():
+    cfg = TrapConfig(target_rr=2.0, stop_buffers=(0.05, 0.5, 1.0))
+
+    # 1) reproductible: mêmes statistiques quel que soit le nombre de workers
+    with TrapSimulator(cfg, workers=1, batch_size=2048, seed=7) as s1, \
+            TrapSimulator(cfg, workers=2, batch_size=2048, seed=7) as s2:
+        r1, r2 = s1.run(10_000), s2.run(10_000)
+        for s in SCENARIOS:
+            assert np.array_equal(r1.acc[s], r2.acc[s]), s
+        assert r1.paths == 4 * 10_000
+        p1, p2 = s1.paths('stop_hunt', 256, batch=3), s2.paths('stop_hunt', 256, batch=3)
+        assert np.array_equal(p1.x, p2.x) and p1.x.dtype == np.float32
+    r3 = TrapSimulator(cfg, workers=1, batch_size=2048, seed=8).run(10_000, scenarios=('stop_hunt',))
+    assert not np.array_equal(r3.acc['stop_hunt'], r1.acc['stop_hunt'])
+
+    # 2) formes injectées
+    sim = TrapSimulator(cfg, seed=1)
+    hunt = sim.paths('stop_hunt', 512)
+    rows = np.arange(512)
+    low_after = np.array([hunt.x[i, t0:te + 1].min() for i, t0, te in zip(rows, hunt.t0, hunt.t_end)])
+    assert np.mean(low_after < hunt.lo) > 0.95
+    assert np.mean(hunt.x[rows, hunt.t_end] > hunt.x[:, hunt.entry]) > 0.9
+    fake = sim.paths('fake_breakout', 512)
+    assert np.mean(fake.x.max(axis=1) > fake.hi) > 0.95 and np.mean(fake.x[rows, fake.t_end] < fake.lo) > 0.9
+    inside = (np.arange(cfg.steps)[None, :] >= hunt.t0[:, None]) & (np.arange(cfg.steps)[None, :] < hunt.t_end[:, None])
+    assert hunt.volume[inside].mean() > 3 * hunt.volume[~inside].mean()
+    assert np.all(np.sign(hunt.flow[:, 1:]) == np.sign(np.diff(hunt.x, axis=1)))
+    short = sim.paths('stop_hunt', 512, side='short')
+    assert np.array_equal(short.x, -hunt.x) and np.array_equal(short.hi, -hunt.lo)
+
+    # 3) évaluation vs boucle naïve (premier contact, exécution du stop au prix franchi)
+    acc = evaluate(hunt, (0.5,), 2.0)[0]
+    stop_n = target_n = trapped_n = 0
+    sum_r = 0.0
+    for i in range(512):
+        px = hunt.x[i, hunt.entry]
+        stop = hunt.lo[i] - np.float32(0.5) * (hunt.hi[i] - hunt.lo[i])
+        risk = px - stop
+        target = px + np.float32(2.0) * risk
+        r = (hunt.x[i, -1] - px) / risk
+        for t in range(hunt.entry + 1, cfg.steps):
+            v = hunt.x[i, t]
+            if v <= stop:
+                stop_n += 1
+                r = (v - px) / risk
+                trapped_n += hunt.x[i, t:].max() >= target
+                break
+            if v >= target:
+                target_n += 1
+                r = 2.0
+                break
+        sum_r += r
+    assert (acc[1], acc[2], acc[4]) == (stop_n, target_n, trapped_n)
+    assert abs(acc[5] - sum_r) < 1e-3 * 512
+
+    # 4) statistiques: le stop hunt piège les stops serrés, un tampon large s'en protège
+    rep = TrapSimulator(cfg, workers=1, seed=3).run(20_000)
+    base, sh, fb = rep.stats('baseline'), rep.stats('stop_hunt'), rep.stats('fake_breakout')
+    assert sh['p_trapped'][0] > 3 * base['p_trapped'][0]
+    assert sh['p_stop'][0] > sh['p_stop'][-1] and sh['mean_r'][-1] > sh['mean_r'][0]
+    assert fb['mean_r'].max() < 0 and abs(base['mean_r'][-1]) < 4 * base['stderr_r'][-1] + 0.02
+    for s in SCENARIOS:
+        st = rep.stats(s)
+        assert np.allclose(st['p_stop'] + st['p_target'] + st['p_open'], 1.0)
+    view = rep.risk_view()
+    assert view['stop_hunt']['stop_buffer'] == 1.0 and set(view) == set(SCENARIOS)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'rep.json'
+        path.write_text(json.dumps(rep.to_dict()), encoding='utf-8')
+        back = json.loads(path.read_text(encoding='utf-8'))
+        assert back['paths'] == 80_000 and back['scenarios']['stop_hunt']['p_stop'] == sh['p_stop'].tolist()
+
+    # 5) débit
+    with TrapSimulator(cfg, workers=1, seed=0) as one:
+        rate1 = one.run(50_000).paths_per_s
+    with TrapSimulator(cfg, workers=2, seed=0) as two:
+        two.run(4096, scenarios=('baseline',))  # démarrage du pool hors mesure
+        rate2 = two.run(50_000).paths_per_s
+    per_night = 4 * 1_000_000 / rate1
+    print(f'trap simulator bench OK: {rate1:,.0f} paths/s in-process, {rate2:,.0f} paths/s with 2 workers '
+          f'on {os.cpu_count()} CPU ({cfg.steps} steps, {len(cfg.stop_buffers)} stop buffers); '
+          f'10^6 paths x {len(SCENARIOS)} scenarios ~ {per_night:,.0f} s per core')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+﻿from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
+
+from trap_simulator.trap_memory import Neighbours, TrapMemory
+
+# Features d'un instant "maintenant" sur une fenêtre de `window` pas
+# (log-prix, volume, flux signé) et les niveaux du range (lo, hi), sans
+# unité: prix en volatilité de la fenêtre ou en largeurs de range.
+FEATURES = (
+    "shape_0", "shape_1", "shape_2", "shape_3", "shape_4", "shape_5", "shape_6", "shape_7",
+    "pos_in_range", "log_width", "ext_high", "ext_low", "log_volume_ratio", "imbalance_short",
+    "imbalance_long", "log_vol_ratio",
+)
+DIM = len(FEATURES)
+_SHORT = 4
+
+
+def extract(x: np.ndarray, volume: np.ndarray, flow: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """
+    Fenêtres (b, W) finissant à l'instant décodé (ou (W,) pour un seul
+    instant) -> features (b, DIM) float32.
+    """
+    x = np.atleast_2d(np.asarray(x, dtype=np.float32))
+    volume = np.atleast_2d(np.asarray(volume, dtype=np.float32))
+    flow = np.atleast_2d(np.asarray(flow, dtype=np.float32))
+    lo = np.atleast_1d(np.asarray(lo, dtype=np.float32))
+    hi = np.atleast_1d(np.asarray(hi, dtype=np.float32))
+    b, w = x.shape
+    if w < 2 * _SHORT:
+        raise ValueError(f"window must be >= {2 * _SHORT}")
+    eps = np.float32(1e-12)
+    dx = np.diff(x, axis=1)
+    sig = dx.std(axis=1) + eps
+    last = x[:, -1]
+    width = np.maximum(hi - lo, eps)
+    out = np.empty((b, DIM), dtype=np.float32)
+    idx = np.linspace(0, w - 2, 8).round().astype(int)
+    out[:, :8] = (x[:, idx] - last[:, None]) / (sig * np.sqrt(np.float32(w)))[:, None]
+    out[:, 8] = (last - lo) / width
+    out[:, 9] = np.log(width / sig)
+    recent = x[:, -2 * _SHORT:]
+    out[:, 10] = np.maximum(recent.max(axis=1) - hi, 0.0) / width
+    out[:, 11] = np.maximum(lo - recent.min(axis=1), 0.0) / width
+    v_all = volume.sum(axis=1) + eps
+    v_short = volume[:, -_SHORT:].sum(axis=1) + eps
+    out[:, 12] = np.log(v_short / _SHORT / (v_all / w))
+    out[:, 13] = flow[:, -_SHORT:].sum(axis=1) / v_short
+    out[:, 14] = flow.sum(axis=1) / v_all
+    out[:, 15] = np.log(dx[:, -2 * _SHORT:].std(axis=1) / sig + eps)
+    return out
+
+
+def features_from_paths(paths, at: np.ndarray, window: int = 32) -> np.ndarray:
+    """Features de chaque chemin d'un TrapPaths à l'indice at[i] (vectorisé)."""
+    at = np.asarray(at)
+    cols = at[:, None] - window + 1 + np.arange(window)
+    if cols.min() < 0:
+        raise ValueError("window reaches before the start of the paths")
+    take = lambda a: np.take_along_axis(a, cols, axis=1)  # noqa: E731
+    return extract(take(paths.x), take(paths.volume), take(paths.flow), paths.lo, paths.hi)
+
+
+def decision_points(paths, rng: np.random.Generator) -> np.ndarray:
+    """
+    Instant décodé par chemin: fin de la première jambe (le balayage vient
+    d'avoir lieu); baseline: instant tiré sur la même plage.
+    """
+    at = np.asarray(paths.t_first).copy()
+    none = at < 0
+    if none.any():
+        top = paths.x.shape[1] - 1
+        lo = min(paths.entry + 2, top)
+        hi = max(lo + 1, int(np.max(paths.t_first)) + 1 if (~none).any() else top)
+        at[none] = rng.integers(lo, hi, int(none.sum()))
+    return at
+
+
+def outcomes(paths, at: np.ndarray, horizon: int) -> np.ndarray:
+    """Déplacement à `horizon` pas après at, en largeurs de range (positif = hausse)."""
+    rows = np.arange(len(at))
+    end = np.minimum(at + horizon, paths.x.shape[1] - 1)
+    return (paths.x[rows, end] - paths.x[rows, at]) / np.maximum(paths.hi - paths.lo, 1e-12)
+
+
+def seed_memory(memory: TrapMemory, simulator, n_paths: int, *, horizon: int = 30, window: int = 32,
+                batch_size: int = 8192, side: str = "long", scenarios: Optional[Sequence[str]] = None) -> int:
+    """
+    Remplit `memory` avec des épisodes simulés (trap_simulator.TrapSimulator):
+    features à l'instant du balayage, label = scénario, issue à horizon.
+    """
+    from trap_simulator.trap_simulator import SCENARIOS
+
+    added = 0
+    for s in scenarios or SCENARIOS:
+        for i in range(0, n_paths, batch_size):
+            size = min(batch_size, n_paths - i)
+            p = simulator.paths(s, size, batch=i // batch_size, side=side)
+            rng = np.random.default_rng([simulator.seed, SCENARIOS.index(s), i])
+            at = decision_points(p, rng)
+            memory.add(features_from_paths(p, at, window), label=s, outcome=outcomes(p, at, horizon),
+                       ts=0.0, side=1 if side == "long" else -1)
+            added += size
+    memory.flush()
+    return added
+
+
+@dataclass
+class TrapRead:
+    """Lecture d'un instant: label le plus probable parmi les épisodes voisins."""
+    label: str
+    share: float
+    shares: Dict[str, float]
+    expected: float
+    neighbours: Neighbours
+    latency_us: float
+    features: np.ndarray = field(repr=False, default=None)
+
+    def as_dict(self) -> Dict[str, Union[str, float, Dict[str, float]]]:
+        return {"label": self.label, "share": self.share, "shares": self.shares, "expected": self.expected,
+                "k": len(self.neighbours), "latency_us": self.latency_us}
+
+
+class TrapDecoder:
+    """
+    "Quels pièges passés ressemblent à maintenant?": extrait les features de
+    la fenêtre courante, interroge TrapMemory (index approché; latence
+    mesurée par tests/trap_memory_bench.py) et résume les voisins:
+    label majoritaire pondéré par la distance, part, issue moyenne attendue.
+    Les épisodes constatés en direct s'ajoutent par remember() (insertion
+    incrémentale, pas de reconstruction d'index).
+
+    Exemple d'usage:
+      mem = TrapMemory("data/models/trap_memory", dim=DIM)
+      dec = TrapDecoder(mem, window=32, k=25)
+      read = dec.decode(log_close[-32:], volume[-32:], flow[-32:], range_lo, range_hi)
+      if read.label == "stop_hunt" and read.share > 0.6: ...
+    """
+
+    def __init__(self, memory: TrapMemory, *, window: int = 32, k: int = 25) -> None:
+        if memory.dim != DIM:
+            raise ValueError(f"memory dim {memory.dim} != decoder features {DIM}")
+        self.memory = memory
+        self.window = window
+        self.k = k
+
+    def features(self, x, volume, flow, lo: float, hi: float) -> np.ndarray:
+        w = self.window
+        x, volume, flow = (np.asarray(a)[-w:] for a in (x, volume, flow))
+        if len(x) < w:
+            raise ValueError(f"need {w} steps of history, got {len(x)}")
+        return extract(x, volume, flow, lo, hi)[0]
+
+    def read(self, feats: np.ndarray) -> TrapRead:
+        t0 = time.perf_counter()
+        nb = self.memory.query(feats, self.k)
+        shares = nb.label_share()
+        label, share = next(iter(shares.items())) if shares else ("", 0.0)
+        if len(nb):
+            w = 1.0 / (1.0 + nb.dist)
+            ok = np.isfinite(nb.outcome)
+            expected = float((w[ok] * nb.outcome[ok]).sum() / w[ok].sum()) if ok.any() else float("nan")
+        else:
+            expected = float("nan")
+        return TrapRead(label, share, shares, expected, nb, (time.perf_counter() - t0) * 1e6, feats)
+
+    def decode(self, x, volume, flow, lo: float, hi: float) -> TrapRead:
+        return self.read(self.features(x, volume, flow, lo, hi))
+
+    def remember(self, feats: np.ndarray, label: str, outcome: float, *, ts: Optional[float] = None,
+                 side: int = 0) -> int:
+        return int(self.memory.add(feats, label=label, outcome=outcome, ts=ts, side=side)[0])
@@ -0,0 +1,420 @@
+﻿from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+log = logging.getLogger("sniper")
+
+HEADER = "header.json"
+FEATURES = "features.f32"
+EPISODES = "episodes.bin"
+CODES = "codes.u64"
+LSH = "lsh.npz"
+
+# Un épisode par ligne (16 octets), aligné sur la ligne de features de même indice.
+EPISODE = np.dtype([
+    ("ts", "<f8"),          # horodatage de l'épisode (s)
+    ("outcome", "<f4"),     # issue mesurée (ex: rendement à horizon en largeurs de range)
+    ("label", "<i2"),       # indice dans header["labels"] (stop_hunt, fake_breakout...)
+    ("side", "i1"),         # +1 long / -1 short / 0 indéfini
+    ("flags", "u1"),
+])
+
+
+@dataclass
+class Neighbours:
+    """Voisins d'une requête, du plus proche au plus lointain."""
+    ids: np.ndarray
+    dist: np.ndarray
+    labels: List[str]
+    outcome: np.ndarray
+    ts: np.ndarray
+    candidates: int = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def label_share(self) -> Dict[str, float]:
+        """Part pondérée (1 / (1 + distance)) de chaque label parmi les voisins."""
+        if not len(self.ids):
+            return {}
+        w = 1.0 / (1.0 + self.dist)
+        out: Dict[str, float] = {}
+        for lab, wi in zip(self.labels, w):
+            out[lab] = out.get(lab, 0.0) + float(wi)
+        tot = float(w.sum())
+        return {k: v / tot for k, v in sorted(out.items(), key=lambda kv: -kv[1])}
+
+
+def _grow(path: Path, dtype: np.dtype, shape: tuple) -> np.memmap:
+    """(Re)projette un fichier brut en memmap r+, étendu à `shape` si besoin (zéros)."""
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    with open(path, "ab") as f:
+        if f.tell() < size:
+            f.truncate(size)
+    return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+
+def _gather(sorted_keys: np.ndarray, ids: np.ndarray, keys: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """Ids des entrées égales à `keys` dans les tranches [lo, hi) de sorted_keys (une lecture par entrée)."""
+    n = hi - lo
+    total = int(n.sum())
+    if not total:
+        return np.empty(0, dtype=np.uint32)
+    idx = np.arange(total) + np.repeat(lo - (np.cumsum(n) - n), n)
+    return ids[idx[sorted_keys[idx] == np.repeat(keys, n)]]
+
+
+class TrapMemory:
+    """
+    Mémoire persistante d'épisodes de pièges: un vecteur de features de
+    longueur fixe par épisode (float32, memmap), ses métadonnées (EPISODE,
+    memmap) et un index de voisinage approché par LSH euclidien (projections
+    aléatoires p-stables quantifiées):
+      - n_tables tables de n_proj projections: h_j = floor((a_j.v + b_j) / w)
+        sur le vecteur centré/réduit, combinées en une clé uint64
+        (somme de h_j x m_j modulo 2^64); a, b, m tirés une fois (lsh.npz);
+      - chaque table ajoute son sel à la clé: toutes les tables tiennent
+        dans un seul tableau trié (clés + ids), interrogé par un unique
+        searchsorted pour toutes les sondes; les insertions récentes forment
+        une queue bornée (dict clé -> ids, une lecture par sonde), fusionnée
+        par insertion triée (np.insert, copie O(N) amortie sur merge_every
+        insertions) quand elle atteint merge_every épisodes: pas de
+        reconstruction;
+      - multi-probe: pour les `probes` projections les plus proches d'une
+        frontière de cellule, la cellule voisine est aussi sondée (clé
+        décalée de +-m_j); en zone dense, seuls les max_candidates
+        épisodes vus dans le plus de tables sont gardés, puis reclassés en
+        distance euclidienne exacte.
+    Les codes sont stockés (codes.u64): à l'ouverture, l'index se trie depuis
+    le disque sans recalcul. Le compteur persistant (header.json, remplacé
+    atomiquement) n'avance qu'au flush().
+
+    Exemple d'usage:
+      mem = TrapMemory("data/models/trap_memory", dim=16)
+      mem.add(features, label="stop_hunt", outcome=1.8, ts=time.time())
+      nb = mem.query(now_features, k=20)
+      nb.label_share()        # {"stop_hunt": 0.7, "baseline": 0.2, ...}
+      mem.close()
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        *,
+        dim: Optional[int] = None,
+        n_tables: int = 16,
+        n_proj: int = 8,
+        bucket_width: float = 2.0,
+        probes: int = 4,
+        center: Optional[Sequence[float]] = None,
+        scale: Optional[Sequence[float]] = None,
+        capacity: int = 1 << 16,
+        merge_every: int = 1024,
+        max_candidates: int = 512,
+        seed: int = 0,
+    ) -> None:
+        self.dir = Path(directory)
+        self.merge_every = max(1, merge_every)
+        self.max_candidates = max(1, max_candidates)
+        self.probes = probes
+        head = self.dir / HEADER
+        if head.exists():
+            h = json.loads(head.read_text(encoding="utf-8"))
+            if dim is not None and dim != h["dim"]:
+                raise ValueError(f"{self.dir}: stored dim {h['dim']} != requested {dim}")
+        else:
+            if dim is None or dim < 1:
+                raise ValueError(f"{self.dir}: new memory needs dim >= 1")
+            if n_proj < 1 or n_tables < 1 or bucket_width <= 0:
+                raise ValueError("n_proj and n_tables must be >= 1, bucket_width > 0")
+            self.dir.mkdir(parents=True, exist_ok=True)
+            h = {
+                "version": 1, "dim": dim, "n_tables": n_tables, "n_proj": n_proj, "count": 0,
+                "capacity": max(1024, capacity), "labels": [],
+                "center": list(center) if center is not None else [0.0] * dim,
+                "scale": list(scale) if scale is not None else [1.0] * dim,
+                "created": time.time(),
+            }
+            rng = np.random.default_rng(seed)
+            k = n_tables * n_proj
+            np.savez(self.dir / LSH,
+                     a=(rng.standard_normal((k, dim)) / bucket_width).astype(np.float32),
+                     b=rng.uniform(0.0, 1.0, k).astype(np.float32),
+                     m=rng.integers(1, 1 << 62, k, dtype=np.uint64) | np.uint64(1),
+                     salt=rng.integers(0, 1 << 63, n_tables, dtype=np.uint64))
+        self.dim = int(h["dim"])
+        self.n_tables = int(h["n_tables"])
+        self.n_proj = int(h["n_proj"])
+        self.labels: List[str] = list(h["labels"])
+        self._label_ids = {lab: i for i, lab in enumerate(self.labels)}
+        self.center = np.asarray(h["center"], dtype=np.float32)
+        self.scale = np.asarray(h["scale"], dtype=np.float32)
+        if len(self.center) != self.dim or len(self.scale) != self.dim or np.any(self.scale <= 0):
+            raise ValueError("center/scale must have length dim and scale > 0")
+        self.count = int(h["count"])
+        self.capacity = int(h["capacity"])
+        self.created = float(h.get("created", 0.0))
+        with np.load(self.dir / LSH) as z:
+            self._a, self._b = z["a"], z["b"]
+            self._m = z["m"].reshape(self.n_tables, self.n_proj)
+            self._salt = z["salt"]
+        self._map()
+        if not head.exists():
+            self.flush()
+        self._build()
+
+    # ---------- stockage ----------
+
+    def _map(self) -> None:
+        self._mm = (
+            _grow(self.dir / FEATURES, np.float32, (self.capacity, self.dim)),
+            _grow(self.dir / EPISODES, EPISODE, (self.capacity,)),
+            _grow(self.dir / CODES, np.uint64, (self.capacity, self.n_tables)),
+        )
+        # vues ndarray sur les mêmes pages: pas de __getitem__ Python de np.memmap sur le chemin chaud
+        self.features, self.episodes, self.codes = (np.asarray(m) for m in self._mm)
+
+    def _reserve(self, m: int) -> None:
+        if self.count + m <= self.capacity:
+            return
+        cap = self.capacity
+        while cap < self.count + m:
+            cap *= 2
+        for m in self._mm:
+            m.flush()
+        self._mm = self.features = self.episodes = self.codes = None  # libère les anciennes projections
+        self.capacity = cap
+        self._map()
+
+    def flush(self) -> None:
+        """Écrit les memmaps puis le header (compteur) par remplacement atomique."""
+        for m in self._mm:
+            m.flush()
+        h = {
+            "version": 1, "dim": self.dim, "n_tables": self.n_tables, "n_proj": self.n_proj,
+            "count": self.count, "capacity": self.capacity, "labels": self.labels,
+            "center": self.center.tolist(), "scale": self.scale.tolist(), "created": self.created,
+        }
+        tmp = self.dir / (HEADER + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(h, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.dir / HEADER)
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self.flush()
+            self._mm = self.features = self.episodes = self.codes = None
+
+    def __enter__(self) -> "TrapMemory":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def memory_bytes(self) -> int:
+        """Octets de l'index en RAM (clés + ids triés); les données restent en memmap."""
+        return self._keys.nbytes + self._ids.nbytes + self._dir.nbytes
+
+    # ---------- index ----------
+
+    def normalize(self, x: np.ndarray) -> np.ndarray:
+        v = np.asarray(x, dtype=np.float32)
+        if v.shape[-1] != self.dim:
+            raise ValueError(f"expected {self.dim} features, got {v.shape[-1]}")
+        return (v - self.center) / self.scale
+
+    def _project(self, v: np.ndarray) -> np.ndarray:
+        """(m, dim) normalisés -> coordonnées de cellule continues (m, n_tables, n_proj)."""
+        proj = v @ self._a.T
+        proj += self._b
+        return proj.reshape(len(v), self.n_tables, self.n_proj)
+
+    def _hash(self, proj: np.ndarray) -> np.ndarray:
+        cells = np.floor(proj).astype(np.int64).view(np.uint64)
+        return (cells * self._m).sum(axis=2, dtype=np.uint64) + self._salt  # modulo 2^64
+
+    def _build(self) -> None:
+        """Index trié depuis les codes stockés (ouverture)."""
+        n = self.count
+        keys = self.codes[:n].ravel()
+        order = np.argsort(keys)
+        self._keys = keys[order]
+        self._ids = (order // self.n_tables).astype(np.uint32)
+        self._merged = n
+        self._tail: Dict[int, List[int]] = {}
+        self._directory()
+
+    @staticmethod
+    def _dir_bits(n_keys: int) -> int:
+        return int(np.clip(np.log2(max(n_keys, 1)) - 2, 8, 22))
+
+    def _directory(self) -> None:
+        """
+        Répertoire des préfixes: _dir[p] = nb de clés dont les bits de poids
+        fort valent moins que p; une sonde lit directement sa tranche (~4
+        clés) au lieu d'une recherche dichotomique en mémoire froide.
+        """
+        bits = self._dir_bits(len(self._keys))
+        self._shift = np.uint64(64 - bits)
+        starts = np.arange(1 << bits, dtype=np.uint64) << self._shift
+        self._dir = np.append(self._keys.searchsorted(starts), len(self._keys)).astype(np.int64)
+
+    def _merge(self) -> None:
+        """
+        Fusionne la queue (insertions récentes) dans le tableau trié et le
+        répertoire. np.insert recopie tout l'index: O(N) par fusion (~46 ms
+        à 300k épisodes x 16 tables), soit O(N / merge_every) amorti par
+        insertion (~45 us); l'insertion qui déclenche la fusion paie le tout.
+        Une fusion en place dans une capacité préallouée déplacerait autant
+        d'octets: même coût, sans l'allocation.
+        """
+        a, b = self._merged, self.count
+        if b <= a:
+            return
+        tk = self.codes[a:b].ravel()
+        order = np.argsort(tk, kind="stable")
+        tk, ti = tk[order], (a + order // self.n_tables).astype(np.uint32)
+        pos = np.searchsorted(self._keys, tk, side="right")
+        self._keys = np.insert(self._keys, pos, tk)
+        self._ids = np.insert(self._ids, pos, ti)
+        self._tail.clear()
+        self._merged = b
+        if self._dir_bits(len(self._keys)) > 64 - int(self._shift):
+            self._directory()
+        else:
+            counts = np.bincount((tk >> self._shift).astype(np.intp), minlength=len(self._dir) - 1)
+            self._dir[1:] += np.cumsum(counts)
+
+    def _label_id(self, label: str) -> int:
+        i = self._label_ids.get(label)
+        if i is None:
+            i = self._label_ids[label] = len(self.labels)
+            self.labels.append(label)
+        return i
+
+    def add(
+        self,
+        features: np.ndarray,
+        *,
+        label: Union[str, Sequence[str]] = "",
+        outcome: Union[float, Sequence[float]] = np.nan,
+        ts: Union[float, Sequence[float], None] = None,
+        side: Union[int, Sequence[int]] = 0,
+    ) -> np.ndarray:
+        """Ajoute un épisode (dim,) ou un lot (m, dim); retourne les ids."""
+        v = self.normalize(features)
+        if v.ndim == 1:
+            v = v[None, :]
+        m = len(v)
+        if m == 0:
+            return np.empty(0, dtype=np.int64)
+        if not np.all(np.isfinite(v)):
+            raise ValueError("features must be finite")
+        self._reserve(m)
+        a, b = self.count, self.count + m
+        self.features[a:b] = v
+        self.codes[a:b] = self._hash(self._project(v))
+        ep = self.episodes[a:b]
+        labels = [label] * m if isinstance(label, str) else list(label)
+        if len(labels) != m:
+            raise ValueError("one label per episode")
+        ep["label"] = [self._label_id(lab) for lab in labels]
+        ep["outcome"] = outcome
+        ep["ts"] = time.time() if ts is None else ts
+        ep["side"] = side
+        ep["flags"] = 0
+        self.count = b
+        if self.count - self._merged >= self.merge_every:
+            self._merge()
+        else:
+            for i, row in enumerate(self.codes[a:b].tolist(), start=a):
+                for key in row:
+                    self._tail.setdefault(key, []).append(i)
+        return np.arange(a, b)
+
+    def _candidates(self, v: np.ndarray) -> np.ndarray:
+        proj = self._project(v[None, :])[0]                      # (n_tables, n_proj)
+        codes = self._hash(proj[None])[0]                        # (n_tables,)
+        p = min(self.probes, self.n_proj)
+        if p:
+            frac = proj - np.floor(proj)
+            up = frac > 0.5                                       # frontière la plus proche: au-dessus
+            margin = np.where(up, 1.0 - frac, frac)
+            near = np.argsort(margin, axis=1)[:, :p]
+            rows = np.arange(self.n_tables)[:, None]
+            step = self._m[rows, near]
+            keys = np.concatenate([codes[:, None], np.where(up[rows, near], codes[:, None] + step,
+                                                            codes[:, None] - step)], axis=1)
+        else:
+            keys = codes[:, None]
+        keys = keys.ravel()
+        slot = (keys >> self._shift).astype(np.intp)
+        found = _gather(self._keys, self._ids, keys, self._dir[slot], self._dir[slot + 1])
+        if self._tail:
+            get = self._tail.get
+            tail = [i for key in keys.tolist() for i in get(key, ())]
+            if tail:
+                found = np.concatenate([found, np.asarray(tail, dtype=np.uint32)])
+        if not len(found):
+            return found.astype(np.int64)
+        found.sort()
+        first = np.r_[True, found[1:] != found[:-1]]
+        uniq = found[first]
+        if len(uniq) > self.max_candidates:
+            # zone dense: on garde les épisodes vus dans le plus de tables (les plus proches en espérance)
+            starts = np.flatnonzero(first)
+            hits = np.diff(np.append(starts, len(found)))
+            uniq = np.sort(uniq[np.argpartition(-hits, self.max_candidates - 1)[:self.max_candidates]])
+        return uniq.astype(np.int64)
+
+    def query(self, features: np.ndarray, k: int = 10, *, exact: bool = False,
+              label: Optional[str] = None) -> Neighbours:
+        """
+        k plus proches épisodes de `features` (dim,). exact=True: balayage
+        complet (référence de rappel); label: ne garder que ce label.
+        """
+        v = self.normalize(features)
+        if v.ndim != 1:
+            raise ValueError("query takes a single feature vector")
+        if exact or self.count <= 8192:
+            cand = np.arange(self.count)
+        else:
+            cand = self._candidates(v)
+        if label is not None:
+            lid = self._label_ids.get(label, -1)
+            cand = cand[self.episodes["label"][cand] == lid]
+            if len(cand) < k:  # label rare parmi les candidats: balayage de ce label
+                cand = np.flatnonzero(self.episodes["label"][:self.count] == lid)
+        if len(cand):
+            diff = self.features[cand] - v
+            d2 = np.einsum("ij,ij->i", diff, diff)
+            kk = min(k, len(cand))
+            top = np.argpartition(d2, kk - 1)[:kk] if kk < len(cand) else np.arange(len(cand))
+            top = top[np.argsort(d2[top], kind="stable")]
+            ids, dist = cand[top], np.sqrt(d2[top])
+        else:
+            ids, dist = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ep = self.episodes[ids]
+        return Neighbours(ids, dist, [self.labels[i] for i in ep["label"]], ep["outcome"], ep["ts"],
+                          candidates=len(cand))
+
+    def vectors(self, ids: np.ndarray) -> np.ndarray:
+        """Features stockées (normalisées) des ids."""
+        return self.features[np.asarray(ids)]
+
+    def label_counts(self) -> Dict[str, int]:
+        counts = np.bincount(self.episodes["label"][:self.count], minlength=len(self.labels))
+        return {lab: int(c) for lab, c in zip(self.labels, counts)}
@@ -0,0 +1,385 @@
+﻿from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+log = logging.getLogger("sniper")
+
+# Monte Carlo de pièges de marché. Chaque chemin est un log-prix (n_steps,):
+# une phase de range définit les niveaux (lo, hi), une position longue est
+# prise à la clôture du range avec un stop sous lo (tampon en largeurs de
+# range) et un objectif à target_rr x risque. Un scénario injecte ensuite
+# une forme de piège (jambes linéaires par morceaux) au-dessus du bruit:
+#   - stop_hunt: plongée sous lo (balaye les stops) puis rallye;
+#   - fake_breakout: cassure au-dessus de hi, maintien, puis effondrement sous lo;
+#   - liquidity_sweep: balayage de hi puis de lo, retour au milieu du range;
+#   - baseline: bruit seul (référence).
+# Les shorts sont évalués sur les chemins miroirs (side="short").
+
+SCENARIOS = ("baseline", "stop_hunt", "fake_breakout", "liquidity_sweep")
+
+# colonnes des accumulateurs (par scénario et par tampon de stop)
+_ACC = ("paths", "stop", "target", "open", "trapped", "sum_r", "sum_r2", "sum_mae", "sum_mfe",
+        "sum_t_stop", "sum_t_target")
+_A = {k: i for i, k in enumerate(_ACC)}
+
+
+@dataclass(frozen=True)
+class TrapConfig:
+    """Paramètres de génération; profondeurs et rallyes en largeurs de range, durées en pas."""
+    steps: int = 240
+    range_steps: int = 60
+    sigma: float = 1e-3
+    inject_after: Tuple[int, int] = (5, 60)
+    depth: Tuple[float, float] = (0.1, 0.6)
+    follow: Tuple[float, float] = (0.5, 2.5)
+    leg_steps: Tuple[int, int] = (2, 6)
+    revert_steps: Tuple[int, int] = (4, 20)
+    volume_mult: float = 4.0
+    target_rr: float = 2.0
+    stop_buffers: Tuple[float, ...] = (0.05, 0.25, 0.5, 1.0)
+
+    def __post_init__(self) -> None:
+        longest = self.inject_after[1] + 3 * max(self.leg_steps[1], self.revert_steps[1])
+        if self.range_steps < 2 or self.steps < self.range_steps + longest:
+            raise ValueError(f"steps must be >= range_steps + {longest} (longest trap)")
+        if self.sigma <= 0 or self.target_rr <= 0 or not self.stop_buffers or min(self.stop_buffers) <= 0:
+            raise ValueError("sigma, target_rr and stop_buffers must be > 0")
+
+
+@dataclass
+class TrapPaths:
+    """Lot de chemins: log-prix, volume et flux signé (achats - ventes), tous (b, n_steps) float32."""
+    scenario: str
+    x: np.ndarray
+    volume: np.ndarray
+    flow: np.ndarray
+    t0: np.ndarray          # début du piège (-1 pour baseline)
+    t_first: np.ndarray     # fin de la première jambe (balayage), -1 pour baseline
+    t_end: np.ndarray       # fin de la dernière jambe
+    entry: int              # indice de l'entrée (clôture du range)
+    lo: np.ndarray
+    hi: np.ndarray
+
+
+def _uniform(rng: np.random.Generator, lohi: Tuple[float, float], b: int) -> np.ndarray:
+    return rng.uniform(lohi[0], lohi[1], b).astype(np.float32)
+
+
+def _steps(rng: np.random.Generator, lohi: Tuple[int, int], b: int) -> np.ndarray:
+    return rng.integers(lohi[0], lohi[1] + 1, b)
+
+
+def _legs(tt: np.ndarray, levels: Sequence[np.ndarray], durations: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Décalage linéaire par morceaux: part de 0 en tt=0, vaut levels[i] en
+    sum(durations[:i+1]) puis reste au dernier niveau; tt (b, n) relatif au
+    début du piège.
+    """
+    out = np.zeros(tt.shape, dtype=np.float32)
+    start = np.zeros(len(tt), dtype=np.float32)
+    prev = np.zeros(len(tt), dtype=np.float32)
+    ramp = np.empty(tt.shape, dtype=np.float32)
+    for lvl, dur in zip(levels, durations):
+        d = dur.astype(np.float32)
+        np.subtract(tt, start[:, None], out=ramp)
+        ramp /= d[:, None]
+        np.clip(ramp, 0.0, 1.0, out=ramp)
+        ramp *= (lvl - prev)[:, None]
+        out += ramp
+        start += d
+        prev = lvl
+    return out
+
+
+def generate(config: TrapConfig, scenario: str, n_paths: int, rng: np.random.Generator,
+             side: str = "long") -> TrapPaths:
+    """Un lot de chemins pour un scénario (vectorisé, float32)."""
+    if scenario not in SCENARIOS:
+        raise ValueError(f"unknown scenario: {scenario} (known: {', '.join(SCENARIOS)})")
+    c, b, n = config, n_paths, config.steps
+    x = rng.standard_normal((b, n), dtype=np.float32)
+    x *= np.float32(c.sigma)
+    np.cumsum(x, axis=1, out=x)
+    e = c.range_steps - 1
+    lo = x[:, :c.range_steps].min(axis=1)
+    hi = x[:, :c.range_steps].max(axis=1)
+    w = hi - lo
+    volume = rng.standard_normal((b, n), dtype=np.float32)  # log-normal, tiré en float32
+    volume *= np.float32(0.5)
+    np.exp(volume, out=volume)
+
+    t0 = np.full(b, -1)
+    t_first = np.full(b, -1)
+    t_end = np.full(b, -1)
+    if scenario != "baseline":
+        t0 = e + _steps(rng, c.inject_after, b)
+        rows = np.arange(b)
+        leg = lambda: _steps(rng, c.leg_steps, b)  # noqa: E731
+        rev = lambda: _steps(rng, c.revert_steps, b)  # noqa: E731
+        if scenario == "stop_hunt":
+            levels = [lo - _uniform(rng, c.depth, b) * w, x[:, e] + _uniform(rng, c.follow, b) * w]
+            durs = [leg(), rev()]
+        elif scenario == "fake_breakout":
+            top = hi + _uniform(rng, c.depth, b) * w
+            levels = [top, top, lo - _uniform(rng, c.depth, b) * w]
+            durs = [rev(), leg(), leg()]
+        else:  # liquidity_sweep
+            levels = [hi + _uniform(rng, c.depth, b) * w, lo - _uniform(rng, c.depth, b) * w, (lo + hi) / 2]
+            durs = [leg(), leg(), rev()]
+        # chaque jambe rejoint son niveau exactement: décalage = niveau - bruit à la fin de la jambe
+        ends = t0 + np.cumsum(durs, axis=0)
+        rel = [lvl - x[rows, end] for lvl, end in zip(levels, ends)]
+        tt = np.arange(n, dtype=np.float32)[None, :] - t0[:, None].astype(np.float32)
+        x += _legs(tt, rel, durs)
+        t_first, t_end = ends[0], ends[-1]
+        active = (tt >= 0) & (tt < (t_end - t0)[:, None])
+        np.multiply(volume, np.float32(c.volume_mult), out=volume, where=active)
+
+    if side == "short":
+        x = -x
+        lo, hi = -hi, -lo
+    elif side != "long":
+        raise ValueError(f"unknown side: {side}")
+    flow = np.empty_like(x)
+    flow[:, 0] = 0.0
+    np.subtract(x[:, 1:], x[:, :-1], out=flow[:, 1:])
+    flow /= np.float32(c.sigma)
+    np.tanh(flow, out=flow)
+    flow *= volume
+    return TrapPaths(scenario, x, volume, flow, t0, t_first, t_end, e, lo, hi)
+
+
+def evaluate(paths: TrapPaths, buffers: Sequence[float], target_rr: float) -> np.ndarray:
+    """
+    Issue d'une position longue prise à paths.entry, pour chaque tampon de
+    stop: accumulateurs (len(buffers), len(_ACC)) sommables entre lots.
+    Premier contact (stop ou objectif) par argmax sur le masque booléen;
+    `trapped` = stoppé puis objectif atteint plus tard (le stop a été chassé).
+    Le stop est exécuté au premier prix qui le franchit (R <= -1 en cas de
+    gap), l'objectif au prix limite; les positions encore ouvertes sont
+    valorisées au dernier pas.
+    """
+    x, e = paths.x, paths.entry
+    post = x[:, e + 1:]
+    b, m = post.shape
+    rows = np.arange(b)
+    px = x[:, e]
+    w = paths.hi - paths.lo
+    cmax = np.maximum.accumulate(post, axis=1)
+    cmin = np.minimum.accumulate(post, axis=1)
+    rmax = np.maximum.accumulate(post[:, ::-1], axis=1)[:, ::-1]  # max futur à partir de t
+    out = np.zeros((len(buffers), len(_ACC)))
+    for i, buf in enumerate(buffers):
+        stop = paths.lo - np.float32(buf) * w
+        risk = px - stop
+        target = px + np.float32(target_rr) * risk
+        hs = cmin <= stop[:, None]
+        ht = cmax >= target[:, None]
+        s_any, t_any = hs[:, -1], ht[:, -1]
+        s_idx = np.where(s_any, hs.argmax(axis=1), m)
+        t_idx = np.where(t_any, ht.argmax(axis=1), m)
+        stopped = s_idx < t_idx
+        won = t_idx < s_idx
+        opened = ~(stopped | won)
+        last = np.minimum(np.minimum(s_idx, t_idx), m - 1)
+        # stop-market: exécuté au prix qui franchit le stop (gap compris); objectif = ordre limite
+        r = np.where(won, target_rr, (post[rows, last] - px) / risk)
+        trapped = stopped & (rmax[rows, last] >= target)
+        acc = out[i]
+        acc[_A["paths"]] = b
+        acc[_A["stop"]] = stopped.sum()
+        acc[_A["target"]] = won.sum()
+        acc[_A["open"]] = opened.sum()
+        acc[_A["trapped"]] = trapped.sum()
+        acc[_A["sum_r"]] = r.sum(dtype=np.float64)
+        acc[_A["sum_r2"]] = (r * r).sum(dtype=np.float64)
+        acc[_A["sum_mae"]] = ((px - cmin[rows, last]) / risk).sum(dtype=np.float64)
+        acc[_A["sum_mfe"]] = ((cmax[rows, last] - px) / risk).sum(dtype=np.float64)
+        acc[_A["sum_t_stop"]] = s_idx[stopped].sum() + stopped.sum()
+        acc[_A["sum_t_target"]] = t_idx[won].sum() + won.sum()
+    return out
+
+
+def _run_batch(config: TrapConfig, scenario: str, n_paths: int, entropy: int, key: Tuple[int, ...],
+               side: str) -> np.ndarray:
+    rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=key))
+    return evaluate(generate(config, scenario, n_paths, rng, side), config.stop_buffers, config.target_rr)
+
+
+@dataclass
+class TrapReport:
+    """
+    Statistiques agrégées par scénario et tampon de stop. risk_view() donne,
+    par scénario, les probabilités de stop / objectif / piège et l'espérance
+    en R du meilleur tampon: à brancher sur le contrôle de risque.
+    """
+    config: TrapConfig
+    side: str
+    seed: int
+    acc: Dict[str, np.ndarray]
+    seconds: float = 0.0
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def paths(self) -> int:
+        return int(sum(a[0, _A["paths"]] for a in self.acc.values()))
+
+    @property
+    def paths_per_s(self) -> float:
+        return self.paths / self.seconds if self.seconds > 0 else 0.0
+
+    def stats(self, scenario: str) -> Dict[str, np.ndarray]:
+        """Colonnes (len(stop_buffers),): p_stop, p_target, p_open, p_trapped, mean_r, stderr_r, ..."""
+        a = self.acc[scenario]
+        n = a[:, _A["paths"]]
+        stop, target = a[:, _A["stop"]], a[:, _A["target"]]
+        mean = a[:, _A["sum_r"]] / n
+        var = np.maximum(a[:, _A["sum_r2"]] / n - mean * mean, 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {
+                "stop_buffer": np.asarray(self.config.stop_buffers, dtype=np.float64),
+                "p_stop": stop / n,
+                "p_target": target / n,
+                "p_open": a[:, _A["open"]] / n,
+                "p_trapped": a[:, _A["trapped"]] / n,
+                "trapped_share": np.where(stop > 0, a[:, _A["trapped"]] / stop, 0.0),
+                "mean_r": mean,
+                "stderr_r": np.sqrt(var / n),
+                "mae_r": a[:, _A["sum_mae"]] / n,
+                "mfe_r": a[:, _A["sum_mfe"]] / n,
+                "steps_to_stop": np.where(stop > 0, a[:, _A["sum_t_stop"]] / stop, np.nan),
+                "steps_to_target": np.where(target > 0, a[:, _A["sum_t_target"]] / target, np.nan),
+            }
+
+    def risk_view(self) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for s in self.acc:
+            st = self.stats(s)
+            i = int(np.argmax(st["mean_r"]))
+            out[s] = {k: float(v[i]) for k, v in st.items()}
+        return out
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "side": self.side, "seed": self.seed, "paths": self.paths, "seconds": round(self.seconds, 4),
+            "paths_per_s": round(self.paths_per_s, 1), "config": asdict(self.config), "meta": self.meta,
+            "scenarios": {s: {k: v.tolist() for k, v in self.stats(s).items()} for s in self.acc},
+            "risk_view": self.risk_view(),
+        }
+
+
+class TrapSimulator:
+    """
+    Monte Carlo vectorisé de pièges (stop hunt, fausse cassure, balayage de
+    liquidité): les chemins sont générés par lots NumPy (b, n_steps) en
+    float32, évalués contre un placement long (entrée, stop sous le range,
+    objectif en R) et réduits en accumulateurs; les lots sont répartis sur
+    un pool de processus.
+
+    Reproductible: le lot i du scénario j tire ses nombres de
+    SeedSequence(seed, spawn_key=(j, i)); le résultat ne dépend que de
+    (seed, batch_size), pas du nombre de workers ni de l'ordre d'exécution
+    (les accumulateurs sont sommés dans l'ordre des lots).
+
+    Exemple d'usage:
+      sim = TrapSimulator(TrapConfig(target_rr=2.0), workers=8, seed=42)
+      rep = sim.run(1_000_000)              # par scénario
+      rep.risk_view()["stop_hunt"]          # p_stop, p_trapped, mean_r du meilleur tampon
+      print(f"{rep.paths_per_s:,.0f} paths/s")
+    """
+
+    def __init__(
+        self,
+        config: Optional[TrapConfig] = None,
+        *,
+        workers: Optional[int] = None,
+        batch_size: int = 8192,
+        seed: int = 0,
+    ) -> None:
+        if batch_size < 1:
+            raise ValueError("batch_size must be >= 1")
+        self.config = config or TrapConfig()
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.batch_size = batch_size
+        self.seed = seed
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self) -> "TrapSimulator":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def paths(self, scenario: str, n_paths: int, *, batch: int = 0, side: str = "long") -> TrapPaths:
+        """Chemins bruts du lot `batch` (mêmes tirages que run()), pour inspection ou décodage."""
+        key = (SCENARIOS.index(scenario), batch)
+        rng = np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=key))
+        return generate(self.config, scenario, n_paths, rng, side)
+
+    def run(self, n_paths: int, *, scenarios: Sequence[str] = SCENARIOS, side: str = "long") -> TrapReport:
+        """n_paths chemins par scénario."""
+        for s in scenarios:
+            if s not in SCENARIOS:
+                raise ValueError(f"unknown scenario: {s} (known: {', '.join(SCENARIOS)})")
+        jobs: List[Tuple[str, int, Tuple[int, int]]] = []
+        for s in scenarios:
+            for i in range(math.ceil(n_paths / self.batch_size)):
+                size = min(self.batch_size, n_paths - i * self.batch_size)
+                jobs.append((s, size, (SCENARIOS.index(s), i)))
+        t0 = time.perf_counter()
+        if self.workers == 1:
+            parts = [_run_batch(self.config, s, size, self.seed, key, side) for s, size, key in jobs]
+        else:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers)
+            futs = [self._pool.submit(_run_batch, self.config, s, size, self.seed, key, side)
+                    for s, size, key in jobs]
+            parts = [f.result() for f in futs]
+        acc: Dict[str, np.ndarray] = {s: np.zeros((len(self.config.stop_buffers), len(_ACC))) for s in scenarios}
+        for (s, _, _), part in zip(jobs, parts):
+            acc[s] += part
+        dt = time.perf_counter() - t0
+        meta = {"batches": len(jobs), "batch_size": self.batch_size, "workers": self.workers}
+        return TrapReport(self.config, side, self.seed, acc, dt, meta)
+
+
+def _main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Monte Carlo trap scenarios (stop hunt, fake breakout, sweep)")
+    parser.add_argument("--paths", type=int, default=100_000, help="paths per scenario")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch", type=int, default=8192)
+    parser.add_argument("--side", choices=("long", "short"), default="long")
+    parser.add_argument("--target-rr", type=float, default=2.0)
+    parser.add_argument("--out", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    with TrapSimulator(TrapConfig(target_rr=args.target_rr), workers=args.workers, batch_size=args.batch,
+                       seed=args.seed) as sim:
+        rep = sim.run(args.paths, side=args.side)
+    doc = rep.to_dict()
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, indent=2)
+    print(json.dumps({"paths": rep.paths, "paths_per_s": round(rep.paths_per_s), "risk_view": doc["risk_view"]},
+                     indent=2))
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,305 @@
+﻿from __future__ import annotations
+
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+log = logging.getLogger("sniper")
+
+# Types d'impulsions
+BURST, IMBALANCE, MOMENTUM = "burst", "imbalance", "momentum"
+KINDS = (BURST, IMBALANCE, MOMENTUM)
+
+_exp = math.exp
+_sqrt = math.sqrt
+
+
+@dataclass(frozen=True)
+class PulseConfig:
+    """
+    tau_fast / tau_slow (s): constantes de décroissance des compteurs
+    rapides (l'impulsion) et lents (la référence). Une impulsion n'est
+    lue qu'après warmup_s d'historique et au moins min_trades trades
+    récents (compteur rapide), puis au plus une fois par cooldown_s et par
+    type pour un symbole.
+    """
+    tau_fast: float = 2.0
+    tau_slow: float = 120.0
+    burst_ratio: float = 5.0        # intensité rapide / intensité lente (trades/s)
+    imbalance: float = 0.75         # |achats - ventes| / volume sur la fenêtre rapide
+    move_z: float = 5.0             # écart au prix lissé / écart-type attendu sur la fenêtre rapide
+    var_trades: int = 500           # mémoire (en trades) de la variance des rendements
+    min_trades: int = 20
+    warmup_s: Optional[float] = None  # None: tau_slow
+    cooldown_s: float = 5.0
+
+    def __post_init__(self) -> None:
+        if not 0 < self.tau_fast < self.tau_slow:
+            raise ValueError("need 0 < tau_fast < tau_slow")
+        if self.min_trades < 1 or self.var_trades < 2:
+            raise ValueError("min_trades must be >= 1 and var_trades >= 2")
+
+
+class Pulse(NamedTuple):
+    """Impulsion détectée; side = +1 (acheteurs agressifs / hausse), -1 sinon."""
+    symbol: str
+    kind: str
+    ts: float
+    price: float
+    side: int
+    strength: float     # burst: ratio d'intensité; imbalance: part signée; momentum: z
+    rate: float         # trades/s sur la fenêtre rapide
+    flow: float         # (achats - ventes) / volume, fenêtre rapide
+    move_z: float
+
+
+# ---------- File bornée mono-producteur / mono-consommateur ----------
+
+class PulseQueue:
+    """
+    Anneau borné SPSC sans verrou: seul le producteur écrit _tail (après
+    avoir rempli le slot), seul le consommateur écrit _head. Sous le GIL
+    chaque affectation d'attribut est atomique, donc un thread consommateur
+    peut vider la file pendant que le décodeur la remplit. File pleine:
+    l'impulsion la plus récente est refusée et comptée dans `dropped` (le
+    producteur ne touche jamais _head).
+
+    Exemple d'usage:
+      q = PulseQueue(4096)
+      q.push(pulse)              # producteur (PulseDecoder)
+      for p in q.drain(): ...    # consommateur, éventuellement dans un autre thread
+    """
+
+    __slots__ = ("capacity", "_mask", "_buf", "_head", "_tail", "dropped", "high_water")
+
+    def __init__(self, capacity: int = 4096) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        size = 1 << (capacity - 1).bit_length()
+        self.capacity = size
+        self._mask = size - 1
+        self._buf: List[Any] = [None] * size
+        self._head = 0
+        self._tail = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    def __len__(self) -> int:
+        return self._tail - self._head
+
+    @property
+    def pushed(self) -> int:
+        return self._tail
+
+    def push(self, item: Any) -> bool:
+        tail = self._tail
+        n = tail - self._head
+        if n >= self.capacity:
+            self.dropped += 1
+            return False
+        self._buf[tail & self._mask] = item
+        self._tail = tail + 1  # publication: le slot est écrit
+        if n >= self.high_water:
+            self.high_water = n + 1
+        return True
+
+    def pop(self) -> Any:
+        head = self._head
+        if head == self._tail:
+            return None
+        i = head & self._mask
+        item, self._buf[i] = self._buf[i], None
+        self._head = head + 1
+        return item
+
+    def drain(self, max_items: Optional[int] = None) -> List[Any]:
+        head, tail = self._head, self._tail
+        if max_items is not None:
+            tail = min(tail, head + max_items)
+        buf, mask = self._buf, self._mask
+        out = []
+        for k in range(head, tail):
+            i = k & mask
+            out.append(buf[i])
+            buf[i] = None
+        self._head = tail
+        return out
+
+
+# ---------- Décodeur ----------
+
+class _Sym:
+    __slots__ = ("symbol", "t", "first", "cf", "cs", "vf", "ff", "price", "anchor", "var", "last")
+
+    def __init__(self, symbol: str, t: float, price: float) -> None:
+        self.symbol = symbol
+        self.t = t
+        self.first = t
+        self.cf = self.cs = 0.0        # nombre de trades, décroissance rapide / lente
+        self.vf = self.ff = 0.0        # volume et flux signé (achats - ventes), rapides
+        self.price = price
+        self.anchor = price            # prix lissé sur tau_fast
+        self.var = 0.0                 # variance des rendements par trade
+        self.last = [-math.inf] * len(KINDS)
+
+
+class PulseDecoder:
+    """
+    Détection d'impulsions sur le flux de trades (aggTrade) de tous les
+    symboles, en O(1) par trade et sans tableau d'historique: par symbole,
+    compteurs à décroissance exponentielle en temps (trades, volume, flux
+    signé sur tau_fast; trades sur tau_slow), prix lissé et variance en
+    ligne des rendements. Trois lectures:
+
+      - burst: intensité rapide >= burst_ratio x intensité lente;
+      - imbalance: |flux signé| / volume >= imbalance sur la fenêtre rapide;
+      - momentum: écart au prix lissé >= move_z écarts-types attendus.
+
+    Les impulsions (Pulse) partent dans une PulseQueue bornée; le décodeur
+    n'appelle aucun consommateur sur le chemin chaud.
+
+    Exemple d'usage:
+      dec = PulseDecoder(PulseConfig(burst_ratio=6.0))
+      dec.on_agg_trade(msg)                       # {"e": "aggTrade", "s", "p", "q", "T", "m"}
+      dec.on_trade("BTCUSDT", ts, price, qty, buyer_maker)
+      for p in dec.queue.drain(): ...             # thread consommateur possible
+      for f, block in MarketReplay(paths).blocks():
+          dec.on_records(block, f.symbols)        # rejeu d'un enregistrement market_recorder
+    """
+
+    def __init__(self, config: Optional[PulseConfig] = None, *, queue: Optional[PulseQueue] = None,
+                 queue_size: int = 4096) -> None:
+        self.config = c = config or PulseConfig()
+        self.queue = queue if queue is not None else PulseQueue(queue_size)
+        self._syms: Dict[str, _Sym] = {}
+        self.trades = 0
+        self.pulses = dict.fromkeys(KINDS, 0)
+        # constantes du chemin chaud
+        self._if = 1.0 / c.tau_fast
+        self._is = 1.0 / c.tau_slow
+        self._burst_k = c.burst_ratio * c.tau_fast / c.tau_slow  # cf >= k * cs <=> ratio d'intensités
+        self._va = 1.0 / c.var_trades
+        self._warm = c.tau_slow if c.warmup_s is None else c.warmup_s
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._syms)
+
+    def state(self, symbol: str) -> Dict[str, float]:
+        """Lecture des compteurs d'un symbole (décroissance appliquée jusqu'au dernier trade)."""
+        s = self._syms[symbol]
+        return {"rate_fast": s.cf * self._if, "rate_slow": s.cs * self._is,
+                "flow": s.ff / s.vf if s.vf > 0 else 0.0, "volume_fast": s.vf, "price": s.price,
+                "anchor": s.anchor, "ret_std": _sqrt(s.var)}
+
+    # ---------- chemin chaud ----------
+
+    def on_trade(self, symbol: str, ts: float, price: float, qty: float, buyer_maker: bool) -> int:
+        """Un trade (ts en secondes); retourne le nombre d'impulsions émises."""
+        s = self._syms.get(symbol)
+        if s is None:
+            s = self._syms[symbol] = _Sym(symbol, ts, price)
+        self.trades += 1
+        dt = ts - s.t
+        if dt > 0.0:
+            f = _exp(-dt * self._if)
+            s.cf = s.cf * f + 1.0
+            s.cs = s.cs * _exp(-dt * self._is) + 1.0
+            s.vf *= f
+            s.ff *= f
+            s.anchor += (1.0 - f) * (price - s.anchor)
+            s.t = ts
+        else:
+            s.cf += 1.0
+            s.cs += 1.0
+        s.vf += qty
+        s.ff += -qty if buyer_maker else qty
+        r = price / s.price - 1.0
+        s.var += self._va * (r * r - s.var)
+        s.price = price
+        cf = s.cf
+        if cf < self.config.min_trades or ts - s.first < self._warm:
+            return 0
+        c = self.config
+        n = 0
+        flow = s.ff / s.vf if s.vf > 0.0 else 0.0
+        var = s.var
+        # écart au prix lissé, en écarts-types d'une marche aléatoire de cf trades
+        z = (price / s.anchor - 1.0) / _sqrt(var * cf) if var > 0.0 else 0.0
+        if cf >= self._burst_k * s.cs:
+            n += self._emit(s, 0, ts, price, 1 if flow >= 0 else -1, cf * self._if / (s.cs * self._is), flow, z)
+        if flow >= c.imbalance or flow <= -c.imbalance:
+            n += self._emit(s, 1, ts, price, 1 if flow > 0 else -1, flow, flow, z)
+        if z >= c.move_z or z <= -c.move_z:
+            n += self._emit(s, 2, ts, price, 1 if z > 0 else -1, z, flow, z)
+        return n
+
+    def _emit(self, s: _Sym, k: int, ts: float, price: float, side: int, strength: float, flow: float,
+              z: float) -> int:
+        if ts - s.last[k] < self.config.cooldown_s:
+            return 0
+        s.last[k] = ts
+        kind = KINDS[k]
+        self.pulses[kind] += 1
+        self.queue.push(Pulse(s.symbol, kind, ts, price, side, strength, s.cf * self._if, flow, z))
+        return 1
+
+    # ---------- entrées ----------
+
+    def on_agg_trade(self, msg: Mapping[str, Any]) -> int:
+        """Message Binance @aggTrade / @trade (éventuellement enveloppé {"stream", "data"})."""
+        d = msg.get("data", msg)
+        return self.on_trade(d["s"], d["T"] * 1e-3, float(d["p"]), float(d["q"]), bool(d["m"]))
+
+    def on_batch(self, symbols: Iterable[str], ts: Sequence[float], price: Sequence[float],
+                 qty: Sequence[float], buyer_maker: Sequence[bool]) -> int:
+        """Trades en colonnes (listes ou tableaux), dans l'ordre du flux."""
+        if isinstance(ts, np.ndarray):
+            ts, price, qty, buyer_maker = ts.tolist(), price.tolist(), qty.tolist(), buyer_maker.tolist()
+        on_trade = self.on_trade
+        n = 0
+        for s, t, p, q, m in zip(symbols, ts, price, qty, buyer_maker):
+            n += on_trade(s, t, p, q, m)
+        return n
+
+    def on_records(self, records: np.ndarray, symbols: Sequence[str]) -> int:
+        """Enregistrements market_recorder.RECORD (bloc de MarketReplay.blocks()): trades seulement."""
+        from sniper_engine.market_recorder import TRADE
+
+        tr = records[records["kind"] == TRADE]
+        if not len(tr):
+            return 0
+        names = np.asarray(symbols, dtype=object)[tr["sym"]]
+        return self.on_batch(names.tolist(), tr["ts"] * 1e-9, tr["price"], tr["qty"], (tr["flags"] & 1).astype(bool))
+
+
+def _main():
+    import argparse
+    import json
+
+    from sniper_engine.market_recorder import MarketReplay
+
+    parser = argparse.ArgumentParser(description="Replay recorded trades through the pulse decoder")
+    parser.add_argument("source", nargs="+", help="tick files or directories (market_recorder)")
+    parser.add_argument("--burst-ratio", type=float, default=PulseConfig.burst_ratio)
+    parser.add_argument("--imbalance", type=float, default=PulseConfig.imbalance)
+    parser.add_argument("--move-z", type=float, default=PulseConfig.move_z)
+    args = parser.parse_args()
+
+    dec = PulseDecoder(PulseConfig(burst_ratio=args.burst_ratio, imbalance=args.imbalance, move_z=args.move_z))
+    t0 = time.perf_counter()
+    for f, block in MarketReplay(args.source).blocks():
+        dec.on_records(block, f.symbols)
+        for p in dec.queue.drain():
+            print(json.dumps(p._asdict()))
+    dt = time.perf_counter() - t0
+    print(json.dumps({"trades": dec.trades, "pulses": dec.pulses, "dropped": dec.queue.dropped,
+                      "trades_per_s": round(dec.trades / dt) if dt > 0 else None}))
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,489 @@
+﻿from __future__ import annotations
+
+import abc
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from vectorx.vectorx_signals import BAR_FIELDS, FeatureDef, SignalSet, VectorXConfig, load_config
+
+log = logging.getLogger("sniper")
+
+NAN = float("nan")
+META = "meta.json"
+SNAPSHOT_FORMAT = 1
+
+
+# ---------- Features vectorisées ----------
+#
+# Chaque feature garde son état dans des tableaux (capacité, ...) indexés
+# par symbole; update() reçoit les lignes mises à jour (slice ou indices)
+# et la source de ces lignes, et retourne la valeur de la feature pour
+# elles. Mêmes définitions que les indicateurs streaming de
+# sniper_engine.indicators (EMA, ZScore, RSI, ATR).
+
+class _Feature(abc.ABC):
+    fields: Dict[str, Tuple[Tuple[int, ...], Any, float]] = {}
+
+    def __init__(self, name: str, d: FeatureDef) -> None:
+        self.name = name
+        self.source = d.source
+        self.period = d.period
+
+    def layout(self) -> Dict[str, Tuple[Tuple[int, ...], Any, float]]:
+        """{champ: (forme sans l'axe symbole, dtype, valeur initiale)}."""
+        return self.fields
+
+    @abc.abstractmethod
+    def update(self, st: Dict[str, np.ndarray], rows, x: np.ndarray, bars: np.ndarray) -> np.ndarray:
+        ...
+
+    def key(self, field: str) -> str:
+        return f"{self.name}.{field}"
+
+
+class _EMA(_Feature):
+    fields = {"value": ((), np.float64, NAN)}
+
+    def update(self, st, rows, x, bars):
+        e = st[self.key("value")]
+        prev = e[rows]
+        a = 2.0 / (self.period + 1)
+        new = np.where(np.isnan(prev), x, prev + a * (x - prev))
+        e[rows] = new
+        return new
+
+
+class _LogRet(_Feature):
+    fields = {"prev": ((), np.float64, NAN)}
+
+    def update(self, st, rows, x, bars):
+        p = st[self.key("prev")]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out = np.log(x / p[rows])
+        p[rows] = x
+        return out
+
+
+class _EWStd(_Feature):
+    fields = {"mean": ((), np.float64, NAN), "var": ((), np.float64, 0.0)}
+
+    def update(self, st, rows, x, bars):
+        m, v = st[self.key("mean")], st[self.key("var")]
+        a = 2.0 / (self.period + 1)
+        mr, vr = m[rows], v[rows]
+        first = np.isnan(mr)
+        d = np.where(first, 0.0, x - mr)
+        new_m = np.where(first, x, mr + a * d)
+        new_v = np.where(first, 0.0, (1.0 - a) * (vr + a * d * d))
+        m[rows], v[rows] = new_m, new_v
+        return np.sqrt(new_v)
+
+
+class _Ring(_Feature):
+    """Fenêtre glissante de `period` valeurs par symbole."""
+
+    def layout(self):
+        return {"ring": ((self.period,), np.float64, 0.0), "pos": ((), np.int64, 0), "n": ((), np.int64, 0)}
+
+    def _push(self, st, rows, x) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        ring, pos, n = st[self.key("ring")], st[self.key("pos")], st[self.key("n")]
+        r = np.arange(len(ring))[rows]
+        pr = pos[rows]
+        old = ring[r, pr]
+        ring[r, pr] = x
+        pos[rows] = (pr + 1) % self.period
+        nr = n[rows] + 1
+        n[rows] = nr
+        return r, old, nr
+
+
+class _ZScore(_Ring):
+    # somme et somme des carrés des valeurs décalées (x - première valeur),
+    # comme indicators.ZScore: O(1) par pas quelle que soit la période
+
+    def layout(self):
+        return {**super().layout(), "ref": ((), np.float64, NAN), "s": ((), np.float64, 0.0),
+                "q": ((), np.float64, 0.0)}
+
+    def update(self, st, rows, x, bars):
+        ref, s, q = st[self.key("ref")], st[self.key("s")], st[self.key("q")]
+        r0 = ref[rows]
+        r0 = np.where(np.isnan(r0), x, r0)
+        ref[rows] = r0
+        y = x - r0
+        _, old, nr = self._push(st, rows, y)
+        sr = s[rows] + (y - old)
+        qr = q[rows] + (y * y - old * old)
+        s[rows], q[rows] = sr, qr
+        m = sr / self.period
+        var = qr / self.period - m * m
+        sd = np.sqrt(np.maximum(var, 0.0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = np.where(sd > 0, (y - m) / sd, 0.0)
+        return np.where(nr >= self.period, z, NAN)
+
+
+class _ROC(_Ring):
+    def update(self, st, rows, x, bars):
+        _, old, nr = self._push(st, rows, x)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(nr > self.period, x / old - 1.0, NAN)
+
+
+def _wilder(st: Dict[str, np.ndarray], prefix: str, rows, v: np.ndarray, p: int) -> np.ndarray:
+    """Moyenne de Wilder (amorce: moyenne simple des p premières valeurs)."""
+    n, acc, val = st[prefix + "n"], st[prefix + "acc"], st[prefix + "value"]
+    n1 = n[rows] + 1
+    a = acc[rows]
+    cur = val[rows]
+    new = np.where(n1 == p, (a + v) / p, np.where(n1 > p, (cur * (p - 1) + v) / p, NAN))
+    n[rows] = n1
+    acc[rows] = np.where(n1 < p, a + v, a)
+    val[rows] = new
+    return new
+
+
+def _wilder_fields(prefix: str) -> Dict[str, Tuple[Tuple[int, ...], Any, float]]:
+    return {prefix + "n": ((), np.int64, 0), prefix + "acc": ((), np.float64, 0.0),
+            prefix + "value": ((), np.float64, NAN)}
+
+
+class _RSI(_Feature):
+    fields = {"prev": ((), np.float64, NAN), **_wilder_fields("gain."), **_wilder_fields("loss.")}
+
+    def update(self, st, rows, x, bars):
+        p = st[self.key("prev")]
+        prev = p[rows].copy()  # rows peut être une slice (vue)
+        p[rows] = x
+        out = np.full(len(prev), NAN)
+        ok = ~np.isnan(prev)
+        if not ok.any():
+            return out
+        sub = np.arange(len(p))[rows][ok]
+        d = x[ok] - prev[ok]
+        ag = _wilder(st, self.key("gain."), sub, np.maximum(d, 0.0), self.period)
+        al = _wilder(st, self.key("loss."), sub, np.maximum(-d, 0.0), self.period)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = np.where(al == 0.0, np.where(ag == 0.0, 50.0, 100.0), 100.0 - 100.0 / (1.0 + ag / al))
+        out[ok] = np.where(np.isnan(ag), NAN, r)
+        return out
+
+
+class _ATR(_Feature):
+    fields = {"prev_close": ((), np.float64, NAN), **_wilder_fields("tr.")}
+
+    def update(self, st, rows, x, bars):
+        h, lo, c = bars[:, 1], bars[:, 2], bars[:, 0]
+        pc = st[self.key("prev_close")]
+        prev = pc[rows]
+        tr = h - lo
+        with np.errstate(invalid="ignore"):
+            tr = np.where(np.isnan(prev), tr, np.maximum(tr, np.maximum(np.abs(h - prev), np.abs(lo - prev))))
+        pc[rows] = c
+        return _wilder(st, self.key("tr."), rows, tr, self.period)
+
+
+_KINDS = {"ema": _EMA, "logret": _LogRet, "ewstd": _EWStd, "zscore": _ZScore, "roc": _ROC, "rsi": _RSI,
+          "atr": _ATR}
+
+
+# ---------- Moteur ----------
+
+class VectorX:
+    """
+    Moteur de signaux multi-symboles: à chaque pas (barre), une seule passe
+    NumPy met à jour les features de tous les symboles concernés
+    (matrice symboles x features) puis évalue les signaux de
+    vectorx_config.yml sur les colonnes (une colonne = un vecteur sur les
+    symboles), sans boucle Python par symbole.
+
+      - step(close, high, low, volume, rows=None): barres alignées sur
+        `symbols` (ou sur `rows` pour une mise à jour partielle);
+      - stage()/flush() ou attach(BarAggregator, "1m"): les barres
+        clôturées sont regroupées puis évaluées en un pas;
+      - matrix (n, F), scores (n, G), directions (n, G) int8: vues à jour;
+      - snapshot(): état versionné sous <snapshot.dir>/<name>/vNNNNNN/
+        (un .npy par tableau + meta.json), écrit dans un répertoire
+        temporaire puis renommé; restore() relit les .npy en mmap et les
+        recopie: moteur chaud en quelques millisecondes.
+
+    Exemple d'usage:
+      vx = VectorX(load_config())                    # vectorx/vectorx_config.yml
+      vx.restore()                                   # dernier snapshot compatible, s'il existe
+      vx.attach(aggregator, "1m")
+      ...
+      vx.flush()                                     # un pas pour toutes les barres en attente
+      vx.scores[vx.index["BTCUSDT"]]
+      vx.snapshot()
+    """
+
+    def __init__(
+        self,
+        config: Union[VectorXConfig, str, Path, None] = None,
+        *,
+        snapshot_dir: Union[str, Path, None] = None,
+        autosave: bool = False,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.config = config if isinstance(config, VectorXConfig) else load_config(*(() if config is None else (config,)))
+        self.snapshot_root = Path(snapshot_dir or self.config.snapshot.dir) / self.config.name
+        self.autosave = autosave
+        self._clock = clock
+        self.features = [_KINDS[d.kind](name, d) for name, d in self.config.features.items()]
+        self.columns = [f.name for f in self.features]
+        self._col = {name: j for j, name in enumerate(self.columns)}
+        self.signals = SignalSet(self.config.signals)
+        self.symbols: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.steps = 0
+        self.version = 0
+        self._last_save = clock()
+        self._layout: Dict[str, Tuple[Tuple[int, ...], Any, float]] = {
+            "bars": ((len(BAR_FIELDS),), np.float64, NAN),
+            "count": ((), np.int64, 0),
+            "matrix": ((len(self.features),), np.float64, NAN),
+            "scores": ((len(self.signals),), np.float64, NAN),
+            "directions": ((len(self.signals),), np.int8, 0),
+        }
+        for f in self.features:
+            for k, spec in f.layout().items():
+                self._layout[f.key(k)] = spec
+        self.capacity = 0
+        self.state: Dict[str, np.ndarray] = {}
+        self._grow(self.config.capacity)
+        self._staged: Dict[int, Tuple[float, float, float, float]] = {}
+        self.add_symbols(self.config.symbols)
+
+    # ---------- symboles / état ----------
+
+    def _grow(self, capacity: int) -> None:
+        n = len(self.symbols)
+        for key, (tail, dtype, fill) in self._layout.items():
+            arr = np.full((capacity,) + tail, fill, dtype=dtype)
+            old = self.state.get(key)
+            if old is not None:
+                arr[:n] = old[:n]
+            self.state[key] = arr
+        self.capacity = capacity
+
+    def add_symbols(self, symbols: Iterable[str]) -> List[int]:
+        rows = []
+        for s in symbols:
+            i = self.index.get(s)
+            if i is None:
+                if len(self.symbols) == self.capacity:
+                    self._grow(self.capacity * 2)
+                i = self.index[s] = len(self.symbols)
+                self.symbols.append(s)
+            rows.append(i)
+        return rows
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self.state["matrix"][:len(self.symbols)]
+
+    @property
+    def scores(self) -> np.ndarray:
+        return self.state["scores"][:len(self.symbols)]
+
+    @property
+    def directions(self) -> np.ndarray:
+        return self.state["directions"][:len(self.symbols)]
+
+    def column(self, name: str) -> np.ndarray:
+        """Vue sur une feature (ou un champ de barre) pour tous les symboles."""
+        if name in self._col:
+            return self.matrix[:, self._col[name]]
+        return self.state["bars"][:len(self.symbols), BAR_FIELDS.index(name)]
+
+    def signal(self, name: str) -> np.ndarray:
+        return self.scores[:, self.signals.names.index(name)]
+
+    # ---------- pas de calcul ----------
+
+    def step(self, close, high=None, low=None, volume=None, *, rows: Optional[Sequence[int]] = None) -> np.ndarray:
+        """
+        Intègre une barre par symbole de `rows` (tous les symboles si None)
+        et réévalue features et signaux; retourne scores (vue).
+        """
+        n = len(self.symbols)
+        idx: Union[slice, np.ndarray] = slice(0, n) if rows is None else np.asarray(rows, dtype=np.intp)
+        close = np.asarray(close, dtype=np.float64)
+        m = n if rows is None else len(idx)
+        if close.shape != (m,):
+            raise ValueError(f"expected {m} closes, got shape {close.shape}")
+        bars = np.empty((m, len(BAR_FIELDS)))
+        bars[:, 0] = close
+        bars[:, 1] = close if high is None else high
+        bars[:, 2] = close if low is None else low
+        bars[:, 3] = 0.0 if volume is None else volume
+        missing = np.isnan(close)
+        if missing.any():  # pas de barre pour ces symboles: leur état ne bouge pas
+            idx = np.arange(self.capacity)[idx][~missing]
+            bars = bars[~missing]
+        st = self.state
+        st["bars"][idx] = bars
+        st["count"][idx] += 1
+        mat = st["matrix"]
+        for j, f in enumerate(self.features):
+            src = f.source
+            if src in self._col:
+                x = mat[idx, self._col[src]]
+            else:
+                x = bars[:, BAR_FIELDS.index(src)]
+            ok = ~np.isnan(x)
+            if ok.all():
+                mat[idx, j] = f.update(st, idx, x, bars)
+            elif ok.any():
+                sub = np.arange(self.capacity)[idx][ok]
+                mat[sub, j] = f.update(st, sub, x[ok], bars[ok])
+        self._evaluate()
+        self.steps += 1
+        if self.autosave and self._clock() - self._last_save >= self.config.snapshot.every_s:
+            self.snapshot()
+        return self.scores
+
+    def _evaluate(self) -> None:
+        n = len(self.symbols)
+        if not len(self.signals) or not n:
+            return
+        env: Dict[str, np.ndarray] = {name: self.state["bars"][:n, k] for k, name in enumerate(BAR_FIELDS)}
+        mat = self.state["matrix"][:n]
+        env.update({name: mat[:, j] for j, name in enumerate(self.columns)})
+        self.signals.evaluate(env, self.state["scores"][:n], self.state["directions"][:n])
+
+    def stage(self, symbol: str, close: float, high: Optional[float] = None, low: Optional[float] = None,
+              volume: float = 0.0) -> None:
+        """Met une barre en attente (la dernière l'emporte); flush() les évalue en un pas."""
+        i = self.index.get(symbol)
+        if i is None:
+            i = self.add_symbols([symbol])[0]
+        c = float(close)
+        self._staged[i] = (c, c if high is None else float(high), c if low is None else float(low), float(volume))
+
+    def flush(self) -> int:
+        if not self._staged:
+            return 0
+        rows = np.fromiter(self._staged.keys(), dtype=np.intp, count=len(self._staged))
+        b = np.array(list(self._staged.values()))
+        self._staged.clear()
+        self.step(b[:, 0], b[:, 1], b[:, 2], b[:, 3], rows=rows)
+        return len(rows)
+
+    def attach(self, aggregator: Any, spec: str) -> None:
+        """Alimente stage() avec les barres `spec` clôturées d'un sniper_engine.bar_aggregator.BarAggregator."""
+        def _on_bar(symbol, bar_spec, ring):
+            if bar_spec.name == spec:
+                b = ring.last(1)
+                self.stage(symbol, b.close[0], b.high[0], b.low[0], b.volume[0])
+        aggregator.subscribe(_on_bar)
+
+    # ---------- snapshots ----------
+
+    def versions(self) -> List[int]:
+        if not self.snapshot_root.is_dir():
+            return []
+        out = []
+        for p in self.snapshot_root.iterdir():
+            if p.is_dir() and p.name.startswith("v") and p.name[1:].isdigit() and (p / META).exists():
+                out.append(int(p.name[1:]))
+        return sorted(out)
+
+    def snapshot(self) -> Path:
+        """Écrit l'état courant dans une nouvelle version; garde les `snapshot.keep` dernières."""
+        self.flush()
+        version = max([self.version] + self.versions()) + 1
+        final = self.snapshot_root / f"v{version:06d}"
+        tmp = self.snapshot_root / f".v{version:06d}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        n = len(self.symbols)
+        for key, arr in self.state.items():
+            np.save(tmp / f"{key}.npy", arr[:n])
+        meta = {
+            "format": SNAPSHOT_FORMAT, "version": version, "name": self.config.name,
+            "state_hash": self.config.state_hash(), "created": self._clock(), "steps": self.steps,
+            "symbols": self.symbols, "columns": self.columns, "signals": self.signals.names,
+        }
+        with open(tmp / META, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, final)
+        self.version = version
+        self._last_save = self._clock()
+        for old in self.versions()[:-self.config.snapshot.keep]:
+            shutil.rmtree(self.snapshot_root / f"v{old:06d}", ignore_errors=True)
+        return final
+
+    def restore(self, version: Optional[int] = None) -> bool:
+        """
+        Recharge un snapshot (le plus récent par défaut). False s'il n'y en a
+        pas; ValueError s'il a été écrit pour d'autres features.
+        """
+        versions = self.versions()
+        if version is None:
+            if not versions:
+                return False
+            version = versions[-1]
+        path = self.snapshot_root / f"v{version:06d}"
+        meta = json.loads((path / META).read_text(encoding="utf-8"))
+        if meta["format"] != SNAPSHOT_FORMAT or meta["state_hash"] != self.config.state_hash():
+            raise ValueError(f"{path}: snapshot state does not match the configured features")
+        symbols = list(meta["symbols"])
+        cap = max(self.config.capacity, 1)
+        while cap < len(symbols):
+            cap *= 2
+        self.symbols, self.index, self.state = [], {}, {}
+        self._grow(cap)
+        self.symbols = symbols
+        self.index = {s: i for i, s in enumerate(symbols)}
+        n = len(symbols)
+        for key in self._layout:
+            file = path / f"{key}.npy"
+            if not file.exists():
+                if key in ("scores", "directions"):
+                    continue  # signaux modifiés depuis: recalculés ci-dessous
+                raise ValueError(f"{path}: missing state array {key}")
+            src = np.load(file, mmap_mode="r")
+            if key in ("scores", "directions") and src.shape[1:] != self.state[key].shape[1:]:
+                continue
+            self.state[key][:n] = src
+        self.steps = int(meta["steps"])
+        self.version = version
+        self._staged.clear()
+        self._evaluate()
+        self.add_symbols(self.config.symbols)
+        return True
+
+
+def _main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="VectorX snapshots")
+    parser.add_argument("--config", default=None, help="path to vectorx_config.yml")
+    parser.add_argument("--list", action="store_true", help="list snapshot versions")
+    args = parser.parse_args()
+
+    vx = VectorX(args.config)
+    if args.list:
+        for v in vx.versions():
+            meta = json.loads((vx.snapshot_root / f"v{v:06d}" / META).read_text(encoding="utf-8"))
+            print(json.dumps({"version": v, "symbols": len(meta["symbols"]), "steps": meta["steps"],
+                              "created": meta["created"]}))
+        return
+    t0 = time.perf_counter()
+    ok = vx.restore()
+    print(json.dumps({"restored": ok, "version": vx.version, "symbols": len(vx.symbols),
+                      "ms": round((time.perf_counter() - t0) * 1e3, 2)}))
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,185 @@
+﻿from __future__ import annotations
+
+import ast
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Literal, Mapping, Optional
+
+import numpy as np
+import yaml
+from pydantic import Field, ValidationError, model_validator
+
+from modules_utils.config_loader import BaseModel
+
+# Définitions des features et signaux VectorX (vectorx_config.yml) et
+# compilation des expressions de signaux en fonctions NumPy sur des
+# colonnes (un vecteur par feature, une ligne par symbole).
+
+CONFIG_PATH = Path(__file__).with_name("vectorx_config.yml")
+BAR_FIELDS = ("close", "high", "low", "volume")
+
+
+class FeatureDef(BaseModel):
+    kind: Literal["ema", "logret", "ewstd", "zscore", "roc", "rsi", "atr"]
+    source: str = "close"
+    period: int = Field(default=14, ge=1)
+
+
+class SignalDef(BaseModel):
+    expr: str
+    long_above: Optional[float] = None
+    short_below: Optional[float] = None
+
+
+class SnapshotDef(BaseModel):
+    dir: str = "data/models/vectorx_snapshots"
+    keep: int = Field(default=5, ge=1)
+    every_s: float = Field(default=300.0, gt=0)
+
+
+class VectorXConfig(BaseModel):
+    name: str = Field(default="default", pattern=r"^[A-Za-z0-9_.-]+$")
+    symbols: List[str] = []
+    capacity: int = Field(default=64, ge=1)
+    features: Dict[str, FeatureDef] = {}
+    signals: Dict[str, SignalDef] = {}
+    snapshot: SnapshotDef = SnapshotDef()
+
+    @model_validator(mode="after")
+    def _check_refs(self) -> "VectorXConfig":
+        known = set(BAR_FIELDS)
+        for name, f in self.features.items():
+            if name in known:
+                raise ValueError(f"feature {name!r} shadows a bar field or an earlier feature")
+            if f.source not in known:
+                raise ValueError(f"feature {name!r}: unknown source {f.source!r} (bar fields or earlier features)")
+            known.add(name)
+        for name, s in self.signals.items():
+            missing = names_in(s.expr) - known
+            if missing:
+                raise ValueError(f"signal {name!r}: unknown names {sorted(missing)}")
+        return self
+
+    def state_hash(self) -> str:
+        """Empreinte de la disposition de l'état (features seulement): un snapshot n'est valide que pour elle."""
+        doc = json.dumps({k: v.model_dump() for k, v in self.features.items()}, sort_keys=True)
+        return hashlib.blake2b(doc.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def load_config(path: str | Path = CONFIG_PATH) -> VectorXConfig:
+    data = yaml.safe_load(Path(path).read_text(encoding="utf-8-sig")) or {}
+    try:
+        return VectorXConfig(**(data.get("vectorx") or {}))
+    except ValidationError as e:
+        raise ValueError(f"Invalid {Path(path).name}: {e}") from e
+
+
+# ---------- Expressions ----------
+
+Column = Callable[[Mapping[str, np.ndarray]], np.ndarray]
+
+_BINOPS = {
+    ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide, ast.Pow: np.power,
+}
+_CMPOPS = {
+    ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater, ast.GtE: np.greater_equal,
+    ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+_FUNCS: Dict[str, Callable[..., np.ndarray]] = {
+    "abs": np.abs, "sign": np.sign, "tanh": np.tanh, "log": np.log, "exp": np.exp, "sqrt": np.sqrt,
+    "min": np.minimum, "max": np.maximum, "clip": np.clip, "where": np.where,
+}
+
+
+def names_in(expr: str) -> set:
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"invalid expression {expr!r}: {e.msg}") from None
+    return {n.id for n in ast.walk(tree) if isinstance(n, ast.Name) and n.id not in _FUNCS}
+
+
+def compile_expr(expr: str) -> Column:
+    """
+    Compile une expression (ex: "tanh((ema_fast - ema_slow) / (close * vol))")
+    en fonction env -> tableau. Seuls noms de colonnes, constantes
+    numériques, + - * / **, comparaisons, and/or/not et les fonctions de
+    _FUNCS sont admis; le reste lève ValueError (pas d'eval).
+    """
+    def build(node: ast.AST) -> Column:
+        if isinstance(node, ast.Expression):
+            return build(node.body)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+                and not isinstance(node.value, bool):
+            c = float(node.value)
+            return lambda env: c
+        if isinstance(node, ast.Name):
+            name = node.id
+            return lambda env: env[name]
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINOPS:
+            op, a, b = _BINOPS[type(node.op)], build(node.left), build(node.right)
+            return lambda env: op(a(env), b(env))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd, ast.Not)):
+            a = build(node.operand)
+            if isinstance(node.op, ast.USub):
+                return lambda env: np.negative(a(env))
+            if isinstance(node.op, ast.Not):
+                return lambda env: np.logical_not(a(env))
+            return a
+        if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in _CMPOPS:
+            op, a, b = _CMPOPS[type(node.ops[0])], build(node.left), build(node.comparators[0])
+            return lambda env: op(a(env), b(env))
+        if isinstance(node, ast.BoolOp):
+            parts = [build(v) for v in node.values]
+            op = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+
+            def _bool(env, parts=parts, op=op):
+                out = parts[0](env)
+                for p in parts[1:]:
+                    out = op(out, p(env))
+                return out
+            return _bool
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCS \
+                and not node.keywords:
+            fn, args = _FUNCS[node.func.id], [build(a) for a in node.args]
+            return lambda env: fn(*(a(env) for a in args))
+        raise ValueError(f"unsupported expression element: {ast.dump(node)[:60]}")
+
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"invalid expression {expr!r}: {e.msg}") from None
+    return build(tree)
+
+
+class SignalSet:
+    """
+    Signaux compilés: evaluate(env, scores, directions) remplit une colonne
+    par signal pour toutes les lignes (symboles) d'un coup; direction = +1
+    si score > long_above, -1 si score < short_below, 0 sinon (NaN: 0).
+
+    Exemple d'usage:
+      sigs = SignalSet(load_config().signals)
+      sigs.evaluate({"close": close, "ema_fast": ef, ...}, scores, dirs)
+    """
+
+    def __init__(self, defs: Mapping[str, SignalDef]) -> None:
+        self.names = list(defs)
+        self.defs = dict(defs)
+        self._fns = [compile_expr(d.expr) for d in defs.values()]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def evaluate(self, env: Mapping[str, Any], scores: np.ndarray, directions: np.ndarray) -> None:
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            for j, (fn, d) in enumerate(zip(self._fns, self.defs.values())):
+                col = scores[:, j]
+                col[...] = fn(env)
+                dcol = directions[:, j]
+                dcol[...] = 0
+                if d.long_above is not None:
+                    dcol[col > d.long_above] = 1
+                if d.short_below is not None:
+                    dcol[col < d.short_below] = -1